@@ -1,7 +1,9 @@
 #!/usr/bin/python3
 
 import sqlparse.sql as sql
-from sqlparse import format, parse
+from sqlparse import format, lexer
+from sqlparse.engine import grouping
+from sqlparse.engine.statement_splitter import StatementSplitter
 from typing import Any
 import sys
 import os
@@ -10,35 +12,50 @@ import gzip
 import re
 import string
 import secrets
+import codecs
+import hashlib
+import json
+import bisect
+import time
+import tracemalloc
+import threading
+import inspect
 
 
 class Attribute:
     """Trida reprezentujici atribut (vc. pripadneho aliasu a pozadovane hodnoty)"""
-    # Typy zavislosti u fiktivnich atributu:
+    # Atributy jsou ulozeny ve slotech (bez slovniku __dict__), kterych jsou pri zpracovani rozsahlejsich dotazu miliony
+    __slots__ = ("name", "short_name", "alias", "kind", "condition", "comment")
+    # Druh podminky (kind): bezny atribut, jehoz pripadna podminka je textem ulozenym v condition
+    CONDITION_TEXT = 0
+    # Specialni podminky (condition je u nich vzdy None), typy zavislosti u fiktivnich atributu:
     # Fiktivni atribut je pouzit k predani relevantniho komentare
-    CONDITION_COMMENT = "COMMENT"
+    CONDITION_COMMENT = 1
     # Fiktivni atribut obsahuje referenci (ID) na navazanou tabulku vzniklou pri parsovani "EXISTS SELECT ..."
-    CONDITION_EXISTS_SELECT = "EXISTS_SELECT"
+    CONDITION_EXISTS_SELECT = 2
     # Fiktivni atribut obsahuje referenci (ID) na jiz existujici navazanou tabulku (typicky subselect)
-    CONDITION_DEPENDENCY = "DEPENDENCY"
+    CONDITION_DEPENDENCY = 3
     # Fiktivni atribut obsahuje jmeno tabulky reprezentujici subselect (vlivem rekurzivniho zpracovavani totiz je na jedno urovni rekurze zjisten pripadny alias a komentar k subselectu a na jine urovni rekurze pak nazev mezi-tabulky pro subselect)
-    CONDITION_SUBSELECT_NAME = "SUBSELECT_NAME"
+    CONDITION_SUBSELECT_NAME = 4
     # Fiktivni atribut s informaci, ze v podminkach byl Placeholder (:PROMENNA)
-    CONDITION_PLACEHOLDER_PRESENT = "PLACEHOLDER_PRESENT"
+    CONDITION_PLACEHOLDER_PRESENT = 5
     # Atribut neni kompletni (typicky v dusledku chybneho rozdeleni tokenu na vice casti -- chyby v sqlparse)
-    CONDITION_SPLIT_ATTRIBUTE = "SPLIT_ATTRIBUTE"
+    CONDITION_SPLIT_ATTRIBUTE = 6
     # Atribut indikujici skutecnost, ze okolni dva atributy musi byt slouceny zde ulozenou spojkou (potreba typicky v situaci, kdy je operace apod. vracena jako vice tokenu v dusledku pritomnosti "komentar \n" nekde uvnitr)
-    CONDITION_SPLIT_ATTRIBUTE_LINK = "SPLIT_ATTRIBUTE_LINK"
+    CONDITION_SPLIT_ATTRIBUTE_LINK = 7
     # Atribut typicky obsahujici literal, kde byl SQL kod vlivem chyby v sqlparse rozdelen na vice casti a muze tedy chybet alias
-    CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING = "SPLIT_ATTRIBUTE_ALIAS_MISSING"
+    CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING = 8
     # Atributy obsahujici pouze jednu cast podminky (leva strana podminky, operator, prava strana podminky; typicky z casti "ON ...", kde jsou v urcitych situacich tokeny vraceny jednotlive)
-    CONDITION_SINGLE_ELEMENT = "SINGLE_ELEMENT"
+    CONDITION_SINGLE_ELEMENT = 9
     # Atribut z bloku ve WITH, u ktereho dopredu zname pouze alias ("WITH table(attr_alias_1, attr_alias_2, ...) AS ...")
-    CONDITION_TBD = "TO_BE_DETERMINED"
+    CONDITION_TBD = 10
+    # Textova podoba specialnich podminek (index == kind; pouzivana pri vypisu atributu)
+    CONDITION_NAMES = [None, "COMMENT", "EXISTS_SELECT", "DEPENDENCY", "SUBSELECT_NAME", "PLACEHOLDER_PRESENT", "SPLIT_ATTRIBUTE", "SPLIT_ATTRIBUTE_LINK", "SPLIT_ATTRIBUTE_ALIAS_MISSING", "SINGLE_ELEMENT", "TO_BE_DETERMINED"]
 
-    def __init__(self, name, alias=None, condition=None, comment=None):
+    def __init__(self, name, alias=None, condition=None, comment=None, kind=CONDITION_TEXT):
         self.set_name(name)
-        self.alias = alias
+        self.alias = ParseSession.current().pool.intern(alias)
+        self.kind = kind
         self.condition = condition
         self.set_comment(comment)
 
@@ -50,11 +67,14 @@ class Attribute:
             name = name.replace("\n", " ").replace("\t", " ")
             # Vicenasobne bile znaky taktez nahradime mezerami
             name = re.sub("\\s+", " ", name)
-            self.name = name
             if Attribute.is_standard_name(name):
+                # Identifikatory se v ramci davky zpracovani mnohokrat opakuji, ukladame tedy sdilene instance (viz InternPool)
+                pool = ParseSession.current().pool
+                self.name = pool.intern(name)
                 # Funguje i v pripade, ze tecku nenajdeme (proste vrati name)
-                self.short_name = name[(name.rfind(".") + 1):]
+                self.short_name = pool.intern(name[(name.rfind(".") + 1):])
             else:
+                self.name = name
                 self.short_name = None
         else:
             self.name = None
@@ -69,17 +89,27 @@ class Attribute:
 
     def is_standard_attribute(self) -> bool:
         """Vraci logickou hodnotu udavajici, zda podminka uvedena u atributu je standardni, nebo jde o specialni podminku ze seznamu CONDITION_* v tride Attribute"""
-        return (self.name != None
-                and self.condition != Attribute.CONDITION_COMMENT
-                and self.condition != Attribute.CONDITION_EXISTS_SELECT
-                and self.condition != Attribute.CONDITION_DEPENDENCY
-                and self.condition != Attribute.CONDITION_SUBSELECT_NAME
-                and self.condition != Attribute.CONDITION_PLACEHOLDER_PRESENT
-                and self.condition != Attribute.CONDITION_SPLIT_ATTRIBUTE
-                and self.condition != Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
-                and self.condition != Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING
-                and self.condition != Attribute.CONDITION_SINGLE_ELEMENT
-                and self.condition != Attribute.CONDITION_TBD)
+        return self.name != None and self.kind == Attribute.CONDITION_TEXT
+
+    def has_condition(self) -> bool:
+        """Vraci logickou hodnotu udavajici, zda je u atributu uvedena nejaka podminka (textova ci specialni)"""
+        return self.condition != None or self.kind != Attribute.CONDITION_TEXT
+
+    def get_condition(self) -> str:
+        """Vraci textovou podobu podminky atributu (u specialnich podminek jejich nazev z CONDITION_NAMES), prip. None"""
+        if self.kind != Attribute.CONDITION_TEXT:
+            return Attribute.CONDITION_NAMES[self.kind]
+        return self.condition
+
+    def set_condition(self, condition: str, kind=CONDITION_TEXT) -> None:
+        """Nastavi textovou podminku (prip. None), resp. specialni podminku zadanou pomoci kind. Metoda nic nevraci."""
+        self.kind = kind
+        self.condition = condition
+
+    def append_to_condition(self, text: str) -> None:
+        """Pripoji zadany text k textove podobe podminky (specialni podminka se tim stava beznou textovou podminkou). Metoda nic nevraci."""
+        self.condition = self.get_condition() + text
+        self.kind = Attribute.CONDITION_TEXT
 
     def set_comment(self, comment: str) -> None:
         """Nastavi komentar u atributu"""
@@ -101,7 +131,7 @@ class Attribute:
     def deep_copy(self) -> "Attribute":
         """Vraci "hlubokou" kopii atributu"""
         # Pro zrychleni operace nejprve vytvorime atribut s name == comment == None a tyto nasledne doplnime primym prirazenim (tzn. bez interniho volani metod set_name(...) a set_comment(...))
-        attribute = Attribute(name=None, alias=self.alias, condition=self.condition, comment=None)
+        attribute = Attribute(name=None, alias=self.alias, condition=self.condition, comment=None, kind=self.kind)
         attribute.name = self.name
         attribute.short_name = self.short_name
         attribute.comment = self.comment
@@ -109,26 +139,24 @@ class Attribute:
 
 
 class Table:
-    """Trida reprezentujici tabulku (kazda tabulka ma unikatni ID a jmeno)"""
-    # Nejnizsi volne ID
-    __next_id__ = 0
-    # Mnozina sablon pro automatickou tvorbu nazvu tabulek (klic == sablona, hodnota == aktualni poradove cislo k pouziti pri tvorbe nazvu)
-    __next_template_num__ = {}
+    """Trida reprezentujici tabulku (kazda tabulka ma unikatni ID a jmeno v ramci relace, viz ParseSession)"""
+    __slots__ = ("id", "name", "statement_aliases", "attributes", "conditions", "used_bind_vars", "table_type", "comment", "subcomment", "source_span", "linked_to_tables_id", "references")
     # Typy tabulek (nutne pro pozdejsi barevne odliseni v generovanem diagramu/.dia)
     STANDARD_TABLE = 0
     WITH_TABLE = 1
     MAIN_SELECT = 2
     AUX_TABLE = 3
-    # Kolekce nalezenych tabulek
-    __tables__ = []
+    # Blok z WITH mimo okoli bloku zadaneho prepinacem --focus, na ktery zpracovane bloky odkazuji (jeho kod nebyl zpracovan, nejde vsak o tabulku z DB, viz focus_statement(...))
+    WITH_STUB = 4
 
-    def __init__(self, name=None, name_template=None, attributes=None, conditions=None, comment=None, source_sql=None, table_type=None):
+    def __init__(self, name=None, name_template=None, attributes=None, conditions=None, comment=None, source_span=None, table_type=None):
         self.id = Table.__generate_id__()
         if name != None:
-            self.name = name
+            self.name = ParseSession.current().pool.intern(name)
         else:
             # Jmeno nebylo zadane, vygenerujeme ho pomoci sablony
             self.name = Table.__generate_name__(name_template)
+        # Aliasy tabulek uvedene v teto tabulce (klic == ID tabulky, hodnota == mnozina aliasu, tzn. slovnik s aliasy jako klici zachovavajici poradi pridani)
         self.statement_aliases = {}
         self.attributes = []
         if attributes != None:
@@ -136,26 +164,30 @@ class Table:
         self.conditions = []
         if conditions != None:
             self.conditions.extend(conditions)
-        self.used_bind_vars = []
+        # Pouzite bindovane promenne a ID navazanych tabulek jsou (kvuli castemu testovani prislusnosti) ulozeny jako mnoziny zachovavajici poradi pridani (slovniky s hodnotami None)
+        self.used_bind_vars = {}
         # Typ tabulky musime nastavit pred nastavovanim komentare, jeliokz se podle toho ridi, zda rozdelovat ci nerozdelovat komentar na hlavni cast a podkomentar
         if (table_type == None
                 or (table_type != Table.STANDARD_TABLE
                 and table_type != Table.WITH_TABLE
                 and table_type != Table.MAIN_SELECT
-                and table_type != Table.AUX_TABLE)):
+                and table_type != Table.AUX_TABLE
+                and table_type != Table.WITH_STUB)):
             table_type = Table.STANDARD_TABLE
         self.table_type = table_type
         self.set_comment(comment)
-        self.source_sql = source_sql
-        self.linked_to_tables_id = []
+        # Rozsah SQL kodu tabulky ve sdilenem zdrojovem kodu (viz SourceBuffer); samotny text vraci get_source_sql()
+        self.source_span = source_span
+        self.linked_to_tables_id = {}
+        # Pocet vyskytu tabulky v SQL kodu (identicke subselecty v ramci prikazu sdileji jedinou mezi-tabulku, viz ParseSession.find_subselect(...))
+        self.references = 1
 
     def __str__(self) -> str:
         # Odsazeni pouzivane pri vypisu tabulek
         indent = "    "
+        # Aliasy jsou serazene podle abecedy
         alias_collection = Table.get_all_known_aliases(self.id)
         if len(alias_collection) > 0:
-            # Aliasy chceme mit serazene podle abecedy
-            alias_collection.sort()
             aliases = f"\n{indent}{indent}".join(alias_collection)
         else:
             aliases = "<žádné>"
@@ -182,8 +214,8 @@ class Table:
             # Zde chceme vypsat podminky z WHERE/ON, takze textove reprezentace budou vc. pripadnych podminek. Postupovat budeme temer stejne jako pri vypisu standardnich atributu.
             attribute_collection = []
             for attr in self.conditions:
-                if attr.condition != None:
-                    condition = f" {attr.condition}"
+                if attr.has_condition():
+                    condition = f" {attr.get_condition()}"
                 else:
                     condition = ""
                 if attr.alias != None:
@@ -202,55 +234,49 @@ class Table:
         else:
             conditions = "<žádné>"
         if self.uses_bind_vars():
-            self.used_bind_vars.sort()
-            bind_vars = f"\n{indent}{indent}".join(self.used_bind_vars)
+            bind_vars = f"\n{indent}{indent}".join(sorted(self.used_bind_vars))
         else:
             bind_vars = "<žádné>"
         # Analogicky budeme postupovat u seznamu navazanych tabulek (chceme je mit serazene abecedne podle jmen)
         if len(self.linked_to_tables_id) > 0:
             name_collection = []
             for id in self.linked_to_tables_id:
-                for table in Table.__tables__:
-                    if table.id == id:
-                        name_collection.append(f"{table.name} (ID {id})")
-                        break
+                table = Table.get_table_by_id(id)
+                if table != None:
+                    name_collection.append(f"{table.name} (ID {id})")
             names = f"\n{indent}{indent}".join(name_collection)
         else:
             names = "<žádné>"
         comment = Table.__trim_to_length__(self.comment)
         subcomment = Table.__trim_to_length__(self.subcomment)
-        source_sql = Table.__trim_to_length__(self.source_sql)
-        return f"TABULKA {self.name} (ID {self.id})\n{indent}Všechny známé aliasy:\n{indent}{indent}{aliases}\n{indent}Sloupce:\n{indent}{indent}{attributes}\n{indent}Podmínky (bez uvažování log. spojek):\n{indent}{indent}{conditions}\n{indent}Použité bindované proměnné:\n{indent}{indent}{bind_vars}\n{indent}Vazba na tabulky:\n{indent}{indent}{names}\n{indent}Komentář:\n{indent}{indent}\"{comment}\"\n{indent}Podkomentář:\n{indent}{indent}\"{subcomment}\"\n{indent}SQL kód:\n{indent}{indent}\"{source_sql}\""
+        source_sql = Table.__trim_to_length__(self.get_source_sql())
+        references = f", výskytů v SQL kódu: {self.references}" if self.references > 1 else ""
+        return f"TABULKA {self.name} (ID {self.id}{references})\n{indent}Všechny známé aliasy:\n{indent}{indent}{aliases}\n{indent}Sloupce:\n{indent}{indent}{attributes}\n{indent}Podmínky (bez uvažování log. spojek):\n{indent}{indent}{conditions}\n{indent}Použité bindované proměnné:\n{indent}{indent}{bind_vars}\n{indent}Vazba na tabulky:\n{indent}{indent}{names}\n{indent}Komentář:\n{indent}{indent}\"{comment}\"\n{indent}Podkomentář:\n{indent}{indent}\"{subcomment}\"\n{indent}SQL kód:\n{indent}{indent}\"{source_sql}\""
 
     @classmethod
     def get_all_known_aliases(cls, table_id: int) -> list:
-        """Vraci vsechny zname aliasy tabulky se zadanym ID"""
-        if table_id < 0 or table_id > Table.__next_id__ - 1:
-            return []
-        alias_collection = []
-        for table in Table.__tables__:
-            if table_id in table.statement_aliases.keys():
-                aliases = table.statement_aliases[table_id]
-                for a in aliases:
-                    if not a in alias_collection:
-                        alias_collection.append(a)
-        return alias_collection
+        """Vraci abecedne serazene vsechny zname aliasy tabulky se zadanym ID"""
+        return sorted(ParseSession.current().symbols.aliases.get(table_id, {}))
 
     @classmethod
     def add_alias(cls, alias_table: "Table", table_id: int, alias: str) -> bool:
         """Ulozi statement alias (slovnik aliasu je ulozen v alias_table) tabulky s ID == table_id. Vraci logickou hodnotu vyjadrujici uspesnost pozadovane operace."""
         if (alias_table == None
                 or table_id < 0
-                or table_id > Table.__next_id__ - 1
+                or table_id > ParseSession.current().next_id - 1
                 or alias == None):
             # Neni co, resp. k cemu nastavit...
             return False
+        session = ParseSession.current()
+        alias = session.pool.intern(alias)
         statement_aliases = alias_table.statement_aliases
         if not table_id in statement_aliases:
-            statement_aliases[table_id] = [alias]
+            statement_aliases[table_id] = {alias: None}
+            session.symbols.add_alias(alias_table.id, table_id, alias)
             return True
         if not alias in statement_aliases[table_id]:
-            statement_aliases[table_id].append(alias)
+            statement_aliases[table_id][alias] = None
+            session.symbols.add_alias(alias_table.id, table_id, alias)
             return True
         # Alias uz je ulozeny z drivejska, takze vratime False
         return False
@@ -261,7 +287,7 @@ class Table:
     #         return 0
     #     count = 0
     #     for attribute in self.attributes:
-    #         if attribute.is_standard_attribute() or attribute.condition == Attribute.CONDITION_TBD:
+    #         if attribute.is_standard_attribute() or attribute.kind == Attribute.CONDITION_TBD:
     #             count += 1
     #     return count
     
@@ -349,13 +375,16 @@ class Table:
         if var == None:
             return False
         var = var.strip()
-        if len(var) == 0:
-            return False
         if var.startswith(":"):
             var = var[1:]
+        elif var.startswith("&"):
+            # Substitucni promenna (&NAZEV, &&NAZEV) vracena z FastLexer
+            var = var.lstrip("&")
+        if len(var) == 0:
+            return False
         if var in self.used_bind_vars:
             return False
-        self.used_bind_vars.append(var)
+        self.used_bind_vars[var] = None
         return True
 
     def copy_bind_vars_to_table(self, target_table: "Table") -> None:
@@ -364,14 +393,13 @@ class Table:
             return
         for var in self.used_bind_vars:
             # Zde predpokladame, ze ve zdrojove kolekci jsou jen promenne s "pricetnymi" nazvy, cili muzeme rovnou aktualizovat cilovou kolekci namisto volani add_bind_var(...), kde by znovu probihaly veskere kontroly
-            if var in target_table.used_bind_vars:
-                continue
-            target_table.used_bind_vars.append(var)
+            target_table.used_bind_vars[var] = None
 
     def copy_aliases_to_table(self, target_table: "Table") -> None:
         """Zkopiruje aliasy ze slovniku aktualni tabulky (self.statement_aliases) do slovnku cilove tabulky (target_table.statement_aliases). Metoda nic nevraci."""
         if target_table == None:
             return False
+        symbols = ParseSession.current().symbols
         tables_with_aliases = self.statement_aliases.keys()
         for id in tables_with_aliases:
             if id in target_table.statement_aliases:
@@ -379,7 +407,8 @@ class Table:
                 additional_aliases = self.statement_aliases[id]
                 for a in additional_aliases:
                     if not a in current_aliases:
-                        current_aliases.append(a)
+                        current_aliases[a] = None
+                        symbols.add_alias(target_table.id, id, a)
 
     def set_comment(self, comment: str) -> None:
         """Zadany retezec rozdeli na hlavni komentar a podkomentar a oboji ulozi k tabulce. Metoda nic nevraci."""
@@ -413,10 +442,25 @@ class Table:
         else:
             self.subcomment = text
     
+    def set_name(self, name: str) -> None:
+        """Prejmenuje tabulku (vc. aktualizace indexu jmen relace, viz SymbolTable). Metoda nic nevraci."""
+        symbols = ParseSession.current().symbols
+        symbols.remove_name(self)
+        self.name = symbols.pool.intern(name)
+        symbols.add_name(self)
+
     def comment_is_set(self) -> bool:
         """Vraci logickou hodnotu udavajici, zda je u tabulky nastaven neprazdny komentar"""
         return self.comment != None and len(self.comment) > 0
 
+    def get_source_sql(self) -> str:
+        """Vrati SQL kod tabulky (text je sestaven az nyni ze sdileneho zdrojoveho kodu), prip. None, pokud kod neni znam"""
+        return ParseSession.current().source.get_text(self.source_span)
+
+    def source_sql_is_set(self) -> bool:
+        """Vraci logickou hodnotu udavajici, zda je u tabulky nastaven neprazdny SQL kod"""
+        return self.source_span != None and self.source_span[2] > self.source_span[1]
+
     @classmethod
     def __lrstrip__(cls, text: str, strip_chars: str) -> str:
         text = text.lstrip(strip_chars).rstrip(strip_chars)
@@ -441,44 +485,11 @@ class Table:
 
     @classmethod
     def get_table_by_name(cls, name: str, alias_table: "Table", match_attribute=None, exclude_table_id=-1) -> "Table":
-        """Vrati odkaz na tabulku odpovidajici zadanemu jmenu (muze byt i alias), prip. None, pokud v kolekci Table.__tables__ zadna takova tabulka neexistuje. Najdeme-li dve rozdilne tabulky (jednu podle jmena a druhou podle aliasu), je potreba rozhodnout na zaklade jejich atributu pomoci match_attribute. Parametr exclude_table_id slouzi k odfiltrovani aktualne resene tabulky (tato nemuze byt zdrojem informaci sama pro sebe). Porovnavani jmen je case-sensitive!"""
+        """Vrati odkaz na tabulku odpovidajici zadanemu jmenu (muze byt i alias), prip. None, pokud v kolekci tabulek relace zadna takova tabulka neexistuje. Najdeme-li dve rozdilne tabulky (jednu podle jmena a druhou podle aliasu), je potreba rozhodnout na zaklade jejich atributu pomoci match_attribute. Parametr exclude_table_id slouzi k odfiltrovani aktualne resene tabulky (tato nemuze byt zdrojem informaci sama pro sebe). Jmena i aliasy jsou porovnavany bez ohledu na velikost pismen."""
         if name == None:
             return None
-        statement_aliases = {}
-        if alias_table != None:
-            # Pro potreby porovnavani si zde vytvorime docasnou lowercase kopii statement aliasu
-            ids = alias_table.statement_aliases.keys()
-            for id in ids:
-                aliases = alias_table.statement_aliases[id]
-                for a in aliases:
-                    statement_aliases[id] = a.lower()
-        # Porovnavat budeme lowercase verze jmen
-        name = name.lower()
-        # Dostali jsme v parametru obycejne jmeno (prip. alias), nebo kanonicke jmeno (vc. schematu)?
-        bare_name_or_alias = name.rfind(".") < 0
-        # Jestlize je zadane jmeno tabulky bez nazvu schematu, ale o tabulce stejneho jmena vc. explicitniho uvedeni nazvu schematu uz vime, jde pravdepodobne (byt ne zcela jiste) o tutez tabulku. Pozor: Oracle nema problem zpracovat i situace typu "SELECT stage.id ... FROM ... INNER JOIN (SELECT stage.stage_id AS id FROM org.stage) AS stage" -- v JOIN/SELECT evidentne referencujeme org.stage, nikoliv alias subselectu, zatimco v hlavnim SELECT referencujeme alias subselectu v JOIN).
-        table_via_name = None
-        table_via_alias = None
-        for table in Table.__tables__:
-            # Nejprve si ulozime jmeno tabulky v lowercase verzi
-            table_name = table.name.lower()
-            # Mame uz nalezeno jak podle jmena, tak podle aliasu?
-            if table_via_name != None and table_via_alias != None:
-                break
-            # Resime tabulku, kterou mame ignorovat?
-            if table.id == exclude_table_id:
-                continue
-            trimmed_name = None
-            # Pokud jsme v parametru obdrzeli jmeno bez schematu a nazev tabulky (table_name) mame naopak ulozen vc. schematu, budeme se zadanym jmenem porovnavat i nazev tabulky bez schematu
-            if bare_name_or_alias:
-                i = table_name.rfind(".")
-                if i > 0:
-                    trimmed_name = table_name[(i + 1):]
-                # Uvnitr podminky jeste rovnou porovname alias
-                if table.id in statement_aliases and name in statement_aliases[table.id]:
-                    table_via_alias = table
-            if name == table_name or name == trimmed_name:
-                table_via_name = table
+        # Tabulky podle jmena (vc. porovnani jmena bez schematu) a podle aliasu v ramci alias_table najdeme v indexu jmen relace. Pozor: Oracle nema problem zpracovat i situace typu "SELECT stage.id ... FROM ... INNER JOIN (SELECT stage.stage_id AS id FROM org.stage) AS stage" -- v JOIN/SELECT evidentne referencujeme org.stage, nikoliv alias subselectu, zatimco v hlavnim SELECT referencujeme alias subselectu v JOIN).
+        (table_via_name, table_via_alias) = ParseSession.current().symbols.find(name, alias_table.id if alias_table != None else None, exclude_table_id)
         # Jestlize jsme tabulku nenasli podle nazvu a zaroven nemuze na zaklade match_attribute jit o tabulku z DB (zde by pri korektnim zadani byly v nazvu atributu dve tecky: "schema.tabulka.atribut"), vratime tabulku dle aliasu
         if table_via_name == None:
             return table_via_alias
@@ -500,29 +511,28 @@ class Table:
         #   (b) u takové tabulky mame uplny prehled o vsech atributech.
         match_name = match_attribute[(i + 1):]
         for attribute in table_via_alias.attributes:
-            # Preskocime vsechny fiktivni atributy (tzn. s condition != None; toto si muzeme dovolit, jelikoz standardni podminky jsou ukladany do table.conditions)
-            if attribute.condition != None:
+            # Preskocime vsechny fiktivni atributy (tzn. s jakoukoliv podminkou, viz has_condition(); toto si muzeme dovolit, jelikoz standardni podminky jsou ukladany do table.conditions)
+            if attribute.has_condition():
                 continue
-            if attribute.short_name.lower() == match_name or attribute.alias.lower() == match_name:
+            # Vyrazy (funkce, operace apod.) nemaji kratke jmeno a atributy bez aliasu nemaji alias
+            if (attribute.short_name or "").lower() == match_name or (attribute.alias or "").lower() == match_name:
                 return table_via_alias
         # Jestlize jsme neobjevili shodu v tabulce nalezene podle aliasu, musi jit o atribut (snadno i takovy, o kterem explicitne nevime) z tabulky v DB
         return table_via_name
 
     @classmethod
     def get_table_by_id(cls, id: int) -> "Table":
-        """Vrati odkaz na tabulku zadaneho ID, prip. None, pokud v kolekci Table.__tables__ zadna takova tabulka neexistuje"""
+        """Vrati odkaz na tabulku zadaneho ID, prip. None, pokud v kolekci tabulek relace zadna takova tabulka neexistuje"""
         if id == None or id < 0:
             return None
-        for table in Table.__tables__:
-            if id == table.id:
-                return table
-        return None
+        return ParseSession.current().tables_by_id.get(id)
 
     @classmethod
     def __generate_id__(cls) -> int:
         """Vrati nejnizsi volne celociselne ID, ktere lze priradit aktualne vytvarene tabulce (metoda je volana pouze z kontruktoru)"""
-        id = Table.__next_id__
-        Table.__next_id__ += 1
+        session = ParseSession.current()
+        id = session.next_id
+        session.next_id += 1
         return id
 
     @classmethod
@@ -536,25 +546,310 @@ class Table:
             if len(template) == 0:
                 template = "table"
         # Byla uz zadana sablona drive pouzita? Pokud ano, zjistime aktualni volne poradove cislo, jinak pouzijeme 0.
+        next_template_num = ParseSession.current().next_template_num
         try:
-            num = Table.__next_template_num__[template]
+            num = next_template_num[template]
         except:
             num = 0
-        # Nakonec sablonu pridame do mnoziny Table.__next_template_num__ a nastavime nove poradove cislo
-        Table.__next_template_num__[template] = num + 1
+        # Nakonec sablonu pridame do mnoziny sablon relace a nastavime nove poradove cislo
+        next_template_num[template] = num + 1
         return f"{template}-{num}"
 
     def link_to_table_id(self, id: int) -> bool:
         """Nastavi vazbu aktualni tabulky na tabulku se zadanym ID. Pokud uz vazba existuje (nebo se snazime nastavit vazbu na tabulku samotnou), vrati False, jinak vrati True."""
         if id in self.linked_to_tables_id or id == self.id:
             return False
-        self.linked_to_tables_id.append(id)
+        self.linked_to_tables_id[id] = None
         return True
 
 
 # hints_upper = ["MATERIALIZE", "NO_STAR_TRANSFORMATION"]
 
 
+class SourceBuffer:
+    """Sdileny (nemenny) zdrojovy kod SQL prikazu zpracovanych v ramci relace (viz ParseSession). Tabulky si misto kopie SQL kodu ukladaji pouze rozsah (index prikazu, zacatek, konec) a text je sestaven az pri vypisu (viz Table.get_source_sql()). Zpetnou nahradu nahodnych retezcu je tak mozne provest jedinkrat nad textem celeho prikazu."""
+
+    def __init__(self):
+        # Texty zpracovanych prikazu (uchovavany az do vypisu tabulek, a to i pri postupnem zpracovani souboru)
+        self.texts = []
+        # Pozice listovych tokenu (klic == id(token)) v prave zpracovavanem prikazu; prikaz si drzime kvuli platnosti id(...)
+        self.positions = {}
+        # Index komentaru v prave zpracovavanem prikazu (klic == id(token), vc. seskupenych sql.Comment) s jiz rozdelenou uvodni a koncovou casti (viz split_comment_text(...)). Jde pouze o jednorazove rozdeleni komentaru pro split_comment(...); prirazeni komentaru k tabulkam a sloupcum (comment_before apod. v process_statement(...)) ani orezani textu v set_comment(...) index nenahrazuje, jelikoz pravidla tohoto prirazeni obchazeji chyby seskupovani tokenu v sqlparse a nelze je vyjadrit pouhym sousedstvim tokenu.
+        self.comments = {}
+        self.statement = None
+
+    def add_statement(self, s: sql.TokenList) -> None:
+        """Prida text zadaneho prikazu do bufferu, spocita pozice jeho tokenu (seskupeni tokenu na pozicich nic nemeni, prikaz tedy muze byt seskupeny i neseskupeny) a sestavi index komentaru (viz get_comment(...)). Metoda nic nevraci."""
+        positions = {}
+        comments = {}
+        position = 0
+        # Listove tokeny prochazime s explicitnim zasobnikem (nikoliv pomoci rekurzivniho s.flatten()), aby hloubka vnoreni prikazu nebyla omezena limitem rekurze
+        stack = s.tokens[::-1]
+        while len(stack) > 0:
+            token = stack.pop()
+            if token.is_group:
+                # Seskupeny komentar (sql.Comment) indexujeme zvlast, jelikoz jeho hodnota muze obsahovat i koncove bile znaky
+                if isinstance(token, sql.Comment):
+                    comments[id(token)] = split_comment_text(token.value)
+                stack.extend(token.tokens[::-1])
+                continue
+            positions[id(token)] = position
+            if token.ttype == sql.T.Comment.Single or token.ttype == sql.T.Comment.Multiline:
+                comments[id(token)] = split_comment_text(token.value)
+            position += len(token.value)
+        # Text celeho prikazu je v sqlparse predpocitan (a seskupenim tokenu se nemeni)
+        self.texts.append(s.value)
+        self.positions = positions
+        self.comments = comments
+        self.statement = s
+
+    def add_text(self, text: str) -> None:
+        """Prida do bufferu pouze text prikazu bez pozic tokenu a indexu komentaru (pozice tokenu si pocita volajici, viz process_statement_dependencies(...)). Metoda nic nevraci."""
+        self.texts.append(text)
+        self.positions = {}
+        self.comments = {}
+        self.statement = None
+
+    def get_comment(self, t: sql.Token) -> list:
+        """Vrati komentar zadaneho tokenu prave zpracovavaneho prikazu rozdeleny na uvodni a koncovou cast, prip. None, pokud token v indexu neni"""
+        return self.comments.get(id(t))
+
+    def get_position(self, t: sql.Token) -> int:
+        """Vrati pozici zacatku zadaneho tokenu (vc. seskupenych tokenu) v textu prave zpracovavaneho prikazu"""
+        while t.is_group:
+            t = t.tokens[0]
+        return self.positions[id(t)]
+
+    def get_end_position(self, t: sql.Token) -> int:
+        """Vrati pozici konce zadaneho tokenu v textu prave zpracovavaneho prikazu"""
+        return self.get_position(t) + len(t.value)
+
+    def get_span(self, start: int, end: int) -> tuple:
+        """Vrati rozsah (index prikazu, zacatek, konec) v textu prave zpracovavaneho prikazu"""
+        return (len(self.texts) - 1, start, end)
+
+    def get_text(self, span: tuple) -> str:
+        """Vrati text odpovidajici zadanemu rozsahu, prip. None, pokud rozsah neni zadany"""
+        if span == None:
+            return None
+        (index, start, end) = span
+        return self.texts[index][start:end]
+
+    def restore(self, engine: "RewriteEngine", r_tag: str, tables: list) -> None:
+        """V textech vsech prikazu provede zpetnou nahradu nahodnych retezcu (viz restore_replacements(...)) a podle zmen delek textu prepocita rozsahy SQL kodu zadanych tabulek. Metoda nic nevraci."""
+        # Posuny pozic v jednotlivych prikazech ve tvaru ([pozice za nahrazenym retezcem v puvodnim textu], [celkovy posun od teto pozice dal])
+        shifts = {}
+        for index in range(len(self.texts)):
+            if r_tag in self.texts[index].lower():
+                (self.texts[index], shifts[index]) = engine.apply_mapped(self.texts[index])
+
+        def shift(position: int, ends: list, deltas: list) -> int:
+            # Rozsahy zacinaji i konci na hranicich tokenu, tzn. nikdy ne uvnitr nahrazovaneho retezce
+            k = bisect.bisect_right(ends, position) - 1
+            return position if k < 0 else position + deltas[k]
+
+        for table in tables:
+            if table.source_span != None and table.source_span[0] in shifts:
+                (index, start, end) = table.source_span
+                (ends, deltas) = shifts[index]
+                table.source_span = (index, shift(start, ends, deltas), shift(end, ends, deltas))
+
+
+class InternPool:
+    """Sklad identifikatoru (jmen tabulek, atributu a aliasu splnujicich Attribute.is_standard_name(...)) a klicu jmen tabulek, ktery muze byt sdilen vice relacemi zpracovani (viz ParseSession). Pri davkovem zpracovani mnoha souboru v jednom procesu vlastni sklad ridici kod davky a predava ho vsem relacim, takze stale se opakujici nazvy tabulek z DB a jejich sloupcu jsou v pameti ulozeny jen jednou a lowercase podoba jmena kazde tabulky je spocitana jen jednou. Stejne retezce z ruznych tabulek a souboru jsou pak totozne objekty, takze klice v indexu jmen (viz SymbolTable) jsou porovnavany nejprve (a zpravidla jen) podle identity. Vyrazy (CASE, NVL(...), aritmeticke operace apod.) a generovana jmena mezi-tabulek se do skladu neukladaji, jeho velikost tedy zavisi pouze na poctu ruznych identifikatoru, nikoliv na objemu zpracovaneho kodu."""
+
+    def __init__(self):
+        # Jednotlive retezce (klic == hodnota)
+        self.strings = {}
+        # Klice jmen tabulek: jmeno -> (lowercase jmeno, lowercase jmeno bez schematu, prip. None u jmena bez schematu)
+        self.table_keys = {}
+
+    def intern(self, text: str) -> str:
+        """Vrati sdilenou instanci zadaneho identifikatoru; jine retezce (a None) vrati beze zmeny"""
+        if text == None:
+            return None
+        shared = self.strings.get(text)
+        if shared != None:
+            return shared
+        if Attribute.is_standard_name(text):
+            self.strings[text] = text
+        return text
+
+    def get_table_key(self, name: str) -> tuple:
+        """Vrati klic jmena tabulky (prip. aliasu) pro index jmen: dvojici (lowercase jmeno, lowercase jmeno bez schematu), pricemz jmeno bez schematu je None, pokud zadane jmeno zadne schema neobsahuje. Ukladany jsou pouze klice identifikatoru."""
+        key = self.table_keys.get(name)
+        if key == None:
+            folded = self.intern(name.lower())
+            i = folded.rfind(".")
+            key = (folded, self.intern(folded[(i + 1):]) if i > 0 else None)
+            if Attribute.is_standard_name(name):
+                self.table_keys[self.intern(name)] = key
+        return key
+
+
+class SymbolTable:
+    """Index jmen a aliasu tabulek relace zpracovani (viz ParseSession) pro Table.get_table_by_name(...). Jmena i aliasy jsou ulozeny v lowercase verzi (jmena vc. schematu navic i bez schematu), takze vyhledani je jedinym dotazem do slovniku misto prochazeni vsech tabulek. Aliasy jsou rozdeleny do oboru platnosti: oborem je tabulka (SELECT, subselect apod.), ve ktere byl alias uveden (viz Table.add_alias(...)), aliasy z vnorenych subselectu jsou do nadrazeneho oboru prenaseny pomoci Table.copy_aliases_to_table(...). Index je udrzovan prubezne pri pridavani tabulek a aliasu."""
+
+    def __init__(self, tables_by_id: dict, pool: InternPool):
+        # Index tabulek podle ID (sdileny s relaci zpracovani) a sklad identifikatoru relace (lowercase klice jmen)
+        self.tables_by_id = tables_by_id
+        self.pool = pool
+        # Tabulky podle lowercase jmena, resp. podle lowercase jmena bez schematu (pouze u jmen vc. schematu)
+        self.names = {}
+        self.bare_names = {}
+        # Obory platnosti aliasu (klic == ID tabulky, ve ktere byly aliasy uvedeny, hodnota == slovnik lowercase alias -> seznam ID tabulek)
+        self.scopes = {}
+        # Vsechny zname aliasy jednotlivych tabulek napric obory platnosti (klic == ID tabulky, hodnota == slovnik s aliasy jako klici, tzn. mnozina zachovavajici poradi pridani)
+        self.aliases = {}
+        # Poradi pridani tabulek (pri vice shodach rozhoduje poradi tabulek v kolekci relace)
+        self.order = {}
+
+    def add_table(self, table: "Table") -> None:
+        """Prida do indexu jmeno nove tabulky. Metoda nic nevraci."""
+        self.order[table.id] = len(self.order)
+        self.add_name(table)
+
+    def add_name(self, table: "Table") -> None:
+        """Prida do indexu jmeno (vc. varianty bez schematu) zadane tabulky. Metoda nic nevraci."""
+        (name, bare_name) = self.pool.get_table_key(table.name)
+        self.names.setdefault(name, []).append(table)
+        if bare_name != None:
+            self.bare_names.setdefault(bare_name, []).append(table)
+
+    def remove_name(self, table: "Table") -> None:
+        """Odebere z indexu jmeno (vc. varianty bez schematu) zadane tabulky (napr. pred jejim prejmenovanim). Metoda nic nevraci."""
+        (name, bare_name) = self.pool.get_table_key(table.name)
+        self.names[name].remove(table)
+        if bare_name != None:
+            self.bare_names[bare_name].remove(table)
+
+    def add_alias(self, scope_id: int, table_id: int, alias: str) -> None:
+        """Prida do oboru platnosti tabulky s ID == scope_id alias tabulky s ID == table_id (a zaroven mezi vsechny zname aliasy tabulky, viz Table.get_all_known_aliases(...)). Metoda nic nevraci."""
+        ids = self.scopes.setdefault(scope_id, {}).setdefault(self.pool.get_table_key(alias)[0], [])
+        if not table_id in ids:
+            ids.append(table_id)
+        self.aliases.setdefault(table_id, {})[alias] = None
+
+    def rebuild(self, tables: list) -> None:
+        """Sestavi index znovu ze zadane kolekce tabulek (po odebrani tabulek nebo hromadne zmene jmen a aliasu). Metoda nic nevraci."""
+        self.names = {}
+        self.bare_names = {}
+        self.scopes = {}
+        self.aliases = {}
+        self.order = {}
+        for table in tables:
+            if table.id in self.order:
+                continue
+            self.add_table(table)
+            for (id, aliases) in table.statement_aliases.items():
+                for a in aliases:
+                    self.add_alias(table.id, id, a)
+
+    def find(self, name: str, scope_id: int, exclude_table_id=-1) -> tuple:
+        """Vrati dvojici (tabulka nalezena podle jmena, tabulka nalezena podle aliasu v oboru platnosti tabulky s ID == scope_id); kteroukoliv z nich muze byt None. Aliasy jsou hledany pouze u jmen bez schematu. Pri vice shodach jsou vraceny tytez tabulky jako pri postupnem prochazeni kolekce tabulek relace, ktere skonci, jakmile je nalezena tabulka podle jmena i podle aliasu (vzdy posledni nalezena)."""
+        name = self.pool.get_table_key(name)[0]
+        by_name = self.names.get(name, [])
+        by_alias = []
+        if name.rfind(".") < 0:
+            by_name = by_name + self.bare_names.get(name, [])
+            if scope_id != None and scope_id in self.scopes:
+                by_alias = [self.tables_by_id.get(id) for id in self.scopes[scope_id].get(name, []) if id in self.order]
+        by_name = [table for table in by_name if table.id != exclude_table_id]
+        by_alias = [table for table in by_alias if table.id != exclude_table_id]
+        order = self.order
+        if len(by_name) > 0 and len(by_alias) > 0:
+            # Prochazeni kolekce by skoncilo na pozici, kde uz byla nalezena tabulka podle jmena i podle aliasu
+            stop = max(min(order[table.id] for table in by_name), min(order[table.id] for table in by_alias))
+            by_name = [table for table in by_name if order[table.id] <= stop]
+            by_alias = [table for table in by_alias if order[table.id] <= stop]
+        table_via_name = max(by_name, key=lambda table: order[table.id]) if len(by_name) > 0 else None
+        table_via_alias = max(by_alias, key=lambda table: order[table.id]) if len(by_alias) > 0 else None
+        return table_via_name, table_via_alias
+
+
+class ParseSession:
+    """Stav jednoho prevodu SQL kodu: kolekce nalezenych tabulek, generatory ID a nazvu tabulek, zdrojovy kod zpracovanych prikazu (viz SourceBuffer), varovani a pocty zpracovanych tokenu. Kazde vlakno ma vlastni aktualni relaci (viz current()), se kterou pracuji vsechny funkce zpracovani, takze nezavisle prevody mohou v jednom procesu probihat postupne bez nutnosti resetu i soubezne v ruznych vlaknech."""
+    # Aktualni relace jednotlivych vlaken
+    __local__ = threading.local()
+
+    def __init__(self, pool=None):
+        # Sklad identifikatoru (pri davkovem zpracovani vice souboru sdileny vsemi relacemi davky, jinak vlastni)
+        self.pool = pool if pool != None else InternPool()
+        # Kolekce nalezenych tabulek (tabulky je nutne pridavat pomoci add_table(...)) a jejich index podle ID
+        self.tables = []
+        self.tables_by_id = {}
+        # Index jmen a aliasu tabulek (viz Table.get_table_by_name(...))
+        self.symbols = SymbolTable(self.tables_by_id, self.pool)
+        # Nejnizsi volne ID tabulky
+        self.next_id = 0
+        # Mnozina sablon pro automatickou tvorbu nazvu tabulek (klic == sablona, hodnota == aktualni poradove cislo k pouziti pri tvorbe nazvu)
+        self.next_template_num = {}
+        self.source = SourceBuffer()
+        self.warnings = []
+        # Jiz zpracovane subselecty prave zpracovavaneho prikazu (klic == otisk normalizovaneho SQL kodu, viz get_subselect_key(...))
+        self.subselects = {}
+        # Pocty zpracovanych tokenu podle obsluhy (klic: nazev obsluzne metody, prip. zpusobu zpracovani u preskocenych tokenu, viz StatementHandler); tokeny jsou pocitany pouze pro ladici vystup, jinak None
+        self.token_counts = None
+        # Casovy a pametovy limit pro zpracovani jednoho prikazu
+        self.budget = StatementBudget()
+        # Relace, ktera byla aktualni pred aktivaci teto relace (viz __enter__())
+        self.__previous__ = None
+
+    def __enter__(self) -> "ParseSession":
+        """Nastavi relaci jako aktualni relaci vlakna; na konci bloku with je obnovena predchozi relace"""
+        self.__previous__ = getattr(ParseSession.__local__, "session", None)
+        ParseSession.__local__.session = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        ParseSession.__local__.session = self.__previous__
+        self.__previous__ = None
+
+    @classmethod
+    def current(cls) -> "ParseSession":
+        """Vrati aktualni relaci vlakna (pokud zadna neni nastavena, vytvori novou)"""
+        session = getattr(cls.__local__, "session", None)
+        if session == None:
+            session = ParseSession()
+            cls.__local__.session = session
+        return session
+
+    def add_table(self, table: "Table") -> None:
+        """Prida tabulku do kolekce nalezenych tabulek, do indexu podle ID (viz Table.get_table_by_id(...)) a do indexu jmen (viz SymbolTable). Metoda nic nevraci."""
+        self.tables.append(table)
+        if not table.id in self.tables_by_id:
+            self.tables_by_id[table.id] = table
+            self.symbols.add_table(table)
+
+    def find_subselect(self, key: bytes) -> "Table":
+        """Vrati mezi-tabulku jiz zpracovaneho identickeho subselectu (viz get_subselect_key(...)) z prave zpracovavaneho prikazu a zapocita u ni dalsi vyskyt, prip. vrati None"""
+        table = self.subselects.get(key)
+        if table != None:
+            table.references += 1
+        return table
+
+    def save_state(self) -> tuple:
+        """Vrati stav kolekce tabulek (pocet tabulek, nejnizsi volne ID a poradova cisla sablon nazvu) pro pripadne pozdejsi odvolani zmen pomoci restore_state(...)"""
+        return len(self.tables), self.next_id, dict(self.next_template_num)
+
+    def restore_state(self, state: tuple) -> None:
+        """Odebere vsechny tabulky vytvorene od ulozeni zadaneho stavu (viz save_state()) vc. odkazu na ne ze zbylych tabulek a obnovi generovani ID a nazvu tabulek. Metoda nic nevraci."""
+        (count, next_id, next_template_num) = state
+        for table in self.tables[count:]:
+            if self.tables_by_id.get(table.id) is table:
+                del self.tables_by_id[table.id]
+        del self.tables[count:]
+        self.subselects = {}
+        self.next_id = next_id
+        self.next_template_num = next_template_num
+        # Odebrane tabulky maji vsechny ID >= next_id
+        for table in self.tables:
+            table.linked_to_tables_id = {id: None for id in table.linked_to_tables_id if id < next_id}
+            for id in [id for id in table.statement_aliases.keys() if id >= next_id]:
+                del table.statement_aliases[id]
+        self.symbols.rebuild(self.tables)
+
+
 def is_comment(t: sql.Token) -> bool:
     """Vraci True/false podle toho, zda zadany token je SQL komentarem (tridu nestaci srovnavat jen s sql.Comment!)"""
     if t == None:
@@ -565,9 +860,16 @@ def is_comment(t: sql.Token) -> bool:
 
 
 def split_comment(t: sql.Token) -> list:
-    """Vraci zadany komentar rozdeleny podle posledniho vyskytu skupiny deseti nebo vice pomlcek (split_seq; melo by stacit pro dostatecne dobre odliseni casti). Pokud se zmineny oddelovac v hodnote tokenu nenachazi, vrati metoda celou hodnotu jako pocatecni i koncovou cast, jelikoz nelze dopredu rici, kterou z nich bude volajici kod dale pouzivat. Metoda take predpoklada, ze token sam o sobe je nejakou variantou komentare!"""
+    """Vraci zadany komentar rozdeleny podle posledniho vyskytu skupiny deseti nebo vice pomlcek (viz split_comment_text(...)). Komentare prave zpracovavaneho prikazu jsou rozdeleny predem (viz SourceBuffer.get_comment(...) aktualni relace zpracovani), ostatni az pri volani. Metoda take predpoklada, ze token sam o sobe je nejakou variantou komentare!"""
+    entry = ParseSession.current().source.get_comment(t)
+    if entry != None:
+        return entry
+    return split_comment_text(t.value)
+
+
+def split_comment_text(text: str) -> list:
+    """Vraci zadany text komentare rozdeleny podle posledniho vyskytu skupiny deseti nebo vice pomlcek (split_seq; melo by stacit pro dostatecne dobre odliseni casti). Pokud se zmineny oddelovac v textu nenachazi, vrati metoda cely text jako pocatecni i koncovou cast, jelikoz nelze dopredu rici, kterou z nich bude volajici kod dale pouzivat."""
     split_seq = "----------"
-    text = t.value
     idx = text.rfind(split_seq)
     if idx < 0:
         # Oddelovac se v textu nenachazi, cili vratime cely text jako pocatecni i koncovou cast (jen z nej orezeme leaning/trailing pomlcky a mezery)
@@ -662,10 +964,99 @@ def get_name_alias_comment(t: sql.Token) -> tuple:
     return name, alias, None
 
 
+class StatementBudgetExceeded(Exception):
+    """Vyjimka vyvolana pri prekroceni casoveho ci pametoveho limitu pro zpracovani jednoho SQL prikazu (viz StatementBudget)"""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        # Druh prekroceneho limitu ("timeout", prip. "memory")
+        self.kind = kind
+
+
+class StatementBudget:
+    """Casovy a pametovy limit pro zpracovani jednoho SQL prikazu. Kazda relace zpracovani ma vlastni limity (viz ParseSession.budget), soubezne prevody v ruznych vlaknech se tedy vzajemne neovlivnuji. Dodrzeni limitu je kontrolovano kooperativne: v run_steps(...) pri kazdem vnorenem kroku zpracovani, pri seskupovani tokenu po jednotlivych blocich ve WITH (--chunked) a pri zjistovani zavislosti (--deps-only) na zacatku kazdeho bloku ve WITH. Samotne seskupovani tokenu v sqlparse tedy prerusit nelze, limit je vsak kontrolovan ihned po nem. Spotreba pameti je sledovana pomoci modulu tracemalloc, ktery zpracovani zpomaluje, proto je zapnut pouze pri zadani pametoveho limitu (tracemalloc sleduje pamet celeho procesu, pri soubeznych prevodech v ruznych vlaknech tedy pametovy limit zahrnuje i pamet alokovanou ostatnimi vlakny)."""
+
+    def __init__(self, time_limit=None, memory_limit=None):
+        # Limity (None == bez omezeni): cas v sekundach, pamet v MB
+        self.time_limit = None
+        self.memory_limit = None
+        # Zda jsou limity prave sledovany (viz start(), stop()); kontrola mimo zpracovani prikazu nic nedela
+        self.active = False
+        self.__deadline__ = None
+        self.__memory_start__ = 0
+        self.set_limits(time_limit, memory_limit)
+
+    def set_limits(self, time_limit: int, memory_limit: int) -> None:
+        """Nastavi limity pro zpracovani kazdeho nasledujiciho prikazu (None == bez omezeni). Metoda nic nevraci."""
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        if memory_limit != None and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self) -> None:
+        """Zacne sledovat limity pro prave zpracovavany prikaz. Metoda nic nevraci."""
+        if self.time_limit == None and self.memory_limit == None:
+            return
+        if self.time_limit != None:
+            self.__deadline__ = time.perf_counter() + self.time_limit
+        if self.memory_limit != None:
+            self.__memory_start__ = tracemalloc.get_traced_memory()[0]
+        self.active = True
+
+    def stop(self) -> None:
+        """Ukonci sledovani limitu. Metoda nic nevraci."""
+        self.active = False
+        self.__deadline__ = None
+
+    def check(self) -> None:
+        """Vyvola vyjimku StatementBudgetExceeded, pokud zpracovani prave zpracovavaneho prikazu prekrocilo nektery z limitu. Metoda nic nevraci."""
+        if not self.active:
+            return
+        if self.__deadline__ != None and time.perf_counter() > self.__deadline__:
+            raise StatementBudgetExceeded("timeout", f"Zpracování SQL příkazu překročilo časový limit {self.time_limit} s")
+        if self.memory_limit != None and tracemalloc.get_traced_memory()[0] - self.__memory_start__ > self.memory_limit * 1024 * 1024:
+            raise StatementBudgetExceeded("memory", f"Zpracování SQL příkazu překročilo paměťový limit {self.memory_limit} MB")
+
+
+def run_steps(task) -> Any:
+    """Provede zadany krok zpracovani (generator, napr. process_statement(...)) a vrati jeho vysledek. Vnorene kroky, se kterymi roste hloubka zanoreni (subselecty, zavorky v podminkach, vnorene funkce apod.), si generatory vyzadaji pomoci "yield", jsou tedy provadeny pomoci explicitniho zasobniku (misto rekurze), takze hloubka zanoreni dotazu neni omezena limitem rekurze. Ostatni pomocne kroky (napr. process_token(...) volane z process_statement(...)) jsou kvuli rezii volany primo pomoci "yield from"."""
+    # Limity aktualni relace zpracovani (kontrolujeme pouze, pokud jsou prave sledovany)
+    budget = ParseSession.current().budget
+    # Na zasobniku jsou rozpracovane generatory (kazdy si drzi vlastni stav zpracovani -- kontext, posledni SELECT tabulku apod.); na vrcholu je vzdy ten, ktery se prave provadi
+    stack = [task]
+    value = None
+    error = None
+    while True:
+        try:
+            if error != None:
+                # Vyjimku z vnoreneho kroku predame nadrazenemu kroku (chova se tedy stejne jako u rekurzivniho volani)
+                step = stack[-1].throw(error)
+            else:
+                step = stack[-1].send(value)
+        except StopIteration as result:
+            # Krok byl dokoncen -- jeho navratovou hodnotu predame nadrazenemu kroku
+            stack.pop()
+            if len(stack) == 0:
+                return result.value
+            (value, error) = (result.value, None)
+            continue
+        except Exception as e:
+            stack.pop()
+            if len(stack) == 0:
+                raise
+            (value, error) = (None, e)
+            continue
+        # Pred kazdym vnorenym krokem overime, zda zpracovani prikazu neprekrocilo casovy ci pametovy limit
+        if budget.active:
+            budget.check()
+        stack.append(step)
+        (value, error) = (None, None)
+
+
 def process_comparison(t: sql.Comparison) -> Attribute:
     """Vraci atribut vc. pozadovane hodnoty (typicke uziti: ... JOIN ... ON <token>)"""
     # Dohledani zavislosti udelame ihned, aby bylo mozne korektne ulozit informace o pripadnych subselectech
-    attributes = process_identifier_list_or_function(t, only_save_dependencies=True)
+    attributes = yield from process_identifier_list_or_function(t, only_save_dependencies=True)
     subselect_names, attributes = get_subselect_names(attributes)
     # Pocatecni tokeny v t.tokens jsou soucasti jmena atributu (s pripadnymi oddelovaci/teckami) --> tyto ukladame do components. Ulozeni provedeme bez ohledu na pocet subselectu (len(subselect_names)), protoze stejne musime postupnym prochazenim t.tokens zjistit pouzity operator.
     components = []
@@ -724,7 +1115,7 @@ def get_subselect_names(attributes: list) -> list:
     subselect_names = []
     j = 0
     while j < len(attributes):
-        if attributes[j].condition == Attribute.CONDITION_SUBSELECT_NAME:
+        if attributes[j].kind == Attribute.CONDITION_SUBSELECT_NAME:
             subselect_names.append(attributes[j].comment)
             attributes.pop(j)
             continue
@@ -751,22 +1142,22 @@ def get_attribute_conditions(t: sql.Token) -> list:
     # Postup se lisi podle toho, zda sqlparse vratil jednoduche srovnani (Comparison), sekvenci tokenu (napr. pro urceni rozmezi hodnot), nebo je toto navic v zavorce (Parenthesis) ci jako soucast [ WHERE | ON ] EXISTS.
     if isinstance(t, sql.Comparison):
         # Token je obycejnym srovnanim, takze staci do kolekce attributes pridat navratovou hodnotu process_comparison(...) (nelze vratit primo tuto navratovou hodnotu, tzn. objekt typu Attribute, protoze typ navratove hodnoty se pozdeji poziva k rozliseni, jak presne s takovou hodnotou nalozit). Zaroven musime namisto .append() pouzit .extend(), jelikoz je vlivem dohledavani zavislosti vracen seznam atributu, nikoliv pouze jeden atribut!
-        attributes.extend(process_comparison(t))
+        attributes.extend((yield from process_comparison(t)))
         return attributes
     if isinstance(t, sql.Case) or isinstance(t, sql.Operation):
         # Dohledame zavislosti (nemusime rucne po subtokenech, toto je provedeno ve volane metode)
-        attributes.extend(process_identifier_list_or_function(t, only_save_dependencies=True))
+        attributes.extend((yield from process_identifier_list_or_function(t, only_save_dependencies=True)))
         # Pridame samotnou podminku
-        attributes.append(Attribute(name=t.normalized, condition=Attribute.CONDITION_SINGLE_ELEMENT))
+        attributes.append(Attribute(name=t.normalized, kind=Attribute.CONDITION_SINGLE_ELEMENT))
         return attributes
     if t.ttype == sql.T.Comparison:  # != sql.Comparison!
-        # BUG: pokud je v SQL kodu "JOIN ... ON ... AND name comment NOT IN ( SELECT ... )", vraci toto sqlparse jako oddelene tokeny ([name comment] [NOT IN] [(SELECT ... )]). Na tuto sekvenci pritom narazime primo v process_statement(...), tzn. tokeny jsou pak posilany oddelene do zdejsi metody. Situaci tedy musime nejprve detekovat a potom postupne vracet zpet nekompletni atributy (condition = Attribute.CONDITION_SINGLE_ELEMENT). Pokud by za operatorem byl komentar, byl by sqlparse vracen jako dalsi token, tzn. nema smysl toto zde resit.
-        attributes.append(Attribute(name=t.normalized, condition=Attribute.CONDITION_SINGLE_ELEMENT))
+        # BUG: pokud je v SQL kodu "JOIN ... ON ... AND name comment NOT IN ( SELECT ... )", vraci toto sqlparse jako oddelene tokeny ([name comment] [NOT IN] [(SELECT ... )]). Na tuto sekvenci pritom narazime primo v process_statement(...), tzn. tokeny jsou pak posilany oddelene do zdejsi metody. Situaci tedy musime nejprve detekovat a potom postupne vracet zpet nekompletni atributy (kind = Attribute.CONDITION_SINGLE_ELEMENT). Pokud by za operatorem byl komentar, byl by sqlparse vracen jako dalsi token, tzn. nema smysl toto zde resit.
+        attributes.append(Attribute(name=t.normalized, kind=Attribute.CONDITION_SINGLE_ELEMENT))
         return attributes
     if isinstance(t, sql.Identifier):
         # Projdeme t.tokens, pricemz dopredu vime, ze kolekce attributes bude ve vysledku obsahovat jediny standardni atribut
         # Nejprve dohledame pripadne zavislosti pomoci process_identifier_list_or_function(..., only_save_dependencies=True)
-        dep_attr = process_identifier_list_or_function(t, only_save_dependencies=True)
+        dep_attr = yield from process_identifier_list_or_function(t, only_save_dependencies=True)
         subselect_names, dep_attr = get_subselect_names(dep_attr)
         attributes.extend(dep_attr)
         comment = ""
@@ -794,7 +1185,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                 name = get_op_prefix(subselect_names)
             else:
                 name = t.normalized
-            attributes.append(Attribute(name=name, condition=Attribute.CONDITION_SINGLE_ELEMENT, comment=comment))
+            attributes.append(Attribute(name=name, kind=Attribute.CONDITION_SINGLE_ELEMENT, comment=comment))
             return attributes
         # Podminka je kompletni, muzeme ji nacist a ulozit celou jako standardni atribut (bez ohledu na pripadne subselecty -- stejne musime projit subtokeny kvuli pripadnych komentaru)
         comment = ""
@@ -828,7 +1219,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
         return attributes
     if isinstance(t, sql.Parenthesis) and first_dml_token_is_select(t.tokens):
         # Zpracovavame "( SELECT ... ) [komentar]", tzn. musi jit pouze o cast posdminky (--> condition=Attribute.CONDITION_SINGLE_ELEMENT)
-        dep_attr = process_identifier_list_or_function(t, only_save_dependencies=True)
+        dep_attr = yield from process_identifier_list_or_function(t, only_save_dependencies=True)
         subselect_names, dep_attr = get_subselect_names(dep_attr)
         attributes.extend(dep_attr)
         comment = ""
@@ -839,7 +1230,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
         except:
             pass
         # Zde musi v subselect_names byt alespon jeden prvek!
-        attributes.append(Attribute(name=get_op_prefix(subselect_names), condition=Attribute.CONDITION_SINGLE_ELEMENT, comment=comment))
+        attributes.append(Attribute(name=get_op_prefix(subselect_names), kind=Attribute.CONDITION_SINGLE_ELEMENT, comment=comment))
         return attributes
     if isinstance(t, sql.Parenthesis) or isinstance(t, sql.Where):
         # Projdeme t.tokens a postupne rekurzivne zpracujeme kazdy z patricnych sub-tokenu. Zaroven potrebujeme referenci na posledni token v t.tokens, abychom pripadne mohli predat relevantni komentar zpet do hlavni casti kodu. Zohlednit musime i pripadne klicove slovo WHERE.
@@ -853,7 +1244,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
         while token != None:
             # Nejprve vyresime BUG, kdy vlivem pridani komentare do operace rozdelene na vice radku (napr. "WHERE value > a -- komentar \n + b") dojde k rozdeleni podminky na vice tokenu
             if split_operation:
-                attributes[-1].condition += " " + token.normalized  # Ulozime .normalized (tzn. bez pripadneho komentare)
+                attributes[-1].append_to_condition(" " + token.normalized)  # Ulozime .normalized (tzn. bez pripadneho komentare)
                 split_operation = False
                 # Byl v posledni casti podminky komentar?
                 comment = ""
@@ -866,17 +1257,17 @@ def get_attribute_conditions(t: sql.Token) -> list:
                 if len(comment) > 0 and not attributes[-1].comment_is_set():
                     attributes[-1].set_comment(comment)
                 # Ted jeste dohledame pripadne zavislosti
-                dep_attr = process_identifier_list_or_function(token, only_save_dependencies=True)
+                dep_attr = yield from process_identifier_list_or_function(token, only_save_dependencies=True)
                 subselect_names, dep_attr = get_subselect_names(dep_attr)
                 if len(subselect_names) > 0:
-                    attributes[-1].condition = get_op_prefix(subselect_names)  # + ": " + attributes[-1].condition
+                    attributes[-1].set_condition(get_op_prefix(subselect_names))  # + ": " + attributes[-1].condition
                 attributes.extend(dep_attr)
             elif token.ttype in sql.T.Operator and len(attributes) > 0:
-                attributes[-1].condition += " " + token.value
+                attributes[-1].append_to_condition(" " + token.value)
                 split_operation = True
             elif token.ttype in sql.T.Literal and len(attributes) > 0:
                 # BUG v sqlparse (viz popis analogickeho pripadu nize v teto metode)
-                attributes[-1].condition += " " + token.value
+                attributes[-1].append_to_condition(" " + token.value)
             elif (prev_token_normalized != None
                     and (token.ttype in sql.T.Operator
                     or (token.ttype == sql.T.Keyword
@@ -906,7 +1297,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                         comment = split_comment(token)[0]
                     else:
                         # Cokoliv jineho si ulozime (protoze bile znaky preskakujeme pri hledani tokenu a Punctuation apod. tady syntakticky nedava smysl). Ukladame vsak .normalized, cimz dojde k orezani pripadnych internich komentaru.
-                        dep_attr = process_identifier_list_or_function(token, only_save_dependencies=True)
+                        dep_attr = yield from process_identifier_list_or_function(token, only_save_dependencies=True)
                         attributes.extend(dep_attr)
                         # Nasli jsme v podmince subselect?
                         subselect_names, dep_attr = get_subselect_names(dep_attr)
@@ -933,7 +1324,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                 # Podminka obsahuje i cast "[START] [WITH] [...]" --> preskocime nasledujici dva tokeny ("WITH ...") a u posledniho z nich dohledame pripadne zavislosti; pozor: zde preskakujeme i komentare
                 (i, token) = t.token_next(i, skip_ws=True, skip_cm=True)  # "[WITH]"
                 (i, token) = t.token_next(i, skip_ws=True, skip_cm=True)  # "[...]"
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+                attributes.extend((yield from process_identifier_list_or_function(token, only_save_dependencies=True)))
             elif token.normalized == "CONNECT":
                 # Podminka obsahuje i cast "[CONNECT] [BY] [[NOCYCLE]]" --> preskocime na nasledujici token ("BY"), ale pripadne (volitelne!) klicove slovo "NOCYCLE" vyresime oddelene; pozor: zde preskakujeme i komentare
                 (i, token) = t.token_next(i, skip_ws=True, skip_cm=True)  # "[BY]"
@@ -943,12 +1334,12 @@ def get_attribute_conditions(t: sql.Token) -> list:
             elif token.normalized == "PRIOR":
                 # Podminka obsahuje i cast "PRIOR ..." --> preskocime na nasledujici token a dohledame u nej pripadne zavislosti; pozor: zde preskakujeme i komentare
                 (i, token) = t.token_next(i, skip_ws=True, skip_cm=True)
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+                attributes.extend((yield from process_identifier_list_or_function(token, only_save_dependencies=True)))
             elif isinstance(token, sql.Case):
-                attributes.extend(get_attribute_conditions(token))
+                attributes.extend((yield get_attribute_conditions(token)))
             elif isinstance(token, sql.Parenthesis) and first_dml_token_is_select(token.tokens):
                 # Subselect je soucasti podminky (napr. "( SELECT ... ) BETWEEN ..."). Dohledame tedy zavislosti, na konci cyklu nastavime prev_token_value (protoze token je typu Parenthesis) a v ukladani zbytku tokenu budeme pokracovat v dalsi iteraci (budou pritom take z attributes extrahovna jmena subselectu).
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+                attributes.extend((yield from process_identifier_list_or_function(token, only_save_dependencies=True)))
             elif is_comment(token):
                 # Z komentare nas zajima pouze cast za pripadnou delsi serii pomlcek
                 [attr_comment, comment_before] = split_comment(token)
@@ -960,8 +1351,8 @@ def get_attribute_conditions(t: sql.Token) -> list:
                             break
                 # Ukladat budeme jen neprazdny komentar (nikoliv vysledny komentar po zpracovani "-- \n" apod.)
                 if token == last_nonws_token:
-                    # Zde jsme narazili na komentar k mezi-tabulce (napr. "JOIN ... ON ( ... ) komentar"), prip. komentar k nasledujicimu bloku v SQL kodu. Pridame fiktivni atribut (name == alias == None, condition == Attribute.CONDITION_COMMENT, comment != None), ze ktereho pak bude komentar extrahovan.
-                    attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_COMMENT, comment=comment_before))
+                    # Zde jsme narazili na komentar k mezi-tabulce (napr. "JOIN ... ON ( ... ) komentar"), prip. komentar k nasledujicimu bloku v SQL kodu. Pridame fiktivni atribut (name == alias == None, kind == Attribute.CONDITION_COMMENT, comment != None), ze ktereho pak bude komentar extrahovan.
+                    attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_COMMENT, comment=comment_before))
                     return attributes
                 if len(attributes) > 0:
                     # Jde o komentar k poslednimu nalezenemu atributu
@@ -976,25 +1367,25 @@ def get_attribute_conditions(t: sql.Token) -> list:
                     elif isinstance(token, sql.Parenthesis):
                         # Nasli jsme zavorku se SELECT, k cemuz je nutne vytvorit patricnou mezi-tabulku
                         exists_table = Table(name_template="exists-select", comment=comment_before, table_type=Table.AUX_TABLE)
-                        Table.__tables__.append(exists_table)
-                        # Nove vytvorenou mezi-tabulku jeste musime svazat s hlavni tabulkou, na kterou tady ale nemame referenci. Pridame proto fiktivni atribut (name == alias == None, condition == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table), ze ktereho bude patricny udaj v hlavnim kodu extrahovan
-                        attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_EXISTS_SELECT, comment=str(exists_table.id)))
+                        ParseSession.current().add_table(exists_table)
+                        # Nove vytvorenou mezi-tabulku jeste musime svazat s hlavni tabulkou, na kterou tady ale nemame referenci. Pridame proto fiktivni atribut (name == alias == None, kind == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table), ze ktereho bude patricny udaj v hlavnim kodu extrahovan
+                        attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_EXISTS_SELECT, comment=str(exists_table.id)))
                         # Krome ID mezitabulky musime do hlavniho kodu predat take informaci o podmince. Hned jako dalsi atribut tedy pridame jmennou referenci na exists_table vc. pripadneho komentare a tento pak v hlavnim kodu ulozime mezi podminky.
                         attributes.append(Attribute(name=f"<{exists_table.name}>", alias=None, condition=None, comment=comment_before))
                         # Zavorku nyni zpracujeme jako standardni statement s tim, ze parametrem predame referenci na vytvorenou mezi-tabulku (veskere pripadne zavislosti budou dohledany rekurzivne v process_statement(...))
-                        process_statement(token, exists_table)
+                        yield process_statement(token, exists_table)
                         break
                     (i, token) = t.token_next(i, skip_ws=True, skip_cm=False)
             elif isinstance(token, sql.Function) and token.tokens[0].value.upper() == "EXISTS":
                 # Situace podobna pripadu vyse, avsak zde SQL kod obsahuje "EXISTS( ... )" (tzn. mezi "EXISTS" a "(" neni mezera) --> token je nyni typu Function a zpracovani je nutne provest malinko jinak!
                 exists_table = Table(name_template="exists-select", comment=comment_before, table_type=Table.AUX_TABLE)
-                Table.__tables__.append(exists_table)
-                # Nove vytvorenou mezi-tabulku jeste musime svazat s hlavni tabulkou --> pridame fiktivni atribut (name == alias == None, condition == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table)
-                attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_EXISTS_SELECT, comment=str(exists_table.id)))
+                ParseSession.current().add_table(exists_table)
+                # Nove vytvorenou mezi-tabulku jeste musime svazat s hlavni tabulkou --> pridame fiktivni atribut (name == alias == None, kind == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table)
+                attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_EXISTS_SELECT, comment=str(exists_table.id)))
                 # Krome ID mezitabulky predame do hlavniho kodu take informaci o podmince (= jmennou referenci na exists_table vc. pripadneho komentare)
                 attributes.append(Attribute(name=f"<{exists_table.name}>", alias=None, condition=None, comment=comment_before))
                 # Zavorku -- ulozenou v token.tokens[1] -- nyni zpracujeme jako standardni statement s tim, ze parametrem predame referenci na vytvorenou mezi-tabulku (veskere pripadne zavislosti budou dohledany rekurzivne v process_statement(...))
-                process_statement(token.tokens[1], exists_table)
+                yield process_statement(token.tokens[1], exists_table)
             elif (isinstance(token, sql.Identifier)
                     or isinstance(token, sql.Function)
                     or token.ttype in sql.T.Literal
@@ -1003,7 +1394,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                 # Nasledujici tokeny v t.tokens budeme prochazet tak dlouho, nez ziskame jednu kompletni podminku. Toto nelze resit rekurzivne opetovnym volanim get_attribute_conditions(...), protoze tokeny musime prochazet na stavajici urovni (token \in t.tokens), nikoliv o uroven nize (token.tokens)
                 # Pripadne zavislosti je nutne dohledavat prubezne, jelikoz postupne nacitame dalsi tokeny!
                 comment = ""
-                dep_attr = process_identifier_list_or_function(token, only_save_dependencies=True)
+                dep_attr = yield from process_identifier_list_or_function(token, only_save_dependencies=True)
                 subselect_names, dep_attr = get_subselect_names(dep_attr)
                 attributes.extend(dep_attr)
                 if len(subselect_names) > 0:
@@ -1018,7 +1409,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                 if isinstance(token, sql.Comparison):
                     # Viz BUG popsany nize, zde lze narazit na situaci (a)
                     # token.tokens[0] obsahuje zbytek leve strany podminky, pak je nutne postupovat v token.tokens analogicky kodu nize. Aktualizovat potom budeme posledni standardni (name != None) atribut z rekurzivne zpracovaneho tokenu.
-                    attr = get_attribute_conditions(token)
+                    attr = yield get_attribute_conditions(token)
                     for j in range(len(attr) - 1, -1, -1):
                         if attr[j].name != None:
                             break
@@ -1028,7 +1419,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                     operator = token.normalized
                     (i, token) = t.token_next(i, skip_ws=True, skip_cm=False)
                     if operator == "IS":
-                        dep_attr = process_identifier_list_or_function(token, only_save_dependencies=True)
+                        dep_attr = yield from process_identifier_list_or_function(token, only_save_dependencies=True)
                         subselect_names, dep_attr = get_subselect_names(dep_attr)
                         attributes.extend(dep_attr)
                         if len(subselect_names) > 0:
@@ -1047,7 +1438,7 @@ def get_attribute_conditions(t: sql.Token) -> list:
                                 comment = split_comment(token)[0]
                             else:
                                 # Cokoliv jineho si ulozime (protoze bile znaky preskakujeme pri hledani tokenu a Punctuation apod. tady syntakticky nedava smysl). Ukladame vsak .normalized, cimz dojde k orezani pripadnych internich komentaru.
-                                dep_attr = process_identifier_list_or_function(token, only_save_dependencies=True)
+                                dep_attr = yield from process_identifier_list_or_function(token, only_save_dependencies=True)
                                 # Nasli jsme v podmince subselect?
                                 subselect_names, dep_attr = get_subselect_names(dep_attr)
                                 attributes.extend(dep_attr)
@@ -1070,16 +1461,16 @@ def get_attribute_conditions(t: sql.Token) -> list:
                     attributes.append(Attribute(name=name, condition=f"{operator} {value}", comment=comment))
             elif isinstance(token, sql.Operation):
                 # Operace je vracena jako separatni token. Zde pouze dohledame zavislosti; ulozeni podminky (a pripadna extrakce jmen subselectu) probehne nasledne.
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+                attributes.extend((yield from process_identifier_list_or_function(token, only_save_dependencies=True)))
             elif token.ttype in sql.T.Literal and len(attributes) > 0:
                 # BUG v sqlparse: Pokud podminka obsahuje napr. artimetickou operaci a patricny operator neni od cisla oddelen mezerou, jsou tokeny vraceny spatne. Priklady:
                 #   (a) "tab.col -1 = tab2.col" --> 2 tokeny: "tab.col" (Identifier), "-1 = tab2.col" (Comparison)
                 #   (b) "tab.col = tab2.col +1" --> 2 tokeny: "tab.col = tab2.col" (Comparison), "+1" (Literal)
                 # Zde jsme narazili na pripad (b), kde staci u posledniho atributu aktualizovat podminku.
-                attributes[-1].condition += " " + token.value
+                attributes[-1].append_to_condition(" " + token.value)
             elif token.ttype != sql.T.Keyword and token.ttype != sql.T.Punctuation:
                 # Jde o obycejny atribut (prip. jejich vycet)
-                attributes.extend(get_attribute_conditions(token))
+                attributes.extend((yield get_attribute_conditions(token)))
             # Pokud jsme resili zavorku, ulozime si pro jistotu aktualni token.value, jelikoz toto muze bt potreba, pokud bychom v nasledujicim tokenu narazili na klicove slovo/a NOT BETWEEN/IN apod.
             if isinstance(token, sql.Parenthesis) or isinstance(token, sql.Operation):
                 prev_token_normalized = token.normalized
@@ -1096,10 +1487,11 @@ def process_with_element(t, comment_before="") -> str:
     statement = None
     comment_after = comment_before
     if isinstance(comment_before, tuple):
-        # Zde zpracovavame zbytek umele rozdeleneho tokenu (jen zavorka plus pripadny komentar), tzn. name comment_before  == (comment_before, name, aliases, zacatek_sql_kodu)
+        # Zde zpracovavame zbytek umele rozdeleneho tokenu (jen zavorka plus pripadny komentar), tzn. name comment_before  == (comment_before, name, aliases, pozice_zacatku_sql_kodu)
         name = comment_before[1]
         aliases = comment_before[2]
-        source_sql = comment_before[3] + t.value
+        source = ParseSession.current().source
+        source_span = source.get_span(comment_before[3], source.get_end_position(t))
         comment_before = comment_before[0]
         # Token t je rovnou typu Parenthesis (pripadny komentar za zavorkou je poslednim tokenem v t.tokens)
         statement = t
@@ -1144,26 +1536,41 @@ def process_with_element(t, comment_before="") -> str:
             else:
                 comment_after = ""
             # BUG: Je-li v kodu "name [AS] komentar \n (...)", vrati sqlparse jako prvni token pouze "name [AS] komentar" a samotna zavorka nasleduje az v dalsim tokenu. Toto osetrime kontrolou indexu i (== len(t.tokens) znamena, ze zavorka nebyla soucasti tokenu) a okamzitym vracenim ntice s veskerymi doszd zjistenymi udaji. Puvodni comment_before a odpovidajici cast SQL kodu totiz potrebujeme zachovat a zaroven nemuzeme vracet seznam retezcu, protoze tomu by v pythonu odpovidal i standardni retezec. Na zaklade datoveho typu comment_before pak v dalsim volani teto metody pozname, ze k nove predanemu tokenu je nutne pristupovat jinak.
-            source_sql = t.value
             if i == len(t.tokens):
-                return (comment_before, name, aliases, source_sql)
+                return (comment_before, name, aliases, ParseSession.current().source.get_position(t))
+            source = ParseSession.current().source
+            source_span = source.get_span(source.get_position(t), source.get_end_position(t))
             statement = t.tokens[i]
     # Nyni uz pokracujeme identicky (az na podminku tykajici se statement_sql) bez ohledu na to, zda jsme zpracovavali obvykly WITH blok, nebo blok umele rozdeleny do dvou tokenu
     if statement != None:
-        table = Table(name=name, comment=comment_before, source_sql=source_sql, table_type=Table.WITH_TABLE)
-        Table.__tables__.append(table)
+        table = Table(name=name, comment=comment_before, source_span=source_span, table_type=Table.WITH_TABLE)
+        ParseSession.current().add_table(table)
         if len(aliases) > 0:
             # Zname uz aliasy atributu (byly v zavorce za nazvem tabulky), ale nic vic k atributum tabulky nevime. Pouze tedy nastavime parametr, na zaklade ktereho pak v hlavni casti kodu (process_statement(...)) budou k atributum doplneny zbyle udaje. Jmena atributu (stejne jako condition) budou pro poradek -- at nejsou None -- docasne Attribute.CONDITION_TBD.
             known_attribute_aliases = True
             for a in aliases:
-                table.attributes.append(Attribute(name=Attribute.CONDITION_TBD, condition=Attribute.CONDITION_TBD, alias=a))
+                table.attributes.append(Attribute(name=Attribute.CONDITION_NAMES[Attribute.CONDITION_TBD], kind=Attribute.CONDITION_TBD, alias=a))
         else:
             known_attribute_aliases = False
         # Nakonec doresime zavorku, odkaz na jiz vytvorenou tabulku predame stejne jako parametr ohledne (ne)znalosti aliasu atributu
-        process_statement(statement, table, known_attribute_aliases)
+        yield process_statement(statement, table, known_attribute_aliases)
     return comment_after
 
 
+def get_subselect_key(t: sql.Token) -> bytes:
+    """Vrati otisk normalizovaneho SQL kodu zadaneho tokenu (subselectu), podle ktereho jsou rozpoznavany identicke subselecty (viz ParseSession.find_subselect(...)). SQL kod je normalizovan odstranenim komentaru, nahradou kazde sekvence bilych znaku jedinou mezerou a prevodem na velka pismena, retezcove literaly a identifikatory v uvozovkach pritom zustavaji beze zmeny."""
+    def normalize(m: re.Match) -> str:
+        if m.group(1) != None:
+            return " "
+        if m.group(2) != None:
+            return m.group(2)
+        return m.group(3).upper()
+
+    # Komentare spolu s okolnimi bilymi znaky nahrazujeme jedinou mezerou (jinak by se subselecty lisily podle toho, zda a kde obsahuji komentar)
+    text = re.sub("((?:\\s|--[^\n]*|/\\*[\\s\\S]*?\\*/)+)|('(?:[^']|'')*'|\"[^\"]*\")|([^'\"\\s\\-/]+|[\\-/])", normalize, t.value)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
 def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=False) -> list:
     """Zpracuje token typu Identifier nebo Function a vrati odpovidajici atribut. Je-li pro popsani atributu potreba mezi-tabulka (napr. pokud je misto obycejneho atributu "( SELECT ... )" nebo "( CASE ... )"), vrati krome odpovidajiciho atributu i fiktivni atribut s udajem pro svazani nadrazene tabulky s nove vytvorenou mezi-tabulkou (name == alias == condition == None, comment == ID mezi-tabulky). Parametr only_save_dependencies urcuje, zda chceme ukladat nalezene atributy, nebo nas zajimaji jen pripadne zavislosti na jinych tabulkach."""
     # NULL nelze vyresit nahradami nahodnym retezcem, jelikoz pak selhava parsovani podminek (IS [NOT] NULL apod.) --> pripadne NULLy v rolich literalu musime doresit rucne
@@ -1180,11 +1587,11 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
         # BUG: v dusledku pritomnosti "komentar \n" uvnitr operace apod. muze byt patricna cast kodu rozdelena na vice tokenu. Pridame tedy fiktivni atribut, ktery -- pokud pak bude "z obou stran" mit standardni atributy -- nakonec pouzijeme pro slouceni umele rozdelenych casti.
         if only_save_dependencies:
             return []
-        return [Attribute(name=None, alias=None, condition=Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK, comment=t.value)]
-    # Pokud jde o Placeholder, vratime fiktivni atribut (name == alias == None, condition == Attribute.CONDITION_PLACEHOLDER_PRESENT, comment == nazev placeholderu), podle ktereho pak bude mozne pridat placeholder do seznamu u tabulky, resp. potazmo v generovanem diagramu barevne odlisit patricnou tabulku a uvest u ni seznam bindovanych promennych
+        return [Attribute(name=None, alias=None, kind=Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK, comment=t.value)]
+    # Pokud jde o Placeholder, vratime fiktivni atribut (name == alias == None, kind == Attribute.CONDITION_PLACEHOLDER_PRESENT, comment == nazev placeholderu), podle ktereho pak bude mozne pridat placeholder do seznamu u tabulky, resp. potazmo v generovanem diagramu barevne odlisit patricnou tabulku a uvest u ni seznam bindovanych promennych
     if t.ttype == sql.T.Name.Placeholder:
         attributes = []
-        attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_PLACEHOLDER_PRESENT, comment=t.value))
+        attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_PLACEHOLDER_PRESENT, comment=t.value))
         # Pripadny komentar nikdy neni soucasti placeholderu (BUG: sqlparse takovy komentar zcela preskoci!)
         if not only_save_dependencies:
             attributes.append(Attribute(name=t.value))
@@ -1215,11 +1622,11 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
             # BUG (Literal): pokud jsme narazili na carku a posledni nalezeny atribut je s potencialne chybejicim aliasem, je zrejme, ze alias nebyl uveden. Podminku tedy z posledniho atributu odstranime.
             if token.ttype == sql.T.Punctuation:
                 if (len(attributes) > 0
-                        and attributes[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING):
-                    attributes[-1].condition = None
+                        and attributes[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING):
+                    attributes[-1].set_condition(None)
                 # Muzeme rovnou pokracovat ve zpracovavani dalsiho tokenu
                 continue
-            attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies))
+            attributes.extend((yield process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies)))
             # BUG: posledni token je Identifier (napr. pokud v SQL kodu je "NVL (...)", tzn. s mezerou mezi nazvem funkce a zavorkou). Ulozime tedy nazev funkce; ze jde o rozdeleny atribut, bude nastaveno na konci metody na zaklade promenne split_attr_link == "" (prirazeno vyse).
             if (token == last_nonws_token
                     and token.ttype == sql.T.Keyword
@@ -1233,32 +1640,38 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
         first_token = t.tokens[i]
         if first_token.ttype == sql.T.DML and first_token.normalized == "SELECT":
             # Namisto bezneho atributu pracujeme se zavorkou, ve ktere je dalsi SELECT. S ohledem na moznou delku SELECTu vezmeme jako nazev atributu pouze nazev odpovidajici mezi-tabulky a obsah zavorky zpracujeme jako separatni statement (podobne jako napr. JOIN). Nakonec nastavime zavislosti tabulek. Pripadny komentar k tabulce, ktery uz ale zde nemame k dispozici, nastavime az dodatecne v hlavnim kodu podle atributu reprezentujiciho tuto tabulku.
-            table = Table(name_template="select", table_type=Table.AUX_TABLE)
-            Table.__tables__.append(table)
-            # Sub-token se SELECT je hned jako prvni, neni potreba hledat ho iterovanim pres token.tokens
-            process_statement(t, table)
-            # Nakonec je nutne zaridit nastaveni zavislosti nadrazene tabulky. Na tu ale zde nemame k dispozici odkaz. ID nove mezi-tabulky tedy predame jako fiktivni atribut (name == alias == None, condition == Attribute.CONDITION_DEPENDENCY, comment == ID) a zavislost (prip. zavislosti, nebot jich muze byt vice) pak doresime v hlavnim kodu.
-            attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_DEPENDENCY, comment=str(table.id)))
-            # Nazev tabulky jeste musime (bez ohledu na only_save_dependencies!) predat do volajiciho kodu, aby bylo mozne spraven nastavit jmeno atributu reprezentujiciho zpracovavany SELECT (chceme pouze "<select-N>", nikoliv kompletni "(SELECT ... FROM ...)"). Toto zaridime pridanim fiktivniho atributu (name == alias == None, condition == Attribute.CONDITION_SUBSELECT_NAME, comment = jmeno odp. tabulky), ktery pak bude ve volajicim kodu nalezite aktualizovan udaji o pripadne maliasu subselectu a komentari.
-            attributes.append(Attribute(name=None, alias=None, condition=Attribute.CONDITION_SUBSELECT_NAME, comment=f"<{table.name}>"))
+            # Stejny subselect byva (zvlaste v generovanem kodu) uveden opakovane, v takovem pripade pouze znovu pouzijeme jiz zpracovanou mezi-tabulku
+            session = ParseSession.current()
+            key = get_subselect_key(t)
+            table = session.find_subselect(key)
+            if table == None:
+                table = Table(name_template="select", table_type=Table.AUX_TABLE)
+                session.add_table(table)
+                # Sub-token se SELECT je hned jako prvni, neni potreba hledat ho iterovanim pres token.tokens
+                yield process_statement(t, table)
+                session.subselects[key] = table
+            # Nakonec je nutne zaridit nastaveni zavislosti nadrazene tabulky. Na tu ale zde nemame k dispozici odkaz. ID nove mezi-tabulky tedy predame jako fiktivni atribut (name == alias == None, kind == Attribute.CONDITION_DEPENDENCY, comment == ID) a zavislost (prip. zavislosti, nebot jich muze byt vice) pak doresime v hlavnim kodu.
+            attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_DEPENDENCY, comment=str(table.id)))
+            # Nazev tabulky jeste musime (bez ohledu na only_save_dependencies!) predat do volajiciho kodu, aby bylo mozne spraven nastavit jmeno atributu reprezentujiciho zpracovavany SELECT (chceme pouze "<select-N>", nikoliv kompletni "(SELECT ... FROM ...)"). Toto zaridime pridanim fiktivniho atributu (name == alias == None, kind == Attribute.CONDITION_SUBSELECT_NAME, comment = jmeno odp. tabulky), ktery pak bude ve volajicim kodu nalezite aktualizovan udaji o pripadne maliasu subselectu a komentari.
+            attributes.append(Attribute(name=None, alias=None, kind=Attribute.CONDITION_SUBSELECT_NAME, comment=f"<{table.name}>"))
         elif first_token.ttype == sql.T.Keyword and first_token.normalized == "CASE":
             # V pripade CASE pouze dohledame zavislosti
             for token in t.tokens:
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+                attributes.extend((yield process_identifier_list_or_function(token, only_save_dependencies=True)))
         else:
             # U vseho ostatniho rekurzivne projdeme tokeny vc. ukladani nazvu atributu atd.
             for token in t.tokens:
-                attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies))
+                attributes.extend((yield process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies)))
     elif isinstance(t, sql.Case) or isinstance(t, sql.Comparison):
         for token in t.tokens:
-            attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies))
+            attributes.extend((yield process_identifier_list_or_function(token, only_save_dependencies=only_save_dependencies)))
     elif isinstance(t, sql.Identifier):
         # Jmeno a pripadny alias zjistime pomoci get_name_alias_comment(...)
         name, alias, comment = get_name_alias_comment(t)
         # Pokud je prvni non-whitepace token z t.tokens (vzdy na indexu 0) typu Name, je v t opravdu jen jmeno, prip. take alias a komentar. SYSDATE je vracen jako Name, byt jde o vestavenou funkci (--> toto preskocime toutez podminkou). V ostatnich pripadech musime prvni subtoken rekurzivne analyzovat a ulozit pouze zavislosti (samotny token bude ulozen hned v podmince nize)
         if t.tokens[0].ttype != sql.T.Name:  # and t.normalized.lower() != "sysdate":
-            # Pri rekurzivnim zpracovani kodu zde nevime, zda v t.tokens[0] nebyl napr. dalsi SELECT, k cemuz ale je potreba ulozit atribut s jinym nazvem ("<select-N>" namisto "(SELECT ... FROM ...)"). Vime vsak, ze pokud k takove situaci doslo, je poslednim atributem v attributes fiktivni atribut (kontrolovat budeme pro rychlost pouze podle condition == Attribute.CONDITION_SUBSELECT_NAME, comment = jmeno odp. tabulky). Subselectu ale muze byt vice (!), cili je nutne zkontrolovat vsechny prvky attributes, pripadne fiktivni atributy odebereme a jmeno vysledneho atributu upravime tak, aby odpovidalo resene situaci. Pak uz jen obvyklym zpusobem pridame novy atribut, je-li to potreba na zaklade only_save_dependencies.
-            dep_attr = process_identifier_list_or_function(t.tokens[0], only_save_dependencies=True)
+            # Pri rekurzivnim zpracovani kodu zde nevime, zda v t.tokens[0] nebyl napr. dalsi SELECT, k cemuz ale je potreba ulozit atribut s jinym nazvem ("<select-N>" namisto "(SELECT ... FROM ...)"). Vime vsak, ze pokud k takove situaci doslo, je poslednim atributem v attributes fiktivni atribut (kontrolovat budeme pro rychlost pouze podle kind == Attribute.CONDITION_SUBSELECT_NAME, comment = jmeno odp. tabulky). Subselectu ale muze byt vice (!), cili je nutne zkontrolovat vsechny prvky attributes, pripadne fiktivni atributy odebereme a jmeno vysledneho atributu upravime tak, aby odpovidalo resene situaci. Pak uz jen obvyklym zpusobem pridame novy atribut, je-li to potreba na zaklade only_save_dependencies.
+            dep_attr = yield process_identifier_list_or_function(t.tokens[0], only_save_dependencies=True)
             subselect_names, dep_attr = get_subselect_names(dep_attr)
             attributes.extend(dep_attr)
             if len(subselect_names) > 0:
@@ -1269,7 +1682,7 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
     elif isinstance(t, sql.Operation):
         # Rekurzivne dohledame zavislosti, nicmene pro zamezeni zacykleni je nutne zpracovavat zde kazdy subtoken zvlast.
         for token in t.tokens:
-            attributes.extend(process_identifier_list_or_function(token, only_save_dependencies=True))
+            attributes.extend((yield process_identifier_list_or_function(token, only_save_dependencies=True)))
         # Podobne jako u funkce potrebujeme ulozit atribut a nasledne dohledat zavislosti (pritom zpracovavame vsechny subtokeny, zatimco u funkce pracujeme s druhym subtokenem!)
         if not only_save_dependencies:
             # Jmena subselectu muzeme extrahovat pouze zde, kdyz uz jsou dohledane zavislosti a ukladame patricny standardni atribut
@@ -1280,7 +1693,7 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
             attributes.append(Attribute(name=name, alias=alias, comment=comment))
     elif isinstance(t, sql.Function):
         # Nejprve rekurzivne projdeme veskere argumenty funkce a dohledame pripadne tabulkove zavislosti (--> only_save_dependencies=True). Resit pritom budeme az druhy token v t.tokens, nebot v tom prvnim (t.tokens[0]) je ulozen nazev funkce.
-        attributes.extend(process_identifier_list_or_function(t.tokens[1], only_save_dependencies=True))
+        attributes.extend((yield process_identifier_list_or_function(t.tokens[1], only_save_dependencies=True)))
         # Zda pujde o rozdeleny atribut, se dozvime az pozdeji, kdy pripadne v process_statement(...) narazime na samostatny token (Keyword) WITHIN. Toto se ale doresi v hlavnim kodu.
         # Pokud je v SQL kodu "<funkce> <komentar> WITHIN GROUP (ORDER BY ...)", vrati sqlparse tokeny:
         #   * <funkce> <komentar>
@@ -1296,13 +1709,13 @@ def process_identifier_list_or_function(t: sql.Token, only_save_dependencies=Fal
         # Nasli jsme literal (typicky v situaci, kdy je ve WITH definovana pomocna tabulka s konkretnimi -- v SQL kodu zadanymi -- hodnotami) a tento si zaroven na zaklade parametru only_save_dependencies potrebujeme ulozit
         attributes.append(Attribute(name=t.normalized))
     # Nakonec jeste nastavime condition na Attribute.CONDITION_SPLIT_ATTRIBUTE a comment na patricny spojovaci retezec, pokud je posledni atribut nekompletni (je-li condition jiz nastaveno, pak hodnotu nesmime prepsat!)
-    if split_attr_link != None and attributes[-1].condition == None:
-        # condition aktualizujeme pouze v pripade, ze jsme opravdu alias nenasli (napr. u "SELECT x AS result ...") ho totiz najdeme a nastavenim condition = Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING bychom pak prisli i o pripadny zjisteny komentar!)
+    if split_attr_link != None and not attributes[-1].has_condition():
+        # condition aktualizujeme pouze v pripade, ze jsme opravdu alias nenasli (napr. u "SELECT x AS result ...") ho totiz najdeme a nastavenim kind = Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING bychom pak prisli i o pripadny zjisteny komentar!)
         if split_attr_link == "ALIAS_MISSING":
             if attributes[-1].alias == None:
-                attributes[-1].condition = Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING
+                attributes[-1].set_condition(None, Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING)
         else:
-            attributes[-1].condition = Attribute.CONDITION_SPLIT_ATTRIBUTE
+            attributes[-1].set_condition(None, Attribute.CONDITION_SPLIT_ATTRIBUTE)
             # U fiktivniho atributu musime komentar s ohledem na pritomnost mezer priradit primo, nikoliv pomoci set_comment(...)!
             attributes[-1].comment = split_attr_link
     return attributes
@@ -1313,15 +1726,15 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
     if context != None and "select" in context:
         # Nejprve vyresime situaci, kdy je v SQL kodu hint ("+ MATERIALIZE" apod.), nebo byly tokeny umele rozdeleny na vice casti vlivem pritomnosti "komentar \n" uvnitr operace apod. Vratime proto fiktivni atribut, ktery -- pokud se ukaze, ze byl nesmyslny -- zahodime.
         if t.ttype == sql.T.Operator:
-            return [Attribute(name=None, alias=None, condition=Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK, comment=t.value)]
+            return [Attribute(name=None, alias=None, kind=Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK, comment=t.value)]
         if t.ttype == sql.T.Name.Placeholder:
-            return process_identifier_list_or_function(t, only_save_dependencies=False)
+            return (yield from process_identifier_list_or_function(t, only_save_dependencies=False))
         # Token je v kontextu lib. mutace SELECT (std., UNION SELECT, ...). Pokud je token typu Parenthesis, je potreba vytvorit odpovidajici (mezi-)tabulku a zavorku pak zpracovat jako samostatny SQL statement. Do process_statement(...) pritom musime predat odkaz na novou tabulku, aby bylo mozne spravne priradit nalezene atributy atd. Krome toho muze token reprezentovat i "( SELECT ...) AS ..." nebo "( CASE ... ) AS ..." ve vyctu atributu.
         if isinstance(t, sql.Parenthesis):
             # Zde resime UNION SELECT nebo "SELECT ... FROM ( SELECT ... )"; nemuze jit o "( SELECT ...) AS ..." nebo "( CASE ... ) AS ..." ve vyctu atributu, protoze tam musi byt alias (a takovy token tedy je typu Identifier[List])
             table = Table(name_template=context, comment=comment_before, table_type=Table.AUX_TABLE)
-            Table.__tables__.append(table)
-            process_statement(t, table)
+            ParseSession.current().add_table(table)
+            yield process_statement(t, table)
             return [table]
         attributes = []
         # Je-li token typu Identifier, IdentifierList, Function, prip. Wildcard, jde o obycejny atribut ci seznam atributu. Metoda pak podle toho vrati seznam s jednim ci vicero atributy. I kdybychom ale zpracovavali napr. "SELECT (CASE ...)", tento by musel byt v zavorce, za kterou by musel byt alias, takze by toto opet bylo vraceno jako Identifier.
@@ -1329,7 +1742,7 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
                 or isinstance(t, sql.Identifier)
                 or isinstance(t, sql.Function)
                 or isinstance(t, sql.Operation)):
-            attr = process_identifier_list_or_function(t, only_save_dependencies=False)
+            attr = yield from process_identifier_list_or_function(t, only_save_dependencies=False)
             attributes.extend(attr)
         elif t.ttype == sql.T.Wildcard:
             # Typicky "SELECT * FROM ..."
@@ -1341,17 +1754,27 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
     if context == "from" or context == "join":
         # Token je v kontextu FROM ("SELECT ... FROM <token>"), prip. JOIN (napr. "SELECT ... FROM ... INNER JOIN <token>"). V obou pripadech muze byt token jak typu Parenthesis ("SELECT ... FROM ( SELECT ... )", "... JOIN ( SELECT ... )"), tak muze jit o prosty nazev zdrojove tabulky + pripadny alias a komentar.
         # Zde navic mohou nastat dva pripady: bud je za zavorkou alias a/nebo komentar (--> jako statement zpracujeme t.tokens[0]), nebo je v SQL kodu pouze zavorka (--> jako statement zpracujeme cely token).
+        # Identicke subselecty v ramci prikazu sdileji jedinou mezi-tabulku (viz ParseSession.find_subselect(...))
+        session = ParseSession.current()
         if isinstance(t, sql.Parenthesis):
             # Pripadny komentar by byl az za zavorkou, tzn. comment_before muzeme ignorovat
-            table = Table(name_template="select", table_type=Table.AUX_TABLE)
-            Table.__tables__.append(table)
-            process_statement(t, table)
+            key = get_subselect_key(t)
+            table = session.find_subselect(key)
+            if table == None:
+                table = Table(name_template="select", table_type=Table.AUX_TABLE)
+                session.add_table(table)
+                yield process_statement(t, table)
+                session.subselects[key] = table
             return [table]
         if isinstance(t.tokens[0], sql.Parenthesis):
             # Struktura t.tokens: parenthesis-SELECT [ whitespace(s) [AS whitespace(s) ] alias [ whitespace(s) komentar ] ]
-            # V zavorce je vzdy SELECT, takze je potreba vytvorit odpovidajici (mezi-)tabulku (sablona == "select")
-            table = Table(name_template="select", table_type=Table.AUX_TABLE)
-            Table.__tables__.append(table)
+            # V zavorce je vzdy SELECT, takze je potreba vytvorit odpovidajici (mezi-)tabulku (sablona == "select"), neni-li jiz k dispozici mezi-tabulka identickeho subselectu
+            key = get_subselect_key(t.tokens[0])
+            table = session.find_subselect(key)
+            is_new_table = table == None
+            if is_new_table:
+                table = Table(name_template="select", table_type=Table.AUX_TABLE)
+                session.add_table(table)
             # Prvni sub-token (t.tokens[0]) i vsechno ostatni az po pripadny alias ci komentar zatim preskocime.
             i = 1
             while (i < len(t.tokens) and (t.tokens[i].is_whitespace
@@ -1370,7 +1793,9 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
             if is_comment(last_nonws_token) and not table.comment_is_set():
                 table.set_comment(last_nonws_token.value)
             # Uplne nakonec pak zpracujeme prvni subtoken (t.tokens[0]) jako samostatny statement a odkaz na vytvorenou tabulku predame parametrem
-            process_statement(t.tokens[0], table)
+            if is_new_table:
+                yield process_statement(t.tokens[0], table)
+                session.subselects[key] = table
             return [table]
         if isinstance(t, sql.IdentifierList):
             # Resime situaci "SELECT ... FROM table1 AS alias1, table2 AS alias2, ..."
@@ -1378,7 +1803,7 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
             for token in t.tokens:
                 if not token.is_whitespace and token.ttype != sql.T.Punctuation:
                     # comment_before predavat nemusime, protoze v aktualnim kontextu se nepouziva
-                    tables.extend(process_token(token, alias_table=alias_table, context=context))
+                    tables.extend((yield process_token(token, alias_table=alias_table, context=context)))
             return tables
         # V pripade, ze token (prip. prvni subtoken) neni typu Parenthesis, jde o prosty nazev zdrojove tabulky + pripadny alias a komentar. Tyto ziskame jednoduse zavolanim get_name_alias_comment(...). POZOR: potrebujeme vracet list, ve kterem budou informace k tabulce jako tuple (aby bylo vraceni dat funkcni vc. pripadu, kdy je ve FROM vicero zdroju)!
         return [get_name_alias_comment(t)]
@@ -1386,1009 +1811,2675 @@ def process_token(t, alias_table: Table, context=None, comment_before="") -> Any
         # Token je v kontextu WITH -- Identifier ("WITH <token: name AS ( SELECT ... )>"), IdentifierList ("WITH <token: name_1 AS ( SELECT ... ), name_2 AS ( SELECT ... ), ...>"). Muze jit o typ Parenthesis, pokud byl blok ve WITH umele rozdelen na dva tokeny (viz popis BUGu v process_with_element(...))
         if isinstance(t, sql.Identifier) or isinstance(t, sql.Parenthesis):
             # WITH obsahuje pouze jeden blok (docasnou tabulku) --> zpracujeme metodou process_with_element(...); zaroven musime vratit pripadny komentar, ktery je poslednim tokenem v t.tokens, byt se dost mozna vztahuje az k nasledujicimu tokenu
-            return process_with_element(t, comment_before)
+            return (yield from process_with_element(t, comment_before))
         if isinstance(t, sql.IdentifierList):
             # Jednotlive tokeny v zpracujeme analogicky pripadu vyse. Pritom je nutne postupne predavat nalezene komentare a nakonec vratit posledni vystup metody process_with_element(...).
             for token in t.tokens:
-                comment_before = process_with_element(token, comment_before)
+                comment_before = yield from process_with_element(token, comment_before)
             return comment_before
     if context == "on":
 
         # TODO: bug s COUNT apod. mozna muze byt relevantni i zde? --> OVERIT
 
         # Token je v kontextu ON ("SELECT ... JOIN ... ON <token>"). Zde tedy jde o atributy vc. hodnot, ktere u nich pozadujeme
-        return get_attribute_conditions(t)
+        return (yield from get_attribute_conditions(t))
     if context == None and isinstance(t, sql.Parenthesis):
         # Resime samostatny SELECT (typicky na nejvyssi urovni, byt to tak nemusi nutne byt), ktery je obaleny zavorkami. Zde staci znovu zavolat metodu process_statement(...) a zpet do hlavniho kodu vratit None
-        process_statement(t, table=alias_table)
+        yield process_statement(t, table=alias_table)
         return None
     
 
 
-def stripTrailingWSCP(sql_components: list) -> None:
-    """Odebere ze zadaneho seznamu casti SQL kodu koncove bile znaky (tyto neni duvod ukladat) a uzaviraci zavorku, pokud tato je tesne pred koncovymi bilymi znaky. Metoda upravuje primo zadanou kolekci!"""
-    if sql_components == None or len(sql_components) == 0:
-        return
-    # Pokud jsou na konci bile znaky, musi byt vzdy soucasti posledniho prvku (jakozto soucast sql.Comment.value). Nejprve tedy odstranime koncove bile znaky z sql_components[-1] (plus pripadne i tento prvek, pokud by zmena vyustila v prazdny retezec -- i vicekrat), potom zkontrolujeme/vyresime ")" a nakonec znovu orezeme pripadne koncove bile znaky z nove posledniho prvku kolekce (opet muze vyzadovat vicero odstraneni -- do sql_components standardne ukladame veskere mezery/..., aby zustalo zachovano odsazeni apod.).
-    sc = sql_components[-1].rstrip()
-    while len(sc) == 0:
-        sql_components.pop()
-        sc = sql_components[-1].rstrip()
-    sql_components[-1] = sc
-    # Zavorka (prip. strednik) je vlivem ukladani token.value vzdy bez uvodnich/koncovych bilych znaku
-    if sql_components[-1] == ")" or sql_components[-1] == ";":
-        sql_components.pop()
-    sc = sql_components[-1].rstrip()
-    while len(sc) == 0:
-        sql_components.pop()
-        sc = sql_components[-1].rstrip()
-    sql_components[-1] = sc
+def get_trimmed_end(tokens: list, start: int) -> int:
+    """Vrati pozici konce SQL kodu tvoreneho zadanymi tokeny bez koncovych bilych znaku a bez uzaviraci zavorky (prip. stredniku) tesne pred nimi; tokeny pred pozici start nejsou brany v uvahu."""
+    # Nejprve preskocime koncove bile znaky (vc. tokenu, ktere by po odebrani bilych znaku byly prazdne), potom zkontrolujeme/vyresime ")" (prip. ";") a nakonec znovu preskocime pripadne bile znaky pred touto zavorkou
+    source = ParseSession.current().source
+    k = len(tokens) - 1
+    while k >= 0 and source.get_position(tokens[k]) >= start and len(tokens[k].value.rstrip()) == 0:
+        k -= 1
+    # Zavorka (prip. strednik) je vzdy samostatnym tokenem bez uvodnich/koncovych bilych znaku
+    if k >= 0 and source.get_position(tokens[k]) >= start and tokens[k].value in [")", ";"]:
+        k -= 1
+        while k >= 0 and source.get_position(tokens[k]) >= start and len(tokens[k].value.rstrip()) == 0:
+            k -= 1
+    if k < 0 or source.get_position(tokens[k]) < start:
+        return start
+    return source.get_position(tokens[k]) + len(tokens[k].value.rstrip())
 
 
-def process_statement(s, table=None, known_attribute_aliases=False) -> None:
-    """Zpracuje cely SQL statement vc. vytvoreni patricnych tabulek"""
-    # CTE ... Common Table Expression (WITH, ...)
-    # DDL ... Data Definition Language (...)
-    # DML ... Data Manipulation Language (SELECT, ...)
-    # Tokeny budeme prochazet iteratorem a rovnou budeme preskakovat bile znaky (komentare vsak ne)
-    i = 0
-    t = s.token_first(skip_ws=True, skip_cm=False)
-    # Flag pro predavani informaci o kontextu toho ktereho tokenu (v ruznych kontextech je zpravidla potreba mirne odlisny zpusob zpracovani)
-    context = None
-    # Predchozi kontext potrebujeme napr. pro pripad "ON ... --> AND (EXISTS-SELECT) AND --> ON"
-    prev_context = None
-    # Flag pro reseni nestandardnich situaci vlivem chyb v sqlparse (rozdelene tokeny apod.) -- ridi, zda se lze vratit k predchozimu kontextu
-    can_switch_to_prev_context = True
-    comment_before = ""
-    # Pocitadlo radku od posledniho komentare (nekdy nas zajima komentar pred aktualnim tokenem). Pocatecni hodnota je libovolna takova, aby se v cyklu na zacatku NEresetoval comment_before, pokud by SQL dotaz nezacinal komentarem.
-    token_counter = 10
-    # Zdrojovy kod:
-    #   * WITH: lze primo pomoci t.value
-    #   * JOIN: nutno skladat po castech (oddelene tokeny)
-    #   * SELECT: u "( SELECT ... )" sice lze pouzit t.parent.value, ale toto u top-level SELECT (bez uvedeni v zavorkach) ulozi vzdy kompletne cely (!) SQL dotaz, coz neni zadouci. I zde tedy jsou zdrojove kody skladany po castech.
-    sql_components = []
-    join_components = []
-    join_table = None
-    # union_* jsou potreba v pripade, ze sjednocovani je provadeno bez prikazu "SELECT ..." v zavorce (tzn. "SELECT ... UNION SELECT ..."), jelikoz pak je patricny SQL kod vracen jako prosta sekvence tokenu). Pokud je nektery SELECT v zavorkach, zpracovava se jako samostatny statement.
-    union_components = []
-    union_table = None
-    # Pro korektni nastavovani zavislosti budeme potrebovat take odkaz na posledni "SELECT" tabulku (protoze lze narazit napr. na pripad "SELECT ... FROM ... JOIN ... ON ... UNION SELECT ... FROM ... JOIN ... ON ...", kde prvni join_table je zavislosti prvniho selectu, zatimco ve druhem pripade je patricna join_table zavislosti union-selectu).
-    if table != None:
-        last_select_table_id = table.id
-    else:
-        last_select_table_id = -1
-    # Nekompletni atribut vznikly v dusledku WITHIN GROUP, OVER apod. (viz mj. bugy zminene v process_token(...)); pokud neni None, je potreba ho sloucit s nekompletnim prvnim atributem vracenym v "dalsim kole" zpracovavani atributu
-    split_attribute = None
-    while t != None:
+class TokenKind:
+    """Zpusob zpracovani tokenu v hlavnim cyklu process_statement(...). Zpusob zpracovani je urcen jedinym vyhledanim v tabulce podle typu tokenu (u klicovych slov podle typu a normalizovane podoby), takze se klicova slova nemusi u kazdeho tokenu postupne porovnavat a cena za token neroste s poctem podporovanych klicovych slov. Tabulka je doplnovana za behu (kazdy typ tokenu a kazde klicove slovo je klasifikovano jen jednou). Tabulka je sdilena vsemi relacemi zpracovani (klasifikace nezavisi na zpracovavanem dotazu), konkretni obsluzna metoda je pak urcena take podle kontextu (viz StatementHandler)."""
+    # Obecny token (Identifier, Parenthesis, Function apod.) zpracovavany pomoci process_token(...)
+    OTHER = 0
+    # Bily znak, prip. interpunkce (pouze se ulozi do zdrojoveho kodu)
+    SKIP = 1
+    COMMENT = 2
+    # Klicove slovo, u ktereho nemenime kontext (vetsinou jde o neocekavane klicove slovo)
+    KEYWORD = 3
+    FROM = 4
+    JOIN = 5
+    ON = 6
+    UNION = 7
+    EXISTS = 8
+    OVER = 9
+    # Klicove slovo, za kterym nasleduje parametr (ORDER BY, GROUP BY, SET apod.)
+    KEYWORD_WITH_ARGS = 10
+    INTO = 11
+    CONNECT = 12
+    SEARCH = 13
+    # GRANT, EXCEPTION, RETURN, DROP -- zbytek prikazu nas nezajima
+    END_OF_STATEMENT = 14
+    WITH = 15
+    SELECT = 16
+    MERGE = 17
+    INSERT = 18
+    CREATE = 19
+    WHERE = 20
+    # Ostatni DDL (bez zpracovani)
+    IGNORED = 21
+    NAMES = ["other", "skip", "comment", "keyword", "from", "join", "on", "union", "exists", "over", "keyword-with-args", "into", "connect", "search", "end-of-statement", "with", "select", "merge", "insert", "create", "where", "ignored"]
+
+    # Klicova slova s pevne danym zpusobem zpracovani (FROM a slova obsahujici JOIN, UNION ci EXISTS jsou resena v __classify__(...))
+    KEYWORDS = {"ON": ON, "OVER": OVER, "INTO": INTO, "CONNECT": CONNECT, "SEARCH": SEARCH,
+                "GRANT": END_OF_STATEMENT, "EXCEPTION": END_OF_STATEMENT, "RETURN": END_OF_STATEMENT,
+                "ORDER BY": KEYWORD_WITH_ARGS, "GROUP BY": KEYWORD_WITH_ARGS, "CYCLE": KEYWORD_WITH_ARGS, "SET": KEYWORD_WITH_ARGS, "TO": KEYWORD_WITH_ARGS,
+                "DEFAULT": KEYWORD_WITH_ARGS, "USING": KEYWORD_WITH_ARGS, "WHEN": KEYWORD_WITH_ARGS, "THEN": KEYWORD_WITH_ARGS}
+
+    # Typy tokenu, u kterych zpusob zpracovani zavisi i na normalizovane podobe tokenu
+    __word_ttypes__ = {sql.T.Keyword, sql.T.CTE, sql.T.DML, sql.T.DDL}
+    # Tabulka zpusobu zpracovani (klic: typ tokenu, u klicovych slov (typ, normalizovana podoba), u seskupenych tokenu trida tokenu)
+    __kinds__ = {}
+
+    @classmethod
+    def get_key(cls, t: sql.Token) -> Any:
+        """Vrati klic zadaneho tokenu v tabulce zpusobu zpracovani (viz __kinds__)"""
+        if t.ttype == None:
+            return type(t)
+        if t.ttype in cls.__word_ttypes__:
+            return (t.ttype, t.normalized)
+        return t.ttype
+
+    @classmethod
+    def get(cls, t: sql.Token) -> int:
+        """Vrati zpusob zpracovani zadaneho tokenu"""
+        key = cls.get_key(t)
+        kind = cls.__kinds__.get(key)
+        if kind == None:
+            kind = cls.__classify__(t)
+            cls.__kinds__[key] = kind
+        return kind
+
+    @classmethod
+    def __classify__(cls, t: sql.Token) -> int:
+        if t.ttype == None:
+            # Seskupeny token (komentar muze byt take seskupenym tokenem!)
+            if isinstance(t, sql.Comment):
+                return cls.COMMENT
+            if isinstance(t, sql.Where):
+                return cls.WHERE
+            return cls.OTHER
         if t.ttype == sql.T.Punctuation or t.is_whitespace:
-            # Carku apod. pouze ulozime do kolekci sql_components, join_components a union_components (je nutne aktualizovat vsechny!) a nacteme dalsi token
-            sql_components.append(t.value)
-            join_components.append(t.value)
-            union_components.append(t.value)
-            (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-            continue
-        # Jsme-li dva tokeny od posleniho komentare, muzeme resetovat comment_before (reset po jednom tokenu nelze, jelikoz jednim z nich muze byt carka mezi SQL bloky a komentar k takovemu bloku pak je typicky na radku pred touto carkou). Je take nutne vzit do uvahy can_switch_to_prev_context -- pokud je False, vime, ze doslo k umelemu rozdeleni tokenu a reset comment_before nelze provest.
-        if can_switch_to_prev_context:
-            token_counter += 1
-            if token_counter == 2:
-                comment_before = ""
-        # Nektera klicova slova zpusobi vraceni vicero tokenu namisto jednoho -- v takovem pripade se nesmime vratit k predchozimu kontextu driv, nez zpracujeme veskere relevantni tokeny!
-        can_switch_to_prev_context = True
-        if is_comment(t):
-            # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
-            comment_before = split_comment(t)[1]
-            token_counter = 0
-        elif t.ttype == sql.T.Keyword and split_attribute != None:
-            if t.normalized in ["BETWEEN", "AND", "IS", "IS NOT"]:
-                if split_attribute.condition == None:
-                    split_attribute.condition = t.normalized
-                else:
-                    split_attribute.condition += " " + t.normalized
-            elif t.normalized in ["NULL", "NOT NULL"]:
-                # V tomto pripade vime, ze split_attribute je kompletni
-                split_attribute.condition += " " + t.normalized
-                if context == "on":
-                    join_table.conditions.append(split_attribute)
-                else:
-                    Table.get_table_by_id(last_select_table_id).conditions.append(split_attribute)
-                split_attribute = None
-        elif t.ttype == sql.T.Keyword and t.normalized != "NULL":
-            # Narazili jsme na klicove slovo, coz ve vetsine pripadu vyzaduje nastaveni context
+            return cls.SKIP
+        if t.ttype == sql.T.Comment.Single or t.ttype == sql.T.Comment.Multiline:
+            return cls.COMMENT
+        if t.ttype == sql.T.Keyword:
+            # NULL zpracovavame jako obecny token (POZOR: poradi kontrol odpovida puvodnimu poradi podminek, "JOIN" apod. hledame kdekoliv v klicovem slove)
+            if t.normalized == "NULL":
+                return cls.OTHER
             if t.normalized == "FROM":
-                prev_context = context
-                context = "from"
-                # Musime jeste overit, jestli nemame ulozeny nejaky rozdeleny atribut s Literalem (tento mohl byt na konci seznamu bez aliasu, tzn. byl by docasne ve split_attribute a v tabulce by zatim chybel). V takovem pripade nastavime comment = condition = None a atribut pridame do last_select_table (== table, resp. union_table).
-                if split_attribute != None:
-                    split_attribute.comment = None
-                    split_attribute.condition = None
-                    last_select_table = Table.get_table_by_id(last_select_table_id)
-                    if (len(last_select_table.attributes) > 0
-                            and last_select_table.attributes[-1].condition == Attribute.CONDITION_TBD):
-                        split_attribute.alias = last_select_table.attributes[-1].alias
-                        last_select_table.attributes.pop()
-                    last_select_table.attributes.append(split_attribute)
-                    # Nakonec resetujeme promennou split_attribute
-                    split_attribute = None
-            elif "JOIN" in t.normalized:
-                prev_context = context
-                context = "join"
-                # Zde musime krome nastaveni kontextu navic resetovat join_components
-                join_components = []
-            elif t.normalized == "ON":
-                if context == "merge":
-                    # Jsme-li porad v MERGE ("[MERGE] [INTO] [table AS alias] [USING] [(...) AS alias] [ON] [podminky] [WHEN] [MATCHED] [THEN] [UPDATE] [SET] [...]"), podminky pro upravu dat v DB nas nezajimaji. Nasledujici token tedy preskocime a pak rovnou prejdeme na zacatek cyklu.
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)  # t == [podminky]
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                    continue
-                else:
-                    if join_table == None:
-                        raise Exception(f"Klíčové slovo ON nalezeno před klíčovým slovem JOIN")
-                    prev_context = context
-                    context = "on"
-            elif "UNION" in t.normalized:
-                prev_context = context
-                context = "union-select"
-                # Pokud jsme doted resili UNION SELECT (tzn. pokud union_table != None), je nutne ke stavajici union_table pridat zdrojovy SQL kod a resetovat referenci na tabulku (UNION je totiz timto doreseny)
-                if union_table != None:
-                    # Zdrojovy kod ulozime jedine v pripade, ze zatim nebyl prirazen (muze uz totiz byt ulozen z doby, kdy byl zpracovavan "UNION ( SELECT ... )", tzn. kdy SELECT byl obalen extra zavorkami)
-                    if union_table.source_sql == None or len(union_table.source_sql) == 0:
-                        union_table.source_sql = "".join(union_components)
-                    union_table = None
-            elif "EXISTS" in t.normalized:
-                # BUG: v SQL kodu je "EXISTS komentar \n ( SELECT ...)" --> opet rozdlene tokeny!
-                prev_context = context
-                context = "exists-select"
-            elif t.normalized == "OVER":
-                # Tato cast je nutna pro rucni obejiti chyby v sqlparse (BUG https://github.com/andialbrecht/sqlparse/issues/701 )
-                # Klicove slovo OVER a nasledna zavorka s pripadnym PARTITION BY apod. jsou vraceny jako dva tokeny oddelene od predchoziho tokenu s funkci. Pripadny alias a komentar jsou az soucasti tokenu se zavorkou. Prvni token s OVER tedy pridame do sql_components a nasledne z druheho tokenu zjistime pripadny alias a komentar.
-                last_select_table = Table.get_table_by_id(last_select_table_id)
-                split_attribute = last_select_table.attributes.pop()
-                # Komentar musime s ohledem na pritomnost mezer priradit primo, nikoliv pomoci set-comment(...)!
-                split_attribute.condition = Attribute.CONDITION_SPLIT_ATTRIBUTE
-                split_attribute.comment = " OVER "
-            elif (t.normalized in ["ORDER BY", "GROUP BY", "CYCLE", "SET", "TO", "DEFAULT", "USING", "WHEN", "THEN"]
-                    or (t.normalized == "INTO" and context != "merge")):
-                # V tomto pripade se zda, ze parametry (jeden, prip. vice) jsou vzdy vraceny jako jeden token. Akt. token tedy ulozime do kolekci sql_components, join_components a union_components a nacteme dalsi token (cimz nasledujici token de facto preskocime). V SQL zdroji ale chceme zachovat veskere bile znaky...
-                sql_components.append(t.value)
-                join_components.append(t.value)
-                union_components.append(t.value)
-                (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                while t.is_whitespace:  # Zde predpokladame, ze t != None (pokud t == None, je s SQL kodem neco spatne a stejne bychom museli parsovani prerusit...)
-                    sql_components.append(t.value)
-                    join_components.append(t.value)
-                    union_components.append(t.value)
-                    (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                sql_components.append(t.value)
-                join_components.append(t.value)
-                union_components.append(t.value)
-                (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                # Zaroven si poznacime, ze se zatim nelze vratit k predchozimu kontextu, protoze jeste mohou nasledovat dalsi relevantni tokeny
-                can_switch_to_prev_context = False
-            elif t.normalized == "CONNECT":
-                # Zde nelze obecne rici, jakym zpusobem budou tokeny vraceny (nepovinna klicova slova, Identifier vs. Builtin + Comparison + Integer vs. ...). Nasledujici tokeny tedy musime prochazet a ukladat do kolekci (sql_components atd.) tak dlouho, nez najdeme Comparison. POZOR: "...ttype != sql.T.Comparison" NENI TOTEZ JAKO "not isinstance(..., sql.Comparison)"!
-                while t != None and not (t.ttype == sql.T.Comparison or isinstance(t, sql.Comparison)):
-                    sql_components.append(t.value)
-                    join_components.append(t.value)
-                    union_components.append(t.value)
-                    (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                # Comparison si ulozime do kolekci
-                sql_components.append(t.value)
-                join_components.append(t.value)
-                union_components.append(t.value)
-                # Podminka muze byt rozdelena klicovym slovem PRIOR --> preskocime na nasledujici non-whitespace token a ten uz pak navratem na zacatek hlavniho cyklu zpracujeme standardnim zpusobem.
-                (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                while t.is_whitespace or t.normalized == "PRIOR":  # Zde predpokladame, ze t != None (pokud t == None, je s SQL kodem neco spatne a stejne bychom museli parsovani prerusit...)
-                    sql_components.append(t.value)
-                    join_components.append(t.value)
-                    union_components.append(t.value)
-                    (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-                continue
-            elif t.normalized == "SEARCH":
-                # Napr. "[SEARCH] [DEPTH] [FIRST] [BY] [identifier] [SET] [identifier]" --> musime preskocit na sedmy token od toho aktualniho
-                num_skipped_tokens = 0
-                while t != None and num_skipped_tokens < 6:
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                    token_counter += 1
-                    if token_counter == 2:
-                        comment_before = ""
-                    if is_comment(t):
-                        # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
-                        comment_before = split_comment(t)[1]
-                        token_counter = 0
-                    else:
-                        num_skipped_tokens += 1
-                # Nacteme token nasledujici po nazvu tabulky atd. a preskocime zpet na zacatek hlavniho cyklu
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                continue
-            elif context == "merge" and t.normalized == "INTO":
-                # Akt. token muzeme preskocit (rovnou preskocime i bile znaky), stejne jako ten, ktery po nem nasleduje ("[MERGE] [INTO] [table AS alias] [USING] [(...) AS alias] [ON] [...] [WHEN] [MATCHED] [THEN] [UPDATE] [SET] [...]"; ulozeni stav. tokenu neni potreba)
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)  # t == [table AS alias]
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)  # t == [USING]
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)  # Nyni je v t cast SQL dotazu, ktera nas zajima
-                process_statement(t.tokens[0])
-                # Nacteme dalsi token, skocime zpet na zacatek cyklu a budeme pokracovat ve zpracovavani MERGE
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                continue
-            elif t.normalized == "GRANT" or t.normalized == "EXCEPTION" or t.normalized == "RETURN":
-                # Nasli jsme statement "GRANT privilege-type ON object object-name TO grantees", "EXCEPTION ...", prip. "RETURN hodnota/identifier" -- tohle nas vubec nezajima a muzeme tedy z metody rovnou vyskocit
-                return
-            else:
-
-                # DEBUG
-                if not (t.normalized.startswith("NULLS ")  # "NULLS [FIRST|LAST]"
-                        or t.normalized in ["DISTINCT", "GROUP", "AS", "BEGIN", "END"]
-                        or (context in ["on", "where"] and t.normalized in ["AND", "OR", "NOT"])):
-                    w = f"\n>>> POTENCIALNE PROBLEMATICKE KLICOVE SLOVO: {t.normalized}"
-                    print(w)
-                    warnings.append(w)
-
-            # Kazde jine vyse neuvedene klicove slovo (u kterych nepredpokladame vyskyt parametru) proste na konci tohoto cyklu ulozime a nacteme dalsi token
-
-        elif t.ttype == sql.T.CTE and t.normalized == "WITH":
-            # Jde o WITH pro definici bloku, nebo o WITH jako soucast napr. "CREATE VIEW"?
-            (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-            while t != None:
-                token_counter += 1
-                if token_counter == 2:
-                    comment_before = ""
-                if is_comment(t):
-                    # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
-                    comment_before = split_comment(t)[1]
-                    token_counter = 0
-                elif t.ttype == sql.T.Keyword and t.normalized in ["READ", "CHECK", "GRANT"]:
-                    # Zacatek "READ ONLY", prip. "[CHECK|GRANT] OPTION"
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                    continue
-                elif ((t.ttype == sql.T.Keyword and t.normalized in ["ONLY", "OPTION"])
-                        or t.ttype == sql.T.Punctuation):
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                    continue
-                else:
-                    break
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-            prev_context = context
-            context = "with"
-            # Jsme na zacatku casti WITH, ale zatim jsme nenacetli ani jeden blok --> zakazeme navrat k puvodnimu kontextu, cimz se zaroven zabrani predcasnemu resetu promenne comment_before
-            can_switch_to_prev_context = False
-            # Preskocime zpet na zacatek hlavniho cyklu (v t mame token nasledujici po casti WITH)
-            continue
-        elif t.ttype == sql.T.DML and t.normalized == "SELECT":
-            if context == "union-select":
-                # Spojovane SELECTy mohou byt vc. WHERE apod. a slouceni vsech atributu takovych SELECTu pod nadrazenou tabulku by nemuselo davat smysl. Pokud tedy po UNION [ALL] nasleduje SELECT (bez uvedeni v zavorkach), budou odpovidajici tokeny vraceny sqlparse postupne a tudiz musime uz zde vytvorit patricnou mezi-tabulku. Jinak receno, k situaci je nutne pristupovat podobně jako u JOIN. Je-li SELECT v zavorkach, zpracuje se dale jako samostatny statement.
-                union_table = Table(name_template="union-select", comment=comment_before, table_type=Table.AUX_TABLE)
-                Table.__tables__.append(union_table)
-                last_select_table_id = union_table.id
-                union_components = []
-            else:
-                prev_context = context
-                context = "select"
-                # Pokud jde o SELECT na nejvyssi urovni dotazu, neexistuje pro nej zatim zadna tabulka. Tuto tedy vytvorime, aby k ni pak bylo mozne doplnit atributy atd.
-                if table == None:
-                    table = Table(name_template="main-select", comment=comment_before, table_type=Table.MAIN_SELECT)
-                    Table.__tables__.append(table)
-                    last_select_table_id = table.id
-                    # Tabulka s aliasy (alias_table) zde -- na nejvyssi urovni -- zustava None, takze neni nutne cokoliv nastavovat
-                sql_components = []
-        elif t.ttype == sql.T.DML and t.normalized == "MERGE":
-            prev_context = context
-            context = "merge"
-        elif t.ttype == sql.T.DML and t.normalized == "INSERT":
-            # Nasli jsme "INSERT INTO table [...]" -- preskocime nasledujici dva tokeny (pripadne komentare si ulozime)
-            num_skipped_tokens = 0
-            while t != None and num_skipped_tokens < 2:
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                token_counter += 1
-                if token_counter == 2:
-                    comment_before = ""
-                if is_comment(t):
-                    # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
-                    comment_before = split_comment(t)[1]
-                    token_counter = 0
-                else:
-                    num_skipped_tokens += 1
-            # Nacteme token nasledujici po nazvu tabulky atd. a preskocime zpet na zacatek hlavniho cyklu
-            (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-            continue
-        elif t.ttype == sql.T.DDL:
+                return cls.FROM
+            if "JOIN" in t.normalized:
+                return cls.JOIN
+            if "UNION" in t.normalized:
+                return cls.UNION
+            if "EXISTS" in t.normalized:
+                return cls.EXISTS
+            return cls.KEYWORDS.get(t.normalized, cls.KEYWORD)
+        if t.ttype == sql.T.CTE:
+            return cls.WITH if t.normalized == "WITH" else cls.OTHER
+        if t.ttype == sql.T.DML:
+            return {"SELECT": cls.SELECT, "MERGE": cls.MERGE, "INSERT": cls.INSERT}.get(t.normalized, cls.OTHER)
+        if t.ttype == sql.T.DDL:
             if t.normalized == "DROP":
-                # Nasli jsme "DROP [VIEW ...]" -- tohle nas vubec nezajima a muzeme tedy z metody rovnou vyskocit
-                return
-            elif t.normalized.startswith("CREATE"):
-                # Nasli jsme "CREATE [[OR REPLACE] [FORCE] VIEW ... ( ... ) AS [SELECT | WITH] ...]" -- preskocime vse az po posledni token po AS). Komentare zde preskakovat nemuzeme, protoze ten posledni pred SELECT/WITH muze byt relevantni. cast "... ( ...)" za klicovym slovem VIEW je vracena jako jeden token, coz nam znacne usnadni praci s hledanim SELECT/WITH, ktery muze byt obalen zavorkami.
-                (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                while t != None:
-                    token_counter += 1
-                    if token_counter == 2:
-                        comment_before = ""
-                    if is_comment(t):
-                        # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
-                        comment_before = split_comment(t)[1]
-                        token_counter = 0
-                    elif ((t.ttype == sql.T.DML and t.normalized == "SELECT")
-                            or (t.ttype == sql.T.CTE and t.normalized == "WITH")
-                            or isinstance(t, sql.Parenthesis)):
-                        break
-                    (i, t) = s.token_next(i, skip_ws=True, skip_cm=False)
-                # Preskocime zpet na zacatek hlavniho cyklu (v t mame SELECT, WITH, prip. zavorku se SELECT)
-                continue
-        elif isinstance(t, sql.Where):
-            # Kontext musime nastavit pro potreby pripadneho pozdejsiho odstraneni fiktivnich atributu se "spojkami" (BUG v sqlparse)
-            prev_context = context
-            context = "where"
-            attributes = get_attribute_conditions(t)
-            last_select_table = Table.get_table_by_id(last_select_table_id)
-            # BUG: Pokud parser umele rozdeli seznam atributu v SELECT apod. na vice tokenu, muze u prvniho standardniho atributu chybet komentar, ktery byl v SQL kodu uveden nad patricnym radkem. Podivame se tedy, jestli uz u aktualne resene tabulky jsou nejake standardni atributy, a pokud ano, pridame komentar k poslednimu z nich (tzn. je-li komentar prazdny, nahradime ho obsahem promenne comment_before). Pokud zadny standardni atribut zatim neexistuje, pridame komentar k prvnimu nalezenemu stadardnimu atributu v navracene kolekci (attributes). Pro urychleni budeme seznam prochazet jedine v pripade, ze comment_before != "".
-            if len(comment_before) > 0:
-                attribute = last_select_table.get_last_std_condition()
-                if attribute != None:
-                    if not attribute.comment_is_set():
-                            attribute.comment = comment_before
-                else:
-                    j = 0
-                    while j < len(attributes):
-                        attribute = attributes[j]
-                        if attribute.is_standard_attribute():
-                            if not attribute.comment_is_set():
-                                attribute.comment = comment_before
-                            break
-                        j += 1
-            # Pokud jsme pri nacitani atributu nasli jako posledni sub-token komentar, jde temer jiste o komentar k nasledujicimu bloku SQL kodu. Fiktivni atribut s nesmyslnymi parametry (kontrolovat budeme pro rychlost pouze podle condition == Attribute.CONDITION_COMMENT, comment != None) nyni komentar ziskame zpet a aktualizujeme pomoci nej comment_before.
-            # Ve vracenem objektu mohou byt oba druhy fiktivnich atributu (CONDITION_COMMENT i CONDITION_SINGLE_ELEMENT) --> podivame se na dva posledni atributy
-            processed_attribs = 0
-            while len(attributes) > 0 and processed_attribs < 2:
-                processed_attribs += 1
-                last_attribute = attributes[-1]
-                if last_attribute.condition == Attribute.CONDITION_COMMENT:
-                    # Komentar ulozime jedine v pripade, ze -- po orezani mezer pod. v konstruktoru -- neni None
-                    if last_attribute.comment_is_set():
-                        comment_before = last_attribute.comment
-                    else:
-                        comment_before = ""
-                    attributes.pop()
-                elif last_attribute.condition == Attribute.CONDITION_SINGLE_ELEMENT:
-                    # Ke zpracovani jsme dostali jen jednu cast podminky (LHS, operator, prip. RHS)
-                    if split_attribute == None:
-                        # Zpracovavali jsme LHS (name == jmeno, comment == pripadny komentar)
-                        split_attribute = last_attribute
-                        # Resetujeme podminku, ktera uz nyni neni potreba
-                        split_attribute.condition = None
-                    elif split_attribute.condition == None:
-                        # Zpracovavali jsme operator (name == operator, comment == pripadny komentar)
-                        split_attribute.condition = last_attribute.name
-                        if last_attribute.comment_is_set():
-                            split_attribute.comment = last_attribute.comment
-                    elif split_attribute.condition == "BETWEEN":
-                        # V podmince zatim je pouze "BETWEEN", tzn. relevantni cast pouze pridame do podminky a nastavime pripadny komentar
-                        split_attribute.condition += " " + last_attribute.name
-                        if last_attribute.comment_is_set():
-                            split_attribute.comment = last_attribute.comment
-                    else:
-                        # Zpracovavali jsme RHS (name == zbytek podminky za operatorem, comment == pripadny komentar)
-                        split_attribute.condition += " " + last_attribute.name
-                        if last_attribute.comment_is_set():
-                            split_attribute.comment = last_attribute.comment
-                        last_select_table.conditions.append(split_attribute)
-                        split_attribute = None
-                    attributes.pop()
-            # Vznikly pri zpracovavani podminek nejake mezi-tabulky pro "EXISTS ..."? Pokud ano, stavajici tabulku musime nyni navazat na vsechny takove tabulky pomoci vracenych fiktivnich atributu (kontrolovat budeme pro rychlost pouze podle condition == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table), ktere jsou pak vzdy jednotlive nasledovany atributem se jmennou referenci (a pripadnym komentarem) k dane mezi-tabulce.
-            j = 0
-            while j < len(attributes):
-                attribute = attributes[j]
-                # Nejdrive zkontrolujeme, zda jsme pri parsovani tokenu nenasli placeholder -- pokud ano, je potreba u hlavni tabulky aktualizovat patricny seznam bindovanych promennych
-                if attribute.condition == Attribute.CONDITION_PLACEHOLDER_PRESENT:
-                    last_select_table.add_bind_var(attribute.comment)
-                    if last_select_table_id != table.id:
-                        table.add_bind_var(attribute.comment)
-                    attributes.pop(j)
-                    continue
-                if (attribute.condition == Attribute.CONDITION_DEPENDENCY
-                        or attribute.condition == Attribute.CONDITION_EXISTS_SELECT):
-                    id = int(attribute.comment)
-                    sub_table = Table.get_table_by_id(id)
-                    if union_table != None:
-                        # Vazba table --> union_table byla nastavena uz drive po nalezeni UNION SELECT
-                        union_table.link_to_table_id(id)
-                        # Do union_table take rovnou zkopirujeme bindovane promenne
-                        sub_table.copy_bind_vars_to_table(union_table)
-                    else:
-                        table.link_to_table_id(id)
-                    # Do hlavni tabulky jeste potrebujeme zkopirovat (a) zjistene aliasy a (b) pripadne placeholdery
-                    sub_table.copy_aliases_to_table(table)
-                    sub_table.copy_bind_vars_to_table(table)
-                    # Nakonec odebereme fiktivni atribut z kolekce obj (index j musi zustat beze zmeny)
-                    attributes.pop(j)
-                    # V pripade Attribute.CONDITION_EXISTS_SELECT sice ihned nasleduje jeden standardni atribut se jmennou referenci na odpovidajici mezi-tabulku, ktery bychom mohli po nalezite podmince preskocit, ale podobne narocne je proste pouzit zde continue a nasledujici atribut zkontrolovat obvyklym zpusobem.
-                    continue
-                # Narazit muzeme i na dalsi komentare k nalezenym vnorenym podminkam. Kazdy takovy ulozeny komentar odstranime z kolekce a pokud jemu predchazejici atribut zatim komentar nema, pridame ho. Jinak fiktivni atribut ignorujeme.
-                if attribute.condition == Attribute.CONDITION_COMMENT:
-                    if j > 0 and not attributes[j - 1].comment_is_set():
-                        attributes[j - 1].set_comment(attribute.comment)
-                    attributes.pop(j)
-                    continue
-                # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
-                if (attribute.condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
-                        and j > 0
-                        and j < len(attributes) - 1
-                        and attributes[j - 1].name != None
-                        and attributes[j + 1].name != None):
-                    attributes[j - 1].set_name(name + attribute.comment + attributes[j + 1].name)
-                    attributes[j - 1].alias = attributes[j + 1].alias
-                    if not attributes[j - 1].comment_is_set():
-                        attributes[j - 1].comment = attributes[j + 1].comment
-                    attributes.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
-                    attributes.pop(j)  # ... a zbytek rozdeleneho atributu
-                    continue
-                j += 1
-            # Nyni aktualizujeme podminky v conditions a budouci zavislosti v attributes u patricne tabulky (union_table, resp. table -- dle situace)
-            last_select_table.conditions.extend(attributes)
-        else:
-            # Jakykoliv jiny token zpracujeme "obecnou" metodou process_token(...) s tim, ze parametrem predame informaci o kontextu (context) a pripadnem komentari pred tokenem (comment_before). Timto vyresime napr. i tokeny typu "select ... from ... PIVOT (...)" (typ: Function), jelikoz v miste uziti PIVOT uz je context == None, tzn. process_token(...) vrati None.
-            obj = process_token(t, table, context, comment_before)
-            # Navratova hodnota process_token(...) muze byt ruznych typu v zavislosti na kontextu apod. Na zaklade toho se nyni rozhodneme, jakym konkretnim zpusobem je potreba s ni nalozit.
-            if obj != None:
-                # Podminka na delku obj resi situaci, kdy v ON apod. nejsou uvedene zadne atributy (mozna jde o chybu, nicmene obcas se vyskytuje v testovacich dotazech...)
-                if isinstance(obj, list) and len(obj) > 0:
-                    if isinstance(obj[0], Attribute):
-                        # Ziskali jsme seznam atributu
-                        # BUG: Pokud parser umele rozdeli seznam atributu v SELECT apod. na vice tokenu, muze u prvniho standardniho atributu chybet komentar, ktery byl v SQL kodu uveden nad patricnym radkem. Podivame se tedy, jestli uz u aktualne resene tabulky jsou nejake standardni atributy, a pokud ano, pridame komentar k poslednimu z nich (tzn. je-li komentar prazdny, nahradime ho obsahem promenne comment_before). Pokud zadny standardni atribut zatim neexistuje, pridame komentar k prvnimu nalezenemu stadardnimu atributu v navracene kolekci (obj). Pro urychleni budeme seznam prochazet jedine v pripade, ze comment_before != "".
-                        if len(comment_before) > 0:
-                            if split_attribute != None:
-                                attribute = split_attribute
-                            elif context == "on" or context == "where":
-                                attribute = Table.get_table_by_id(last_select_table_id).get_last_std_condition()
-                            else:
-                                attribute = Table.get_table_by_id(last_select_table_id).get_last_std_attribute()
-                            if attribute != None:
-                                if not attribute.comment_is_set():
-                                        attribute.comment = comment_before
-                            else:
-                                j = 0
-                                while j < len(obj):
-                                    attribute = obj[j]
-                                    if attribute.is_standard_attribute():
-                                        if not attribute.comment_is_set():
-                                            attribute.comment = comment_before
-                                        break
-                                    j += 1
-                        # Nyni pokracujeme ve zpracovavani seznamu atributu 
-                        if context == "on":
-                            # Pokud jsme pri nacitani atributu v "JOIN ... ON ..."" nasli jako posledni sub-token komentar, jde o komentar k mezi-tabulce reprezentujici JOIN. Do seznamu atributu byl v takovem pripade jako posledni pridat fiktivni atribut s nesmyslnymi parametry (kontrolovat budeme pro rychlost pouze podle condition == Attribute.CONDITION_COMMENT, comment != None), ze ktereho nyni komentar ziskame zpet a priradime ho k dane tabulce.
-                            # Ve vracenem objektu mohou byt oba druhy fiktivnich atributu (CONDITION_COMMENT i CONDITION_SINGLE_ELEMENT) --> podivame se na dva posledni atributy
-                            processed_attribs = 0
-                            while len(obj) > 0 and processed_attribs < 2:
-                                processed_attribs += 1
-                                last_attribute = obj[-1]
-                                if last_attribute.condition == Attribute.CONDITION_COMMENT:
-                                    # Komentar ulozime jedine v pripade, ze -- po orezani mezer pod. v konstruktoru -- neni None
-                                    if last_attribute.comment_is_set():
-
-                                        # TODO: nastavit ke split_attribute, pokud existuje?
-
-                                        join_table.set_comment(last_attribute.comment)
-                                    obj.pop()
-                                elif last_attribute.condition == Attribute.CONDITION_SINGLE_ELEMENT:
-                                    # Ke zpracovani jsme dostali jen jednu cast podminky (LHS, operator, prip. RHS)
-                                    if split_attribute == None:
-                                        # Zpracovavali jsme LHS (name == jmeno, comment == pripadny komentar)
-                                        split_attribute = last_attribute
-                                        # Resetujeme podminku, ktera uz nyni neni potreba
-                                        split_attribute.condition = None
-                                    elif split_attribute.condition == None:
-                                        # Zpracovavali jsme operator (name == operator, comment == pripadny komentar)
-                                        split_attribute.condition = last_attribute.name
-                                        if last_attribute.comment_is_set():
-                                            split_attribute.comment = last_attribute.comment
-                                    elif split_attribute.condition == "BETWEEN":
-                                        # V podmince zatim je pouze "BETWEEN", tzn. relevantni cast pouze pridame do podminky a nastavime pripadny komentar
-                                        split_attribute.condition += " " + last_attribute.name
-                                        if last_attribute.comment_is_set():
-                                            split_attribute.comment = last_attribute.comment
-                                    else:
-                                        # Zpracovavali jsme RHS (name == zbytek podminky za operatorem, comment == pripadny komentar)
-                                        split_attribute.condition += " " + last_attribute.name
-                                        if last_attribute.comment_is_set():
-                                            split_attribute.comment = last_attribute.comment
-                                        join_table.conditions.append(split_attribute)
-                                        split_attribute = None
-                                    obj.pop()
-                            # Zkontrolujeme, zda mezi podminkami nebylo "EXISTS ( SELECT ... )", a pripadne aktualizujeme zavislosti a podminky u join_table. Pozor: JOIN je vzdy zavislosti predchoziho selectu (UNION SELECT apod.)!
-                            last_select_table = Table.get_table_by_id(last_select_table_id)
-                            j = 0
-                            while j < len(obj):
-                                attribute = obj[j]
-                                # Nejprve zkontrolujeme, zda jsme pri parsovani tokenu nenasli placeholder -- pokud ano, je potreba aktualizovat seznam bindovanych promennych jak u join_table (protoze u ni jsme placeholder nasli), tak u nadrazene tabulky (table)
-                                if attribute.condition == Attribute.CONDITION_PLACEHOLDER_PRESENT:
-                                    join_table.add_bind_var(attribute.comment)
-                                    last_select_table.add_bind_var(attribute.comment)
-                                    if last_select_table_id != table.id:
-                                        table.add_bind_var(attribute.comment)
-                                    obj.pop(j)
-                                    continue
-                                if (attribute.condition == Attribute.CONDITION_DEPENDENCY
-                                        or attribute.condition == Attribute.CONDITION_EXISTS_SELECT):
-                                    id = int(attribute.comment)
-                                    join_table.link_to_table_id(id)
-                                    sub_table = Table.get_table_by_id(id)
-                                    # Aliasy nalezene pri zpracovavani subselectu (prip. EXISTS SELECT, UNION SELECT) byly ulozeny do slovniku patricne tabulky a musime je zkopirovat do slovniku aktualniho (nadrazeneho) SELECT
-                                    # Jestlize jsme objevili placeholder(y), musime seznam bindovanych promennych predat i do join_table (ktera je nadrazena sub_table) a hlavni tabulky (table, nadrazena join_table). Stejne je potreba upravit union_table, pokud tato aktualne != None.
-                                    sub_table.copy_bind_vars_to_table(join_table)
-                                    # Kopie udaju do last_select_table lze provest primo, nebot kontrola tab != None je provedena uvnitr kopirovaci metody
-                                    sub_table.copy_aliases_to_table(last_select_table)
-                                    sub_table.copy_bind_vars_to_table(last_select_table)
-                                    # Do table budeme kopirovat jedine v pripade, ze to nebylo provedeno na predchozich dvou radcich
-                                    if last_select_table_id != table.id:
-                                        sub_table.copy_aliases_to_table(table)
-                                        sub_table.copy_bind_vars_to_table(table)
-                                    obj.pop(j)
-                                    # V pripade Attribute.CONDITION_EXISTS_SELECT sice ihned nasleduje jeden standardni atribut se jmennou referenci na odpovidajici mezi-tabulku, ktery bychom mohli po nalezite podmince preskocit, ale podobne narocne je proste pouzit zde continue a nasledujici atribut zkontrolovat obvyklym zpusobem.
-                                    continue
-                                # Narazit muzeme i na dalsi komentare k nalezenym vnorenym podminkam. Kazdy takovy ulozeny komentar odstranime z kolekce a pokud jemu predchazejici atribut zatim komentar nema, pridame ho. Jinak fiktivni atribut ignorujeme.
-                                if attribute.condition == Attribute.CONDITION_COMMENT:
-                                    if j > 0 and not obj[j - 1].comment_is_set():
-                                        obj[j - 1].set_comment(attribute.comment)
-                                    obj.pop(j)
-                                    continue
-                                # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
-                                if (attribute.condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
-                                        and j > 0
-                                        and j < len(obj) - 1
-                                        and obj[j - 1].name != None
-                                        and obj[j + 1].name != None):
-                                    obj[j - 1].set_name(name + attribute.comment + obj[j + 1].name)
-                                    obj[j - 1].alias = obj[j + 1].alias
-                                    if not obj[j - 1].comment_is_set():
-                                        obj[j - 1].comment = obj[j + 1].comment
-                                    obj.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
-                                    obj.pop(j)  # ... a zbytek rozdeleneho atributu
-                                    continue
-                                j += 1
-                            # Vraceny objekt (nyni uz bez pripadneho fiktivniho atributu s komentarem) muzeme pouzit k aktualizaci atributu i mezitabulky reprezentujici JOIN. Budouci zavislosti z kolekce future_dependencies pridame do table.attributes.
-                            join_table.conditions.extend(obj)
-                        elif "select" in context:
-                            # Projdeme vraceny seznam, ktery muze obsahovat fiktivni atributy s ID tabulek (kontrolovat budeme pro rychlost pouze podle condition == Attribute.CONDITION_DEPENDENCY; comment == ID tabulky), na nichz zavisi aktualne resena tabulka (typicky scenar: namisto obycejneho atributu je v SELECT uveden dalsi SELECT)
-                            j = 0
-                            while j < len(obj):
-                                attribute = obj[j]
-                                if attribute.condition == Attribute.CONDITION_DEPENDENCY:
-                                    id = int(attribute.comment)
-                                    subselect_table = Table.get_table_by_id(id)
-                                    if union_table != None:
-                                        union_table.link_to_table_id(id)
-                                        # Krome svazani tabulek jeste potrebujeme zkopirovat do union_table (a) zjistene aliasy a (b) pripadne placeholdery
-                                        subselect_table.copy_aliases_to_table(union_table)
-                                        subselect_table.copy_bind_vars_to_table(union_table)
-                                    else:
-                                        table.link_to_table_id(id)
-                                    # Zjistene aliasy a pripadne placeholdery je potreba zkopirovat i do hlavni tabulky
-                                    subselect_table.copy_aliases_to_table(table)
-                                    subselect_table.copy_bind_vars_to_table(table)
-                                    # Nakonec odebereme fiktivni atribut z kolekce obj (index j musi zustat beze zmeny)
-                                    obj.pop(j)
-                                    continue
-                                if attribute.condition == Attribute.CONDITION_PLACEHOLDER_PRESENT:
-                                    if union_table != None:
-                                        union_table.add_bind_var(attribute.comment)
-                                    table.add_bind_var(attribute.comment)
-                                    # Fiktivni atribut musime odebrat z kolekce obj (index j zustava beze zmeny)
-                                    obj.pop(j)
-                                    continue
-                                # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
-                                if (attribute.condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
-                                        and j > 0
-                                        and j < len(obj) - 1
-                                        and obj[j - 1].name != None
-                                        and obj[j + 1].name != None):
-                                    obj[j - 1].set_name(name + attribute.comment + obj[j + 1].name)
-                                    obj[j - 1].alias = obj[j + 1].alias
-                                    if not obj[j - 1].comment_is_set():
-                                        obj[j - 1].comment = obj[j + 1].comment
-                                    obj.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
-                                    obj.pop(j)  # ... a zbytek rozdeleneho atributu
-                                    continue
-                                j += 1
-                            # Dale musime zkontrolovat, jestli nemame ze zpracovavani minuleho tokenu nekomplentni atribut (BUG: WITHIN GROUP apod.). Pokud ne, zkontrolujeme posledni nyni vraceny atribut, zda nahodou neni takovym objektem. Jestlize naopak nekompletni atribut mame, sloucime ho s prvnim nyni vracenym atributem (ktery nasledne odebereme z obj) a takto vznikly kompletni atribut pridame k tabulce. Zde nelze rovnou resetovat split_attribute, jelikoz i zde muze byt posledni atribut opet nekompletni...
-                            # Ve zbylem kodu pro zpracovani vracenych atributu (vc. pripadneho nekompletniho z minula) uz budeme pracovat jen s aktualne resenou tabulkou (at uz pujde o table, nebo union_table). Pro zjednoduseni kodu tedy pouzijeme novou promennou obsahujici referenci na patricnou tabulku.
-                            if split_attribute == None:
-                                # "Rozdeleny" atribut je v kolekci obj vzdy jako posledni --> index == -1
-                                if (obj[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE
-                                        or obj[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING):
-                                    split_attribute = obj.pop()
-                            else:
-                                # Zbytek rozdeleneho atributu je hned na zacatku kolekce
-                                attr_remainder = obj.pop(0)
-                                # Pokud napr. mezi "GROUP" a nasledujici zavorkou neni mezera, je pokracovani tokenu vc. klicoveho slova "GROUP". Zkontrolujeme tedy, zda jmeno attr_remainder zacina na "(" -- pokud ne a spojovaci reteze (split_attribute.comment) zaroven obsahuje vice nez jedno slovo, to posledni z nej odstranime.
-                                if split_attribute.condition == Attribute.CONDITION_SPLIT_ATTRIBUTE:
-                                    attr_link = split_attribute.comment.split()
-                                    if not attr_remainder.name.startswith("(") and len(attr_link) > 1:
-                                        attr_link.pop()
-                                        # Komentar musime nastavit primo (mezery!), nikoliv pomoci set-comment(...)
-                                        split_attribute.comment = " " + " ".join(attr_link) + " "
-                                    # Standardni rozdeleny atribut
-                                    split_attribute.set_name(f"{split_attribute.name}{split_attribute.comment}{attr_remainder.name}")
-                                    split_attribute.alias = attr_remainder.alias
-                                else:
-                                    # Rozdeleny atribut s Literalem
-                                    split_attribute.alias = attr_remainder.name
-                                # condition musime resetovat na None, jinak by zustavalo se spec. hodnotou napr. pri "SELECT x, y result FROM ..."
-                                split_attribute.condition = None
-                                # Tady by nejspis take slo vzit komentar tak, jak je, ale pro poradek vyuzijeme set_comment(...)
-                                split_attribute.set_comment(attr_remainder.comment)
-                                if union_table != None:
-                                    union_table.attributes.append(split_attribute)
-                                table.attributes.append(split_attribute)
-                                if (len(obj) > 0
-                                        and (obj[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE
-                                        or obj[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING)):
-                                    split_attribute = obj.pop()
-                                else:
-                                    split_attribute = None
-                            # Nakonec k tabulce pridame atributy zbyle v obj (musime ale zohlednit pripadnou znalost aliasu!)
-                            if known_attribute_aliases:
-                                # Zde resime blok ve WITH, u ktereho byly za nazvem docasne tabulky uvedeny aliasy (alespon nekterych) atributu. Predchystane ("TBD") atributy ale nelze primo aktualizovat, protoze v dusledku chyb v sqlparse mohlo dojit k umelemu rozdleni tokenu, tzn. zatim nemusime mit k dispozici kompletni sadu atributu. Aktualizujeme proto prvnich len(obj) "TBD" atributu v cilove tabulce s tim, ze kontrolu zbylych "TBD" atributu (vc. pripadneho vyvolani vyjimky) provedeme az uplne na konci process_statement(...).
-                                # Vime, ze aliasy atributu tabulky ve WITH musely byt uvedeny ve stejnem poradi jako atributy nyni zjistene z prikazu SELECT. Atributy u tabulky proto na zaklade jejich poradi aktualizujeme podle objektu vraceneho vyse metodou process_token(...).
-                                # ALE: v obj se mohou vyskytovat fiktivni atributy indikujici pouziti placeholderu (condition == Attribute.CONDITION_PLACEHOLDER_PRESENT), ktere zde musime preskocit.
-                                # Aktualizaci provedeme nejprve u table (pomoci obj). Nasledne, pokud resime UNION SELECT, "zrcadlime" atributy z table do union_table (je to tak jedodussi a asi i rychlejsi nez srovnavat hodnoty atd.).
-                                j = 0
-                                k = 0
-                                while (j < len(table.attributes)):
-                                    # Nejprve najdeme nasledujici "TBD" atribut
-                                    while (j < len(table.attributes)
-                                            and table.attributes[j].condition != Attribute.CONDITION_TBD):
-                                        j += 1
-                                    if j == len(table.attributes):
-                                        # Dosli jsme na konec table.attributes, tzn. uz tam neni zadny dalsi "TBD" atribut
-                                        break
-                                    # Ted v obj preskocime vsechny pripadne fiktivni atributy s informacemi o placeholderech (staci kontrolovat pomoci name == None)
-                                    while k < len(obj) and obj[k].name == None:
-                                        k += 1
-                                    if k == len(obj):
-                                        # Dosli jsme na konec obj, tzn. uz tam neni zadny dalsi standardni atribut, pomoci ktereho bychom mohli aktualizovat pripadne zbyle "TBD" atributy v cilove tabulce
-                                        break
-                                    attr = obj.pop(k)
-                                    # Pokud jsme nasli atribut "*" (prip. "table.*"), zahodime ho, zvysime index j (pro posun na dalsi atribut v table.attributes) a pokracujeme zpet na zacatek cyklu
-                                    if attr.name.endswith("*"):
-                                        j += 1
-                                        continue
-                                    table.attributes[j].set_name(attr.name)
-                                    # Neni nahodou drive zjisteny alias identicky s tim, co bylo v SELECT? Pokud ano, alias odstranime. Alias zde nemuze byt None (drive byl atribut ve tvaru name == condition == Attribute.CONDITION_TBD + s nastavenym aliasem), takze jmeno a alias muzeme porovnavat bez jakekoliv dalsi kontroly.
-                                    if attr.name == table.attributes[j].alias:
-                                        table.attributes[j].alias = None
-                                    table.attributes[j].condition = attr.condition
-                                    # Komentar muzeme aktualizovat primo (bez vyuziti set_comment(...))
-                                    table.attributes[j].comment = attr.comment
-                                    j += 1
-                            if union_table != None:
-                                # # Zpetna aktualizace atributu v hlavni tabulce (table) podle union_table zpusobovala obcas potize (sloupce zadane v UNION SELECT primo pomoci literalu byly v hlavni tabulce navic) --> aktualizovat budeme vyhradne tu tabulku, ktera je prave resena.
-                                # union_table.add_missing_attributes(obj, target_count=table.get_std_attribute_count())
-                                # table.add_missing_attributes(obj)
-                                union_table.attributes.extend(obj)
-                            else:
-                                table.attributes.extend(obj)
+                return cls.END_OF_STATEMENT
+            if t.normalized.startswith("CREATE"):
+                return cls.CREATE
+            return cls.IGNORED
+        return cls.OTHER
 
-                        else:
-                            # Ve zbylych situacich staci pridat nalezene atributy k aktualni tabulce (ktera uz u korektniho SQL kodu nyni nemuze byt None)
-                            table.attributes.extend(obj)
-                    else:
-                        # Ve vracenem seznamu jsou informace o zdrojovych tabulkach (z "FROM ..."), cili pro kazdou z nich provedeme potrebne upravy. POZOR: prvky kolekce mohou byt typu tuple nebo Table podle toho, co jsme nasli v SQL kodu!
-                        for src_table_info in obj:
-                            if isinstance(src_table_info, tuple) and isinstance(src_table_info[0], str):
-                                # Metoda process_token(...) vratila ntici, v niz je prvni prvek retezcem. Jinak receno, ziskali jsme nazev tabulky spolu s pripadnym aliasem a komentarem. Nejprve tedy zkusime najit zdrojovou tabulku, odkud se berou data, a pridame k ni alias.
-                                src_table = Table.get_table_by_name(name=src_table_info[0], alias_table=table)
-                                if src_table == None:
-                                    # Zdrojova tabulka zatim neexistuje (typicky v situaci, kdy resime "SELECT ... FROM dosud_nezminena_tabulka") --> vytvorime ji
-                                    src_table = Table(name=src_table_info[0], comment=src_table_info[2])
-                                    Table.__tables__.append(src_table)
-                                else:
-                                    # Komentar pridame jen v pripade, ze tento zatim neni nastaveny (prvotni komentar zpravidla byva detailnejsi a nedava smysl ho prepsat necim dost mozna kratsim/strucnejsim)
-                                    if not src_table.comment_is_set():
-                                        # Komentar by asi slo vzit primo, ale pro poradek vyuzijeme set_comment(...)
-                                        src_table.set_comment(src_table_info[2])
-                                Table.add_alias(table, src_table.id, src_table_info[1])
-                                # V tuto chvili by uz last_select_table_id melo byt za vsech okolnosti >= 0, tzn. last_select_table != None
-                                last_select_table = Table.get_table_by_id(last_select_table_id)
-                                if context == "join":
-                                    # Pokud resime JOIN, vytvorime patricnou mezi-tabulku (zatim neexistuje!), ke ktere budou nasledne pridany atributy s podminkami dle ON
-                                    join_table = Table(name_template="join", table_type=Table.AUX_TABLE)
-                                    Table.__tables__.append(join_table)
-                                    # Navic je nutne nastavit zavislosti tabulek: table (prip. union_table) --> join_table --> src_table
-                                    join_table.link_to_table_id(src_table.id)
-                                    last_select_table.link_to_table_id(join_table.id)
-                                else:
-                                    # V "obecnem" pripade ("SELECT ... FROM src_table", UNION SELECT) proste jen k aktualni tabulce reprezentujici SELECT pridame zavislost na zdrojove tabulce. Tabulku s aliasy (alias_table) uz netreba nastavovat, jelikoz toto bylo provedeno drive.
-                                    last_select_table.link_to_table_id(src_table.id)
-                                    if last_select_table_id != table.id:
-                                        table.link_to_table_id(last_select_table_id)
-                            elif isinstance(src_table_info, Table):
-                                # Metoda process_token(...) vratila objekt typu Table. Toto muze nastat ve dvou pripadech: bud resime JOIN (k cemuz musime vytvorit mezi-tabulku a nastavit odpovidajici zavislosti), nebo jde o situaci "SELECT ... FROM ( SELECT ... )" (kde uz mezi-tabulka byla vytvorena -- jde o tu vracenou -- a pouze nastavime zavislost aktualni tabulky na mezi-tabulce). Aktualne by last_select_table-id melo vzdy byt >= 0.
-                                last_select_table = Table.get_table_by_id(last_select_table_id)
-                                if context == "join":
-                                    join_table = Table(name_template="join", table_type=Table.AUX_TABLE)
-                                    Table.__tables__.append(join_table)
-                                    # Zavislosti: last_select_table --> join_table --> src_table
-                                    last_select_table.link_to_table_id(join_table.id)
-                                    join_table.link_to_table_id(src_table_info.id)
-                                    # Pripadne placeholdery musime zkopirovat i do join_table (kopirovani do table probehne nize)
-                                elif prev_context == "on":  # Zde musime kontrolovat prev_context, jelikoz pro "ON EXISTS (SELECT ... )" je aktualni kontext jiny!
-                                    join_table.link_to_table_id(src_table_info.id)
-                                    src_table_info.copy_bind_vars_to_table(join_table)
-                                    join_table.conditions.append(Attribute(name=get_op_prefix([f"<{src_table_info.name}>"]), comment=comment_before))
-                                else:
-                                    last_select_table.link_to_table_id(src_table_info.id)
-                                # Do hlavni tabulky jeste potrebujeme zkopirovat (a) zjistene aliasy a (b) pripadne placeholdery
-                                src_table_info.copy_aliases_to_table(last_select_table)
-                                src_table_info.copy_bind_vars_to_table(last_select_table)
-                                if last_select_table_id != table.id:
-                                    src_table_info.copy_aliases_to_table(table)
-                                    src_table_info.copy_bind_vars_to_table(table)
-                                # Byla zavorka za UNION? Pokud ano, musime upravit last_select_table_id 
-                                # Pokud by union_table byla nactena kompletne, bylo by nyni vse hotovo. Vlivem chyb v sqlparse ale muze byt kod rozdelen na vice tokenu, takze nyni je potreba jeste aktualizovat last_select_table_id a union_table.
-                                if src_table_info.name.startswith("union-select-"):
-                                    last_select_table_id = src_table_info.id
-                                    union_table = src_table_info
-                elif context == "with":
-                    # Resime blok WITH, kde navratovou hodnotou je pripadny komentar (byva vracen vzdy jako posledni sub-token, i kdyz se muze tykat az nasledujiciho tokenu)
-                    # K obejiti BUGu v sqlparse muze nekdy byt vracen tuple namisto retezce -- v takovem pripade namisto resetu token_counter snizime hodnotu promenne o 1 a zakazeme reset kontextu
-                    comment_before = obj
-                    if isinstance(obj, tuple):
-                        # Token byl sqlparse umele rozdelen na dva...
-                        token_counter -= 1
-                        can_switch_to_prev_context = False
-                    else:
-                        token_counter = 0
-            # Pokud neexistuje zadny nekompletni atribut (dalsi BUG: WITHIN GROUP, OVER, ...), resp. nenasleduje problematicke klicove slovo, ktere by zpusobilo vraceni vicero tokenu namisto jednoho, se muzeme vratit k predchozimu kontextu. K tomu ale musime taktez zkontrolovat nasledujici token. Podobne overime, jestli nenasleduje AND, coz by znacilo napr. pokracovani podminky v JOIN ... ON podm1 AND podm2 AND ... V SQL kodu chceme zachovat veskere bile znaky!
-            token_was_operator = (t.ttype in sql.T.Operator)
-            (j, next_token) = s.token_next(i, skip_ws=False, skip_cm=False)
-            while next_token != None and next_token.is_whitespace:
-                sql_components.append(t.value)
-                join_components.append(t.value)
-                union_components.append(t.value)
-                i = j
-                t = next_token
-                (j, next_token) = s.token_next(i, skip_ws=False, skip_cm=False)
-            if next_token != None:
-                # Hinty MATERIALIZE a NO_STAR_TRANSFORMATION jsou vraceny jako Identifier, "USE_HASH (arg)" a "USE_NL (arg)" potom jako Function (tzn. zaroven se zavorkou s argumenty). Mezera mezi hintem a zavorkou bude pritomna vzdy, jelikoz toto mame predem osetreno kosmetickou nahradou vq zdrojovem SQL.
-                next_token_upper = next_token.value.upper()
-                while (next_token_upper in ["MATERIALIZE", "NO_STAR_TRANSFORMATION"]
-                        or next_token_upper.startswith("USE_HASH (")
-                        or next_token_upper.startswith("USE_NL (")):
-                    # Ulozime hodnotu akt. tokenu
-                    sql_components.append(t.value)
-                    join_components.append(t.value)
-                    union_components.append(t.value)
-                    # Aktualizujeme index a akt. token
-                    i = j
-                    t = next_token
-                    # Je v tokenu jako posledni non-whitespace subtoken ulozen komentar? (muze se stat v pripade hintu vracenych jako funkce) -- musime obalit try-except, jelikoz .tokens nemusi existovat!
-                    try:
-                        last_nonws_subtoken = get_last_nonws_token(next_token.tokens)
-                        if is_comment(last_nonws_subtoken):
-                            # Chcceme druhou cast komentare (pokud existuji obe), protoze ta prvni se pravdepodobne tyka samotneho hintu
-                            comment_before = split_comment(last_nonws_subtoken)[1]
-                    except:
-                        pass
-                    # Nacteme novy next_token (chceme zachovat veskere bile znaky!)
-                    (j, next_token) = s.token_next(i, skip_ws=False, skip_cm=False)
-                    while next_token != None and next_token.is_whitespace:
-                        sql_components.append(t.value)
-                        join_components.append(t.value)
-                        union_components.append(t.value)
-                        i = j
-                        t = next_token
-                        (j, next_token) = s.token_next(i, skip_ws=False, skip_cm=False)
-                    if next_token != None:
-                        next_token_upper = next_token.value.upper()
-                    else:
-                        next_token_upper = None
-                    # Musime take zakazat reset kontextu
-                    can_switch_to_prev_context = False
-                # Zde musime znovu zkontrolovat, zda i pripadny novy next_token neni None atd.
-                if next_token != None:
-                    next_token_upper = next_token.value.upper()
-                    if next_token_upper == "WITHIN":
-                        # V predchozim tokenu jsme zpracovavali agregacni funkci, za niz byl hned uveden komentar, a "WITHIN" tedy nebylo soucasti daneho tokenu. Slo vsak o rozdeleny atribut (coz jsme tehy jeste nevedeli), takze ted najdeme prvni standardni atribut (asi staci pomoci name != None) od konce table.attributes a presuneme ho do split_attribute (vc. nastaveni condition). (Takovy atribut urcite v table.attributes existuje.) "WITHIN" je v tomto pripade vraceno jako Identifier, ale to zde neni podstatne. Dulezite je, ze se zatim nelze vratit k predchozimu kontextu, coz zaridime uz tim, ze bude split_attribute != None.
-                        if union_table != None:
-                            j = len(union_table.attributes) - 1
-                            while j >= 0:
-                                if union_table.attributes[j].name != None:
-                                    if len(union_table.attributes) == len(table.attributes):
-                                        table.attributes.pop()
-                                    split_attribute = union_table.attributes.pop()
-                                    break
-                                j -= 1
-                        else:
-                            j = len(table.attributes) - 1
-                            while j >= 0:
-                                if table.attributes[j].name != None:
-                                    split_attribute = table.attributes.pop()
-                                    break
-                                j -= 1
-                        split_attribute.condition == Attribute.CONDITION_SPLIT_ATTRIBUTE
-                        split_attribute.comment = " WITHIN GROUP "
-                        # Pokracovat budeme standardne na konci cyklu ulozenim tokenu do kolekci atd. Nasledujici token by pak mel byt "GROUP", prip. "GROUP(...)", ktery zpracujeme obvyklym zpusobem.
-                    else:
-                        # Zde kontrolujeme radeji uppercase verzi, jelikoz ne vse ze seznamu nize je oznaceno za klicove slovo, kde .normalized vraci velka pismena. Zaroven se divame, jestli dalsi token neni carka, protoze pokud by byl, znamenalo by to, ze vycet Identifieru apod. byl v dusledku BUGu umele rozdelen na vicero tokenu (tedy bude jeste mit pokracovani).
-                        # Pokud jsem nasli operator, mohl byl token vlivem BUGu v sqlparse umele rozdelen vlozenim "komentar \n" do operace apod. Reset kontextu tedy zatim pro jistotu zakazeme.
-                        can_switch_to_prev_context = (can_switch_to_prev_context
-                                and (context == "exists-select"  # Po zpracovani EXIST SELECT se potrebujeme vratit k predchozimu kontextu
-                                or not (token_was_operator
-                                or is_comment(next_token)
-                                or next_token.ttype in sql.T.Operator
-                                or next_token_upper in ["OVER", "AND", "OR", "NOT", "CYCLE", "SET", "TO", "DEFAULT", "USING", "DISTINCT", "NULL", ","])))
-            if can_switch_to_prev_context and split_attribute == None:
-                # Pokud resime JOIN a dokoncili jsme parsovani casti ON, muzeme k tabulce ulozit jeji SQL kod
-                if context == "on" and join_table != None:
-                    # Hodnotu tokenu si pridame to kolekce s komponentami zdrojoveho SQL kodu
-                    join_components.append(t.value)
-                    # Jelikoz nyni mame cely JOIN zpracovany, lze k mezi-tabulce priradit i ji odpovidajici SQL kod. Referenci na tabulku ale resetovat nesmime! (na rozdil od union_table, kde je toto potreba). Na rozdil od [UNION] SELECT take nemusime z kolekce join_components odebirat koncove bile znaky/uzaviraci zavorku, protoze tyto se v kolekci nenachazi.
-                    join_table.source_sql = "".join(join_components)
-                    # Musime vyresit pripadne fiktivni atributy vznikle vlivem podminek rozdelenych komentari na vice radku
-                    join_table.conditions = process_remaining_link_attributes(join_table.conditions, copy_conditions=True)
-                context = prev_context
-        # Nakonec si ulozime kod tokenu do kolekci sql_components, join_components a union_components (je nutne aktualizovat vsechny!) a nacteme dalsi token
-        sql_components.append(t.value)
-        join_components.append(t.value)
-        union_components.append(t.value)
-        (i, t) = s.token_next(i, skip_ws=False, skip_cm=False)
-    # Jestlize byl UNION SELECT na konci statementu, chybi u nej zatim SQL kod. Tento tedy nyni pridame.
-    if union_table != None:
-        # Doresime pripadne zbyle fiktivni atributy se "spojkami", pokud se ukazalo, ze rozdeleni na vice tokenu nebylo uprosted nektereho z prvku vyctu v SELECT/ON/WHERE
-        union_table.attributes = process_remaining_link_attributes(union_table.attributes)
-        union_table.conditions = process_remaining_link_attributes(union_table.conditions, copy_conditions=True)
-        stripTrailingWSCP(union_components)
-        # Zdrojovy kod ulozime jedine v pripade, ze zatim nebyl prirazen (muze uz totiz byt ulozen z doby, kdy byl zpracovavan "UNION ( SELECT ... )", tzn. kdy SELECT byl obalen extra zavorkami)
-        if union_table.source_sql == None or len(union_table.source_sql) == 0:
-            union_table.source_sql = "".join(union_components)
-    # Nyni zkontrolujeme, zda v kolekci atributu nezustal nejaky "TBD" (drive zkontrolovat neslo, protoze tokeny jsou nekdy v dusledku chyb v sqlparse umele rozdelene). Pro podchyceni (primarne asi testovacich?) pripadu s blokem/y ve WITH, ale bez alespon jednoho hlavniho SELECT, musime kontrolovat, zda table neni None.
-    if table != None:
-        for attribute in table.attributes:
-            if attribute.condition == Attribute.CONDITION_TBD:
-                raise Exception(f"Počet aliasů atributů uvedených explicitně u tabulky {table.name} je větší než počet atributů vrácených v části SELECT")
-        # Doresime pripadne zbyle fiktivni atributy se "spojkami", pokud se ukazalo, ze rozdeleni na vice tokenu nebylo uprosted nektereho z prvku vyctu v SELECT/ON/WHERE
-        table.attributes = process_remaining_link_attributes(table.attributes)
-        table.conditions = process_remaining_link_attributes(table.conditions, copy_conditions=True)
-        # Obsah sql_components se resetuje pri nalezeni SELECT, resp. JOIN. Pokud je SELECT v zavorkach ("SELECT ... FROM ( SELECT ... )"), obsahuje kolekce na konci jednu uzaviraci zavorku navic, kterou je pred ulozenim SQL kodu nutne odstranit.
-        if len(sql_components) > 0 and sql_components[0].lower() == "select":
-            stripTrailingWSCP(sql_components)
-            table.source_sql = "".join(sql_components)
 
+class StatementState:
+    """Stav zpracovani jednoho SQL prikazu (prip. vnorene zavorky) v process_statement(...), ktery sdileji obsluzne metody jednotlivych kontextu (viz StatementHandler)"""
 
-# TODO: kontrolovat pritomnost lib. fiktivniho atributu + pripadne Exception, pokud u tabulky neco zbylo?    
+    def __init__(self, s: sql.TokenList, table: "Table", known_attribute_aliases: bool):
+        # Vsechny vytvorene tabulky, zdrojovy kod, varovani i statistiky patri do prave aktivni relace zpracovani
+        self.session = ParseSession.current()
+        self.s = s
+        self.table = table
+        self.known_attribute_aliases = known_attribute_aliases
+        # Tokeny budeme prochazet iteratorem a rovnou budeme preskakovat bile znaky (komentare vsak ne)
+        self.i = 0
+        self.t = s.token_first(skip_ws=True, skip_cm=False)
+        # Flag pro predavani informaci o kontextu toho ktereho tokenu (v ruznych kontextech je zpravidla potreba mirne odlisny zpusob zpracovani, viz StatementHandler.CONTEXTS)
+        self.context = None
+        # Predchozi kontext potrebujeme napr. pro pripad "ON ... --> AND (EXISTS-SELECT) AND --> ON"
+        self.prev_context = None
+        # Flag pro reseni nestandardnich situaci vlivem chyb v sqlparse (rozdelene tokeny apod.) -- ridi, zda se lze vratit k predchozimu kontextu
+        self.can_switch_to_prev_context = True
+        self.comment_before = ""
+        # Pocitadlo radku od posledniho komentare (nekdy nas zajima komentar pred aktualnim tokenem). Pocatecni hodnota je libovolna takova, aby se v cyklu na zacatku NEresetoval comment_before, pokud by SQL dotaz nezacinal komentarem.
+        self.token_counter = 10
+        # Zdrojovy kod (tabulky si ukladaji pouze rozsah ve sdilenem zdrojovem kodu, viz SourceBuffer):
+        #   * WITH: rozsah tokenu t
+        #   * JOIN: od tokenu s JOIN do konce podminek v ON (oddelene tokeny)
+        #   * SELECT: u "( SELECT ... )" by sice slo pouzit rozsah t.parent, ale toto u top-level SELECT (bez uvedeni v zavorkach) zahrne vzdy kompletne cely (!) SQL dotaz, coz neni zadouci. I zde si tedy pamatujeme pocatecni pozici a konec urcime az na konci prikazu.
+        self.select_start = None
+        self.join_start = None
+        self.join_table = None
+        # union_* jsou potreba v pripade, ze sjednocovani je provadeno bez prikazu "SELECT ..." v zavorce (tzn. "SELECT ... UNION SELECT ..."), jelikoz pak je patricny SQL kod vracen jako prosta sekvence tokenu). Pokud je nektery SELECT v zavorkach, zpracovava se jako samostatny statement.
+        self.union_start = None
+        self.union_table = None
+        # Pro korektni nastavovani zavislosti budeme potrebovat take odkaz na posledni "SELECT" tabulku (protoze lze narazit napr. na pripad "SELECT ... FROM ... JOIN ... ON ... UNION SELECT ... FROM ... JOIN ... ON ...", kde prvni join_table je zavislosti prvniho selectu, zatimco ve druhem pripade je patricna join_table zavislosti union-selectu).
+        if self.table != None:
+            self.last_select_table_id = self.table.id
+        else:
+            self.last_select_table_id = -1
+        # Nekompletni atribut vznikly v dusledku WITHIN GROUP, OVER apod. (viz mj. bugy zminene v process_token(...)); pokud neni None, je potreba ho sloucit s nekompletnim prvnim atributem vracenym v "dalsim kole" zpracovavani atributu
+        self.split_attribute = None
 
 
-def process_remaining_link_attributes(attributes: list, copy_conditions=False) -> list:
-    """Projde zadany seznam atributu (prip. podminek) a zpracuje pripadne zbyle fiktivni atributy s condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK. Metoda vraci seznam atributu ve stavu po provedeni pripadnych zmen."""
-    j = 1
-    while j < len(attributes) - 1:
-        if (attributes[j].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
-            and attributes[j - 1].name != None
-            and attributes[j + 1].name != None):
-            if attributes[j].comment.startswith(" ") and attributes[j].comment.endswith(" "):
-                link = attributes[j].comment
+class StatementHandler:
+    """Obsluha tokenu v hlavnim cyklu process_statement(...) v kontextu None (zacatek prikazu, prip. kontext bez vlastni obsluhy). Obsluzna metoda tokenu je urcena jedinym vyhledanim v tabulce podle klice (typ tokenu, normalizovana podoba klicoveho slova, kontext), takze cena za token neroste s poctem podporovanych klicovych slov ani kontextu. Potomci teto tridy prepisuji metody, jejichz chovani se v danem kontextu lisi (viz CONTEXTS). Vsechny obsluzne metody vraci, jakym zpusobem ma hlavni cyklus pokracovat (NEXT_TOKEN, CURRENT_TOKEN, END)."""
+    # Nacteni dalsiho tokenu (bile znaky nepreskakujeme, v SQL kodu tabulek jsou zahrnuty diky rozsahum v SourceBuffer)
+    NEXT_TOKEN = 0
+    # Zpracovani tokenu, ktery obsluzna metoda jiz nacetla do StatementState.t
+    CURRENT_TOKEN = 1
+    # Konec zpracovani prikazu
+    END = 2
+    # Nazvy obsluznych metod pro jednotlive zpusoby zpracovani tokenu (index == TokenKind.*; bile znaky a interpunkce jsou pouze preskoceny primo v hlavnim cyklu)
+    METHODS = ["on_other", None, "on_comment", "on_keyword", "on_from", "on_join", "on_on", "on_union", "on_exists", "on_over", "on_keyword_with_args", "on_into",
+               "on_connect", "on_search", "on_end_of_statement", "on_with", "on_select", "on_merge", "on_insert", "on_create", "on_where", "on_ignored"]
+    # Klicova slova, u kterych v danem kontextu nevypisujeme varovani o potencialne problematickem klicovem slove (viz on_keyword(...))
+    EXPECTED_KEYWORDS = ["DISTINCT", "GROUP", "AS", "BEGIN", "END"]
+    # Zda se po zpracovani obecneho tokenu vzdy vracime k predchozimu kontextu (pokud to rozdelene tokeny dovoli, viz finish_token(...))
+    SWITCH_BACK_AFTER_TOKEN = False
+    # Tridy obsluhy jednotlivych kontextu (doplneno po definici vsech trid)
+    CONTEXTS = {}
+    # Tabulka obsluznych metod (klic: (klic tokenu dle TokenKind.get_key(...), kontext), hodnota: (zpusob zpracovani, nazev obsluhy pro pocitadlo, metoda, zda jde o krok zpracovani)). Tabulka je doplnovana za behu a sdilena vsemi relacemi zpracovani.
+    __handlers__ = {}
+
+    @classmethod
+    def get(cls, t: sql.Token, context: str) -> tuple:
+        """Vrati obsluhu zadaneho tokenu v zadanem kontextu jako ntici (zpusob zpracovani, nazev obsluhy, metoda, zda jde o krok zpracovani volany pomoci "yield from")"""
+        key = (TokenKind.get_key(t), context)
+        handler = StatementHandler.__handlers__.get(key)
+        if handler == None:
+            kind = TokenKind.get(t)
+            handler_class = StatementHandler.CONTEXTS.get(context, StatementHandler)
+            method_name = StatementHandler.METHODS[kind]
+            if method_name == None:
+                handler = (kind, TokenKind.NAMES[kind], None, False)
             else:
-                link = " " + attributes[j].comment + " "
-            attributes[j - 1].set_name(attributes[j - 1].name + link + attributes[j + 1].name)
-            attributes[j - 1].alias = attributes[j + 1].alias
-            if copy_conditions:
-                attributes[j - 1].condition = attributes[j + 1].condition
-            if not attributes[j - 1].comment_is_set():
-                attributes[j - 1].comment = attributes[j + 1].comment
-            attributes.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
-            attributes.pop(j)  # ... a zbytek rozdeleneho atributu
-            continue
-        j += 1
-    # Pripadny fiktivni atribut se "spojkou" uplne na zacatku nebo na konci kolekce zahodime (nemohl byt dusledkem rozdeleni atributu na vicero casti, protoze za nim uz nic nenasleduje)
-    if len(attributes) > 0 and attributes[0].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK:
-        attributes.pop(0)
-    if len(attributes) > 0 and attributes[-1].condition == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK:
-        attributes.pop()
-    return attributes
+                method = getattr(handler_class, method_name)
+                handler = (kind, f"{handler_class.__name__}.{method_name}", method, inspect.isgeneratorfunction(method))
+            StatementHandler.__handlers__[key] = handler
+        return handler
+
+    @classmethod
+    def on_split_attribute_keyword(cls, state: StatementState) -> None:
+        """Zpracuje klicove slovo, ktere je pokracovanim nekompletniho (rozdeleneho) atributu StatementState.split_attribute. Metoda nic nevraci."""
+        if state.t.normalized in ["BETWEEN", "AND", "IS", "IS NOT"]:
+            if not state.split_attribute.has_condition():
+                state.split_attribute.set_condition(state.t.normalized)
+            else:
+                state.split_attribute.append_to_condition(" " + state.t.normalized)
+        elif state.t.normalized in ["NULL", "NOT NULL"]:
+            # V tomto pripade vime, ze split_attribute je kompletni
+            state.split_attribute.append_to_condition(" " + state.t.normalized)
+            if state.context == "on":
+                state.join_table.conditions.append(state.split_attribute)
+            else:
+                Table.get_table_by_id(state.last_select_table_id).conditions.append(state.split_attribute)
+            state.split_attribute = None
 
+    @classmethod
+    def on_comment(cls, state: StatementState) -> int:
+        # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
+        state.comment_before = split_comment(state.t)[1]
+        state.token_counter = 0
+        return cls.NEXT_TOKEN
 
-def text_to_dia(text: str) -> str:
-    """Vrati text ve tvaru vhodnem pro vlozeni do .dia"""
-    if text != None and len(text) > 0:
-        # Pocatecni a koncove bile znaky orezeme
-        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-    return ""
+    @classmethod
+    def on_from(cls, state: StatementState) -> int:
+        state.prev_context = state.context
+        state.context = "from"
+        # Musime jeste overit, jestli nemame ulozeny nejaky rozdeleny atribut s Literalem (tento mohl byt na konci seznamu bez aliasu, tzn. byl by docasne ve split_attribute a v tabulce by zatim chybel). V takovem pripade nastavime comment = condition = None a atribut pridame do last_select_table (== table, resp. union_table).
+        if state.split_attribute != None:
+            state.split_attribute.comment = None
+            state.split_attribute.set_condition(None)
+            last_select_table = Table.get_table_by_id(state.last_select_table_id)
+            if (len(last_select_table.attributes) > 0
+                    and last_select_table.attributes[-1].kind == Attribute.CONDITION_TBD):
+                state.split_attribute.alias = last_select_table.attributes[-1].alias
+                last_select_table.attributes.pop()
+            last_select_table.attributes.append(state.split_attribute)
+            # Nakonec resetujeme promennou split_attribute
+            state.split_attribute = None
+        return cls.NEXT_TOKEN
 
+    @classmethod
+    def on_join(cls, state: StatementState) -> int:
+        state.prev_context = state.context
+        state.context = "join"
+        # Zde musime krome nastaveni kontextu navic ulozit pocatecni pozici SQL kodu JOINu
+        state.join_start = state.session.source.get_position(state.t)
+        return cls.NEXT_TOKEN
 
-def generateDiaBlockAttrCode(name, comment) -> str:
-    """Vrati XML kod atributu v Dia bloku "UML Class", kde name je jmeno atributu a comment u nej vlozeny komentar"""
-    code = []
-    code.append(("        <dia:composite type=\"umlattribute\">\n"
-                 "          <dia:attribute name=\"name\">\n"))
-    code.append(f"            <dia:string>#{text_to_dia(name)}#</dia:string>\n")
-    code.append(("          </dia:attribute>\n"
-                 "          <dia:attribute name=\"type\">\n"
-                 "            <dia:string>##</dia:string>\n"
-                 "          </dia:attribute>\n"
-                 "          <dia:attribute name=\"value\">\n"
-                 "            <dia:string>##</dia:string>\n"
-                 "          </dia:attribute>\n"))
-    code.append( "          <dia:attribute name=\"comment\">\n")
-    code.append(f"            <dia:string>#{text_to_dia(comment)}#</dia:string>\n")
-    code.append(("          </dia:attribute>\n"
-                 "          <dia:attribute name=\"visibility\">\n"
-                 "            <dia:enum val=\"3\"/>\n"
-                 "          </dia:attribute>\n"
-                 "          <dia:attribute name=\"abstract\">\n"
-                 "            <dia:boolean val=\"false\"/>\n"
-                 "          </dia:attribute>\n"
-                 "          <dia:attribute name=\"class_scope\">\n"
-                 "            <dia:boolean val=\"false\"/>\n"
-                 "          </dia:attribute>\n"
-                 "        </dia:composite>\n"))
-    return "".join(code)
+    @classmethod
+    def on_on(cls, state: StatementState) -> int:
+        if state.join_table == None:
+            raise Exception(f"Klíčové slovo ON nalezeno před klíčovým slovem JOIN")
+        state.prev_context = state.context
+        state.context = "on"
+        return cls.NEXT_TOKEN
 
+    @classmethod
+    def on_union(cls, state: StatementState) -> int:
+        state.prev_context = state.context
+        state.context = "union-select"
+        # Pokud jsme doted resili UNION SELECT (tzn. pokud union_table != None), je nutne ke stavajici union_table pridat zdrojovy SQL kod a resetovat referenci na tabulku (UNION je totiz timto doreseny)
+        if state.union_table != None:
+            # Zdrojovy kod ulozime jedine v pripade, ze zatim nebyl prirazen (muze uz totiz byt ulozen z doby, kdy byl zpracovavan "UNION ( SELECT ... )", tzn. kdy SELECT byl obalen extra zavorkami)
+            if not state.union_table.source_sql_is_set():
+                state.union_table.source_span = state.session.source.get_span(state.union_start, state.session.source.get_position(state.t))
+            state.union_table = None
+        return cls.NEXT_TOKEN
 
-def get_primary_linked_ids(table: Table, path=[]) -> list:
-    """Vrati ID vsech tabulek z WITH bloku (table_type == Table.WITH_TABLE), resp. SELECT na nejvyssi urovni (table_type == Table.MAIN_SELECT), ktere jsou bud primo uvedeny v linked_to_tables_id, prip. jsou dosazitelne skrze nepreruseny retezec mezi-tabulek (table_type == Table.AUX_TABLE) zacinajici nekterym z ID v linked_to_tables_id. Parametr path zabranuje zacykleni (pokud jsme uz jednou pres aktualni tabulku prosli, hledani ukoncime)."""
-    if table == None or len(table.linked_to_tables_id) == 0 or table.id in path:
-        return []
-    path.append(table.id)
-    primary_linked_ids = []
-    for id in table.linked_to_tables_id:
-        t = Table.get_table_by_id(id)
-        if t.table_type == Table.WITH_TABLE or t.table_type == Table.MAIN_SELECT:
-            # Je tabulka s danym ID primo WITH tabulkou, prip. SELECT na nejvyssi urovni? Pokud ano, pridame toto ID do linked_ids a pokracujeme kontrolou dalsiho ID z linked_to_tables_id.
-            primary_linked_ids.append(t.id)
-        elif t.table_type == Table.AUX_TABLE:
-            # Pokud prave resime mezi-tabulku, musime rekurzivne zkontrolovat veskera ID, se kterymi je tato tabulka svazana
-            primary_linked_ids.extend(get_primary_linked_ids(t, path))
-        # Standardni tabulky (ty z databaze) kontrolovat nemusime, protoze pres ne urcite nemuze vest retezec zavislosti WITH tabulek
-    return primary_linked_ids
+    @classmethod
+    def on_exists(cls, state: StatementState) -> int:
+        # BUG: v SQL kodu je "EXISTS komentar \n ( SELECT ...)" --> opet rozdlene tokeny!
+        state.prev_context = state.context
+        state.context = "exists-select"
+        return cls.NEXT_TOKEN
 
+    @classmethod
+    def on_over(cls, state: StatementState) -> int:
+        # Tato cast je nutna pro rucni obejiti chyby v sqlparse (BUG https://github.com/andialbrecht/sqlparse/issues/701 )
+        # Klicove slovo OVER a nasledna zavorka s pripadnym PARTITION BY apod. jsou vraceny jako dva tokeny oddelene od predchoziho tokenu s funkci. Pripadny alias a komentar jsou az soucasti tokenu se zavorkou. Prvni token s OVER tedy preskocime a nasledne z druheho tokenu zjistime pripadny alias a komentar.
+        last_select_table = Table.get_table_by_id(state.last_select_table_id)
+        state.split_attribute = last_select_table.attributes.pop()
+        # Komentar musime s ohledem na pritomnost mezer priradit primo, nikoliv pomoci set-comment(...)!
+        state.split_attribute.set_condition(None, Attribute.CONDITION_SPLIT_ATTRIBUTE)
+        state.split_attribute.comment = " OVER "
+        return cls.NEXT_TOKEN
 
-def get_random_string(n: int) -> str:
-    """Vraci nahodny retezec o zadane delce (n znaku) slozeny pouze z malych pismen"""
-    return "".join(secrets.choice(string.ascii_lowercase) for _ in range(n))
+    @classmethod
+    def on_keyword_with_args(cls, state: StatementState) -> int:
+        # V tomto pripade se zda, ze parametry (jeden, prip. vice) jsou vzdy vraceny jako jeden token. Nacteme tedy dalsi token (cimz nasledujici token de facto preskocime), pricemz bile znaky mezi nimi rovnez preskocime (v SQL zdroji zustanou zachovany diky rozsahum v SourceBuffer).
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        while state.t.is_whitespace:  # Zde predpokladame, ze t != None (pokud t == None, je s SQL kodem neco spatne a stejne bychom museli parsovani prerusit...)
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        # Zaroven si poznacime, ze se zatim nelze vratit k predchozimu kontextu, protoze jeste mohou nasledovat dalsi relevantni tokeny
+        state.can_switch_to_prev_context = False
+        return cls.NEXT_TOKEN
 
+    @classmethod
+    def on_into(cls, state: StatementState) -> int:
+        # Mimo MERGE jde o klicove slovo s parametrem (viz MergeHandler.on_into(...))
+        return cls.on_keyword_with_args(state)
 
-def replace_match_case(old_str, new_str, text, whole_words=True):
-    """Nahradi vsechny vyskyty retezce old_str (musi jit o cela slova) v retezci text retezcem new_str. V pocatecnich znacich new_str az do delky min(len(old_str), len(new_str)) je zachovana velikost pismen, pripadna dalsi pismena az do konce new_str jsou ponechana tak, jak byla zadana."""
+    @classmethod
+    def on_connect(cls, state: StatementState) -> int:
+        # Zde nelze obecne rici, jakym zpusobem budou tokeny vraceny (nepovinna klicova slova, Identifier vs. Builtin + Comparison + Integer vs. ...). Nasledujici tokeny tedy musime prochazet tak dlouho, nez najdeme Comparison. POZOR: "...ttype != sql.T.Comparison" NENI TOTEZ JAKO "not isinstance(..., sql.Comparison)"!
+        while state.t != None and not (state.t.ttype == sql.T.Comparison or isinstance(state.t, sql.Comparison)):
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        # Podminka muze byt rozdelena klicovym slovem PRIOR --> preskocime na nasledujici non-whitespace token a ten uz pak navratem na zacatek hlavniho cyklu zpracujeme standardnim zpusobem.
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        while state.t.is_whitespace or state.t.normalized == "PRIOR":  # Zde predpokladame, ze t != None (pokud t == None, je s SQL kodem neco spatne a stejne bychom museli parsovani prerusit...)
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        return cls.CURRENT_TOKEN
 
-    def f_match_case(match):
-        g = match.group()
-        res = []
-        min_len = min(len(g), len(new_str))
-        for i in range(min_len):
-            if g[i].isupper():
-                res.append(new_str[i].upper())
+    @classmethod
+    def on_search(cls, state: StatementState) -> int:
+        # Napr. "[SEARCH] [DEPTH] [FIRST] [BY] [identifier] [SET] [identifier]" --> musime preskocit na sedmy token od toho aktualniho
+        num_skipped_tokens = 0
+        while state.t != None and num_skipped_tokens < 6:
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+            state.token_counter += 1
+            if state.token_counter == 2:
+                state.comment_before = ""
+            if is_comment(state.t):
+                # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
+                state.comment_before = split_comment(state.t)[1]
+                state.token_counter = 0
             else:
-                res.append(new_str[i])
-        if min_len < len(new_str):
-            res.extend(new_str[min_len:])
-        return "".join(res)
-    
-    if old_str == None or text == None:
-        return text
-    if new_str == None:
-        new_str = ""
-    # Pro hledani celych slov potrebujeme na zacatek a konec old_str pridat metaznak \b (word boundary, je nutne escapovat zpetne lomitko!)
-    if whole_words:
-        old_str = "\\b" + old_str + "\\b"
-    return re.sub(old_str, f_match_case, text, flags=re.I)
+                num_skipped_tokens += 1
+        # Nacteme token nasledujici po nazvu tabulky atd. a preskocime zpet na zacatek hlavniho cyklu
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        return cls.CURRENT_TOKEN
 
+    @classmethod
+    def on_end_of_statement(cls, state: StatementState) -> int:
+        # Nasli jsme statement "GRANT privilege-type ON object object-name TO grantees", "EXCEPTION ...", "RETURN hodnota/identifier", prip. "DROP [VIEW ...]" -- tohle nas vubec nezajima a muzeme tedy z metody rovnou vyskocit
+        return cls.END
 
-if __name__ == "__main__":
-    write_debug_output = False
-    overwrite_dia = False
-    # Z parametru nacteme nazev souboru se SQL kodem a pozadovane kodovani (prvni parametr obsahuje nazev skriptu)
-    if len(sys.argv) > 3:
-        options = str(sys.argv[1]).lstrip("-").lower()
-        write_debug_output = "d" in options
-        overwrite_dia = "o" in options
-        source_sql = str(sys.argv[2])
-        encoding = str(sys.argv[3])
-    elif len(sys.argv) > 2:
-        source_sql = str(sys.argv[1])
-        encoding = str(sys.argv[2])
-    else:
-        # Pokud bylo zadano malo parametru, zobrazime napovedu a ukoncime provadeni skriptu
-        print("\nSyntaxe:\n\n  sql2xml [-PREP] SOUBOR KODOVANI\n\nkde:\n  -PREP     volitelné přepínače; zadávány hromadně za pomlčkou\n            (např. -do)\n    d       kromě diagramu (.dia) zapíše na disk také ladicí\n            výstupy, tzn. textovou reprezentaci všech nalezených\n            tabulek (*_vystup.txt) a případné soubory s popisem\n            chyb (*_CHYBA.txt) a varování (*_VAROVANI.txt)\n    o       pokud výstupní .dia soubor existuje, bude přepsán;\n            výchozí chování (bez přepínače -o): název výstupního\n            souboru je upraven přidáním čísla tak, aby nedošlo\n            k přepsání existujícího souboru\n  SOUBOR    cesta k souboru s SQL dotazem\n  KODOVANI  kódování, které má být použito při čtení souboru\n            (ansi, cp1250, utf-8, utf-8-sig apod.)\n")
-        os._exit(1)  # sys.exit(1) vyvola dalsi vyjimku (SystemExit)!
+    @classmethod
+    def on_keyword(cls, state: StatementState) -> int:
+        # Kazde jine vyse neuvedene klicove slovo (u kterych nepredpokladame vyskyt parametru) proste na konci tohoto cyklu ulozime a nacteme dalsi token
 
-        # # DEBUG
+        # DEBUG
+        if not (state.t.normalized.startswith("NULLS ")  # "NULLS [FIRST|LAST]"
+                or state.t.normalized in cls.EXPECTED_KEYWORDS):
+            w = f"\n>>> POTENCIALNE PROBLEMATICKE KLICOVE SLOVO: {state.t.normalized}"
+            print(w)
+            state.session.warnings.append(w)
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def on_with(cls, state: StatementState) -> int:
+        # Jde o WITH pro definici bloku, nebo o WITH jako soucast napr. "CREATE VIEW"?
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        while state.t != None:
+            state.token_counter += 1
+            if state.token_counter == 2:
+                state.comment_before = ""
+            if is_comment(state.t):
+                # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
+                state.comment_before = split_comment(state.t)[1]
+                state.token_counter = 0
+            elif state.t.ttype == sql.T.Keyword and state.t.normalized in ["READ", "CHECK", "GRANT"]:
+                # Zacatek "READ ONLY", prip. "[CHECK|GRANT] OPTION"
+                (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+                continue
+            elif ((state.t.ttype == sql.T.Keyword and state.t.normalized in ["ONLY", "OPTION"])
+                    or state.t.ttype == sql.T.Punctuation):
+                (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+                continue
+            else:
+                break
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        state.prev_context = state.context
+        state.context = "with"
+        # Jsme na zacatku casti WITH, ale zatim jsme nenacetli ani jeden blok --> zakazeme navrat k puvodnimu kontextu, cimz se zaroven zabrani predcasnemu resetu promenne comment_before
+        state.can_switch_to_prev_context = False
+        # Preskocime zpet na zacatek hlavniho cyklu (v t mame token nasledujici po casti WITH)
+        return cls.CURRENT_TOKEN
+
+    @classmethod
+    def on_select(cls, state: StatementState) -> int:
+        state.prev_context = state.context
+        state.context = "select"
+        # Pokud jde o SELECT na nejvyssi urovni dotazu, neexistuje pro nej zatim zadna tabulka. Tuto tedy vytvorime, aby k ni pak bylo mozne doplnit atributy atd.
+        if state.table == None:
+            state.table = Table(name_template="main-select", comment=state.comment_before, table_type=Table.MAIN_SELECT)
+            state.session.add_table(state.table)
+            state.last_select_table_id = state.table.id
+            # Tabulka s aliasy (alias_table) zde -- na nejvyssi urovni -- zustava None, takze neni nutne cokoliv nastavovat
+        state.select_start = state.session.source.get_position(state.t)
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def on_merge(cls, state: StatementState) -> int:
+        state.prev_context = state.context
+        state.context = "merge"
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def on_insert(cls, state: StatementState) -> int:
+        # Nasli jsme "INSERT INTO table [...]" -- preskocime nasledujici dva tokeny (pripadne komentare si ulozime)
+        num_skipped_tokens = 0
+        while state.t != None and num_skipped_tokens < 2:
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+            state.token_counter += 1
+            if state.token_counter == 2:
+                state.comment_before = ""
+            if is_comment(state.t):
+                # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
+                state.comment_before = split_comment(state.t)[1]
+                state.token_counter = 0
+            else:
+                num_skipped_tokens += 1
+        # Nacteme token nasledujici po nazvu tabulky atd. a preskocime zpet na zacatek hlavniho cyklu
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        return cls.CURRENT_TOKEN
+
+    @classmethod
+    def on_create(cls, state: StatementState) -> int:
+        # Nasli jsme "CREATE [[OR REPLACE] [FORCE] VIEW ... ( ... ) AS [SELECT | WITH] ...]" -- preskocime vse az po posledni token po AS). Komentare zde preskakovat nemuzeme, protoze ten posledni pred SELECT/WITH muze byt relevantni. cast "... ( ...)" za klicovym slovem VIEW je vracena jako jeden token, coz nam znacne usnadni praci s hledanim SELECT/WITH, ktery muze byt obalen zavorkami.
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        while state.t != None:
+            state.token_counter += 1
+            if state.token_counter == 2:
+                state.comment_before = ""
+            if is_comment(state.t):
+                # Pri nalezeni komentare si tento ulozime jeho druhou cast (za serii pomlcek) a resetujeme token_counter
+                state.comment_before = split_comment(state.t)[1]
+                state.token_counter = 0
+            elif ((state.t.ttype == sql.T.DML and state.t.normalized == "SELECT")
+                    or (state.t.ttype == sql.T.CTE and state.t.normalized == "WITH")
+                    or isinstance(state.t, sql.Parenthesis)):
+                break
+            (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        # Preskocime zpet na zacatek hlavniho cyklu (v t mame SELECT, WITH, prip. zavorku se SELECT)
+        return cls.CURRENT_TOKEN
+
+    @classmethod
+    def on_where(cls, state: StatementState) -> int:
+        # Kontext musime nastavit pro potreby pripadneho pozdejsiho odstraneni fiktivnich atributu se "spojkami" (BUG v sqlparse)
+        state.prev_context = state.context
+        state.context = "where"
+        attributes = yield from get_attribute_conditions(state.t)
+        last_select_table = Table.get_table_by_id(state.last_select_table_id)
+        # BUG: Pokud parser umele rozdeli seznam atributu v SELECT apod. na vice tokenu, muze u prvniho standardniho atributu chybet komentar, ktery byl v SQL kodu uveden nad patricnym radkem. Podivame se tedy, jestli uz u aktualne resene tabulky jsou nejake standardni atributy, a pokud ano, pridame komentar k poslednimu z nich (tzn. je-li komentar prazdny, nahradime ho obsahem promenne comment_before). Pokud zadny standardni atribut zatim neexistuje, pridame komentar k prvnimu nalezenemu stadardnimu atributu v navracene kolekci (attributes). Pro urychleni budeme seznam prochazet jedine v pripade, ze comment_before != "".
+        if len(state.comment_before) > 0:
+            attribute = last_select_table.get_last_std_condition()
+            if attribute != None:
+                if not attribute.comment_is_set():
+                        attribute.comment = state.comment_before
+            else:
+                j = 0
+                while j < len(attributes):
+                    attribute = attributes[j]
+                    if attribute.is_standard_attribute():
+                        if not attribute.comment_is_set():
+                            attribute.comment = state.comment_before
+                        break
+                    j += 1
+        # Pokud jsme pri nacitani atributu nasli jako posledni sub-token komentar, jde temer jiste o komentar k nasledujicimu bloku SQL kodu. Fiktivni atribut s nesmyslnymi parametry (kontrolovat budeme pro rychlost pouze podle kind == Attribute.CONDITION_COMMENT, comment != None) nyni komentar ziskame zpet a aktualizujeme pomoci nej comment_before.
+        # Ve vracenem objektu mohou byt oba druhy fiktivnich atributu (CONDITION_COMMENT i CONDITION_SINGLE_ELEMENT) --> podivame se na dva posledni atributy
+        processed_attribs = 0
+        while len(attributes) > 0 and processed_attribs < 2:
+            processed_attribs += 1
+            last_attribute = attributes[-1]
+            if last_attribute.kind == Attribute.CONDITION_COMMENT:
+                # Komentar ulozime jedine v pripade, ze -- po orezani mezer pod. v konstruktoru -- neni None
+                if last_attribute.comment_is_set():
+                    state.comment_before = last_attribute.comment
+                else:
+                    state.comment_before = ""
+                attributes.pop()
+            elif last_attribute.kind == Attribute.CONDITION_SINGLE_ELEMENT:
+                # Ke zpracovani jsme dostali jen jednu cast podminky (LHS, operator, prip. RHS)
+                if state.split_attribute == None:
+                    # Zpracovavali jsme LHS (name == jmeno, comment == pripadny komentar)
+                    state.split_attribute = last_attribute
+                    # Resetujeme podminku, ktera uz nyni neni potreba
+                    state.split_attribute.set_condition(None)
+                elif not state.split_attribute.has_condition():
+                    # Zpracovavali jsme operator (name == operator, comment == pripadny komentar)
+                    state.split_attribute.set_condition(last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                elif state.split_attribute.condition == "BETWEEN":
+                    # V podmince zatim je pouze "BETWEEN", tzn. relevantni cast pouze pridame do podminky a nastavime pripadny komentar
+                    state.split_attribute.append_to_condition(" " + last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                else:
+                    # Zpracovavali jsme RHS (name == zbytek podminky za operatorem, comment == pripadny komentar)
+                    state.split_attribute.append_to_condition(" " + last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                    last_select_table.conditions.append(state.split_attribute)
+                    state.split_attribute = None
+                attributes.pop()
+        # Vznikly pri zpracovavani podminek nejake mezi-tabulky pro "EXISTS ..."? Pokud ano, stavajici tabulku musime nyni navazat na vsechny takove tabulky pomoci vracenych fiktivnich atributu (kontrolovat budeme pro rychlost pouze podle kind == Attribute.CONDITION_EXISTS_SELECT, comment == ID exists_table), ktere jsou pak vzdy jednotlive nasledovany atributem se jmennou referenci (a pripadnym komentarem) k dane mezi-tabulce.
+        j = 0
+        while j < len(attributes):
+            attribute = attributes[j]
+            # Nejdrive zkontrolujeme, zda jsme pri parsovani tokenu nenasli placeholder -- pokud ano, je potreba u hlavni tabulky aktualizovat patricny seznam bindovanych promennych
+            if attribute.kind == Attribute.CONDITION_PLACEHOLDER_PRESENT:
+                last_select_table.add_bind_var(attribute.comment)
+                if state.last_select_table_id != state.table.id:
+                    state.table.add_bind_var(attribute.comment)
+                attributes.pop(j)
+                continue
+            if (attribute.kind == Attribute.CONDITION_DEPENDENCY
+                    or attribute.kind == Attribute.CONDITION_EXISTS_SELECT):
+                id = int(attribute.comment)
+                sub_table = Table.get_table_by_id(id)
+                if state.union_table != None:
+                    # Vazba table --> union_table byla nastavena uz drive po nalezeni UNION SELECT
+                    state.union_table.link_to_table_id(id)
+                    # Do union_table take rovnou zkopirujeme bindovane promenne
+                    sub_table.copy_bind_vars_to_table(state.union_table)
+                else:
+                    state.table.link_to_table_id(id)
+                # Do hlavni tabulky jeste potrebujeme zkopirovat (a) zjistene aliasy a (b) pripadne placeholdery
+                sub_table.copy_aliases_to_table(state.table)
+                sub_table.copy_bind_vars_to_table(state.table)
+                # Nakonec odebereme fiktivni atribut z kolekce obj (index j musi zustat beze zmeny)
+                attributes.pop(j)
+                # V pripade Attribute.CONDITION_EXISTS_SELECT sice ihned nasleduje jeden standardni atribut se jmennou referenci na odpovidajici mezi-tabulku, ktery bychom mohli po nalezite podmince preskocit, ale podobne narocne je proste pouzit zde continue a nasledujici atribut zkontrolovat obvyklym zpusobem.
+                continue
+            # Narazit muzeme i na dalsi komentare k nalezenym vnorenym podminkam. Kazdy takovy ulozeny komentar odstranime z kolekce a pokud jemu predchazejici atribut zatim komentar nema, pridame ho. Jinak fiktivni atribut ignorujeme.
+            if attribute.kind == Attribute.CONDITION_COMMENT:
+                if j > 0 and not attributes[j - 1].comment_is_set():
+                    attributes[j - 1].set_comment(attribute.comment)
+                attributes.pop(j)
+                continue
+            # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
+            if (attribute.kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
+                    and j > 0
+                    and j < len(attributes) - 1
+                    and attributes[j - 1].name != None
+                    and attributes[j + 1].name != None):
+                attributes[j - 1].set_name(name + attribute.comment + attributes[j + 1].name)
+                attributes[j - 1].alias = attributes[j + 1].alias
+                if not attributes[j - 1].comment_is_set():
+                    attributes[j - 1].comment = attributes[j + 1].comment
+                attributes.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
+                attributes.pop(j)  # ... a zbytek rozdeleneho atributu
+                continue
+            j += 1
+        # Nyni aktualizujeme podminky v conditions a budouci zavislosti v attributes u patricne tabulky (union_table, resp. table -- dle situace)
+        last_select_table.conditions.extend(attributes)
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def on_ignored(cls, state: StatementState) -> int:
+        # Ostatni DDL prikazy pouze preskocime
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def on_other(cls, state: StatementState) -> int:
+        # Jakykoliv jiny token zpracujeme "obecnou" metodou process_token(...) s tim, ze parametrem predame informaci o kontextu (context) a pripadnem komentari pred tokenem (comment_before). Timto vyresime napr. i tokeny typu "select ... from ... PIVOT (...)" (typ: Function), jelikoz v miste uziti PIVOT uz je context == None, tzn. process_token(...) vrati None.
+        obj = yield from process_token(state.t, state.table, state.context, state.comment_before)
+        # Navratova hodnota process_token(...) muze byt ruznych typu v zavislosti na kontextu apod. Na zaklade toho se nyni rozhodneme, jakym konkretnim zpusobem je potreba s ni nalozit.
+        if obj != None:
+            cls.process_result(state, obj)
+        cls.finish_token(state)
+        return cls.NEXT_TOKEN
+
+    @classmethod
+    def process_result(cls, state: StatementState, obj: Any) -> None:
+        """Zpracuje navratovou hodnotu process_token(...) (seznam atributu, prip. zdrojovych tabulek). Metoda nic nevraci."""
+        # Podminka na delku obj resi situaci, kdy v ON apod. nejsou uvedene zadne atributy (mozna jde o chybu, nicmene obcas se vyskytuje v testovacich dotazech...)
+        if isinstance(obj, list) and len(obj) > 0:
+            if isinstance(obj[0], Attribute):
+                # Ziskali jsme seznam atributu
+                # BUG: Pokud parser umele rozdeli seznam atributu v SELECT apod. na vice tokenu, muze u prvniho standardniho atributu chybet komentar, ktery byl v SQL kodu uveden nad patricnym radkem. Podivame se tedy, jestli uz u aktualne resene tabulky jsou nejake standardni atributy, a pokud ano, pridame komentar k poslednimu z nich (tzn. je-li komentar prazdny, nahradime ho obsahem promenne comment_before). Pokud zadny standardni atribut zatim neexistuje, pridame komentar k prvnimu nalezenemu stadardnimu atributu v navracene kolekci (obj). Pro urychleni budeme seznam prochazet jedine v pripade, ze comment_before != "".
+                if len(state.comment_before) > 0:
+                    if state.split_attribute != None:
+                        attribute = state.split_attribute
+                    else:
+                        attribute = cls.get_last_attribute(Table.get_table_by_id(state.last_select_table_id))
+                    if attribute != None:
+                        if not attribute.comment_is_set():
+                                attribute.comment = state.comment_before
+                    else:
+                        j = 0
+                        while j < len(obj):
+                            attribute = obj[j]
+                            if attribute.is_standard_attribute():
+                                if not attribute.comment_is_set():
+                                    attribute.comment = state.comment_before
+                                break
+                            j += 1
+                # Nyni pokracujeme ve zpracovavani seznamu atributu
+                cls.add_attributes(state, obj)
+            else:
+                cls.add_source_tables(state, obj)
+
+    @classmethod
+    def get_last_attribute(cls, last_select_table: "Table") -> "Attribute":
+        """Vrati posledni standardni atribut zadane tabulky, ke kteremu lze priradit komentar pred aktualnim tokenem (prip. None)"""
+        return last_select_table.get_last_std_attribute()
+
+    @classmethod
+    def add_attributes(cls, state: StatementState, obj: list) -> None:
+        """Prida seznam atributu vraceny process_token(...) k tabulce odpovidajici kontextu. Metoda nic nevraci."""
+        # Ve zbylych situacich staci pridat nalezene atributy k aktualni tabulce (ktera uz u korektniho SQL kodu nyni nemuze byt None)
+        state.table.attributes.extend(obj)
+
+    @classmethod
+    def add_source_tables(cls, state: StatementState, obj: list) -> None:
+        """Zpracuje seznam zdrojovych tabulek vraceny process_token(...). Metoda nic nevraci."""
+        # Ve vracenem seznamu jsou informace o zdrojovych tabulkach (z "FROM ..."), cili pro kazdou z nich provedeme potrebne upravy. POZOR: prvky kolekce mohou byt typu tuple nebo Table podle toho, co jsme nasli v SQL kodu!
+        for src_table_info in obj:
+            if isinstance(src_table_info, tuple) and isinstance(src_table_info[0], str):
+                # Metoda process_token(...) vratila ntici, v niz je prvni prvek retezcem. Jinak receno, ziskali jsme nazev tabulky spolu s pripadnym aliasem a komentarem. Nejprve tedy zkusime najit zdrojovou tabulku, odkud se berou data, a pridame k ni alias.
+                src_table = Table.get_table_by_name(name=src_table_info[0], alias_table=state.table)
+                if src_table == None:
+                    # Zdrojova tabulka zatim neexistuje (typicky v situaci, kdy resime "SELECT ... FROM dosud_nezminena_tabulka") --> vytvorime ji
+                    src_table = Table(name=src_table_info[0], comment=src_table_info[2])
+                    state.session.add_table(src_table)
+                else:
+                    # Komentar pridame jen v pripade, ze tento zatim neni nastaveny (prvotni komentar zpravidla byva detailnejsi a nedava smysl ho prepsat necim dost mozna kratsim/strucnejsim)
+                    if not src_table.comment_is_set():
+                        # Komentar by asi slo vzit primo, ale pro poradek vyuzijeme set_comment(...)
+                        src_table.set_comment(src_table_info[2])
+                Table.add_alias(state.table, src_table.id, src_table_info[1])
+                # V tuto chvili by uz last_select_table_id melo byt za vsech okolnosti >= 0, tzn. last_select_table != None
+                last_select_table = Table.get_table_by_id(state.last_select_table_id)
+                cls.link_source_table(state, last_select_table, src_table)
+            elif isinstance(src_table_info, Table):
+                # Metoda process_token(...) vratila objekt typu Table. Toto muze nastat ve dvou pripadech: bud resime JOIN (k cemuz musime vytvorit mezi-tabulku a nastavit odpovidajici zavislosti), nebo jde o situaci "SELECT ... FROM ( SELECT ... )" (kde uz mezi-tabulka byla vytvorena -- jde o tu vracenou -- a pouze nastavime zavislost aktualni tabulky na mezi-tabulce). Aktualne by last_select_table-id melo vzdy byt >= 0.
+                last_select_table = Table.get_table_by_id(state.last_select_table_id)
+                cls.link_subselect(state, last_select_table, src_table_info)
+                # Do hlavni tabulky jeste potrebujeme zkopirovat (a) zjistene aliasy a (b) pripadne placeholdery
+                src_table_info.copy_aliases_to_table(last_select_table)
+                src_table_info.copy_bind_vars_to_table(last_select_table)
+                if state.last_select_table_id != state.table.id:
+                    src_table_info.copy_aliases_to_table(state.table)
+                    src_table_info.copy_bind_vars_to_table(state.table)
+                # Byla zavorka za UNION? Pokud ano, musime upravit last_select_table_id 
+                # Pokud by union_table byla nactena kompletne, bylo by nyni vse hotovo. Vlivem chyb v sqlparse ale muze byt kod rozdelen na vice tokenu, takze nyni je potreba jeste aktualizovat last_select_table_id a union_table.
+                if src_table_info.name.startswith("union-select-"):
+                    state.last_select_table_id = src_table_info.id
+                    state.union_table = src_table_info
+
+    @classmethod
+    def link_source_table(cls, state: StatementState, last_select_table: "Table", src_table: "Table") -> None:
+        """Nastavi zavislost prave resene tabulky na zdrojove tabulce z FROM. Metoda nic nevraci."""
+        # V "obecnem" pripade ("SELECT ... FROM src_table", UNION SELECT) proste jen k aktualni tabulce reprezentujici SELECT pridame zavislost na zdrojove tabulce. Tabulku s aliasy (alias_table) uz netreba nastavovat, jelikoz toto bylo provedeno drive.
+        last_select_table.link_to_table_id(src_table.id)
+        if state.last_select_table_id != state.table.id:
+            state.table.link_to_table_id(state.last_select_table_id)
+
+    @classmethod
+    def link_subselect(cls, state: StatementState, last_select_table: "Table", sub_table: "Table") -> None:
+        """Nastavi zavislost prave resene tabulky na mezi-tabulce vracene process_token(...) (napr. "SELECT ... FROM ( SELECT ... )"). Metoda nic nevraci."""
+        if state.prev_context == "on":  # Zde musime kontrolovat prev_context, jelikoz pro "ON EXISTS (SELECT ... )" je aktualni kontext jiny!
+            state.join_table.link_to_table_id(sub_table.id)
+            sub_table.copy_bind_vars_to_table(state.join_table)
+            state.join_table.conditions.append(Attribute(name=get_op_prefix([f"<{sub_table.name}>"]), comment=state.comment_before))
+        else:
+            last_select_table.link_to_table_id(sub_table.id)
+
+    @classmethod
+    def finish_token(cls, state: StatementState) -> None:
+        """Po zpracovani obecneho tokenu zkontroluje nasledujici tokeny a pripadne se vrati k predchozimu kontextu. Metoda nic nevraci."""
+        # Pokud neexistuje zadny nekompletni atribut (dalsi BUG: WITHIN GROUP, OVER, ...), resp. nenasleduje problematicke klicove slovo, ktere by zpusobilo vraceni vicero tokenu namisto jednoho, se muzeme vratit k predchozimu kontextu. K tomu ale musime taktez zkontrolovat nasledujici token. Podobne overime, jestli nenasleduje AND, coz by znacilo napr. pokracovani podminky v JOIN ... ON podm1 AND podm2 AND ... V SQL kodu chceme zachovat veskere bile znaky!
+        token_was_operator = (state.t.ttype in sql.T.Operator)
+        (j, next_token) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        while next_token != None and next_token.is_whitespace:
+            state.i = j
+            state.t = next_token
+            (j, next_token) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+        if next_token != None:
+            # Hinty MATERIALIZE a NO_STAR_TRANSFORMATION jsou vraceny jako Identifier, "USE_HASH (arg)" a "USE_NL (arg)" potom jako Function (tzn. zaroven se zavorkou s argumenty). Mezera mezi hintem a zavorkou bude pritomna vzdy, jelikoz toto mame predem osetreno kosmetickou nahradou vq zdrojovem SQL.
+            next_token_upper = next_token.value.upper()
+            while (next_token_upper in ["MATERIALIZE", "NO_STAR_TRANSFORMATION"]
+                    or next_token_upper.startswith("USE_HASH (")
+                    or next_token_upper.startswith("USE_NL (")):
+                # Aktualizujeme index a akt. token
+                state.i = j
+                state.t = next_token
+                # Je v tokenu jako posledni non-whitespace subtoken ulozen komentar? (muze se stat v pripade hintu vracenych jako funkce) -- musime obalit try-except, jelikoz .tokens nemusi existovat!
+                try:
+                    last_nonws_subtoken = get_last_nonws_token(next_token.tokens)
+                    if is_comment(last_nonws_subtoken):
+                        # Chcceme druhou cast komentare (pokud existuji obe), protoze ta prvni se pravdepodobne tyka samotneho hintu
+                        state.comment_before = split_comment(last_nonws_subtoken)[1]
+                except:
+                    pass
+                # Nacteme novy next_token (chceme zachovat veskere bile znaky!)
+                (j, next_token) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+                while next_token != None and next_token.is_whitespace:
+                    state.i = j
+                    state.t = next_token
+                    (j, next_token) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+                if next_token != None:
+                    next_token_upper = next_token.value.upper()
+                else:
+                    next_token_upper = None
+                # Musime take zakazat reset kontextu
+                state.can_switch_to_prev_context = False
+            # Zde musime znovu zkontrolovat, zda i pripadny novy next_token neni None atd.
+            if next_token != None:
+                next_token_upper = next_token.value.upper()
+                if next_token_upper == "WITHIN":
+                    # V predchozim tokenu jsme zpracovavali agregacni funkci, za niz byl hned uveden komentar, a "WITHIN" tedy nebylo soucasti daneho tokenu. Slo vsak o rozdeleny atribut (coz jsme tehy jeste nevedeli), takze ted najdeme prvni standardni atribut (asi staci pomoci name != None) od konce table.attributes a presuneme ho do split_attribute (vc. nastaveni condition). (Takovy atribut urcite v table.attributes existuje.) "WITHIN" je v tomto pripade vraceno jako Identifier, ale to zde neni podstatne. Dulezite je, ze se zatim nelze vratit k predchozimu kontextu, coz zaridime uz tim, ze bude split_attribute != None.
+                    if state.union_table != None:
+                        j = len(state.union_table.attributes) - 1
+                        while j >= 0:
+                            if state.union_table.attributes[j].name != None:
+                                if len(state.union_table.attributes) == len(state.table.attributes):
+                                    state.table.attributes.pop()
+                                state.split_attribute = state.union_table.attributes.pop()
+                                break
+                            j -= 1
+                    else:
+                        j = len(state.table.attributes) - 1
+                        while j >= 0:
+                            if state.table.attributes[j].name != None:
+                                state.split_attribute = state.table.attributes.pop()
+                                break
+                            j -= 1
+                    state.split_attribute.kind == Attribute.CONDITION_SPLIT_ATTRIBUTE
+                    state.split_attribute.comment = " WITHIN GROUP "
+                    # Pokracovat budeme standardne na konci cyklu ulozenim tokenu do kolekci atd. Nasledujici token by pak mel byt "GROUP", prip. "GROUP(...)", ktery zpracujeme obvyklym zpusobem.
+                else:
+                    # Zde kontrolujeme radeji uppercase verzi, jelikoz ne vse ze seznamu nize je oznaceno za klicove slovo, kde .normalized vraci velka pismena. Zaroven se divame, jestli dalsi token neni carka, protoze pokud by byl, znamenalo by to, ze vycet Identifieru apod. byl v dusledku BUGu umele rozdelen na vicero tokenu (tedy bude jeste mit pokracovani).
+                    # Pokud jsem nasli operator, mohl byl token vlivem BUGu v sqlparse umele rozdelen vlozenim "komentar \n" do operace apod. Reset kontextu tedy zatim pro jistotu zakazeme.
+                    state.can_switch_to_prev_context = (state.can_switch_to_prev_context
+                            and (cls.SWITCH_BACK_AFTER_TOKEN  # Po zpracovani EXIST SELECT se potrebujeme vratit k predchozimu kontextu
+                            or not (token_was_operator
+                            or is_comment(next_token)
+                            or next_token.ttype in sql.T.Operator
+                            or next_token_upper in ["OVER", "AND", "OR", "NOT", "CYCLE", "SET", "TO", "DEFAULT", "USING", "DISTINCT", "NULL", ","])))
+        if state.can_switch_to_prev_context and state.split_attribute == None:
+            cls.leave_context(state)
+
+    @classmethod
+    def leave_context(cls, state: StatementState) -> None:
+        """Vrati se k predchozimu kontextu. Metoda nic nevraci."""
+        state.context = state.prev_context
+
+
+class WithHandler(StatementHandler):
+    """Obsluha tokenu v casti WITH (bloky WITH zpracovava process_with_element(...), ktera vraci pripadny komentar k nasledujicimu bloku)"""
+
+    @classmethod
+    def process_result(cls, state: StatementState, obj: Any) -> None:
+        if isinstance(obj, list) and len(obj) > 0:
+            super().process_result(state, obj)
+            return
+        # Resime blok WITH, kde navratovou hodnotou je pripadny komentar (byva vracen vzdy jako posledni sub-token, i kdyz se muze tykat az nasledujiciho tokenu)
+        # K obejiti BUGu v sqlparse muze nekdy byt vracen tuple namisto retezce -- v takovem pripade namisto resetu token_counter snizime hodnotu promenne o 1 a zakazeme reset kontextu
+        state.comment_before = obj
+        if isinstance(obj, tuple):
+            # Token byl sqlparse umele rozdelen na dva...
+            state.token_counter -= 1
+            state.can_switch_to_prev_context = False
+        else:
+            state.token_counter = 0
+
+
+class SelectHandler(StatementHandler):
+    """Obsluha tokenu v casti SELECT (seznam atributu, vc. atributu rozdelenych vlivem chyb v sqlparse)"""
+
+    @classmethod
+    def add_attributes(cls, state: StatementState, obj: list) -> None:
+        # Projdeme vraceny seznam, ktery muze obsahovat fiktivni atributy s ID tabulek (kontrolovat budeme pro rychlost pouze podle kind == Attribute.CONDITION_DEPENDENCY; comment == ID tabulky), na nichz zavisi aktualne resena tabulka (typicky scenar: namisto obycejneho atributu je v SELECT uveden dalsi SELECT)
+        j = 0
+        while j < len(obj):
+            attribute = obj[j]
+            if attribute.kind == Attribute.CONDITION_DEPENDENCY:
+                id = int(attribute.comment)
+                subselect_table = Table.get_table_by_id(id)
+                if state.union_table != None:
+                    state.union_table.link_to_table_id(id)
+                    # Krome svazani tabulek jeste potrebujeme zkopirovat do union_table (a) zjistene aliasy a (b) pripadne placeholdery
+                    subselect_table.copy_aliases_to_table(state.union_table)
+                    subselect_table.copy_bind_vars_to_table(state.union_table)
+                else:
+                    state.table.link_to_table_id(id)
+                # Zjistene aliasy a pripadne placeholdery je potreba zkopirovat i do hlavni tabulky
+                subselect_table.copy_aliases_to_table(state.table)
+                subselect_table.copy_bind_vars_to_table(state.table)
+                # Nakonec odebereme fiktivni atribut z kolekce obj (index j musi zustat beze zmeny)
+                obj.pop(j)
+                continue
+            if attribute.kind == Attribute.CONDITION_PLACEHOLDER_PRESENT:
+                if state.union_table != None:
+                    state.union_table.add_bind_var(attribute.comment)
+                state.table.add_bind_var(attribute.comment)
+                # Fiktivni atribut musime odebrat z kolekce obj (index j zustava beze zmeny)
+                obj.pop(j)
+                continue
+            # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
+            if (attribute.kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
+                    and j > 0
+                    and j < len(obj) - 1
+                    and obj[j - 1].name != None
+                    and obj[j + 1].name != None):
+                obj[j - 1].set_name(name + attribute.comment + obj[j + 1].name)
+                obj[j - 1].alias = obj[j + 1].alias
+                if not obj[j - 1].comment_is_set():
+                    obj[j - 1].comment = obj[j + 1].comment
+                obj.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
+                obj.pop(j)  # ... a zbytek rozdeleneho atributu
+                continue
+            j += 1
+        # Dale musime zkontrolovat, jestli nemame ze zpracovavani minuleho tokenu nekomplentni atribut (BUG: WITHIN GROUP apod.). Pokud ne, zkontrolujeme posledni nyni vraceny atribut, zda nahodou neni takovym objektem. Jestlize naopak nekompletni atribut mame, sloucime ho s prvnim nyni vracenym atributem (ktery nasledne odebereme z obj) a takto vznikly kompletni atribut pridame k tabulce. Zde nelze rovnou resetovat split_attribute, jelikoz i zde muze byt posledni atribut opet nekompletni...
+        # Ve zbylem kodu pro zpracovani vracenych atributu (vc. pripadneho nekompletniho z minula) uz budeme pracovat jen s aktualne resenou tabulkou (at uz pujde o table, nebo union_table). Pro zjednoduseni kodu tedy pouzijeme novou promennou obsahujici referenci na patricnou tabulku.
+        if state.split_attribute == None:
+            # "Rozdeleny" atribut je v kolekci obj vzdy jako posledni --> index == -1
+            if (obj[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE
+                    or obj[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING):
+                state.split_attribute = obj.pop()
+        else:
+            # Zbytek rozdeleneho atributu je hned na zacatku kolekce
+            attr_remainder = obj.pop(0)
+            # Pokud napr. mezi "GROUP" a nasledujici zavorkou neni mezera, je pokracovani tokenu vc. klicoveho slova "GROUP". Zkontrolujeme tedy, zda jmeno attr_remainder zacina na "(" -- pokud ne a spojovaci reteze (split_attribute.comment) zaroven obsahuje vice nez jedno slovo, to posledni z nej odstranime.
+            if state.split_attribute.kind == Attribute.CONDITION_SPLIT_ATTRIBUTE:
+                attr_link = state.split_attribute.comment.split()
+                if not attr_remainder.name.startswith("(") and len(attr_link) > 1:
+                    attr_link.pop()
+                    # Komentar musime nastavit primo (mezery!), nikoliv pomoci set-comment(...)
+                    state.split_attribute.comment = " " + " ".join(attr_link) + " "
+                # Standardni rozdeleny atribut
+                state.split_attribute.set_name(f"{state.split_attribute.name}{state.split_attribute.comment}{attr_remainder.name}")
+                state.split_attribute.alias = attr_remainder.alias
+            else:
+                # Rozdeleny atribut s Literalem
+                state.split_attribute.alias = attr_remainder.name
+            # condition musime resetovat na None, jinak by zustavalo se spec. hodnotou napr. pri "SELECT x, y result FROM ..."
+            state.split_attribute.set_condition(None)
+            # Tady by nejspis take slo vzit komentar tak, jak je, ale pro poradek vyuzijeme set_comment(...)
+            state.split_attribute.set_comment(attr_remainder.comment)
+            if state.union_table != None:
+                state.union_table.attributes.append(state.split_attribute)
+            state.table.attributes.append(state.split_attribute)
+            if (len(obj) > 0
+                    and (obj[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE
+                    or obj[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING)):
+                state.split_attribute = obj.pop()
+            else:
+                state.split_attribute = None
+        # Nakonec k tabulce pridame atributy zbyle v obj (musime ale zohlednit pripadnou znalost aliasu!)
+        if state.known_attribute_aliases:
+            # Zde resime blok ve WITH, u ktereho byly za nazvem docasne tabulky uvedeny aliasy (alespon nekterych) atributu. Predchystane ("TBD") atributy ale nelze primo aktualizovat, protoze v dusledku chyb v sqlparse mohlo dojit k umelemu rozdleni tokenu, tzn. zatim nemusime mit k dispozici kompletni sadu atributu. Aktualizujeme proto prvnich len(obj) "TBD" atributu v cilove tabulce s tim, ze kontrolu zbylych "TBD" atributu (vc. pripadneho vyvolani vyjimky) provedeme az uplne na konci process_statement(...).
+            # Vime, ze aliasy atributu tabulky ve WITH musely byt uvedeny ve stejnem poradi jako atributy nyni zjistene z prikazu SELECT. Atributy u tabulky proto na zaklade jejich poradi aktualizujeme podle objektu vraceneho vyse metodou process_token(...).
+            # ALE: v obj se mohou vyskytovat fiktivni atributy indikujici pouziti placeholderu (kind == Attribute.CONDITION_PLACEHOLDER_PRESENT), ktere zde musime preskocit.
+            # Aktualizaci provedeme nejprve u table (pomoci obj). Nasledne, pokud resime UNION SELECT, "zrcadlime" atributy z table do union_table (je to tak jedodussi a asi i rychlejsi nez srovnavat hodnoty atd.).
+            j = 0
+            k = 0
+            while (j < len(state.table.attributes)):
+                # Nejprve najdeme nasledujici "TBD" atribut
+                while (j < len(state.table.attributes)
+                        and state.table.attributes[j].kind != Attribute.CONDITION_TBD):
+                    j += 1
+                if j == len(state.table.attributes):
+                    # Dosli jsme na konec table.attributes, tzn. uz tam neni zadny dalsi "TBD" atribut
+                    break
+                # Ted v obj preskocime vsechny pripadne fiktivni atributy s informacemi o placeholderech (staci kontrolovat pomoci name == None)
+                while k < len(obj) and obj[k].name == None:
+                    k += 1
+                if k == len(obj):
+                    # Dosli jsme na konec obj, tzn. uz tam neni zadny dalsi standardni atribut, pomoci ktereho bychom mohli aktualizovat pripadne zbyle "TBD" atributy v cilove tabulce
+                    break
+                attr = obj.pop(k)
+                # Pokud jsme nasli atribut "*" (prip. "table.*"), zahodime ho, zvysime index j (pro posun na dalsi atribut v table.attributes) a pokracujeme zpet na zacatek cyklu
+                if attr.name.endswith("*"):
+                    j += 1
+                    continue
+                state.table.attributes[j].set_name(attr.name)
+                # Neni nahodou drive zjisteny alias identicky s tim, co bylo v SELECT? Pokud ano, alias odstranime. Alias zde nemuze byt None (drive byl atribut ve tvaru kind == Attribute.CONDITION_TBD + s nastavenym aliasem), takze jmeno a alias muzeme porovnavat bez jakekoliv dalsi kontroly.
+                if attr.name == state.table.attributes[j].alias:
+                    state.table.attributes[j].alias = None
+                state.table.attributes[j].set_condition(attr.condition, attr.kind)
+                # Komentar muzeme aktualizovat primo (bez vyuziti set_comment(...))
+                state.table.attributes[j].comment = attr.comment
+                j += 1
+        if state.union_table != None:
+            # # Zpetna aktualizace atributu v hlavni tabulce (table) podle union_table zpusobovala obcas potize (sloupce zadane v UNION SELECT primo pomoci literalu byly v hlavni tabulce navic) --> aktualizovat budeme vyhradne tu tabulku, ktera je prave resena.
+            # union_table.add_missing_attributes(obj, target_count=table.get_std_attribute_count())
+            # table.add_missing_attributes(obj)
+            state.union_table.attributes.extend(obj)
+        else:
+            state.table.attributes.extend(obj)
+
+
+class UnionHandler(SelectHandler):
+    """Obsluha tokenu za UNION [ALL] (SELECT bez zavorek vytvari vlastni mezi-tabulku)"""
+
+    @classmethod
+    def on_select(cls, state: StatementState) -> int:
+        # Spojovane SELECTy mohou byt vc. WHERE apod. a slouceni vsech atributu takovych SELECTu pod nadrazenou tabulku by nemuselo davat smysl. Pokud tedy po UNION [ALL] nasleduje SELECT (bez uvedeni v zavorkach), budou odpovidajici tokeny vraceny sqlparse postupne a tudiz musime uz zde vytvorit patricnou mezi-tabulku. Jinak receno, k situaci je nutne pristupovat podobně jako u JOIN. Je-li SELECT v zavorkach, zpracuje se dale jako samostatny statement.
+        state.union_table = Table(name_template="union-select", comment=state.comment_before, table_type=Table.AUX_TABLE)
+        state.session.add_table(state.union_table)
+        state.last_select_table_id = state.union_table.id
+        state.union_start = state.session.source.get_position(state.t)
+        return cls.NEXT_TOKEN
+
+
+class ExistsHandler(SelectHandler):
+    """Obsluha tokenu za EXISTS (po zpracovani EXISTS SELECT se potrebujeme vratit k predchozimu kontextu)"""
+    SWITCH_BACK_AFTER_TOKEN = True
+
+
+class FromHandler(StatementHandler):
+    """Obsluha tokenu v casti FROM (zdrojove tabulky zpracovava add_source_tables(...), zavislosti nastavuje link_source_table(...))"""
+
+
+class JoinHandler(StatementHandler):
+    """Obsluha tokenu za JOIN (pro kazdou zdrojovou tabulku je vytvorena mezi-tabulka, ke ktere jsou pozdeji pridany podminky z ON)"""
+
+    @classmethod
+    def link_source_table(cls, state: StatementState, last_select_table: "Table", src_table: "Table") -> None:
+        # Pokud resime JOIN, vytvorime patricnou mezi-tabulku (zatim neexistuje!), ke ktere budou nasledne pridany atributy s podminkami dle ON
+        state.join_table = Table(name_template="join", table_type=Table.AUX_TABLE)
+        state.session.add_table(state.join_table)
+        # Navic je nutne nastavit zavislosti tabulek: table (prip. union_table) --> join_table --> src_table
+        state.join_table.link_to_table_id(src_table.id)
+        last_select_table.link_to_table_id(state.join_table.id)
+
+    @classmethod
+    def link_subselect(cls, state: StatementState, last_select_table: "Table", sub_table: "Table") -> None:
+        state.join_table = Table(name_template="join", table_type=Table.AUX_TABLE)
+        state.session.add_table(state.join_table)
+        # Zavislosti: last_select_table --> join_table --> src_table
+        last_select_table.link_to_table_id(state.join_table.id)
+        state.join_table.link_to_table_id(sub_table.id)
+        # Pripadne placeholdery musime zkopirovat i do join_table (kopirovani do table probehne nize)
+
+
+class OnHandler(StatementHandler):
+    """Obsluha tokenu v casti ON (podminky JOINu se ukladaji k mezi-tabulce JOINu)"""
+    EXPECTED_KEYWORDS = StatementHandler.EXPECTED_KEYWORDS + ["AND", "OR", "NOT"]
+
+    @classmethod
+    def get_last_attribute(cls, last_select_table: "Table") -> "Attribute":
+        return last_select_table.get_last_std_condition()
+
+    @classmethod
+    def add_attributes(cls, state: StatementState, obj: list) -> None:
+        # Pokud jsme pri nacitani atributu v "JOIN ... ON ..."" nasli jako posledni sub-token komentar, jde o komentar k mezi-tabulce reprezentujici JOIN. Do seznamu atributu byl v takovem pripade jako posledni pridat fiktivni atribut s nesmyslnymi parametry (kontrolovat budeme pro rychlost pouze podle kind == Attribute.CONDITION_COMMENT, comment != None), ze ktereho nyni komentar ziskame zpet a priradime ho k dane tabulce.
+        # Ve vracenem objektu mohou byt oba druhy fiktivnich atributu (CONDITION_COMMENT i CONDITION_SINGLE_ELEMENT) --> podivame se na dva posledni atributy
+        processed_attribs = 0
+        while len(obj) > 0 and processed_attribs < 2:
+            processed_attribs += 1
+            last_attribute = obj[-1]
+            if last_attribute.kind == Attribute.CONDITION_COMMENT:
+                # Komentar ulozime jedine v pripade, ze -- po orezani mezer pod. v konstruktoru -- neni None
+                if last_attribute.comment_is_set():
+
+                    # TODO: nastavit ke split_attribute, pokud existuje?
+
+                    state.join_table.set_comment(last_attribute.comment)
+                obj.pop()
+            elif last_attribute.kind == Attribute.CONDITION_SINGLE_ELEMENT:
+                # Ke zpracovani jsme dostali jen jednu cast podminky (LHS, operator, prip. RHS)
+                if state.split_attribute == None:
+                    # Zpracovavali jsme LHS (name == jmeno, comment == pripadny komentar)
+                    state.split_attribute = last_attribute
+                    # Resetujeme podminku, ktera uz nyni neni potreba
+                    state.split_attribute.set_condition(None)
+                elif not state.split_attribute.has_condition():
+                    # Zpracovavali jsme operator (name == operator, comment == pripadny komentar)
+                    state.split_attribute.set_condition(last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                elif state.split_attribute.condition == "BETWEEN":
+                    # V podmince zatim je pouze "BETWEEN", tzn. relevantni cast pouze pridame do podminky a nastavime pripadny komentar
+                    state.split_attribute.append_to_condition(" " + last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                else:
+                    # Zpracovavali jsme RHS (name == zbytek podminky za operatorem, comment == pripadny komentar)
+                    state.split_attribute.append_to_condition(" " + last_attribute.name)
+                    if last_attribute.comment_is_set():
+                        state.split_attribute.comment = last_attribute.comment
+                    state.join_table.conditions.append(state.split_attribute)
+                    state.split_attribute = None
+                obj.pop()
+        # Zkontrolujeme, zda mezi podminkami nebylo "EXISTS ( SELECT ... )", a pripadne aktualizujeme zavislosti a podminky u join_table. Pozor: JOIN je vzdy zavislosti predchoziho selectu (UNION SELECT apod.)!
+        last_select_table = Table.get_table_by_id(state.last_select_table_id)
+        j = 0
+        while j < len(obj):
+            attribute = obj[j]
+            # Nejprve zkontrolujeme, zda jsme pri parsovani tokenu nenasli placeholder -- pokud ano, je potreba aktualizovat seznam bindovanych promennych jak u join_table (protoze u ni jsme placeholder nasli), tak u nadrazene tabulky (table)
+            if attribute.kind == Attribute.CONDITION_PLACEHOLDER_PRESENT:
+                state.join_table.add_bind_var(attribute.comment)
+                last_select_table.add_bind_var(attribute.comment)
+                if state.last_select_table_id != state.table.id:
+                    state.table.add_bind_var(attribute.comment)
+                obj.pop(j)
+                continue
+            if (attribute.kind == Attribute.CONDITION_DEPENDENCY
+                    or attribute.kind == Attribute.CONDITION_EXISTS_SELECT):
+                id = int(attribute.comment)
+                state.join_table.link_to_table_id(id)
+                sub_table = Table.get_table_by_id(id)
+                # Aliasy nalezene pri zpracovavani subselectu (prip. EXISTS SELECT, UNION SELECT) byly ulozeny do slovniku patricne tabulky a musime je zkopirovat do slovniku aktualniho (nadrazeneho) SELECT
+                # Jestlize jsme objevili placeholder(y), musime seznam bindovanych promennych predat i do join_table (ktera je nadrazena sub_table) a hlavni tabulky (table, nadrazena join_table). Stejne je potreba upravit union_table, pokud tato aktualne != None.
+                sub_table.copy_bind_vars_to_table(state.join_table)
+                # Kopie udaju do last_select_table lze provest primo, nebot kontrola tab != None je provedena uvnitr kopirovaci metody
+                sub_table.copy_aliases_to_table(last_select_table)
+                sub_table.copy_bind_vars_to_table(last_select_table)
+                # Do table budeme kopirovat jedine v pripade, ze to nebylo provedeno na predchozich dvou radcich
+                if state.last_select_table_id != state.table.id:
+                    sub_table.copy_aliases_to_table(state.table)
+                    sub_table.copy_bind_vars_to_table(state.table)
+                obj.pop(j)
+                # V pripade Attribute.CONDITION_EXISTS_SELECT sice ihned nasleduje jeden standardni atribut se jmennou referenci na odpovidajici mezi-tabulku, ktery bychom mohli po nalezite podmince preskocit, ale podobne narocne je proste pouzit zde continue a nasledujici atribut zkontrolovat obvyklym zpusobem.
+                continue
+            # Narazit muzeme i na dalsi komentare k nalezenym vnorenym podminkam. Kazdy takovy ulozeny komentar odstranime z kolekce a pokud jemu predchazejici atribut zatim komentar nema, pridame ho. Jinak fiktivni atribut ignorujeme.
+            if attribute.kind == Attribute.CONDITION_COMMENT:
+                if j > 0 and not obj[j - 1].comment_is_set():
+                    obj[j - 1].set_comment(attribute.comment)
+                obj.pop(j)
+                continue
+            # Pokud je pritomen fiktivni atribut se "spojkou" (operatorem), muze -- byt nemusi -- jit o indikator toho, ze okolni standardni (!) atributy byly vlivem chyb v sqlparse umele rozdeleny. Je-li takovy atribut uplne na konci, zatim ho nechame byt; bude doresen, prip. zahozen pri navratu k predchozimu kontextu.
+            if (attribute.kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
+                    and j > 0
+                    and j < len(obj) - 1
+                    and obj[j - 1].name != None
+                    and obj[j + 1].name != None):
+                obj[j - 1].set_name(name + attribute.comment + obj[j + 1].name)
+                obj[j - 1].alias = obj[j + 1].alias
+                if not obj[j - 1].comment_is_set():
+                    obj[j - 1].comment = obj[j + 1].comment
+                obj.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
+                obj.pop(j)  # ... a zbytek rozdeleneho atributu
+                continue
+            j += 1
+        # Vraceny objekt (nyni uz bez pripadneho fiktivniho atributu s komentarem) muzeme pouzit k aktualizaci atributu i mezitabulky reprezentujici JOIN. Budouci zavislosti z kolekce future_dependencies pridame do table.attributes.
+        state.join_table.conditions.extend(obj)
+
+    @classmethod
+    def leave_context(cls, state: StatementState) -> None:
+        # Pokud resime JOIN a dokoncili jsme parsovani casti ON, muzeme k tabulce ulozit jeji SQL kod
+        if state.join_table != None:
+            # Jelikoz nyni mame cely JOIN zpracovany (vc. aktualniho tokenu), lze k mezi-tabulce priradit i ji odpovidajici SQL kod. Referenci na tabulku ale resetovat nesmime! (na rozdil od union_table, kde je toto potreba). Na rozdil od [UNION] SELECT take nemusime odebirat koncove bile znaky/uzaviraci zavorku, protoze tyto v rozsahu nejsou.
+            state.join_table.source_span = state.session.source.get_span(state.join_start, state.session.source.get_end_position(state.t))
+            # Musime vyresit pripadne fiktivni atributy vznikle vlivem podminek rozdelenych komentari na vice radku
+            state.join_table.conditions = process_remaining_link_attributes(state.join_table.conditions, copy_conditions=True)
+        super().leave_context(state)
+
+
+class WhereHandler(StatementHandler):
+    """Obsluha tokenu za WHERE (podminky zpracovava on_where(...), zde jde pouze o pripadne dalsi tokeny rozdelene vlivem chyb v sqlparse)"""
+    EXPECTED_KEYWORDS = StatementHandler.EXPECTED_KEYWORDS + ["AND", "OR", "NOT"]
+
+    @classmethod
+    def get_last_attribute(cls, last_select_table: "Table") -> "Attribute":
+        return last_select_table.get_last_std_condition()
+
+
+class MergeHandler(StatementHandler):
+    """Obsluha tokenu v prikazu MERGE ("[MERGE] [INTO] [table AS alias] [USING] [(...) AS alias] [ON] [podminky] [WHEN] [MATCHED] [THEN] [UPDATE] [SET] [...]")"""
+
+    @classmethod
+    def on_on(cls, state: StatementState) -> int:
+        # Jsme-li porad v MERGE ("[MERGE] [INTO] [table AS alias] [USING] [(...) AS alias] [ON] [podminky] [WHEN] [MATCHED] [THEN] [UPDATE] [SET] [...]"), podminky pro upravu dat v DB nas nezajimaji. Nasledujici token tedy preskocime a pak rovnou prejdeme na zacatek cyklu.
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)  # t == [podminky]
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        return cls.CURRENT_TOKEN
+
+    @classmethod
+    def on_into(cls, state: StatementState) -> int:
+        # Akt. token muzeme preskocit (rovnou preskocime i bile znaky), stejne jako ten, ktery po nem nasleduje ("[MERGE] [INTO] [table AS alias] [USING] [(...) AS alias] [ON] [...] [WHEN] [MATCHED] [THEN] [UPDATE] [SET] [...]"; ulozeni stav. tokenu neni potreba)
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)  # t == [table AS alias]
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)  # t == [USING]
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)  # Nyni je v t cast SQL dotazu, ktera nas zajima
+        yield process_statement(state.t.tokens[0])
+        # Nacteme dalsi token, skocime zpet na zacatek cyklu a budeme pokracovat ve zpracovavani MERGE
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=True, skip_cm=False)
+        return cls.CURRENT_TOKEN
+
+
+StatementHandler.CONTEXTS = {None: StatementHandler, "with": WithHandler, "select": SelectHandler, "union-select": UnionHandler, "exists-select": ExistsHandler,
+                             "from": FromHandler, "join": JoinHandler, "on": OnHandler, "where": WhereHandler, "merge": MergeHandler}
+
+
+def process_statement(s, table=None, known_attribute_aliases=False) -> None:
+    """Zpracuje cely SQL statement vc. vytvoreni patricnych tabulek (jde o krok zpracovani, ktery je nutne provest pomoci run_steps(...)). Tokeny jsou zpracovavany obsluznymi metodami kontextu, ve kterem se nachazeji (viz StatementHandler)."""
+    # CTE ... Common Table Expression (WITH, ...)
+    # DDL ... Data Definition Language (...)
+    # DML ... Data Manipulation Language (SELECT, ...)
+    state = StatementState(s, table, known_attribute_aliases)
+    token_counts = state.session.token_counts
+    # Prikaz na nejvyssi urovni (nikoliv napr. vnorenou zavorku) pridame do sdileneho zdrojoveho kodu, tabulky si pak budou ukladat pouze rozsahy v nem
+    if state.s.parent == None:
+        state.session.source.add_statement(state.s)
+        # Identicke subselecty sdileji mezi-tabulku pouze v ramci jednoho prikazu
+        state.session.subselects = {}
+    while state.t != None:
+        # Obsluhu tokenu zjistime jedinym vyhledanim v tabulce podle typu tokenu, klicoveho slova a kontextu (viz StatementHandler)
+        (kind, name, handler, is_step) = StatementHandler.get(state.t, state.context)
+        if token_counts != None:
+            token_counts[name] = token_counts.get(name, 0) + 1
+        if kind != TokenKind.SKIP:
+            # Jsme-li dva tokeny od posleniho komentare, muzeme resetovat comment_before (reset po jednom tokenu nelze, jelikoz jednim z nich muze byt carka mezi SQL bloky a komentar k takovemu bloku pak je typicky na radku pred touto carkou). Je take nutne vzit do uvahy can_switch_to_prev_context -- pokud je False, vime, ze doslo k umelemu rozdeleni tokenu a reset comment_before nelze provest.
+            if state.can_switch_to_prev_context:
+                state.token_counter += 1
+                if state.token_counter == 2:
+                    state.comment_before = ""
+            # Nektera klicova slova zpusobi vraceni vicero tokenu namisto jednoho -- v takovem pripade se nesmime vratit k predchozimu kontextu driv, nez zpracujeme veskere relevantni tokeny!
+            state.can_switch_to_prev_context = True
+            if state.split_attribute != None and state.t.ttype == sql.T.Keyword:
+                StatementHandler.on_split_attribute_keyword(state)
+            else:
+                if is_step:
+                    action = yield from handler(state)
+                else:
+                    action = handler(state)
+                if action == StatementHandler.CURRENT_TOKEN:
+                    continue
+                if action == StatementHandler.END:
+                    return
+        # Nakonec nacteme dalsi token
+        (state.i, state.t) = state.s.token_next(state.i, skip_ws=False, skip_cm=False)
+    # Jestlize byl UNION SELECT na konci statementu, chybi u nej zatim SQL kod. Tento tedy nyni pridame.
+    if state.union_table != None:
+        # Doresime pripadne zbyle fiktivni atributy se "spojkami", pokud se ukazalo, ze rozdeleni na vice tokenu nebylo uprosted nektereho z prvku vyctu v SELECT/ON/WHERE
+        state.union_table.attributes = process_remaining_link_attributes(state.union_table.attributes)
+        state.union_table.conditions = process_remaining_link_attributes(state.union_table.conditions, copy_conditions=True)
+        # Zdrojovy kod ulozime jedine v pripade, ze zatim nebyl prirazen (muze uz totiz byt ulozen z doby, kdy byl zpracovavan "UNION ( SELECT ... )", tzn. kdy SELECT byl obalen extra zavorkami)
+        if not state.union_table.source_sql_is_set():
+            state.union_table.source_span = state.session.source.get_span(state.union_start, get_trimmed_end(state.s.tokens, state.union_start))
+    # Nyni zkontrolujeme, zda v kolekci atributu nezustal nejaky "TBD" (drive zkontrolovat neslo, protoze tokeny jsou nekdy v dusledku chyb v sqlparse umele rozdelene). Pro podchyceni (primarne asi testovacich?) pripadu s blokem/y ve WITH, ale bez alespon jednoho hlavniho SELECT, musime kontrolovat, zda table neni None.
+    if state.table != None:
+        for attribute in state.table.attributes:
+            if attribute.kind == Attribute.CONDITION_TBD:
+                raise Exception(f"Počet aliasů atributů uvedených explicitně u tabulky {state.table.name} je větší než počet atributů vrácených v části SELECT")
+        # Doresime pripadne zbyle fiktivni atributy se "spojkami", pokud se ukazalo, ze rozdeleni na vice tokenu nebylo uprosted nektereho z prvku vyctu v SELECT/ON/WHERE
+        state.table.attributes = process_remaining_link_attributes(state.table.attributes)
+        state.table.conditions = process_remaining_link_attributes(state.table.conditions, copy_conditions=True)
+        # Pocatecni pozice se nastavuje pri nalezeni SELECT. Pokud je SELECT v zavorkach ("SELECT ... FROM ( SELECT ... )"), je na konci jedna uzaviraci zavorka navic, kterou je pri urceni konce SQL kodu nutne vynechat.
+        if state.select_start != None:
+            state.table.source_span = state.session.source.get_span(state.select_start, get_trimmed_end(state.s.tokens, state.select_start))
+
+
+def get_skipped_statement_kind(s: sql.Statement) -> str:
+    """Podle (neseskupenych) tokenu SQL prikazu zjisti, zda jde o prikaz, ze ktereho nemohou vzniknout zadne tabulky (GRANT, DROP, CREATE INDEX apod.), a tudiz ho neni potreba seskupovat ani zpracovavat. Vraci druh prikazu (napr. "CREATE INDEX"), prip. None, pokud prikaz preskocit nelze."""
+    t = s.token_first(skip_ws=True, skip_cm=True)
+    if t == None:
+        return None
+    words = t.normalized.upper().split()
+    kind = words[0]
+    if kind in ["GRANT", "REVOKE"]:
+        # Seznam privilegii muze obsahovat i SELECT, prikaz ale nikdy dotaz neobsahuje
+        return kind
+    if not kind in ["CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "COMMENT", "ANALYZE", "AUDIT", "NOAUDIT", "PURGE", "LOCK",
+                    "INSERT", "UPDATE", "DELETE", "COMMIT", "ROLLBACK", "SAVEPOINT", "SET", "EXEC", "EXECUTE", "CALL",
+                    "EXCEPTION", "RETURN", "END", "PROMPT", "SPOOL", "WHENEVER"]:
+        return None
+    # Ostatni prikazy lze preskocit jen v pripade, ze nikde neobsahuji SELECT ani WITH (napr. "CREATE VIEW ... AS SELECT ...", "INSERT INTO ... SELECT ...", PL/SQL bloky apod. zpracovat musime)
+    for token in s.tokens:
+        if token.ttype == sql.T.CTE or (token.ttype == sql.T.DML and token.normalized == "SELECT"):
+            return None
+    if kind in ["CREATE", "ALTER", "DROP", "TRUNCATE", "COMMENT"]:
+        # U DDL prikazu rozlisime i typ objektu (pripadne modifikatory jako UNIQUE, PUBLIC apod. preskocime)
+        i = s.token_index(t)
+        while True:
+            (i, t) = s.token_next(i, skip_ws=True, skip_cm=True)
+            if t == None:
+                break
+            word = t.normalized.upper().split()[0]
+            if not word in ["OR", "REPLACE", "UNIQUE", "BITMAP", "PUBLIC", "GLOBAL", "PRIVATE", "TEMPORARY", "FORCE", "NOFORCE", "ON"]:
+                kind += " " + word
+                break
+    return kind
+
+
+def collapse_in_lists(s: sql.Statement, replacements: dict, r_tag: str, min_count=100) -> sql.Statement:
+    """V (neseskupenych) tokenech SQL prikazu nahradi kazdy seznam literalu v "IN (...)" s alespon min_count polozkami jedinym tokenem (nahodny retezec zacinajici znackou r_tag). Puvodni seznam je pridan do slovniku nahrad replacements, takze ho restore_replacements(...) po zpracovani vrati zpet. Vraci upraveny prikaz (prip. puvodni prikaz, pokud k zadne nahrade nedoslo)."""
+    tokens = s.tokens
+    new_tokens = []
+    # Pocatek dosud nezkopirovanych tokenu
+    start = 0
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        i += 1
+        if t.ttype != sql.T.Keyword or t.normalized != "IN":
+            continue
+        while i < len(tokens) and tokens[i].is_whitespace:
+            i += 1
+        if i == len(tokens) or not tokens[i].match(sql.T.Punctuation, "("):
+            continue
+        i += 1
+        # Seznam smi obsahovat pouze literaly (retezce, cisla), carky a bile znaky. Bile znaky na zacatku a na konci seznamu do nahrady nezahrnujeme (tokeny v zavorce pak sqlparse seskupuje stejne jako puvodni seznam).
+        while i < len(tokens) and tokens[i].is_whitespace:
+            i += 1
+        list_start = i
+        list_end = i
+        count = 0
+        while i < len(tokens):
+            t = tokens[i]
+            if t.ttype in sql.T.Number or t.ttype == sql.T.String.Single:
+                count += 1
+                list_end = i + 1
+            elif not (t.is_whitespace or t.match(sql.T.Punctuation, ",")):
+                break
+            i += 1
+        if count < min_count or i == len(tokens) or not tokens[i].match(sql.T.Punctuation, ")"):
+            continue
+        # Seznam nahradime nahodnym retezcem (stejne seznamy sdileji i tentyz nahradni retezec)
+        original = "".join(t.value for t in tokens[list_start:list_end])
+        if r_tag in original.lower():
+            # Seznam muze obsahovat nahradni retezce z preprocess_query(...) (napr. 'data', zpetna lomitka v retezcich). Zpetna nahrada je jednopruchodova, vnorene nahradni retezce by tedy jiz obnoveny nebyly, do slovniku nahrad proto ukladame seznam po zpetne nahrade.
+            original = create_restore_engine(replacements).apply(original)
+        if original in replacements:
+            r_str = replacements[original][0]
+        else:
+            # Stejne jako v create_replacements(...) nesmi byt nahradni retezec shodny s jinym nahradnim retezcem ani obsahovat nektery z nahrazovanych vyrazu
+            while True:
+                r_str = r_tag + get_random_string(16)
+                collision = False
+                for (rk, (rs, _)) in replacements.items():
+                    if rs == r_str or rk in r_str:
+                        collision = True
+                        break
+                if not collision:
+                    break
+            replacements[original] = (r_str, False)
+        new_tokens.extend(tokens[start:list_start])
+        new_tokens.append(sql.Token(sql.T.Name, r_str))
+        start = list_end
+    if start == 0:
+        return s
+    new_tokens.extend(tokens[start:])
+    return sql.Statement(new_tokens)
+
+
+def focus_statement(s: sql.Statement, focus_name: str, depth: int) -> tuple:
+    """V (neseskupenych) tokenech SQL prikazu zacinajiciho klicovym slovem WITH ponecha pouze blok focus_name a bloky (prip. hlavni cast prikazu), ktere jsou od nej vzdaleny nejvyse depth vazeb proti smeru i po smeru zavislosti. Vazby mezi bloky jsou zjisteny pouze podle nazvu (bez seskupovani tokenu), odebrane bloky, na ktere ponechane bloky odkazuji, jsou pak zpracovany jako bezne tabulky (po zpracovani je nutne je oznacit pomoci mark_with_stubs(...)). Vraci ntici (upraveny prikaz, pocet ponechanych bloku, celkovy pocet bloku, mnozina normalizovanych nazvu odebranych bloku, na ktere ponechane bloky odkazuji), prip. (None, 0, 0, None), pokud prikaz blok focus_name neobsahuje."""
+    tokens = s.tokens
+    i = 0
+    while i < len(tokens) and (tokens[i].is_whitespace or is_comment(tokens[i])):
+        i += 1
+    if i == len(tokens) or tokens[i].ttype != sql.T.CTE:
+        return None, 0, 0, None
+    # Bloky ve WITH ve tvaru [zacatek, konec) -- od nazvu bloku po zavorku s jeho kodem, prip. po klauzule SEARCH/CYCLE za ni. Komentare a carky mezi bloky do bloku nezahrnujeme (komentar k bloku muze byt pred carkou i za ni), hlavni cast prikazu zacina prvnim DML klicovym slovem na nejvyssi urovni.
+    blocks = []
+    start = None
+    expect_name = True
+    after_as = False
+    level = 0
+    for k in range((i + 1), len(tokens)):
+        t = tokens[k]
+        if t.is_whitespace or is_comment(t):
+            continue
+        if t.match(sql.T.Punctuation, "("):
+            level += 1
+        elif t.match(sql.T.Punctuation, ")"):
+            level -= 1
+            if level == 0 and after_as:
+                # Konec kodu bloku
+                blocks.append([start, k + 1])
+                start = None
+                after_as = False
+        elif level > 0:
+            continue
+        elif t.ttype == sql.T.DML:
+            break
+        elif start != None:
+            # Pred kodem bloku (za nazvem, prip. za zavorkou s aliasy sloupcu) nas zajima pouze AS
+            if t.ttype == sql.T.Keyword and t.normalized == "AS":
+                after_as = True
+        elif t.match(sql.T.Punctuation, ","):
+            expect_name = True
+        elif expect_name:
+            start = k
+            expect_name = False
+        elif len(blocks) > 0:
+            # Klauzule za kodem bloku (SEARCH, CYCLE)
+            blocks[-1][1] = k + 1
+    if start != None or len(blocks) == 0:
+        return None, 0, 0, None
+    # Hlavni cast prikazu ma index len(blocks)
+    segments = blocks + [[blocks[-1][1], len(tokens)]]
+
+    def normalize(name: str) -> str:
+        return name.strip("\"").lower()
+
+    # Nazvy bloku (nazev muze byt vracen i jako klicove slovo, prip. jako identifikator v uvozovkach)
+    names = {}
+    for n in range(len(blocks)):
+        for t in tokens[segments[n][0]:segments[n][1]]:
+            if t.ttype in sql.T.Name or t.ttype == sql.T.Keyword or t.ttype == sql.T.String.Symbol:
+                names[normalize(t.value)] = n
+                break
+    focus = names.get(normalize(focus_name))
+    if focus == None:
+        return None, 0, 0, None
+    # Vazby mezi castmi prikazu: uses[n] == casti, na ktere cast n odkazuje, used_by[n] == casti, ktere odkazuji na cast n
+    uses = [set() for n in range(len(segments))]
+    used_by = [set() for n in range(len(segments))]
+    for n in range(len(segments)):
+        for t in tokens[segments[n][0]:segments[n][1]]:
+            if t.ttype in sql.T.Name or t.ttype == sql.T.Keyword or t.ttype == sql.T.String.Symbol:
+                m = names.get(normalize(t.value))
+                if m != None and m != n:
+                    uses[n].add(m)
+                    used_by[m].add(n)
+
+    def get_neighbourhood(edges: list) -> set:
+        # Casti dosazitelne z bloku focus po nejvyse depth vazbach (prohledavani do sirky)
+        reached = {focus}
+        frontier = {focus}
+        for d in range(depth):
+            frontier = {m for n in frontier for m in edges[n]} - reached
+            reached.update(frontier)
+        return reached
+
+    selected = get_neighbourhood(uses) | get_neighbourhood(used_by)
+    # Prikaz sestavime z tokenu pred prvnim blokem (WITH) a vybranych bloku vc. komentaru pred nimi, ktere oddelime carkami. Hlavni cast prikazu (vc. komentaru pred ni) pripojime, pokud byla vybrana.
+    new_tokens = list(tokens[:(i + 1)])
+    separator_start = i + 1
+    first = True
+    for n in range(len(blocks)):
+        if n in selected:
+            if not first:
+                new_tokens.append(sql.Token(sql.T.Punctuation, ","))
+            new_tokens.extend(t for t in tokens[separator_start:blocks[n][0]] if not t.match(sql.T.Punctuation, ","))
+            new_tokens.extend(tokens[blocks[n][0]:blocks[n][1]])
+            first = False
+        separator_start = blocks[n][1]
+    if len(blocks) in selected:
+        new_tokens.extend(tokens[separator_start:])
+    # Odebrane bloky, na ktere ponechane casti prikazu odkazuji, budou zpracovany jako bezne tabulky, ktere je pak potreba odlisit od tabulek z DB
+    stubs = {name for (name, n) in names.items() if n not in selected and len(used_by[n] & selected) > 0}
+    return sql.Statement(new_tokens), len(selected) - (1 if len(blocks) in selected else 0), len(blocks), stubs
+
+
+def mark_with_stubs(first_table: int, stubs: set) -> None:
+    """Tabulky aktualni relace zpracovani od indexu first_table, ktere byly vytvoreny jako bezne tabulky z odkazu na bloky z WITH odebrane pomoci focus_statement(...), oznaci jako Table.WITH_STUB. Metoda nic nevraci."""
+    for table in ParseSession.current().tables[first_table:]:
+        if table.table_type == Table.STANDARD_TABLE and table.name.strip("\"").lower() in stubs:
+            table.table_type = Table.WITH_STUB
+
+
+def process_statement_dependencies(s: sql.Statement) -> None:
+    """Zjednodusene zpracovani SQL prikazu, pri kterem jsou z (neseskupenych) tokenu zjisteny pouze tabulky a vazby mezi nimi. Vytvorene tabulky nemaji atributy, podminky ani komentare a subselecty, JOINy apod. nemaji vlastni mezi-tabulky (zavislosti jsou vzdy prirazeny primo bloku ve WITH, prip. hlavnimu SELECTu). Metoda nic nevraci."""
+    session = ParseSession.current()
+    # Tokeny jsou neseskupene, pozice tokenu v textu prikazu si tedy spocitame sami (bez indexu vsech tokenu a komentaru v SourceBuffer.add_statement(...))
+    session.source.add_text(s.value)
+    # Bile znaky a komentare nas nezajimaji, pozice zbylych tokenu v textu prikazu si ale musime pamatovat kvuli ukladani SQL kodu bloku ve WITH
+    positions = []
+    tokens = []
+    position = 0
+    for token in s.tokens:
+        if not (token.is_whitespace or token.ttype == sql.T.Comment.Single or token.ttype == sql.T.Comment.Multiline):
+            positions.append(position)
+            tokens.append(token)
+        position += len(token.value)
+    # Typy tokenu, ktere mohou byt nazvem tabulky (testy "ttype in sql.T.Name" jsou pomale, vysledky si proto pamatujeme)
+    name_ttypes = {}
+
+    def is_name(ttype) -> bool:
+        result = name_ttypes.get(ttype)
+        if result == None:
+            result = name_ttypes[ttype] = ttype != None and (ttype in sql.T.Name or ttype == sql.T.String.Symbol)
+        return result
+
+    # Tabulka, ke ktere jsou prave prirazovany nalezene zavislosti (blok ve WITH, prip. hlavni SELECT)
+    table = None
+    level = 0
+    # Cast WITH: uroven zanoreni, na ktere jsou nazvy bloku (None == nejsme v casti WITH), nazev prave zpracovavaneho bloku a pocatek jeho SQL kodu (prvni token v zavorce)
+    with_level = None
+    with_name = None
+    with_start = -1
+    # Urovne zanoreni, na kterych jsme v casti FROM (tzn. za carkou nasleduje dalsi zdrojova tabulka)
+    from_levels = []
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        t = tokens[i]
+        if t.match(sql.T.Punctuation, "("):
+            if with_level == level and with_name != None:
+                # Zacatek kodu bloku ve WITH ("name [(aliasy)] AS (...)"; zavorku s aliasy atributu pozname podle chybejiciho AS)
+                if i > 0 and tokens[i - 1].ttype == sql.T.Keyword and tokens[i - 1].normalized == "AS":
+                    table = Table(name=with_name, table_type=Table.WITH_TABLE)
+                    session.add_table(table)
+                    with_name = None
+                    # SQL kod bloku zacina (stejne jako pri uplnem zpracovani) prvnim tokenem v zavorce, uvodni bile znaky a komentare preskocime
+                    with_start = positions[i + 1] if i + 1 < len(tokens) else positions[i] + len(t.value)
+                    # Dodrzeni limitu pro zpracovani prikazu kontrolujeme na zacatku kazdeho bloku
+                    session.budget.check()
+            level += 1
+            expect_table = False
+        elif t.match(sql.T.Punctuation, ")"):
+            if level in from_levels:
+                from_levels.remove(level)
+            level -= 1
+            if with_level == level and table != None and table.table_type == Table.WITH_TABLE and table.source_span == None:
+                # Konec bloku ve WITH, ulozime rozsah jeho SQL kodu (bez uzaviraci zavorky a bilych znaku pred ni, pripadne komentare na konci ale ponechame, viz get_trimmed_end(...))
+                with_end = with_start + len(s.value[with_start:positions[i]].rstrip())
+                table.source_span = session.source.get_span(with_start, with_end)
+        elif with_level == level:
+            if t.ttype == sql.T.DML:
+                # Hlavni cast prikazu za casti WITH
+                with_level = None
+                table = None
+                continue
+            elif with_name == None and (is_name(t.ttype) or t.ttype == sql.T.Keyword) and not (t.ttype == sql.T.Keyword and t.normalized == "AS"):
+                with_name = t.value
+        elif t.ttype == sql.T.CTE and level == 0:
+            with_level = 0
+        elif t.ttype == sql.T.DML and t.normalized == "SELECT" and table == None:
+            # SELECT na nejvyssi urovni dotazu
+            table = Table(name_template="main-select", table_type=Table.MAIN_SELECT)
+            session.add_table(table)
+        elif t.ttype == sql.T.Keyword and (t.normalized == "FROM" or t.normalized.endswith("JOIN")):
+            if not level in from_levels:
+                from_levels.append(level)
+            expect_table = True
+        elif t.match(sql.T.Punctuation, ",") and level in from_levels:
+            expect_table = True
+        elif expect_table and is_name(t.ttype):
+            # Nazev zdrojove tabulky (vc. pripadneho schematu), za kterym muze nasledovat alias
+            components = [t.value]
+            while i + 2 < len(tokens) and tokens[i + 1].match(sql.T.Punctuation, ".") and is_name(tokens[i + 2].ttype):
+                components.append(tokens[i + 2].value)
+                i += 2
+            name = ".".join(components)
+            src_table = Table.get_table_by_name(name=name, alias_table=None)
+            if src_table == None:
+                src_table = Table(name=name)
+                session.add_table(src_table)
+            if i + 1 < len(tokens) and tokens[i + 1].ttype in sql.T.Name:
+                i += 1
+                Table.add_alias(table, src_table.id, tokens[i].value)
+            if table != None:
+                table.link_to_table_id(src_table.id)
+            expect_table = False
+        elif level in from_levels and t.ttype in sql.T.Keyword:
+            # Konec casti FROM (WHERE, GROUP BY, ON apod.)
+            from_levels.remove(level)
+            expect_table = False
+        else:
+            expect_table = False
+        i += 1
+
+
+def group_statement_by_with_elements(s: sql.Statement) -> sql.Statement:
+    """Seskupi tokeny SQL prikazu zacinajiciho klicovym slovem WITH po castech (zvlast kazdy blok ve WITH a zvlast hlavni cast prikazu) a vrati vysledny prikaz pro zpracovani v process_statement(...). Casova narocnost seskupovani tokenu v sqlparse roste s delkou prikazu vice nez linearne (a pocet tokenu je navic omezen), u prikazu s mnoha bloky ve WITH je tedy vyrazne vyhodnejsi seskupovat bloky samostatne. Prikazy bez WITH jsou seskupeny standardne."""
+    tokens = s.tokens
+    i = 0
+    while i < len(tokens) and (tokens[i].is_whitespace or is_comment(tokens[i])):
+        i += 1
+    if i == len(tokens) or tokens[i].ttype != sql.T.CTE:
+        return grouping.group(s)
+    # Hranice bloku hledame pouze podle zavorek a carek na nejvyssi urovni: blok zacina nazvem a konci pred carkou oddelujici dalsi blok (pripadne komentare a bile znaky za zavorkou s kodem bloku jsou tedy jeho soucasti, stejne jako pri seskupeni celeho prikazu), resp. pred hlavni casti prikazu. Tokeny mezi bloky (carky, komentare apod.) seskupujeme take samostatne, jinak by nebyly slouceny napr. po sobe jdouci jednoradkove komentare.
+    grouped_tokens = []
+    separator_start = 0
+    end_token = sql.Token(sql.T.Whitespace, " ")
+    with_token = tokens[i]
+    i += 1
+    level = 0
+    start = None
+    while i < len(tokens):
+        t = tokens[i]
+        if start == None:
+            if t.is_whitespace or is_comment(t) or t.ttype == sql.T.Punctuation:
+                i += 1
+                continue
+            # Komentare na konci seznamu tokenu sqlparse neseskupi (za skupinou komentaru musi nasledovat jiny token), proto docasne pridame mezeru, kterou pak opet odebereme
+            separator = grouping.group(sql.Statement(tokens[separator_start:i] + [end_token]))
+            if separator.tokens[-1] is not end_token:
+                return grouping.group(s)
+            grouped_tokens.extend(separator.tokens[:-1])
+            if t.ttype == sql.T.DML:
+                break
+            start = i
+        if t.match(sql.T.Punctuation, "("):
+            level += 1
+        elif t.match(sql.T.Punctuation, ")"):
+            level -= 1
+        elif level == 0 and (t.match(sql.T.Punctuation, ",") or t.ttype == sql.T.DML):
+            # Blok seskupime samostatne; aby byl vysledek stejny jako pri seskupeni celeho prikazu, musi mu predchazet klicove slovo WITH a za nim nasledovat dalsi token (viz vyse), oba tyto tokeny pak opet odebereme
+            element = grouping.group(sql.Statement([with_token, sql.Token(sql.T.Whitespace, " ")] + tokens[start:i] + [end_token]))
+            if element.tokens[-1] is not end_token:
+                # Pomocny token byl seskupen spolu s tokeny bloku -- radeji tedy seskupime cely prikaz najednou
+                return grouping.group(s)
+            grouped_tokens.extend(element.tokens[2:-1])
+            # Seskupovani celeho prikazu prerusit nelze, mezi bloky vsak muzeme zkontrolovat dodrzeni limitu pro zpracovani prikazu
+            ParseSession.current().budget.check()
+            start = None
+            separator_start = i
+            continue
+        i += 1
+    if start != None:
+        # Prikaz bez hlavni casti
+        element = grouping.group(sql.Statement([with_token, sql.Token(sql.T.Whitespace, " ")] + tokens[start:]))
+        grouped_tokens.extend(element.tokens[2:])
+    elif i < len(tokens):
+        grouped_tokens.extend(grouping.group(sql.Statement(tokens[i:])).tokens)
+    else:
+        grouped_tokens.extend(grouping.group(sql.Statement(tokens[separator_start:])).tokens)
+    return sql.Statement(grouped_tokens)
+
+
+# TODO: kontrolovat pritomnost lib. fiktivniho atributu + pripadne Exception, pokud u tabulky neco zbylo?    
+
+
+def process_remaining_link_attributes(attributes: list, copy_conditions=False) -> list:
+    """Projde zadany seznam atributu (prip. podminek) a zpracuje pripadne zbyle fiktivni atributy s kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK. Metoda vraci seznam atributu ve stavu po provedeni pripadnych zmen."""
+    j = 1
+    while j < len(attributes) - 1:
+        if (attributes[j].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK
+            and attributes[j - 1].name != None
+            and attributes[j + 1].name != None):
+            if attributes[j].comment.startswith(" ") and attributes[j].comment.endswith(" "):
+                link = attributes[j].comment
+            else:
+                link = " " + attributes[j].comment + " "
+            attributes[j - 1].set_name(attributes[j - 1].name + link + attributes[j + 1].name)
+            attributes[j - 1].alias = attributes[j + 1].alias
+            if copy_conditions:
+                attributes[j - 1].set_condition(attributes[j + 1].condition, attributes[j + 1].kind)
+            if not attributes[j - 1].comment_is_set():
+                attributes[j - 1].comment = attributes[j + 1].comment
+            attributes.pop(j)  # Odebereme fiktivni atribut se "spojkou"...
+            attributes.pop(j)  # ... a zbytek rozdeleneho atributu
+            continue
+        j += 1
+    # Pripadny fiktivni atribut se "spojkou" uplne na zacatku nebo na konci kolekce zahodime (nemohl byt dusledkem rozdeleni atributu na vicero casti, protoze za nim uz nic nenasleduje)
+    if len(attributes) > 0 and attributes[0].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK:
+        attributes.pop(0)
+    if len(attributes) > 0 and attributes[-1].kind == Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK:
+        attributes.pop()
+    return attributes
+
+
+def text_to_dia(text: str) -> str:
+    """Vrati text ve tvaru vhodnem pro vlozeni do .dia"""
+    if text != None and len(text) > 0:
+        # Pocatecni a koncove bile znaky orezeme
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return ""
+
+
+def generateDiaBlockAttrCode(name, comment) -> str:
+    """Vrati XML kod atributu v Dia bloku "UML Class", kde name je jmeno atributu a comment u nej vlozeny komentar"""
+    code = []
+    code.append(("        <dia:composite type=\"umlattribute\">\n"
+                 "          <dia:attribute name=\"name\">\n"))
+    code.append(f"            <dia:string>#{text_to_dia(name)}#</dia:string>\n")
+    code.append(("          </dia:attribute>\n"
+                 "          <dia:attribute name=\"type\">\n"
+                 "            <dia:string>##</dia:string>\n"
+                 "          </dia:attribute>\n"
+                 "          <dia:attribute name=\"value\">\n"
+                 "            <dia:string>##</dia:string>\n"
+                 "          </dia:attribute>\n"))
+    code.append( "          <dia:attribute name=\"comment\">\n")
+    code.append(f"            <dia:string>#{text_to_dia(comment)}#</dia:string>\n")
+    code.append(("          </dia:attribute>\n"
+                 "          <dia:attribute name=\"visibility\">\n"
+                 "            <dia:enum val=\"3\"/>\n"
+                 "          </dia:attribute>\n"
+                 "          <dia:attribute name=\"abstract\">\n"
+                 "            <dia:boolean val=\"false\"/>\n"
+                 "          </dia:attribute>\n"
+                 "          <dia:attribute name=\"class_scope\">\n"
+                 "            <dia:boolean val=\"false\"/>\n"
+                 "          </dia:attribute>\n"
+                 "        </dia:composite>\n"))
+    return "".join(code)
+
+
+class DependencyGraph:
+    """Graf zavislosti tabulek sestaveny jednorazove po zpracovani vsech prikazu. Uzly na urovni WITH jsou tabulky z WITH bloku (table_type == Table.WITH_TABLE) a SELECTy na nejvyssi urovni (table_type == Table.MAIN_SELECT); zavislosti mezi nimi mohou vest i oklikou pres nepreruseny retezec mezi-tabulek (table_type == Table.AUX_TABLE). Graf poskytuje tyto zavislosti (viz get_dependencies(...)), topologicke poradi uzlu (order) a cykly (cycles, typicky rekurzivni bloky z WITH). Nadbytecne zavislosti lze odebrat tranzitivni redukci (viz reduce())."""
+
+    def __init__(self, tables: list):
+        # ID tabulek jsou pridelovana postupne od 0 (viz ParseSession), seznamy sousednosti i dalsi udaje o uzlech tedy muzeme indexovat primo podle ID
+        size = max((table.id for table in tables), default=-1) + 1
+        self.table_types = [None] * size
+        self.links = [None] * size
+        # ID uzlu na urovni WITH v poradi vytvoreni tabulek (tabulka muze byt v kolekci vicekrat, viz ParseSession.add_table(...))
+        self.primary_ids = []
+        for table in tables:
+            if self.links[table.id] == None:
+                self.table_types[table.id] = table.table_type
+                self.links[table.id] = list(table.linked_to_tables_id)
+                if table.table_type == Table.WITH_TABLE or table.table_type == Table.MAIN_SELECT:
+                    self.primary_ids.append(table.id)
+        # Zavislosti mezi-tabulek na uzlech na urovni WITH spocteme jedinym pruchodem mezi-tabulek v reverznim topologickem poradi (kazda mezi-tabulka je tak zpracovana az po vsech mezi-tabulkach, na kterych zavisi), vysledky jsou pak sdileny vsemi tabulkami, ktere na dane mezi-tabulce zavisi
+        self.closures = [None] * size
+        for id in self.__get_aux_postorder__():
+            self.closures[id] = self.__get_closure__(id)
+        # Zavislosti uzlu na urovni WITH (klic == ID uzlu, hodnota == seznam ID uzlu, na kterych primo ci oklikou pres mezi-tabulky zavisi)
+        self.dependencies = {}
+        for id in self.primary_ids:
+            self.dependencies[id] = list(self.__get_closure__(id))
+        # Silne souvisle komponenty grafu v topologickem poradi (viz __get_components__()), z nich pak odvodime topologicke poradi uzlu a cykly
+        self.components = self.__get_components__()
+        self.order = [id for component in self.components for id in component]
+        self.cycles = [component for component in self.components if len(component) > 1 or component[0] in self.dependencies[component[0]]]
+
+    def __get_aux_postorder__(self) -> list:
+        """Vrati ID vsech mezi-tabulek v reverznim topologickem poradi (kazda mezi-tabulka je uvedena az za vsemi mezi-tabulkami, na kterych zavisi). Pripadne cykly mezi-tabulek jsou preruseny v miste prvniho navratu do jiz rozpracovane mezi-tabulky."""
+        # Stav mezi-tabulek: None == dosud nenavstivena, False == rozpracovana, True == zpracovana
+        state = [None] * len(self.links)
+        postorder = []
+        for id in range(len(self.links)):
+            if self.table_types[id] != Table.AUX_TABLE or state[id] != None:
+                continue
+            # Rekurzi nahradime vlastnim zasobnikem (retezce mezi-tabulek mohou byt velmi dlouhe); polozkou je ID tabulky a index nasledujici vazby ke zpracovani
+            state[id] = False
+            stack = [[id, 0]]
+            while len(stack) > 0:
+                item = stack[-1]
+                links = self.links[item[0]]
+                if item[1] < len(links):
+                    linked_id = links[item[1]]
+                    item[1] += 1
+                    if self.table_types[linked_id] == Table.AUX_TABLE and state[linked_id] == None:
+                        state[linked_id] = False
+                        stack.append([linked_id, 0])
+                else:
+                    state[item[0]] = True
+                    postorder.append(item[0])
+                    stack.pop()
+        return postorder
+
+    def __get_closure__(self, id: int) -> dict:
+        """Vrati ID uzlu na urovni WITH, na kterych tabulka se zadanym ID zavisi primo ci oklikou pres mezi-tabulky (jako mnozinu v podobe slovniku s hodnotami None, aby bylo zachovano poradi vazeb). Predpoklada, ze u vsech mezi-tabulek, na kterych tabulka zavisi, jsou jiz tyto zavislosti spocteny."""
+        closure = {}
+        for linked_id in self.links[id]:
+            table_type = self.table_types[linked_id]
+            if table_type == Table.WITH_TABLE or table_type == Table.MAIN_SELECT:
+                closure[linked_id] = None
+            elif table_type == Table.AUX_TABLE and self.closures[linked_id] != None:
+                closure.update(self.closures[linked_id])
+            # Standardni tabulky (ty z databaze) kontrolovat nemusime, protoze pres ne urcite nemuze vest retezec zavislosti WITH tabulek
+        return closure
+
+    def __get_components__(self) -> list:
+        """Vrati silne souvisle komponenty grafu uzlu na urovni WITH (kazda komponenta je seznamem ID uzlu; komponenta s vice uzly, prip. s uzlem zavisejicim sam na sobe, je cyklem) v topologickem poradi, tzn. kazda komponenta je uvedena az za komponentami, na kterych zavisi. Pouziva Tarjanuv algoritmus, ktery komponenty vraci prave v tomto poradi."""
+        index = {}
+        low = {}
+        on_stack = {}
+        component_stack = []
+        components = []
+        for start_id in self.primary_ids:
+            if start_id in index:
+                continue
+            # Rekurzi opet nahradime vlastnim zasobnikem (polozkou je ID uzlu a index nasledujici zavislosti ke zpracovani)
+            index[start_id] = low[start_id] = len(index)
+            on_stack[start_id] = None
+            component_stack.append(start_id)
+            stack = [[start_id, 0]]
+            while len(stack) > 0:
+                item = stack[-1]
+                id = item[0]
+                dependencies = self.dependencies[id]
+                if item[1] < len(dependencies):
+                    linked_id = dependencies[item[1]]
+                    item[1] += 1
+                    if not linked_id in index:
+                        index[linked_id] = low[linked_id] = len(index)
+                        on_stack[linked_id] = None
+                        component_stack.append(linked_id)
+                        stack.append([linked_id, 0])
+                    elif linked_id in on_stack:
+                        low[id] = min(low[id], index[linked_id])
+                    continue
+                stack.pop()
+                if len(stack) > 0:
+                    low[stack[-1][0]] = min(low[stack[-1][0]], low[id])
+                if low[id] == index[id]:
+                    # Uzel je korenem silne souvisle komponenty, kterou tvori vsechny uzly na zasobniku az po nej
+                    component = []
+                    while len(component) == 0 or component[-1] != id:
+                        component.append(component_stack.pop())
+                        del on_stack[component[-1]]
+                    component.reverse()
+                    components.append(component)
+        return components
+
+    def reduce(self) -> int:
+        """Provede tranzitivni redukci zavislosti uzlu na urovni WITH, tzn. odebere kazdou zavislost A -> C, pokud A zavisi i na jinem uzlu B, ze ktereho je C dosazitelny (A -> B -> ... -> C). Dosazitelnost je pocitana nad silne souvislymi komponentami (viz __get_components__()) v topologickem poradi, pricemz mnoziny dosazitelnych komponent jsou bitove mapy (cela cisla), takze redukce zvlada i tisice uzlu. Zavislosti uvnitr cyklu (vc. rekurzivnich bloku) jsou ponechany. Vraci pocet odebranych zavislosti."""
+        component_index = {}
+        for (i, component) in enumerate(self.components):
+            for id in component:
+                component_index[id] = i
+        # Bitove mapy komponent dosazitelnych z jednotlivych komponent (bit k odpovida k-te komponente, komponenta samotna v mape neni)
+        reachable = [0] * len(self.components)
+        removed = 0
+        for (i, component) in enumerate(self.components):
+            # Dosazitelnost komponenty spocteme jeste z puvodnich (neredukovanych) zavislosti, redukce ji nezmeni
+            for id in component:
+                for linked_id in self.dependencies[id]:
+                    k = component_index[linked_id]
+                    if k != i:
+                        reachable[i] |= reachable[k] | (1 << k)
+            for id in component:
+                # Komponenty dosazitelne z nektere z primych zavislosti uzlu (jine nez vlastni komponenty) -- zavislosti smerujici do nich jsou nadbytecne
+                covered = 0
+                for linked_id in self.dependencies[id]:
+                    k = component_index[linked_id]
+                    if k != i:
+                        covered |= reachable[k]
+                if covered == 0:
+                    continue
+                dependencies = [linked_id for linked_id in self.dependencies[id] if (covered >> component_index[linked_id]) & 1 == 0]
+                removed += len(self.dependencies[id]) - len(dependencies)
+                self.dependencies[id] = dependencies
+        return removed
+
+    def get_dependencies(self, id: int) -> list:
+        """Vrati ID vsech uzlu na urovni WITH (viz DependencyGraph), na kterych uzel se zadanym ID zavisi primo, prip. oklikou pres nepreruseny retezec mezi-tabulek"""
+        return self.dependencies.get(id, [])
+
+
+def get_random_string(n: int) -> str:
+    """Vraci nahodny retezec o zadane delce (n znaku) slozeny pouze z malych pismen"""
+    return "".join(secrets.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def match_case(matched: str, new_str: str) -> str:
+    """Vrati retezec new_str, v jehoz pocatecnich znacich az do delky min(len(matched), len(new_str)) je velikost pismen nastavena podle retezce matched. Pripadna dalsi pismena az do konce new_str jsou ponechana tak, jak byla zadana."""
+    res = []
+    min_len = min(len(matched), len(new_str))
+    for i in range(min_len):
+        if matched[i].isupper():
+            res.append(new_str[i].upper())
+        else:
+            res.append(new_str[i])
+    if min_len < len(new_str):
+        res.extend(new_str[min_len:])
+    return "".join(res)
+
+
+class RewriteEngine:
+    """Trida pro hromadne nahrady retezcu v textu jedinym pruchodem. Vsechna pravidla jsou zkompilovana do jednoho regularniho vyrazu (alternativy usporadane do stromu podle spolecnych prefixu), podle nalezeneho retezce je pak z tabulky pravidel urcena patricna nahrada. Hledani je case-insensitive a velikost pismen nalezeneho retezce je zachovana: v pocatecnich znacich nahrady az do delky min(len(nalezeny retezec), len(nahrada)) je velikost pismen nastavena podle nalezeneho retezce, pripadna dalsi pismena nahrady jsou ponechana tak, jak byla zadana (viz match_case(...))."""
+
+    def __init__(self):
+        # Tabulka pravidel; klicem je hledany retezec (lowercase), hodnotou seznam pravidel ve tvaru (nahrada, kontext pred shodou, kontext za shodou, zkompilovany regularni vyraz pro overeni podminek, podminky jako retezec)
+        self.rules = {}
+        self.regex = None
+        # Jiz jednou vypocitane nahrady (klic == (nalezeny text, index pravidla))
+        self.cache = {}
+
+    def add_rule(self, old_str: str, new_str: str, whole_words=True, before=None, after=None) -> None:
+        """Prida pravidlo pro nahradu retezce old_str (nejde o regularni vyraz) retezcem new_str. Volitelne kontexty before/after musi v textu byt tesne pred/za old_str, samy vsak nahrazovany nejsou (mohou tedy byt sdileny sousednimi shodami). Pri zachovavani velikosti pismen se s nimi pocita, jako by byly soucasti old_str i new_str. Metoda nic nevraci."""
+        if old_str == None or len(old_str) == 0:
+            return
+        if new_str == None:
+            new_str = ""
+        if before == None:
+            before = ""
+        if after == None:
+            after = ""
+        # Podminky (nulove sirky) overovane az za nalezenym retezcem
+        conditions = []
+        if whole_words:
+            conditions.append(f"(?<=\\b{RewriteEngine.__escape__(old_str)})\\b")
+        if len(before) > 0:
+            conditions.append(f"(?<={RewriteEngine.__escape__(before + old_str)})")
+        if len(after) > 0:
+            conditions.append(f"(?={RewriteEngine.__escape__(after)})")
+        condition = "".join(conditions)
+        verify_regex = re.compile(RewriteEngine.__escape__(old_str) + condition)
+        key = old_str.lower()
+        if not key in self.rules:
+            self.rules[key] = []
+        self.rules[key].append((new_str, before, after, verify_regex, condition))
+        # Pripadny drive zkompilovany vyraz uz neodpovida sade pravidel
+        self.regex = None
+
+    def apply(self, text: str) -> str:
+        """Provede v zadanem textu nahrady podle vsech pravidel (jedinym pruchodem zleva doprava, tzn. vystup jednoho pravidla uz neni vstupem pravidel dalsich) a vrati upraveny text. Pokud na stejne pozici vyhovuje vice pravidel, ma prednost delsi hledany retezec, prip. drive pridane pravidlo."""
+        if text == None or len(self.rules) == 0:
+            return text
+        if self.regex == None:
+            self.regex = re.compile(self.__build_pattern__())
+        return self.regex.sub(self.__substitute__, text)
+
+    def apply_mapped(self, text: str) -> tuple:
+        """Stejne jako apply(...) provede v zadanem textu nahrady, navic vsak krome upraveneho textu vrati i posuny pozic ve tvaru ([pozice za nahrazenym retezcem v puvodnim textu], [celkovy posun pozic od teto pozice dal]), podle kterych lze prepocitat pozice v puvodnim textu na pozice v textu upravenem."""
+        ends = []
+        deltas = []
+        if text == None or len(self.rules) == 0:
+            return text, (ends, deltas)
+        if self.regex == None:
+            self.regex = re.compile(self.__build_pattern__())
+
+        def substitute(match) -> str:
+            new_str = self.__substitute__(match)
+            ends.append(match.end())
+            deltas.append((deltas[-1] if len(deltas) > 0 else 0) + len(new_str) - (match.end() - match.start()))
+            return new_str
+
+        return self.regex.sub(substitute, text), (ends, deltas)
+
+    def __build_pattern__(self) -> str:
+        """Vrati regularni vyraz odpovidajici vsem pravidlum. Hledane retezce jsou usporadany do stromu podle spolecnych prefixu (Python re jinak u kazdeho znaku textu zkousi postupne vsechny alternativy)."""
+        trie = {}
+        for key in self.rules.keys():
+            node = trie
+            for ch in key:
+                if not ch in node:
+                    node[ch] = {}
+                node = node[ch]
+            # Prazdny klic oznacuje konec hledaneho retezce; hodnotou jsou podminky jednotlivych pravidel (alespon jedna musi byt splnena)
+            conditions = [rule[4] for rule in self.rules[key]]
+            if "" in conditions:
+                node[""] = ""
+            else:
+                node[""] = "(?:" + "|".join(conditions) + ")"
+        return RewriteEngine.__build_trie_pattern__(trie)
+
+    @classmethod
+    def __build_trie_pattern__(cls, node: dict) -> str:
+        """Vrati regularni vyraz pro zadany uzel stromu hledanych retezcu"""
+        alternatives = []
+        # Delsi retezce (pokracovani ve stromu) musi mit prednost pred koncem retezce v aktualnim uzlu
+        for ch in node.keys():
+            if ch != "":
+                alternatives.append(RewriteEngine.__escape__(ch) + RewriteEngine.__build_trie_pattern__(node[ch]))
+        if "" in node:
+            alternatives.append(node[""])
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    @classmethod
+    def __escape__(cls, text: str) -> str:
+        """Vrati regularni vyraz odpovidajici zadanemu retezci bez ohledu na velikost pismen. Pismena jsou rozepsana jako [xX], jelikoz re.IGNORECASE hledani ve stromu vyrazne zpomaluje."""
+        components = []
+        for ch in text:
+            lower = ch.lower()
+            upper = ch.upper()
+            if lower != upper and len(lower) == 1 and len(upper) == 1:
+                components.append(f"[{lower}{upper}]")
+            else:
+                components.append(re.escape(ch))
+        return "".join(components)
+
+    def __substitute__(self, match) -> str:
+        """Vrati nahradu pro shodu nalezenou v metode apply(...)"""
+        g = match.group()
+        rules = self.rules[g.lower()]
+        # Pravidlo, jehoz podminky jsou splneny (s vice pravidly pro tentyz retezec je nutne podminky overit znovu)
+        i = 0
+        if len(rules) > 1:
+            while i < len(rules) - 1 and rules[i][3].match(match.string, match.start()) == None:
+                i += 1
+        key = (g, i)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        (new_str, before, after, _, _) = rules[i]
+        text = match_case(before + g + after, before + new_str + after)
+        text = text[len(before):(len(text) - len(after))]
+        self.cache[key] = text
+        return text
+
+
+def create_replacements(is_in_query) -> tuple:
+    """Pripravi slovnik docasnych nahrad problematickych vyrazu nahodnymi retezci a vrati ntici (slovnik nahrad, spolecna znacka vsech nahradnich retezcu). Funkce is_in_query(r_str) musi vracet, zda se retezec r_str vyskytuje v puvodnim SQL kodu (bez ohledu na velikost pismen)."""
+    # (b) Docasne nahrady nahodnymi retezci, boolovska hodnota znaci, zda pozadujeme nahradu celych slov
+    # BUG: pokud je slovo "result" pouzito jako nazev bloku ve WITH, ve vyctu v SELECT, FROM, JOIN, prip. v jinem podobnem kontextu, dojde vlivem chyby v sqlparse k umelemu rozdeleni tokenu a jinak funkcni algoritmus tedy selze. Vytvorime si tedy slovnik znamych problematickych vyrazu, ktere pred zpracovanim SQL kodu nahradime nahodne generovanymi retezci. Po zpracovani zase ve vytvorenych vystupech vse nahradime zpet (vzdy hromadne, jelikoz i konflikt s XML strukturou .dia je nepravdepodobny). Skutecnost, ze tak ztratime informaci o malych/velkych pismenech (tedy ze napr. "result", "Result", "RESULT" apod. budou ve vystupech oznacovany pouze jako "result"), neni uplne podstatna.
+    # Jako hodnotu lze ve slovniku ulozit pripadny nutny prefix nahodneho retezce. Potrebujeme, aby:
+    #   * nahradni retezce byly ruzne,
+    #   * v zadnem z nich se nevyskytoval lib. z puvodnich problematickych vyrazu a
+    #   * zadny z nich nebyl v puvodnim SQL kodu (bez ohledu na velikost pismen; kosmeticke upravy v create_rewrite_engine(...) nove sekvence pismen vytvorit nemohou, takze staci kontrolovat puvodni SQL kod).
+    # Pro snazsi kontrolu si budeme generovane nahradni retezce ukladat do kolekce generated_r_strs.
+    replacements = {}
+    replacements["data"] = ("", True)
+    replacements["result"] = ("", True)
+    replacements["rownum"] = ("", True)
+    replacements["cmp"] = ("", True)
+    replacements["old"] = ("", True)
+    replacements["new"] = ("", True)
+    replacements["do"] = ("", True)
+    replacements["level"] = ("", True)
+    replacements["table_name"] = ("", True)
+    replacements["&&"] = (":", False)  # | Zde nas zachovani malych/velkych pismen netrapi, jelikoz nahrazujeme
+    replacements["&"] = (":", False)   # | pouze ampersandy (napr. "&data" --> ":RANDOMSTRINGdata")
+
+    # TODO: slo by takto vyresit i bug "within group"? (vyzadovalo by ale regex klic atd., jelikoz mezi slovy mohou byt bile znaky!)
+
+    # BUG: sqlparse neumi korektne zpracovat kod, kde se napr. jako literal (nebo jeho cast) vyskytuje "\", proto i zpetna lomitka docasne nahradime nahodnym retezcem.
+    replacements["\\"] = ("", False)
+    generated_r_strs = []
+    r_keys = replacements.keys()
+    # Vsechny nahradni retezce budou zacinat spolecnou (nahodnou) znackou, diky ktere pri zpetne nahrade snadno pozname retezce, ve kterych zadny nahradni retezec byt nemuze
+    while True:
+        r_tag = get_random_string(8)
+        key_in_r_tag = False
+        for rk in r_keys:
+            if rk in r_tag:
+                key_in_r_tag = True
+                break
+        if not key_in_r_tag:
+            break
+    for r_key in r_keys:
+        (prefix, whole_words) = replacements[r_key]
+        while True:
+            # Potrebujeme retezec dost dlouhy na to, abychom nahodou nevygenerovali klicove slovo apod. (24 znaku by snad melo stacit). Zaroven musi jeho delka byt prinejmensim takova, jako delka puvodniho vyrazu, aby bylo mozne kompletne zachovat velikosti pismen. Pred nahodny retezec musime pridat prefix ulozeny ve slovniku replacements a spolecnou znacku!
+            r_str = prefix + r_tag + get_random_string(max(24, len(r_key)) - len(r_tag))
+            if r_str in generated_r_strs or is_in_query(r_str):
+                continue
+            key_in_r_str = False
+            for rk in r_keys:
+                if rk in r_str:
+                    key_in_r_str = True
+                    break
+            if not key_in_r_str:
+                generated_r_strs.append(r_str)
+                replacements[r_key] = (r_str, whole_words)
+                break
+    return replacements, r_tag
+
+
+def create_rewrite_engine(replacements: dict) -> RewriteEngine:
+    """Vrati objekt RewriteEngine se vsemi pravidly pro upravu SQL kodu pred parsovanim (kosmeticke upravy a docasne nahrady podle slovniku vytvoreneho funkci create_replacements(...))"""
+    # Pred analyzou SQL kodu musime provest nahradu problematickych vyrazu. Nektere upravime jen kosmeticky (ale tak, ze se tim vyhneme problemum s parserem), jine je potreba nahradit nahodnymi retezci. Vsechna pravidla pridame do jedineho objektu RewriteEngine, takze SQL kod bude nakonec projit pouze jednou. Pravidla se vyhodnocuji nad puvodnim textem, cili kontext sdileny sousednimi nahradami (napr. zavorka v "nvl (count (") je nutne zadat pomoci before/after, nikoliv jako soucast vzoru.
+    engine = RewriteEngine()
+    # (a) Kosmeticke upravy (vzory jsou obycejne retezce, nikoliv regularni vyrazy)
+    # Nektere funkce potrebujeme bez mezery mezi nazvem a pocatecni zavorkou, coz bude vyzadovat vice ruznych nahrad (nelze resit pomoc nahrad "celych slov"). Pro usnadneni situace si budeme takove nazvy funkci ukladat do specialni kolekce a vsechny potrebne nahrady pak pridame hromadne.
+    fcns_no_space = []
+    # Podobne musi byt za nekterymi klicovymi slovy a hinty vzdy mezera
+    kws_space = []
+    hints_space = []
+    # Nezlomitelne mezery nahradime standardnimi mezerami
+    engine.add_rule("\xa0", " ", whole_words=False)
+    # Za kazdym klicovym slovem OVER potrebujeme mezeru, abychom se vyhnuli dalsi zbytecne uprave kodu pro podchyceni pripadu "OVER(". Nelze ale nahrazovat cela slova, takze musime pro predejiti potizim nahrazovat retezec s kontextem pocatecni mezery (resp. \n, \t).
+    kws_space.append("over")
+    # Podobne vyresime hinty "use_hash" a "use_nl"
+    hints_space.append("use_hash")
+    hints_space.append("use_nl")
+    # COUNT(...), NVL(...), SUM(...) atd. musi byt bez mezery, jinak neni vraceno jako funkce, ale jako samostatne klicove slovo
+    fcns_no_space.append("count")
+    fcns_no_space.append("nvl")
+    fcns_no_space.append("sum")
+    fcns_no_space.append("max")
+    fcns_no_space.append("min")
+    fcns_no_space.append("to_date")
+    fcns_no_space.append("to_number")
+    # Operator NOT musi byt s mezerou na obou stranach -- cast vyresime jako bezne klicove slovo, zbytek ("," nebo "(" pred NOT) doresime primo zde rucne
+    kws_space.append("not")
+    engine.add_rule("not", " not ", whole_words=False, before=",", after="(")
+    engine.add_rule("not", " not ", whole_words=False, before="(", after="(")
+    # Nyni doresime funkce, kde nesmi byt mezera mezi nazvem a pocatecni zavorkou, a klicova slova, kde naopak mezera byt musi. Nezlomitelna mezera je nahrazovana v temze pruchodu, takze ji musime vsude uvazovat stejne jako standardni mezeru.
+    ws_chars = [" ", "\xa0", "\n", "\t"]
+    for fcn in fcns_no_space:
+        for space in [" ", "\xa0"]:
+            for ws in ws_chars:
+                engine.add_rule(f"{fcn}{space}", fcn, whole_words=False, before=ws, after="(")
+            engine.add_rule(f"{fcn}{space}", f" {fcn}", whole_words=False, before=",", after="(")
+            engine.add_rule(f"{fcn}{space}", f" {fcn}", whole_words=False, before="(", after="(")
+    for kw in kws_space:
+        for ws in ws_chars:
+            engine.add_rule(kw, f"{kw} ", whole_words=False, before=ws, after="(")
+    for hint in hints_space:
+        engine.add_rule(hint, f" {hint} ", whole_words=False, before="+", after="(")
+        for ws in ws_chars:
+            engine.add_rule(hint, f"{hint} ", whole_words=False, before=ws, after="(")
+    # Za kazdou uzaviraci zavorkou potrebujeme mezeru, abychom podchytili pripad "funkce()alias" (toto by cele bylo vraceno jako jmeno, alias by chybel)
+    engine.add_rule(")", ") ", whole_words=False)
+    # # Podobne, byt uz ciste z kosmetickych duvodu vzhledem k nahradam zavorek, upravime vyskyty carek.
+    # engine.add_rule(",", ", ", whole_words=False)
+
+    # Nahradni retezce jsou nachystane, pridame odpovidajici pravidla (Kompletni zachovani velikosti pismen je zarizeno primo v RewriteEngine, kde jsou velikosti pismen v nahradnim retezci nastaveny podle velikosti pismen v puvodnim vyrazu.)
+    for r_key in replacements.keys():
+        (r_str, whole_words) = replacements[r_key]
+        engine.add_rule(r_key, r_str, whole_words=whole_words)
+    return engine
+
+
+def preprocess_query(query: str) -> tuple:
+    """Pripravi SQL kod k parsovani (kosmeticke upravy a docasne nahrady problematickych vyrazu nahodnymi retezci) a vrati ntici (upraveny SQL kod, slovnik nahrad pro zpetnou nahradu, spolecna znacka vsech nahradnich retezcu)"""
+    lc_query = query.lower()
+    replacements, r_tag = create_replacements(lambda r_str: r_str in lc_query)
+    # Vsechna pravidla aplikujeme jedinym pruchodem SQL kodem
+    return create_rewrite_engine(replacements).apply(query), replacements, r_tag
+
+
+def split_sql_file(file, chunk_size=1048576):
+    """Postupne (po castech o chunk_size znacich) cte SQL kod z otevreneho souboru a vraci jej po usecich zakoncenych strednikem, ktery neni soucasti retezce, identifikatoru v uvozovkach ani komentare. Usek muze byt i jen casti prikazu (napr. uvnitr BEGIN ... END), hranice useku ale nikdy nerozdeli token."""
+    token_regex = re.compile("--|/\\*|['\";]")
+    closing = {"--": "\n", "/*": "*/", "'": "'", "\"": "\""}
+    buffer = ""
+    # Zacatek dosud nevraceneho useku v bufferu (buffer je zkracovan jen jednou pro kazdou nactenou cast souboru, ne po kazdem stredniku) a pozice, od ktere pokracuje hledani
+    start = 0
+    pos = 0
+    eof = False
+    while not eof:
+        chunk = file.read(chunk_size)
+        eof = len(chunk) == 0
+        buffer = buffer[start:] + chunk
+        pos -= start
+        start = 0
+        while True:
+            match = token_regex.search(buffer, pos)
+            if match == None:
+                if eof:
+                    pos = len(buffer)
+                else:
+                    # Posledni znak muze byt zacatkem "--" nebo "/*", ktery bude dokoncen az v dalsi casti souboru
+                    pos = max(pos, len(buffer) - 1)
+                break
+            g = match.group()
+            if g == ";":
+                yield buffer[start:match.end()]
+                start = match.end()
+                pos = start
+                continue
+            end = buffer.find(closing[g], match.end())
+            if end == -1:
+                if eof:
+                    # Neukonceny retezec nebo komentar na konci souboru
+                    pos = len(buffer)
+                else:
+                    # Konec retezce nebo komentare muze byt az v dalsi casti souboru
+                    pos = match.start()
+                break
+            pos = end + len(closing[g])
+    if start < len(buffer):
+        yield buffer[start:]
+
+
+def find_strings_in_file(file_name: str, encoding: str, strings: list, chunk_size=1048576) -> set:
+    """Vrati mnozinu tech retezcu ze seznamu strings (zadanych malymi pismeny), ktere se vyskytuji v souboru file_name (bez ohledu na velikost pismen). Soubor je cten postupne, v pameti tedy nikdy neni cely."""
+    found = set()
+    # Konec predchozi casti souboru si musime pamatovat, abychom nalezli i retezce na hranici dvou casti
+    overlap = max([len(s) for s in strings]) - 1
+    tail = ""
+    with open(file_name, mode="r", encoding=encoding) as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if len(chunk) == 0:
+                break
+            text = tail + chunk.lower()
+            for s in strings:
+                if s in text:
+                    found.add(s)
+            tail = text[(len(text) - overlap):] if overlap > 0 else ""
+    return found
+
+
+def preprocess_file(file_name: str, encoding: str) -> tuple:
+    """Obdoba funkce preprocess_query(...) pro postupne zpracovani souboru; vrati ntici (objekt RewriteEngine s pravidly pro upravu SQL kodu, slovnik nahrad pro zpetnou nahradu, spolecna znacka vsech nahradnich retezcu)"""
+    # Nahradni retezce nemuzeme kontrolovat primo pri generovani (soubor nechceme mit v pameti cely), takze soubor projdeme az s hotovym slovnikem nahrad. Kolizni retezce si zapamatujeme a generovani pripadne zopakujeme.
+    found = set()
+    while True:
+        replacements, r_tag = create_replacements(lambda r_str: r_str in found)
+        new_found = find_strings_in_file(file_name, encoding, [r_str for (r_str, _) in replacements.values()])
+        if len(new_found) == 0:
+            break
+        found.update(new_found)
+    return create_rewrite_engine(replacements), replacements, r_tag
+
+
+class FastLexer:
+    """Rychly lexikalni analyzator pro podmnozinu SQL pouzivanou v Oracle. Vraci stejny proud tokenu (dvojice (typ tokenu, hodnota)) jako lexer v sqlparse nad SQL kodem upravenym pomoci create_rewrite_engine(...), problematicke vyrazy ale rovnou klasifikuje spravne, takze neni potreba zadna docasna nahrada nahodnymi retezci (ani zpetna nahrada ve vystupech). Zamerne se lisi pouze u "&" primo za slovem (vraci substitucni promennou) a u zpetnych lomitek mimo retezce (lomitko je soucasti slova jen tam, kde slovo zacina ci pokracuje), kde by lexer v sqlparse po nahrade vratil nahodne retezce (viz tests/test_fast_lexer.py)."""
+    # Slova, ktera by sqlparse chybne povazoval za klicova slova (musi odpovidat slovum nahrazovanym v create_replacements(...)); vzdy je vracime jako jmena
+    NAME_WORDS = {"data", "result", "rownum", "cmp", "old", "new", "do", "level", "table_name"}
+    # Funkce, u kterych je odstranena mezera pred pocatecni zavorkou (viz fcns_no_space v create_rewrite_engine(...)); klicem je nazev funkce, hodnotou znaky, po kterych je zaroven vlozena mezera pred nazev funkce
+    FCNS_NO_SPACE = {"count": ",(", "nvl": ",(", "sum": ",(", "max": ",(", "min": ",(", "to_date": ",(", "to_number": ",("}
+    # Klicova slova a hinty, za ktere je pred pocatecni zavorkou vlozena mezera (viz kws_space a hints_space v create_rewrite_engine(...)); hodnotou jsou znaky, po kterych je zaroven vlozena mezera i pred slovo
+    WORDS_SPACE = {"over": "", "not": ",(", "use_hash": "+", "use_nl": "+"}
+    # Bile znaky, po kterych jsou vyse uvedene upravy provadeny (nezlomitelne mezery jsou predem nahrazeny standardnimi)
+    WS_CHARS = " \n\t"
+    # Pravidla ve stejnem poradi, jako v sqlparse.keywords.SQL_REGEX (bez konstrukci z jinych dialektu, tzn. MySQL, PostgreSQL apod.). Typ None znaci slovo, jehoz typ urcime podle slovniku klicovych slov.
+    RULES = [
+        ("(?:--|# )\\+.*?(?:\\r\\n|\\r|\\n|$)", sql.T.Comment.Single.Hint),
+        ("(?:--|# ).*?(?:\\r\\n|\\r|\\n|$)", sql.T.Comment.Single),
+        ("/\\*", sql.T.Comment.Multiline),
+        ("\\r\\n|\\r|\\n", sql.T.Newline),
+        ("\\s", sql.T.Whitespace),
+        (":=", sql.T.Assignment),
+        ("::", sql.T.Punctuation),
+        ("\\*", sql.T.Wildcard),
+        ("\\?", sql.T.Name.Placeholder),
+        ("(?<!\\w)[$:?]\\w+", sql.T.Name.Placeholder),
+        # Substitucni promenne (&NAZEV, &&NAZEV)
+        ("&&?\\w*", sql.T.Name.Placeholder),
+        ("(?:CASE|IN|VALUES|USING|FROM|AS)\\b", sql.T.Keyword),
+        ("(?:@|##|#)[A-ZÀ-Ü]\\w+", sql.T.Name),
+        ("[A-ZÀ-Ü]\\w*(?=\\s*\\.(?!\\d))", sql.T.Name),
+        ("(?<=\\.)[A-ZÀ-Ü]\\w*", sql.T.Name),
+        ("[A-ZÀ-Ü]\\w*(?=\\()", sql.T.Name),
+        ("-?0x[\\dA-F]+", sql.T.Number.Hexadecimal),
+        ("-?\\d+(?:\\.\\d+)?E-?\\d+", sql.T.Number.Float),
+        ("(?![_A-ZÀ-Ü])-?(?:\\d+(?:\\.\\d*)|\\.\\d+)(?![_A-ZÀ-Ü])", sql.T.Number.Float),
+        ("(?![_A-ZÀ-Ü])-?\\d+(?![_A-ZÀ-Ü])", sql.T.Number.Integer),
+        # V Oracle nejsou v retezcich a identifikatorech v uvozovkach zpetna lomitka escape znaky
+        ("'(?:''|[^'])*'", sql.T.String.Single),
+        ("\"(?:\"\"|[^\"])*\"", sql.T.String.Symbol),
+        ("(?:(?:LEFT\\s+|RIGHT\\s+|FULL\\s+)?(?:INNER\\s+|OUTER\\s+|STRAIGHT\\s+)?|(?:CROSS\\s+|NATURAL\\s+)?)?JOIN\\b", sql.T.Keyword),
+        ("END(?:\\s+IF|\\s+LOOP|\\s+WHILE|\\s+FOR|\\s+CASE)?\\b", sql.T.Keyword),
+        ("IF\\s+(?:NOT\\s+)?EXISTS\\b", sql.T.Keyword),
+        ("NOT\\s+NULL\\b", sql.T.Keyword),
+        ("(?:ASC|DESC)(?:\\s+NULLS\\s+(?:FIRST|LAST))?\\b", sql.T.Keyword.Order),
+        ("NULLS\\s+(?:FIRST|LAST)\\b", sql.T.Keyword.Order),
+        ("UNION\\s+ALL\\b", sql.T.Keyword),
+        ("CREATE(?:\\s+OR\\s+REPLACE)?\\b", sql.T.Keyword.DDL),
+        ("DOUBLE\\s+PRECISION\\b", sql.T.Name.Builtin),
+        ("GROUP\\s+BY\\b", sql.T.Keyword),
+        ("ORDER\\s+BY\\b", sql.T.Keyword),
+        ("PRIMARY\\s+KEY\\b", sql.T.Keyword),
+        ("AT\\s+TIME\\s+ZONE\\s+'[^']+'", sql.T.Keyword.TZCast),
+        ("(?:NOT\\s+)?(?:LIKE|ILIKE|RLIKE)\\b", sql.T.Operator.Comparison),
+        ("(?:NOT\\s+)?REGEXP(?:\\s+BINARY)?\\b", sql.T.Operator.Comparison),
+        # Zpetna lomitka mimo retezce (sqlparse je zpracovat neumi, puvodne byla nahrazovana nahodnymi pismeny) povazujeme za soucast slova
+        ("[\\w\\\\][$#\\w\\\\]*", None),
+        ("[;:()\\[\\],\\.]", sql.T.Punctuation),
+        ("\\->>?|#>>?|@>|<@|\\?\\|?|\\?&|\\-|#\\-", sql.T.Operator),
+        ("[<>=~!]+", sql.T.Operator.Comparison),
+        ("[+/@#%^|^-]+", sql.T.Operator),
+        (".", sql.T.Error),
+    ]
+    __regex__ = None
+    # Jiz jednou urcene typy slov (klicem je slovo velkymi pismeny)
+    __keyword_types__ = {}
+
+    @classmethod
+    def get_tokens(cls, text: str):
+        """Postupne vraci tokeny zadaneho SQL kodu jako dvojice (typ tokenu, hodnota), stejne jako sqlparse.lexer.tokenize(...)"""
+        if cls.__regex__ == None:
+            # Vsechna pravidla spojime do jedineho regularniho vyrazu, podle indexu skupiny pak pozname, ktere pravidlo bylo pouzito (alternativy jsou zkouseny zleva, prednost tedy ma drive uvedene pravidlo)
+            cls.__regex__ = re.compile("|".join(f"({rx})" for (rx, _) in cls.RULES), re.IGNORECASE | re.UNICODE)
+        match_at = cls.__regex__.match
+        rule_types = [None] + [ttype for (_, ttype) in cls.RULES]
+        # Pravidla, jejichz vysledkem muze byt slovo upravovane v create_rewrite_engine(...)
+        word_rules = {i + 1 for i in range(len(cls.RULES)) if cls.RULES[i][1] in (sql.T.Name, None)}
+        ws_chars = cls.WS_CHARS
+        text = text.replace("\xa0", " ")
+        pos = 0
+        length = len(text)
+        while pos < length:
+            m = match_at(text, pos)
+            rule = m.lastindex
+            value = m.group()
+            ttype = rule_types[rule]
+            end = m.end()
+            if ttype == sql.T.Comment.Multiline:
+                # Viceradkovy komentar (prip. hint) hledame az do nejblizsiho "*/"; pokud neni ukoncen, jde stejne jako v sqlparse o operator "/"
+                hint = text.startswith("/*+", pos)
+                close = text.find("*/", pos + (3 if hint else 2))
+                if close == -1:
+                    yield sql.T.Operator, "/"
+                    pos += 1
+                    continue
+                end = close + 2
+                yield (sql.T.Comment.Multiline.Hint if hint else ttype), text[pos:end]
+            elif rule in word_rules:
+                lower = value.lower()
+                prev = text[pos - 1] if pos > 0 else ""
+                if ttype == None:
+                    ttype = cls.__get_keyword_type__(value)
+                # Problematicka slova jsou v create_rewrite_engine(...) nahrazovana pouze jako cela slova, slovo tesne za cislem (napr. "1.5e3do") tedy zpracujeme jako kazde jine
+                if lower in cls.NAME_WORDS and not (prev.isalnum() or prev == "_"):
+                    yield sql.T.Name, value
+                elif lower in cls.FCNS_NO_SPACE and prev != "" and (prev in ws_chars or prev in cls.FCNS_NO_SPACE[lower]) and text.startswith(" (", end):
+                    # Funkce bez mezery pred zavorkou (jinak by sqlparse vracel samostatne klicove slovo); mezeru preskocime
+                    if not prev in ws_chars:
+                        yield sql.T.Whitespace, " "
+                    yield sql.T.Name, value
+                    end += 1
+                elif lower in cls.WORDS_SPACE and prev != "" and (prev in ws_chars or prev in cls.WORDS_SPACE[lower]) and text.startswith("(", end):
+                    # Klicove slovo (prip. hint) s mezerou pred zavorkou, tzn. nejde o funkci
+                    if not prev in ws_chars:
+                        yield sql.T.Whitespace, " "
+                    yield cls.__get_keyword_type__(value), value
+                    yield sql.T.Whitespace, " "
+                else:
+                    yield ttype, value
+            elif value == ")":
+                # Za kazdou uzaviraci zavorkou potrebujeme mezeru (viz create_rewrite_engine(...))
+                yield ttype, value
+                yield sql.T.Whitespace, " "
+            else:
+                yield ttype, value
+            pos = end
+
+    @classmethod
+    def __get_keyword_type__(cls, value: str) -> Any:
+        """Vrati typ tokenu pro zadane slovo podle slovniku klicovych slov v sqlparse (sql.T.Name, pokud nejde o klicove slovo)"""
+        upper = value.upper()
+        try:
+            return cls.__keyword_types__[upper]
+        except KeyError:
+            pass
+        ttype = sql.T.Name if "\\" in value else lexer.Lexer.get_default_instance().is_keyword(value)[0]
+        cls.__keyword_types__[upper] = ttype
+        return ttype
+
+
+def parse_file(file_name: str, encoding: str, engine: RewriteEngine, group_tokens=True, chunk_size=1048576):
+    """Postupne (po castech o chunk_size znacich) cte a parsuje SQL kod ze souboru file_name (vcetne uprav pomoci engine) a vraci jednotlive prikazy. Vysledek je stejny jako u sqlparse.parse(...), v pameti je vsak vzdy jen prave zpracovavany prikaz. Pri group_tokens == False nejsou tokeny prikazu seskupovany. Pri engine == None je pouzit FastLexer (bez jakychkoliv uprav SQL kodu)."""
+    with open(file_name, mode="r", encoding=encoding) as file:
+        # Useky ze split_sql_file(...) nerozdeluji tokeny, lze je tedy lexikalne analyzovat samostatne a prikazy rozdelit az v proudu tokenu (stejne jako v sqlparse.parse(...))
+        if engine == None:
+            tokens = (token for segment in split_sql_file(file, chunk_size) for token in FastLexer.get_tokens(segment))
+        else:
+            tokens = (token for segment in split_sql_file(file, chunk_size) for token in lexer.tokenize(engine.apply(segment), encoding))
+        for s in StatementSplitter().process(tokens):
+            if group_tokens:
+                yield grouping.group(s)
+            else:
+                yield s
+
+
+def create_restore_engine(replacements: dict) -> RewriteEngine:
+    """Vrati objekt RewriteEngine pro zpetnou nahradu nahodnych retezcu puvodnimi vyrazy (pravidla jsou pouze opacna, nez pri nahradach v create_rewrite_engine(...))"""
+    engine = RewriteEngine()
+    for r_key in replacements.keys():
+        (r_str, _) = replacements[r_key]
+        # Nahradni retezce jsou jedinecne a v puvodnim SQL kodu se nevyskytuji, cela slova tedy pozadovat nemusime (a ani nesmime, nahradni retezce mohou byt slepene, napr. "&data" --> ":RANDOMSTRING1RANDOMSTRING2")
+        engine.add_rule(r_str, r_key, whole_words=False)
+    return engine
+
+
+def restore_replacements(replacements: dict, r_tag: str) -> None:
+    """Ve vsech tabulkach provede zpetnou nahradu nahodnych retezcu vytvorenych ve funkci preprocess_query(...) puvodnimi vyrazy. Metoda nic nevraci."""
+
+    def restore(text: str) -> str:
+        # Retezce bez spolecne znacky nahradnich retezcu neni nutne prochazet regularnim vyrazem
+        if text == None or not r_tag in text.lower():
+            return text
+        return engine.apply(text)
+
+    # Pokud nebyly provedeny zadne nahrady (FastLexer bez dlouhych seznamu v "IN (...)"), neni co obnovovat
+    if len(replacements) == 0:
+        return
+    # Zpetne nahrady provedeme jedinym pruchodem kazdeho retezce
+    engine = create_restore_engine(replacements)
+    session = ParseSession.current()
+    for table in session.tables:
+        # Jmeno
+        table.name = restore(table.name)
+        # Aliasy (mnoziny aliasu sestavime znovu)
+        for key in table.statement_aliases.keys():
+            table.statement_aliases[key] = {restore(a): None for a in table.statement_aliases[key]}
+        # Atributy
+        for attr in table.attributes:
+            # Jmeno
+            attr.name = restore(attr.name)
+            # Kratke jmeno
+            attr.short_name = restore(attr.short_name)
+            # Alias
+            attr.alias = restore(attr.alias)
+            # # Podminky nemusime u standardnich atributu vubec resit, protoze je vzdy None
+            # attr.condition = restore(attr.condition)
+            # Komentar
+            attr.comment = restore(attr.comment)
+        # Podminky
+        for attr in table.conditions:
+            attr.name = restore(attr.name)
+            attr.short_name = restore(attr.short_name)
+            attr.alias = restore(attr.alias)
+            attr.condition = restore(attr.condition)
+            attr.comment = restore(attr.comment)
+        # Bindovane promenne (mnozinu promennych sestavime znovu)
+        used_bind_vars = {}
+        for bind_var in table.used_bind_vars:
+            if r_tag in bind_var.lower():
+                # Pred nahradou zpet musime nejprve pridat ":" a potom zase ":" (prip. jeden ci dva "&") zase odebrat!
+                bind_var = engine.apply(":" + bind_var)
+                while bind_var.startswith(":") or bind_var.startswith("&"):
+                    bind_var = bind_var[1:]
+            used_bind_vars[bind_var] = None
+        table.used_bind_vars = used_bind_vars
+        # Komentar
+        table.comment = restore(table.comment)
+    # Zdrojovy kod tabulek je ulozen pouze jako rozsah ve sdilenem zdrojovem kodu, zpetnou nahradu tedy staci provest jedinkrat v textech celych prikazu
+    session.source.restore(engine, r_tag, session.tables)
+    # Jmena i aliasy tabulek se mohla zmenit, index jmen tedy sestavime znovu
+    session.symbols.rebuild(session.tables)
+
+
+def get_with_names(tokens: list) -> list:
+    """Vrati nazvy bloku z casti WITH na zaklade (neseskupenych) tokenu jednoho SQL prikazu. Pokud prikaz nezacina klicovym slovem WITH, vrati prazdny seznam."""
+    names = []
+    i = 0
+    while i < len(tokens) and (tokens[i].is_whitespace or is_comment(tokens[i])):
+        i += 1
+    if i == len(tokens) or tokens[i].ttype != sql.T.CTE:
+        return names
+    level = 0
+    name = None
+    expect_name = True
+    for t in tokens[(i + 1):]:
+        if t.is_whitespace or is_comment(t):
+            continue
+        if t.match(sql.T.Punctuation, "("):
+            level += 1
+        elif t.match(sql.T.Punctuation, ")"):
+            level -= 1
+        elif level > 0:
+            continue
+        elif expect_name:
+            # Nazev bloku muze byt vracen i jako klicove slovo (napr. "level"), prip. jako identifikator v uvozovkach
+            if t.ttype == sql.T.DML or not (t.ttype in sql.T.Name or t.ttype == sql.T.Keyword or t.ttype == sql.T.String.Symbol):
+                break
+            name = t.value
+            expect_name = False
+        elif t.ttype == sql.T.Keyword and t.normalized == "AS":
+            if name != None:
+                names.append(name)
+                name = None
+        elif t.match(sql.T.Punctuation, ","):
+            expect_name = True
+        else:
+            # Hlavni cast prikazu (SELECT apod.)
+            break
+    return names
+
+
+def add_with_tables_by_names(tokens: list, comment: str) -> list:
+    """Nahradni zpracovani SQL prikazu, ktery se nepodarilo zpracovat: podle neseskupenych tokenu prikazu vytvori pouze tabulky pro bloky z casti WITH (bez atributu a vazeb) se zadanym komentarem. Vraci seznam nazvu techto bloku."""
+    names = get_with_names(tokens)
+    for name in names:
+        table = Table(name=name, comment=comment, table_type=Table.WITH_TABLE)
+        ParseSession.current().add_table(table)
+    return names
+
+
+def write_statement_report(file_name: str, source_file_name: str, report: list) -> None:
+    """Ulozi stav zpracovani jednotlivych SQL prikazu (seznam slovniku s klici "statement" -- poradove cislo prikazu, "status" -- "ok", "skipped", "error", "timeout" nebo "memory" a dalsimi podrobnostmi) spolu se souhrnem podle stavu do JSON souboru file_name. Metoda nic nevraci."""
+    summary = {}
+    for status in report:
+        summary[status["status"]] = summary.get(status["status"], 0) + 1
+    with open(file_name, mode="w", encoding="utf-8") as report_file:
+        json.dump({"source": source_file_name, "summary": summary, "statements": report}, report_file, ensure_ascii=False, indent=1)
+
+
+def build_statement_index(file_name: str, encoding: str) -> list:
+    """Projde soubor file_name a vrati seznam zaznamu o jednotlivych SQL prikazech (slovniky s klici "start" a "end" -- pozice prvniho a za poslednim bajtem prikazu v souboru, "keyword" -- prvni klicove slovo, "with_blocks" -- nazvy bloku ve WITH, "hash" -- SHA-1 hash puvodniho SQL kodu). Prikazy jsou rozdeleny stejne jako v sqlparse.parse(...), soubor je cten postupne."""
+    engine, replacements, _ = preprocess_file(file_name, encoding)
+    restore_engine = create_restore_engine(replacements)
+    # Pozice v souboru potrebujeme v bajtech; pripadny BOM na zacatku souboru preskocime zvlast, jinak by jej enkoder (napr. "utf-8-sig") pridal ke kazdemu useku
+    byte_encoding = encoding
+    bom_length = 0
+    if codecs.lookup(encoding).name == "utf-8-sig":
+        byte_encoding = "utf-8"
+        with open(file_name, mode="rb") as file:
+            if file.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+                bom_length = len(codecs.BOM_UTF8)
+    offset = bom_length
+    # Za strednikem je soucasti prikazu jeste zbytek radku, pokud obsahuje jen bile znaky, prip. jednoradkovy komentar (viz StatementSplitter v sqlparse)
+    trailing_regex = re.compile("(?:[^\\S\\r\\n]|(?:--|# )(?!\\+)[^\\r\\n]*(?:\\r\\n|\\r|\\n|$))*")
+    splitter = StatementSplitter()
+    # Koncove pozice a hashe prikazu
+    ends = []
+    hashes = []
+    h = hashlib.sha1()
+
+    def tokens(file):
+        nonlocal offset, h
+        for segment in split_sql_file(file):
+            # Pokud predchozi usek ukoncil prikaz, je nutne zde zaznamenat hranici prikazu (tokeny z noveho useku jsou StatementSplitter-em zpracovany az po tomto miste)
+            if splitter.consume_ws:
+                trailing = trailing_regex.match(segment).group()
+                b_trailing = trailing.encode(byte_encoding)
+                h.update(b_trailing)
+                ends.append(offset + len(b_trailing))
+                hashes.append(h.hexdigest())
+                h = hashlib.sha1()
+                b_segment = segment[len(trailing):].encode(byte_encoding)
+                h.update(b_segment)
+                offset += len(b_trailing) + len(b_segment)
+            else:
+                b_segment = segment.encode(byte_encoding)
+                h.update(b_segment)
+                offset += len(b_segment)
+            for token in lexer.tokenize(engine.apply(segment), encoding):
+                yield token
+
+    index = []
+    # Konce radku musi zustat zachovany, jinak by nesedely pozice v bajtech
+    with open(file_name, mode="r", encoding=encoding, newline="") as file:
+        for s in splitter.process(tokens(file)):
+            first_token = s.token_first(skip_cm=True)
+            index.append({"keyword": first_token.normalized.upper() if first_token != None else None,
+                          "with_blocks": [restore_engine.apply(name) for name in get_with_names(s.tokens)]})
+    ends.append(offset)
+    hashes.append(h.hexdigest())
+    # Zaverecny usek obsahujici jen bile znaky (bez prikazu) sqlparse nevraci, pocet hranic tedy muze byt o jednu vyssi nez pocet prikazu. Prvni prikaz zacina az za pripadnym BOM.
+    start = bom_length
+    for i in range(len(index)):
+        index[i]["start"] = start
+        index[i]["end"] = ends[i]
+        index[i]["hash"] = hashes[i]
+        start = ends[i]
+    return index
+
+
+def get_statement_index(file_name: str, encoding: str, rebuild=False) -> list:
+    """Vrati index SQL prikazu v souboru file_name (viz build_statement_index(...)). Index je ulozen vedle zdrojoveho souboru (*_index.json) a pri dalsim volani je znovu pouzit, pokud se nezmenila velikost ani cas posledni zmeny souboru (obsah ctenych prikazu je navic overen podle hashe v select_statements(...)), prip. pokud neni pozadovano jeho nove vytvoreni (rebuild)."""
+    index_file_name = file_name[:-4] + "_index.json"
+    stat = os.stat(file_name)
+    source = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "encoding": encoding}
+    try:
+        if not rebuild:
+            with open(index_file_name, mode="r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+            if data["source"] == source:
+                return data["statements"]
+    except (OSError, ValueError, KeyError, TypeError):
+        # Index neexistuje nebo je poskozeny, vytvorime jej znovu
+        pass
+    index = build_statement_index(file_name, encoding)
+    with open(index_file_name, mode="w", encoding="utf-8") as index_file:
+        json.dump({"source": source, "statements": index}, index_file, ensure_ascii=False, indent=1)
+    return index
+
+
+def select_statements(file_name: str, encoding: str, statement_numbers=None, with_block_names=None) -> tuple:
+    """Vrati ntici (SQL kod, seznam poradovych cisel prikazu v souboru) pouze tech prikazu ze souboru file_name, ktere maji dane poradove cislo (od 1) nebo v casti WITH obsahuji blok s danym nazvem (bez ohledu na velikost pismen). Ostatni casti souboru nejsou vubec ctene. Pokud obsah nektereho z nactenych prikazu neodpovida hashi v drive ulozenem indexu (soubor byl zmenen, aniz by se zmenila jeho velikost a cas posledni zmeny), je index vytvoren znovu."""
+    if statement_numbers == None:
+        statement_numbers = []
+    if with_block_names == None:
+        with_block_names = []
+    lc_names = [name.strip("\"").lower() for name in with_block_names]
+    for rebuild in [False, True]:
+        index = get_statement_index(file_name, encoding, rebuild)
+        for n in statement_numbers:
+            if n < 1 or n > len(index):
+                raise Exception(f"Ve zdrojovém SQL souboru není příkaz č. {n} (počet příkazů: {len(index)})")
+        query = []
+        numbers = []
+        valid = True
+        with open(file_name, mode="rb") as file:
+            for i in range(len(index)):
+                entry = index[i]
+                if not (i + 1) in statement_numbers and len([name for name in entry["with_blocks"] if name.strip("\"").lower() in lc_names]) == 0:
+                    continue
+                file.seek(entry["start"])
+                b_statement = file.read(entry["end"] - entry["start"])
+                if hashlib.sha1(b_statement).hexdigest() != entry["hash"]:
+                    valid = False
+                    break
+                # Konce radku sjednotime stejne jako pri cteni souboru v textovem rezimu
+                statement = b_statement.decode(encoding)
+                query.append(statement.replace("\r\n", "\n").replace("\r", "\n"))
+                numbers.append(i + 1)
+        if valid:
+            break
+    if not valid:
+        raise Exception("Zdrojový SQL soubor byl během čtení změněn")
+    if len(query) == 0:
+        raise Exception("Ve zdrojovém SQL souboru nebyl nalezen žádný z požadovaných příkazů")
+    return "".join(query), numbers
+
+
+def extract_plsql_queries(tokens) -> list:
+    """Projde (neseskupene) tokeny PL/SQL kodu (napr. tela balicku) a vrati seznam v nem vnorenych dotazu (kurzory, SELECT ... INTO, FOR ... IN (SELECT ...) apod.) ve tvaru (prikaz, nazev procedury/funkce vc. pripadneho nazvu balicku a kurzoru, cislo radku). Struktura bloku (PACKAGE, BEGIN ... END, CASE ... END) je sledovana pouze na urovni tokenu, takze zadne seskupovani tokenu neni potreba."""
+    tokens = list(tokens)
+
+    def get_word(k: int) -> str:
+        # Klicova slova a jmena porovnavame bez ohledu na velikost pismen, u ostatnich tokenu nas hodnota nezajima
+        (ttype, value) = tokens[k]
+        if ttype in sql.T.Keyword or ttype in sql.T.Name:
+            return value.upper()
+        return None
+
+    def next_significant(k: int) -> int:
+        # Index nasledujiciho tokenu, ktery neni bilym znakem ani komentarem (prip. len(tokens))
+        k += 1
+        while k < len(tokens) and (tokens[k][0] in sql.T.Whitespace or tokens[k][0] in sql.T.Comment):
+            k += 1
+        return k
+
+    def read_name(k: int) -> tuple:
+        # Nazev (vc. pripadneho schematu, tzn. "schema.nazev") zacinajici za tokenem s indexem k; vraci ntici (nazev, index posledniho tokenu nazvu)
+        parts = []
+        k = next_significant(k)
+        while k < len(tokens) and (tokens[k][0] in sql.T.Name or tokens[k][0] in sql.T.Keyword or tokens[k][0] == sql.T.String.Symbol):
+            parts.append(tokens[k][1])
+            j = next_significant(k)
+            if j < len(tokens) and tokens[j] == (sql.T.Punctuation, "."):
+                k = next_significant(j)
+            else:
+                break
+        return ".".join(parts), k
+
+    queries = []
+    # Zasobnik otevrenych bloku ("PACKAGE", "BEGIN", "CASE") a zasobnik procedur/funkci ve tvaru (nazev, pocet otevrenych bloku v dobe deklarace)
+    blocks = []
+    procedures = []
+    package = None
+    # Balicek, procedura ci funkce, jejiz deklarace zatim nebyla ukoncena klicovym slovem IS/AS, ve tvaru (druh, nazev)
+    pending = None
+    cursor = None
+    level = 0
+    line = 1
+    i = 0
+    while i < len(tokens):
+        (ttype, value) = tokens[i]
+        word = get_word(i)
+        if (ttype == sql.T.DML and word == "SELECT") or ttype == sql.T.CTE:
+            # Zacatek vnoreneho dotazu: dotaz konci strednikem na stejne urovni zanoreni, prip. uzaviraci zavorkou, ktera do dotazu nepatri (napr. "FOR r IN (SELECT ...) LOOP")
+            end = i
+            query_level = 0
+            while end < len(tokens):
+                if tokens[end] == (sql.T.Punctuation, "("):
+                    query_level += 1
+                elif tokens[end] == (sql.T.Punctuation, ")"):
+                    query_level -= 1
+                    if query_level < 0:
+                        break
+                elif tokens[end] == (sql.T.Punctuation, ";") and query_level == 0:
+                    break
+                end += 1
+            names = [name for name in [package, procedures[-1][0] if len(procedures) > 0 else None, cursor] if name != None]
+            label = ".".join(names) if len(names) > 0 else "plsql"
+            queries.append((sql.Statement([sql.Token(tt, v) for (tt, v) in tokens[i:end]]), label, line))
+            # Tokeny dotazu preskocime (vc. pocitani radku)
+            for k in range(i, end):
+                line += tokens[k][1].count("\n")
+            i = end
+            continue
+        if word in ["PROCEDURE", "FUNCTION"]:
+            (name, k) = read_name(i)
+            pending = ("procedure", name)
+        elif word == "PACKAGE":
+            k = next_significant(i)
+            if k < len(tokens) and get_word(k) == "BODY":
+                (name, k) = read_name(k)
+            else:
+                (name, k) = read_name(i)
+            pending = ("package", name)
+        elif word == "CURSOR":
+            (cursor, k) = read_name(i)
+        elif word in ["IS", "AS"] and level == 0 and pending != None:
+            # Zacatek deklaracni casti balicku, procedury ci funkce
+            if pending[0] == "package":
+                package = pending[1]
+                blocks.append("PACKAGE")
+            else:
+                procedures.append((pending[1], len(blocks)))
+            pending = None
+        elif word == "BEGIN":
+            blocks.append("BEGIN")
+        elif word == "CASE":
+            blocks.append("CASE")
+        elif word == "END CASE":
+            if len(blocks) > 0 and blocks[-1] == "CASE":
+                blocks.pop()
+        elif word == "END" and len(blocks) > 0:
+            block = blocks.pop()
+            if block == "BEGIN" and len(procedures) > 0 and procedures[-1][1] == len(blocks):
+                procedures.pop()
+            elif block == "PACKAGE":
+                package = None
+        elif value == "(" and ttype == sql.T.Punctuation:
+            level += 1
+        elif value == ")" and ttype == sql.T.Punctuation:
+            level -= 1
+        elif value == ";" and ttype == sql.T.Punctuation and level == 0:
+            # Konec prikazu (prip. dopredne deklarace procedury bez IS/AS)
+            pending = None
+            cursor = None
+        line += value.count("\n")
+        i += 1
+    return queries
+
+
+def label_plsql_tables(first_table: int, label: str, line: int) -> None:
+    """Tabulky vytvorene z dotazu vnoreneho v PL/SQL kodu (tzn. tabulky aktualni relace zpracovani od indexu first_table) oznaci nazvem procedury/funkce, ve ktere se dotaz nachazi: hlavni SELECT je pojmenovan podle procedury (a nema-li komentar, je do nej ulozeno cislo radku), nazvy bloku z WITH jsou nazvem procedury uvozeny. Metoda nic nevraci."""
+    for table in ParseSession.current().tables[first_table:]:
+        if table.table_type == Table.MAIN_SELECT:
+            table.set_name(Table.__generate_name__(label))
+            if not table.comment_is_set():
+                table.set_comment(f"PL/SQL, řádek {line}")
+        elif table.table_type == Table.WITH_TABLE:
+            table.set_name(f"{label}.{table.name}")
+
+
+if __name__ == "__main__":
+    write_debug_output = False
+    overwrite_dia = False
+    stream_statements = False
+    deps_only = False
+    chunked = False
+    # None == vychozi lexikalni analyzator podle rezimu zpracovani (viz nize)
+    fast_engine = None
+    plsql = False
+    reduce_edges = False
+    selected_statements = []
+    selected_with_blocks = []
+    focus_name = None
+    focus_depth = 1
+    time_limit = None
+    memory_limit = None
+    # Z parametru nacteme nazev souboru se SQL kodem a pozadovane kodovani (prvni parametr obsahuje nazev skriptu). Dlouhe prepinace (--NAZEV HODNOTA) mohou byt uvedeny kdekoliv, ostatni parametry zpracujeme podle poradi.
+    args = []
+    args_ok = True
+    i = 1
+    while i < len(sys.argv):
+        arg = str(sys.argv[i])
+        if arg == "--statement" and i + 1 < len(sys.argv) and str(sys.argv[i + 1]).isdigit():
+            selected_statements.append(int(sys.argv[i + 1]))
+            i += 2
+        elif arg == "--with-block" and i + 1 < len(sys.argv):
+            selected_with_blocks.append(str(sys.argv[i + 1]))
+            i += 2
+        elif arg == "--focus" and i + 1 < len(sys.argv):
+            focus_name = str(sys.argv[i + 1])
+            i += 2
+        elif arg == "--depth" and i + 1 < len(sys.argv) and str(sys.argv[i + 1]).isdigit():
+            focus_depth = int(sys.argv[i + 1])
+            i += 2
+        elif arg == "--timeout" and i + 1 < len(sys.argv) and str(sys.argv[i + 1]).isdigit():
+            time_limit = int(sys.argv[i + 1])
+            i += 2
+        elif arg == "--max-memory" and i + 1 < len(sys.argv) and str(sys.argv[i + 1]).isdigit():
+            memory_limit = int(sys.argv[i + 1])
+            i += 2
+        elif arg == "--deps-only":
+            deps_only = True
+            i += 1
+        elif arg == "--chunked":
+            chunked = True
+            i += 1
+        elif arg == "--plsql":
+            plsql = True
+            i += 1
+        elif arg == "--reduce":
+            reduce_edges = True
+            i += 1
+        elif arg == "--engine" and i + 1 < len(sys.argv) and str(sys.argv[i + 1]).lower() in ["fast", "sqlparse"]:
+            fast_engine = str(sys.argv[i + 1]).lower() == "fast"
+            i += 2
+        elif arg.startswith("--"):
+            args_ok = False
+            break
+        else:
+            args.append(arg)
+            i += 1
+    if args_ok and len(args) > 2:
+        options = args[0].lstrip("-").lower()
+        write_debug_output = "d" in options
+        overwrite_dia = "o" in options
+        stream_statements = "s" in options
+        source_sql = args[1]
+        encoding = args[2]
+    elif args_ok and len(args) > 1:
+        source_sql = args[0]
+        encoding = args[1]
+    else:
+        # Pokud bylo zadano malo parametru (prip. neznamy prepinac), zobrazime napovedu a ukoncime provadeni skriptu
+        print("\nSyntaxe:\n\n  sql2xml [-PREP] [--deps-only] [--chunked] [--plsql] [--reduce]\n          [--engine fast|sqlparse] [--statement N] [--with-block NAZEV]\n          [--focus NAZEV [--depth K]]\n          [--timeout SEKUNDY] [--max-memory MB] SOUBOR KODOVANI\n\nkde:\n  -PREP     volitelné přepínače; zadávány hromadně za pomlčkou\n            (např. -do)\n    d       kromě diagramu (.dia) zapíše na disk také ladicí\n            výstupy, tzn. textovou reprezentaci všech nalezených\n            tabulek (*_vystup.txt) a případné soubory s popisem\n            chyb (*_CHYBA.txt) a varování (*_VAROVANI.txt)\n    o       pokud výstupní .dia soubor existuje, bude přepsán;\n            výchozí chování (bez přepínače -o): název výstupního\n            souboru je upraven přidáním čísla tak, aby nedošlo\n            k přepsání existujícího souboru\n    s       soubor je čten a zpracováván postupně po jednotlivých\n            SQL příkazech (vhodné pro velmi rozsáhlé skripty)\n  --deps-only\n            zjistí pouze tabulky a vazby mezi nimi (bez sloupců,\n            podmínek a komentářů), což je cca 2,5× až 3,5×\n            rychlejší\n  --chunked\n            tokeny jsou seskupovány zvlášť pro každý blok z části\n            WITH (vhodné pro dotazy s velkým počtem WITH bloků)\n  --plsql   zpracuje pouze dotazy vnořené v PL/SQL kódu (např.\n            v těle balíčku); tabulky jsou pojmenovány podle\n            procedury/funkce, ve které se dotaz nachází\n  --reduce  v diagramu vynechá vazby mezi bloky, které vyplývají\n            z jiných vazeb (A závisí na B i na C, přičemž B sám\n            závisí na C)\n  --engine fast|sqlparse\n            lexikální analýza SQL kódu vlastním (rychlejším)\n            analyzátorem pro Oracle SQL (fast), nebo pomocí\n            knihovny sqlparse (sqlparse); výchozí je sqlparse,\n            s přepínačem --deps-only fast\n  --statement N\n            zpracuje pouze N-tý SQL příkaz ze souboru (číslováno\n            od 1); lze zadat opakovaně\n  --with-block NAZEV\n            zpracuje pouze SQL příkazy, které v části WITH obsahují\n            blok daného názvu; lze zadat opakovaně\n  --focus NAZEV\n            zpracuje pouze blok daného názvu z části WITH a bloky\n            (příp. hlavní část příkazu), které jsou od něj vzdáleny\n            nejvýše K vazeb proti směru i po směru závislostí;\n            odkazované bloky mimo toto okolí nejsou zpracovány\n            a ve výstupu jsou uvedeny zvlášť (nikoliv jako tabulky\n            z DB)\n  --depth K\n            vzdálenost pro --focus (výchozí hodnota: 1)\n  --timeout SEKUNDY\n            časový limit pro zpracování jednoho SQL příkazu\n  --max-memory MB\n            paměťový limit pro zpracování jednoho SQL příkazu\n            (sledování spotřeby paměti zpracování zpomaluje)\n  SOUBOR    cesta k souboru s SQL dotazem\n  KODOVANI  kódování, které má být použito při čtení souboru\n            (ansi, cp1250, utf-8, utf-8-sig apod.)\n")
+        os._exit(1)  # sys.exit(1) vyvola dalsi vyjimku (SystemExit)!
+
+        # # DEBUG
         # write_debug_output = True
         # source_sql = "./test-files/Ankety_Podil_odpovedi_po_programech.sql"
         # # encoding = "utf-8"
@@ -2396,16 +4487,40 @@ if __name__ == "__main__":
         # # encoding = "ansi"
         # # encoding = "cp1250"  # windows-1250
 
+    if fast_engine == None:
+        # Pri zjistovani pouze zavislosti (bez seskupovani tokenu) tvori lexikalni analyza vetsinu doby zpracovani, pouzijeme tedy rychlejsi vlastni analyzator (vraci stejny proud tokenu jako sqlparse, viz FastLexer)
+        fast_engine = deps_only
     exit_code = 0
     fTxt = None
     fDia = None
     fNamePrefix = source_sql[:-4]
-    warnings = []
-    # BUG: pokud je slovo "result" pouzito jako nazev bloku ve WITH, ve vyctu v SELECT, FROM, JOIN, prip. v jinem podobnem kontextu, dojde vlivem chyby v sqlparse k umelemu rozdeleni tokenu a jinak funkcni algoritmus tedy selze. Vytvorime si tedy slovnik znamych problematickych vyrazu, ktere pred zpracovanim SQL kodu nahradime nahodne generovanymi retezci. Po zpracovani zase ve vytvorenych vystupech vse nahradime zpet (vzdy hromadne, jelikoz i konflikt s XML strukturou .dia je nepravdepodobny). Skutecnost, ze tak ztratime informaci o malych/velkych pismenech (tedy ze napr. "result", "Result", "RESULT" apod. budou ve vystupech oznacovany pouze jako "result"), neni uplne podstatna.
+    # Vsechny prikazy souboru zpracujeme v jedine relaci zpracovani (tabulky, varovani apod. viz ParseSession)
+    session = ParseSession()
+    session.__enter__()
+    if write_debug_output:
+        session.token_counts = {}
+    # Pocty preskocenych prikazu podle druhu (viz get_skipped_statement_kind(...))
+    skipped_statements = {}
+    # Pocty zpracovanych a vsech bloku ve WITH v prikazech s blokem focus_name (viz focus_statement(...))
+    focus_blocks = [0, 0]
+    # Stav zpracovani jednotlivych prikazu (viz write_statement_report(...)) a popisy chyb
+    statement_report = []
+    errors = []
+    # Poradova cisla nactenych prikazu ve zdrojovem souboru (pouze pri zpracovani vybranych prikazu)
+    statement_numbers = None
+    session.budget.set_limits(time_limit, memory_limit)
     try:
         print()
-        with open(source_sql, mode="r", encoding=encoding) as file:
-            query = "".join(file.readlines())
+        if focus_name != None and not plsql:
+            # Staci nacist pouze prikazy, ktere blok focus_name obsahuji
+            selected_with_blocks.append(focus_name)
+        if len(selected_statements) > 0 or len(selected_with_blocks) > 0:
+            # Pomoci indexu prikazu (pri prvnim pouziti je vytvoren a ulozen vedle zdrojoveho souboru) nacteme pouze pozadovane prikazy
+            (query, statement_numbers) = select_statements(source_sql, encoding, selected_statements, selected_with_blocks)
+            stream_statements = False
+        elif not stream_statements or plsql:
+            with open(source_sql, mode="r", encoding=encoding) as file:
+                query = "".join(file.readlines())
 
         # VYPSANI PUVODNIHO DOTAZU V PREFORMATOVANEM STAVU -- POZOR: FORMATOVANI SLOZITEJSICH SQL DOTAZU MNOHDY TRVA DELSI DOBU!
         # S komentari neni idealni (nektera zalomeni radku jsou orezana apod.)
@@ -2418,176 +4533,127 @@ if __name__ == "__main__":
             fTxt = open(fNamePrefix + "_vystup.txt", mode="w", encoding="utf-8")
             # fTxt.write(formatted_sql + "\n")
 
-        # Pred analyzou SQL kodu musime provest nahradu problematickych vyrazu. Nektere upravime jen kosmeticky (ale tak, ze se tim vyhneme problemum s parserem), jine je potreba nahradit nahodnymi retezci. Nejprve vyresime kosmeticke zmeny, pote stejny slovnik (replacements) vycistime a pouzijeme ho pro ulozeni docasnych nahrad. Zde na zacatku slovnik vyplnime problematickymi vyrazy, jako hodnotu lze ulozit pripadny nutny prefix nahodneho retezce. Potrebujeme, aby:
-        #   * nahradni retezce byly ruzne,
-        #   * v zadnem z nich se nevyskytoval lib. z puvodnich problematickych vyrazu a
-        #   * zadny z nich nebyl v puvodnim SQL kodu (bez ohledu na velikost pismen).
-        # Pro snazsi kontrolu si budeme generovane nahradni retezce ukladat do kolekce generated_r_strs.
-        # Kompletni zachovani velikosti pismen je zarizno pomoci metody replace_keep_case(...), kde jsou velikosti pismen v nahradnim retezci nastaveny podle velikosti pismen v puvodnim vyrazu.
-        # (a) Kosmeticke upravy (zavorku v klici je nutno escapovat, jelikoz hledame pomoci regularnich vyrazu!)
-        replacements = {}
-        # Nektere funkce potrebujeme bez mezery mezi nazvem a pocatecni zavorkou, coz bude vyzadovat vice ruznych nahrad (nelze resit pomoc nahrad "celych slov"). Pro usnadneni situace si budeme takove nazvy funkci ukladat do specialni kolekce a vsechny potrebne nahrady pak pridame hromadne.
-        fcns_no_space = []
-        # Podobne musi byt za nekterymi klicovymi slovy a hinty vzdy mezera
-        kws_space = []
-        hints_space = []
-        # Nezlomitelne mezery nahradime standardnimi mezerami
-        replacements["u\xa0"] = " "
-        # Za kazdym klicovym slovem OVER potrebujeme mezeru, abychom se vyhnuli dalsi zbytecne uprave kodu pro podchyceni pripadu "OVER(". Nelze ale nahrazovat cela slova (s "word boundary" na zacatk ua konci regex retezce), takze musime pro predejiti potizim nahrazovat retezec vc. pocatecni mezery (resp. \n, \t).
-        kws_space.append("over")
-        # Podobne vyresime hinty "use_hash" a "use_nl"
-        hints_space.append("use_hash")
-        hints_space.append("use_nl")
-        # COUNT(...), NVL(...), SUM(...) atd. musi byt bez mezery, jinak neni vraceno jako funkce, ale jako samostatne klicove slovo
-        fcns_no_space.append("count")
-        fcns_no_space.append("nvl")
-        fcns_no_space.append("sum")
-        fcns_no_space.append("max")
-        fcns_no_space.append("min")
-        fcns_no_space.append("to_date")
-        fcns_no_space.append("to_number")
-        # Operator NOT musi byt s mezerou na obou stranach -- cast vyresime jako bezne klicove slovo, zbytek ("," nebo "(" pred NOT) doresime primo zde rucne
-        kws_space.append("not")
-        replacements[",not\\("] = ", not ("
-        replacements["\\(not\\("] = "( not ("
-        # Nyni doresime funkce, kde nesmi byt mezera mezi nazvem a pocatecni zavorkou, a klicova slova, kde naopak mezera byt musi
-        for fcn in fcns_no_space:
-            replacements[f" {fcn} \\("] = f" {fcn}("
-            replacements[f"\\n{fcn} \\("] = f"\n{fcn}("
-            replacements[f"\\t{fcn} \\("] = f"\t{fcn}("
-            replacements[f",{fcn} \\("] = f", {fcn}("
-            replacements[f"\\({fcn} \\("] = f"( {fcn}("
-        for kw in kws_space:
-            replacements[f" {kw}\\("] = f" {kw} ("
-            replacements[f"\\n{kw}\\("] = f"\n{kw} ("
-            replacements[f"\\t{kw}\\("] = f"\t{kw} ("
-        for hint in hints_space:
-            replacements[f"\\+{hint}\\("] = f"+ {hint} ("
-            replacements[f" {hint}\\("] = f" {hint} ("
-            replacements[f"\\n{hint}\\("] = f"\n{hint} ("
-            replacements[f"\\t{hint}\\("] = f"\t{hint} ("
-        # Za kazdou uzaviraci zavorkou potrebujeme mezeru, abychom podchytili pripad "funkce()alias" (toto by cele bylo vraceno jako jmeno, alias by chybel)
-        replacements["\\)"] = ") "
-        # # Podobne, byt uz ciste z kosmetickych duvodu vzhledem k nahradam zavorek, upravime vyskyty carek.
-        # replacements["\\,"] = ", "
-        r_keys = replacements.keys()
-        for r_key in r_keys:
-            # Nahrazujeme libovolne vyskyty (tzn. bez ohledu na to, zda je shoda nalezena jako cele slovo)
-            query = replace_match_case(r_key, replacements[r_key], query, whole_words=False)
-
-        # (b) Docasne nahrady nahodnymi retezci, boolovska hodnota znaci, zda pozadujeme nahradu celych slov
-        replacements = {}
-        replacements["data"] = ("", True)
-        replacements["result"] = ("", True)
-        replacements["rownum"] = ("", True)
-        replacements["cmp"] = ("", True)
-        replacements["old"] = ("", True)
-        replacements["new"] = ("", True)
-        replacements["do"] = ("", True)
-        replacements["level"] = ("", True)
-        replacements["table_name"] = ("", True)
-        replacements["&&"] = (":", False)  # | Zde nas zachovani malych/velkych pismen netrapi, jelikoz nahrazujeme
-        replacements["&"] = (":", False)   # | pouze ampersandy (napr. "&data" --> ":RANDOMSTRINGdata")
-
-        # TODO: slo by takto vyresit i bug "within group"? (vyzadovalo by ale regex klic atd., jelikoz mezi slovy mohou byt bile znaky!)
-
-        # BUG: sqlparse neumi korektne zpracovat kod, kde se napr. jako literal (nebo jeho cast) vyskytuje "\". Ackoliv by nahrada pomoci reg. vyrazu "jednim smerem" (nutno escapovat: "\\\\" --> RANDOMSTRING) fungovala dobre, pri zpetne nahrade bychom dle ocekavani dostali "\\". Vec tedy vyresime tak, ze po provedeni pocatecnich nahrad zmenime klic u tohoto posledniho objektu na "\\".
-        replacements["\\\\"] = ("", False)
-        lc_query = query.lower()
-        generated_r_strs = []
-        r_keys = replacements.keys()
-        for r_key in r_keys:
-            (prefix, whole_words) = replacements[r_key]
-            while True:
-                # Potrebujeme retezec dost dlouhy na to, abychom nahodou nevygenerovali klicove slovo apod. (24 znaku by snad melo stacit). Zaroven musi jeho delka byt prinejmensim takova, jako delka puvodniho vyrazu, aby bylo mozne kompletne zachovat velikosti pismen. Pred nahodny retezec musime pridat prefix ulozeny ve slovniku replacements!
-                r_str = prefix + get_random_string(max(24, len(r_key)))
-                if r_str in generated_r_strs or r_str in lc_query:
-                    continue
-                key_in_r_str = False
-                for rk in r_keys:
-                    if rk in r_str:
-                        key_in_r_str = True
-                        break
-                if not key_in_r_str:
-                    generated_r_strs.append(r_str)
-                    replacements[r_key] = (r_str, whole_words)
-                    break
-        # Nahradni retezce jsou nachystane, upravime obsah promenne query
-        for r_key in r_keys:
-            # Bezny string neumi case-insensitive nahrady --> musime provest pomoci modulu re
-            (r_str, whole_words) = replacements[r_key]
-            query = replace_match_case(r_key, r_str, query, whole_words=whole_words)
-        # Opravime klic (escapovana zpetna lomitka) u patricneho zaznamu ve slovniku nahrad, aby korektne fungovala i zpetna nahrada
-        replacements["\\"] = replacements.pop("\\\\")
-
-        # Nyni muzeme zacit parsovat
-        statements = parse(query, encoding=encoding)
-        for s in statements:
-            process_statement(s)
-        
+        # Prikazy nejprve pouze rozdelime (bez seskupovani tokenu), abychom mohli levne preskocit prikazy, ze kterych nemohou vzniknout zadne tabulky. Casove narocne seskupovani tokenu (stejne jako v sqlparse.parse(...)) provadime az u zbylych prikazu.
+        if plsql:
+            # Z PL/SQL kodu zpracujeme pouze vnorene dotazy (zbytek kodu se do tabulek prevest neda)
+            if fast_engine:
+                replacements, r_tag = {}, get_random_string(8)
+                tokens = FastLexer.get_tokens(query)
+            else:
+                query, replacements, r_tag = preprocess_query(query)
+                tokens = lexer.tokenize(query, encoding)
+            statements = extract_plsql_queries(tokens)
+        elif stream_statements:
+            # Soubor cteme a parsujeme postupne, tokeny jsou tak v pameti vzdy jen pro prave zpracovavany prikaz (nahrady problematickych vyrazu jsou provadeny prubezne). Text zpracovanych prikazu zustava v pameti kvuli SQL kodu tabulek (viz SourceBuffer).
+            if fast_engine:
+                # Vlastni lexikalni analyzator zadne nahrady nepotrebuje (znacku potrebujeme jen pro pripadne nahrady seznamu v collapse_in_lists(...))
+                engine, replacements, r_tag = None, {}, get_random_string(8)
+            else:
+                engine, replacements, r_tag = preprocess_file(source_sql, encoding)
+            statements = parse_file(source_sql, encoding, engine, group_tokens=False)
+        elif fast_engine:
+            # Vlastni lexikalni analyzator problematicke vyrazy rozpozna sam, zadne nahrady tedy nejsou potreba (znacku potrebujeme jen pro pripadne nahrady seznamu v collapse_in_lists(...))
+            replacements, r_tag = {}, get_random_string(8)
+            statements = StatementSplitter().process(FastLexer.get_tokens(query))
+        else:
+            # Pred analyzou SQL kodu musime provest nahradu problematickych vyrazu (kosmeticke upravy + docasne nahrady nahodnymi retezci)
+            query, replacements, r_tag = preprocess_query(query)
+
+            # Nyni muzeme zacit parsovat
+            statements = StatementSplitter().process(lexer.tokenize(query, encoding))
+        if not plsql:
+            # Prikazy mimo PL/SQL kod nemaji zadny nazev procedury ani cislo radku
+            statements = ((s, None, None) for s in statements)
+        for (n, (s, label, line)) in enumerate(statements):
+            # U vybranych prikazu pouzijeme jejich poradove cislo ve zdrojovem souboru (vnorene dotazy z PL/SQL kodu cislujeme postupne, jsou popsany nazvem procedury a cislem radku)
+            statement_number = statement_numbers[n] if statement_numbers != None and not plsql and n < len(statement_numbers) else n + 1
+            first_table = len(session.tables)
+            kind = get_skipped_statement_kind(s)
+            if kind != None:
+                skipped_statements[kind] = skipped_statements.get(kind, 0) + 1
+                statement_report.append({"statement": statement_number, "status": "skipped", "kind": kind})
+                continue
+            # Kazdy prikaz zpracovavame samostatne (s pripadnym casovym a pametovym limitem), takze chyba v jednom prikazu neznehodnoti vysledky zpracovani ostatnich prikazu
+            status = {"statement": statement_number, "status": "ok"}
+            if label != None:
+                status["label"] = label
+                status["line"] = line
+            state = session.save_state()
+            tokens = list(s.tokens)
+            started = time.perf_counter()
+            session.budget.start()
+            try:
+                # Dlouhe seznamy literalu v "IN (...)" nahradime jedinym tokenem (jinak by zbytecne zpomalovaly seskupovani i zpracovani podminek; pri zjistovani pouze zavislosti se tokeny neseskupuji ani podminky nezpracovavaji)
+                if not deps_only:
+                    s = collapse_in_lists(s, replacements, r_tag)
+                if focus_name != None:
+                    # Z prikazu ponechame pouze blok focus_name a jeho okoli (az po seskupeni tokenu by to bylo zbytecne drahe)
+                    (focused, kept, count, stubs) = focus_statement(s, focus_name, focus_depth)
+                    if focused == None:
+                        # Prikaz bez bloku focus_name preskocime, ve stavu zpracovani jej ale uvedeme (aby stav odpovidal prikazum ve zdrojovem souboru)
+                        status["status"] = "skipped"
+                        status["kind"] = "focus"
+                        statement_report.append(status)
+                        continue
+                    s = focused
+                    focus_blocks[0] += kept
+                    focus_blocks[1] += count
+                # Seskupeni tokenu meni primo seznam s.tokens, pro pripadne nahradni zpracovani si tedy ponechame kopii neseskupenych tokenu
+                tokens = list(s.tokens)
+                if deps_only:
+                    # Pro zjisteni zavislosti staci neseskupene tokeny
+                    process_statement_dependencies(s)
+                elif chunked:
+                    run_steps(process_statement(group_statement_by_with_elements(s)))
+                else:
+                    run_steps(process_statement(grouping.group(s)))
+                if focus_name != None:
+                    mark_with_stubs(first_table, stubs)
+            except Exception as e:
+                session.budget.stop()
+                status["status"] = e.kind if isinstance(e, StatementBudgetExceeded) else "error"
+                status["error"] = str(e)
+                print(f"\nSQL PŘÍKAZ Č. {statement_number} SE NEPODAŘILO ZPRACOVAT:\n\n" + traceback.format_exc())
+                errors.append(f"SQL příkaz č. {statement_number}:\n{traceback.format_exc()}")
+                # Odvolame vse, co bylo z prikazu dosud vytvoreno, a z neseskupenych tokenu zjistime alespon nazvy bloku ve WITH
+                session.restore_state(state)
+                status["with_blocks"] = add_with_tables_by_names(tokens, f"Příkaz č. {statement_number} se nepodařilo zpracovat ({status['status']})")
+            finally:
+                session.budget.stop()
+            status["seconds"] = round(time.perf_counter() - started, 3)
+            status["tables"] = len(session.tables) - first_table
+            statement_report.append(status)
+            if label != None:
+                label_plsql_tables(first_table, label, line)
+
+        # Stav zpracovani jednotlivych prikazu ulozime ve strojove citelne podobe
+        write_statement_report(fNamePrefix + "_stav.json", source_sql, statement_report)
+
+        if focus_name != None and focus_blocks[1] == 0:
+            raise Exception(f"Ve zdrojovém SQL souboru nebyl nalezen blok \"{focus_name}\" v části WITH")
+
         # Po zpracovani kodu je nutne provest zpetnou nahradu vsech drive nahrazenych problematickych vyrazu
-        for r_key in replacements.keys():
-            (r_str, whole_words) = replacements[r_key]
-            for table in Table.__tables__:
-                # Jmeno
-                table.name = replace_match_case(r_str, r_key, table.name, whole_words=whole_words)
-                # Aliasy (nutno iterovat pomoci indexu!)
-                for key in table.statement_aliases.keys():
-                    aliases = table.statement_aliases[key]
-                    for i in range(len(aliases)):
-                        aliases[i] = replace_match_case(r_str, r_key, aliases[i], whole_words=whole_words)
-                # Atributy
-                for attr in table.attributes:
-                    # Jmeno
-                    attr.name = replace_match_case(r_str, r_key, attr.name, whole_words=whole_words)
-                    # Kratke jmeno
-                    if attr.short_name != None:
-                        attr.short_name = replace_match_case(r_str, r_key, attr.short_name, whole_words=whole_words)
-                    # Alias
-                    if attr.alias != None:
-                        attr.alias = replace_match_case(r_str, r_key, attr.alias, whole_words=whole_words)
-                    # # Podminky nemusime u standardnich atributu vubec resit, protoze je vzdy None
-                    # if attr.condition != None:
-                    #     attr.condition = replace_keep_case(repl_str, repl_key, attr.condition)
-                    # Komentar
-                    if attr.comment != None:
-                        attr.comment = replace_match_case(r_str, r_key, attr.comment, whole_words=whole_words)
-                # Podminky
-                for attr in table.conditions:
-                    attr.name = replace_match_case(r_str, r_key, attr.name, whole_words=whole_words)
-                    if attr.short_name != None:
-                        attr.short_name = replace_match_case(r_str, r_key, attr.short_name, whole_words=whole_words)
-                    if attr.alias != None:
-                        attr.alias = replace_match_case(r_str, r_key, attr.alias, whole_words=whole_words)
-                    if attr.condition != None:
-                        attr.condition = replace_match_case(r_str, r_key, attr.condition, whole_words=whole_words)
-                    if attr.comment != None:
-                        attr.comment = replace_match_case(r_str, r_key, attr.comment, whole_words=whole_words)
-                # Bindovane promenne (nutno iterovat pomoci indexu!)
-                for i in range(len(table.used_bind_vars)):
-                    # Pred nahradou zpet musime nejprve pridat ":" a potom zase ":" (prip. jeden ci dva "&") zase odebrat!
-                    bind_var = ":" + table.used_bind_vars[i]
-                    bind_var = replace_match_case(r_str, r_key, bind_var, whole_words=whole_words)
-                    while bind_var.startswith(":") or bind_var.startswith("&"):
-                        bind_var = bind_var[1:]
-                    table.used_bind_vars[i] = bind_var
-                # Komentar
-                if table.comment != None:
-                    table.comment = replace_match_case(r_str, r_key, table.comment, whole_words=whole_words)
-                # Zdrojovy kod
-                if table.source_sql != None:
-                    table.source_sql = replace_match_case(r_str, r_key, table.source_sql, whole_words=whole_words)
+        restore_replacements(replacements, r_tag)
 
         # Byla v kodu nalezena alespon jedna tabulka? Pokud ne, vypiseme chybu pomoci vyjimky
-        if len(Table.__tables__) == 0:
+        if len(session.tables) == 0:
             raise Exception("Ve zdrojovem SQL souboru nebyla nalezena žádná tabulka")
 
+        # Zavislosti mezi bloky z WITH (prip. SELECTy na nejvyssi urovni) zjistime jednorazove pro vsechny dalsi vystupy
+        graph = DependencyGraph(session.tables)
+        if reduce_edges:
+            # Nadbytecne vazby (vyplyvajici z jinych vazeb) by u rozsahlych dotazu zbytecne zahltily diagram
+            removed_edges = graph.reduce()
+
         # Vypiseme textovou reprezentaci tabulek
         std_table_collection = []
-        for table in Table.__tables__:
-            # Jmena tabulek z DB si pouze ulozime do kolekce pro potreby pozdejsiho vypisu seznamu
+        stub_table_collection = []
+        for table in session.tables:
+            # Jmena tabulek z DB si pouze ulozime do kolekce pro potreby pozdejsiho vypisu seznamu (odkazovane bloky z WITH mimo okoli bloku focus_name vypiseme zvlast)
             if table.table_type == Table.STANDARD_TABLE:
                 std_table_collection.append(f"    * {table.name}")
+            elif table.table_type == Table.WITH_STUB:
+                stub_table_collection.append(f"    * {table.name}")
             if write_debug_output:
                 output = f"{table}\n"
                 # # DEBUG: vypisy zatim zakazeme, aby slo lepe sledovat potencialne problematicka klicova slova
@@ -2602,9 +4668,50 @@ if __name__ == "__main__":
             output = "\nTento SQL dotaz používá následující tabulky z DB:\n" + "\n".join(std_table_collection) + "\n"
         else:
             output = "\nTento SQL dotaz nepoužívá žádné tabulky z DB.\n"
+        if len(stub_table_collection) > 0:
+            stub_table_collection.sort()
+            output += "\nOdkazované bloky z části WITH mimo zpracované okolí bloku (nejde o tabulky z DB):\n" + "\n".join(stub_table_collection) + "\n"
         print(output)
         if write_debug_output:
             fTxt.write(output)
+        # Pripadne preskocene prikazy (bez dotazu) vypiseme souhrnne podle druhu
+        if len(skipped_statements) > 0:
+            output = "Přeskočené SQL příkazy (neobsahují dotaz):\n" + "\n".join(f"    * {kind}: {skipped_statements[kind]}" for kind in sorted(skipped_statements.keys())) + "\n"
+            print(output)
+            if write_debug_output:
+                fTxt.write(output)
+        # Prikazy, ktere se nepodarilo zpracovat, vypiseme souhrnne (podrobnosti jsou v *_stav.json)
+        failed = [status for status in statement_report if not status["status"] in ["ok", "skipped"]]
+        if len(failed) > 0:
+            output = "Nezpracované SQL příkazy (chyba, příp. překročení časového či paměťového limitu; z části WITH jsou převzaty pouze názvy bloků):\n" + "\n".join(f"    * příkaz č. {status['statement']}: {status['status']}" for status in failed) + "\n"
+            print(output)
+            if write_debug_output:
+                fTxt.write(output)
+        # Pri zpracovani okoli jednoho bloku vypiseme, kolik bloku ve WITH bylo skutecne zpracovano
+        if focus_name != None:
+            output = f"Zpracované bloky z části WITH (blok \"{focus_name}\" a jeho okolí do vzdálenosti {focus_depth}): {focus_blocks[0]} z {focus_blocks[1]}\n"
+            print(output)
+            if write_debug_output:
+                fTxt.write(output)
+        # Cyklicke zavislosti bloku (typicky rekurzivni bloky z WITH) vypiseme souhrnne
+        if len(graph.cycles) > 0:
+            output = "Cyklické závislosti bloků (např. rekurzivní bloky z části WITH):\n" + "\n".join("    * " + (" -> ".join([Table.get_table_by_id(cycle[0]).name] * 2) if len(cycle) == 1 else ", ".join(Table.get_table_by_id(id).name for id in cycle)) for cycle in graph.cycles) + "\n"
+            print(output)
+            if write_debug_output:
+                fTxt.write(output)
+        # Pri tranzitivni redukci vypiseme, kolik vazeb bylo vynechano
+        if reduce_edges:
+            output = f"Vynechané nadbytečné vazby mezi bloky (vyplývají z jiných vazeb): {removed_edges}\n"
+            print(output)
+            if write_debug_output:
+                fTxt.write(output)
+        # DEBUG: poradi bloku podle zavislosti (kazdy blok je uveden az za bloky, na kterych zavisi)
+        if write_debug_output and len(graph.order) > 0:
+            fTxt.write("\nPořadí bloků podle závislostí:\n" + "\n".join(f"    * {Table.get_table_by_id(id).name} (ID {id})" for id in graph.order) + "\n")
+        # DEBUG: pocty tokenu podle zpusobu zpracovani v process_statement(...) (vhodne pro hledani "horkych" mist pri zpracovani rozsahlych dotazu)
+        if session.token_counts != None and len(session.token_counts) > 0:
+            names = sorted(session.token_counts, key=lambda name: -session.token_counts[name])
+            fTxt.write("\nPočty zpracovaných tokenů podle obsluhy:\n" + "\n".join(f"    * {name}: {session.token_counts[name]}" for name in names) + "\n")
 
         # # Bloky a vazby mezi nimi ulozime v XML formatu kompatibilnim s aplikaci Dia ( https://wiki.gnome.org/Apps/Dia )
         header = ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
@@ -2710,13 +4817,7 @@ if __name__ == "__main__":
         dx = w + 3
         dy = h + 3
 
-        # Budeme vykreslovat pouze tabulky z WITH/SELECT na nejvyssi urovni. Aby bylo mozne spravne pridat zavislosti, musime nejprve u kazde takove tabulky zjistit, jestli "oklikou" (pres mezi-tabulku/y) nezavisi na jine tabulce z WITH. Takove zavislosti si opet ulozime do slovniku, kde klicem bude ID tabulky a hodnotou seznam ID navazanych tabulek.
-        primary_linked_ids = {}
-        for table in Table.__tables__:
-            # Zavislosti budeme hledat vyhradne u tabulek z WITH bloku
-            if (table.table_type == Table.WITH_TABLE
-                    or table.table_type == Table.MAIN_SELECT):
-                primary_linked_ids[table.id] = get_primary_linked_ids(table, path=[])
+        # Budeme vykreslovat pouze tabulky z WITH/SELECT na nejvyssi urovni, zavislosti mezi nimi (i ty vedouci "oklikou" pres mezi-tabulky) jsou jiz spocteny v grafu zavislosti
 
         # Nyni muzeme zacit "sazet" bloky na (jedinou) vrstvu v diagramu. Kod bloku budeme skladat postupne jako kolekci (aby slo snadno pouzivat f-strings) a az nakonec vse sloucime a zapiseme do souboru. Propojeni bloku pridame az pote, co budou veskere bloky v XML (k tomu si budeme do block_pos ukladat ID tabulek a jim odpovidajici pozice bloku).
         block_pos = {}
@@ -2725,7 +4826,7 @@ if __name__ == "__main__":
         table_id_to_obj_id = {}
         # Index nasl. bloku pouzivany pri rozmistovani na "radku"
         i = 0
-        for table in Table.__tables__:
+        for table in session.tables:
             # Preskocime vsechny tabulky, ktere nejsou primo z WITH bloku/SELECTy na nejvyssi urovni
             if (table.table_type != Table.WITH_TABLE
                     and table.table_type != Table.MAIN_SELECT):
@@ -2854,11 +4955,9 @@ if __name__ == "__main__":
             # Podkomentar (ulozime pouze v pripade, ze existuje)
             if table.subcomment != None and len(table.subcomment) > 0:
                 code.append(generateDiaBlockAttrCode("Podkomentář", text_to_dia(table.subcomment)))
-            # Aliasy (ulozime pouze v pripade, ze existuje alespon jeden)
+            # Aliasy (ulozime pouze v pripade, ze existuje alespon jeden; jsou serazene podle abecedy)
             aliases = Table.get_all_known_aliases(table.id)
             if len(aliases) > 0:
-                # Aliasy chceme mit serazene podle abecedy
-                aliases.sort()
                 code.append(generateDiaBlockAttrCode("Aliasy", ", ".join(aliases)))
             # Atributy
             if len(table.attributes) > 0:
@@ -2874,11 +4973,10 @@ if __name__ == "__main__":
                 code.append(generateDiaBlockAttrCode("Sloupce", "\n".join(attributes)))
             # Bindovane promenne
             if table.uses_bind_vars():
-                table.used_bind_vars.sort()
-                code.append(generateDiaBlockAttrCode("Bindované proměnné", ", ".join(table.used_bind_vars)))
+                code.append(generateDiaBlockAttrCode("Bindované proměnné", ", ".join(sorted(table.used_bind_vars))))
             # SQL kod
-            if table.source_sql != None and len(table.source_sql) > 0:
-                code.append(generateDiaBlockAttrCode("SQL kód", table.source_sql))
+            if table.source_sql_is_set():
+                code.append(generateDiaBlockAttrCode("SQL kód", table.get_source_sql()))
             code.append(("      </dia:attribute>\n"
                          "      <dia:attribute name=\"operations\"/>\n"
                          "      <dia:attribute name=\"template\">\n"
@@ -2898,13 +4996,13 @@ if __name__ == "__main__":
                 y += dy
 
         # Po vlozeni vsech bloku muzeme pridat propojeni mezi nimi (priblizne souradnice budeme dopocitavat na zaklade pozic bloku)
-        for table in Table.__tables__:
+        for table in session.tables:
             # Opet preskocime vsechny tabulky, ktere nejsou primo z WITH bloku/SELECTy na nejvyssi urovni
             if (table.table_type != Table.WITH_TABLE
                     and table.table_type != Table.MAIN_SELECT):
                 continue
             # Je tabulka navazana na alespon jednu jinou tabulkou?
-            table_linked_to_primary_ids = primary_linked_ids[table.id]
+            table_linked_to_primary_ids = graph.get_dependencies(table.id)
             if len(table_linked_to_primary_ids) > 0:
                 current_block_id = table_id_to_obj_id[table.id]
                 # Pozice akt. tabulky
@@ -2968,19 +5066,19 @@ if __name__ == "__main__":
         fDia.write(bytes(footer, "UTF-8"))
     except:
         print("\nDOŠLO K CHYBĚ:\n\n" + traceback.format_exc())
-
-        # DEBUG
-        if write_debug_output:
-            with open(fNamePrefix + "_CHYBA.txt", mode="w", encoding="utf-8") as error_file:
-                error_file.write(traceback.format_exc())
-
+        errors.append(traceback.format_exc())
         exit_code = 1
     finally:
         if fTxt != None:
             fTxt.close()
         if fDia != None:
             fDia.close()
-        if write_debug_output and len(warnings) > 0:
+        # DEBUG
+        if write_debug_output and len(errors) > 0:
+            with open(fNamePrefix + "_CHYBA.txt", mode="w", encoding="utf-8") as error_file:
+                error_file.write("\n".join(errors))
+        if write_debug_output and len(session.warnings) > 0:
             with open(fNamePrefix + "_VAROVANI.txt", mode="w", encoding="utf-8") as warning_file:
-                warning_file.write("".join(warnings))
+                warning_file.write("".join(session.warnings))
+        session.__exit__(None, None, None)
     os._exit(exit_code)  # sys.exit(exit_code) nelze s exit_code > 0 pouzit -- vyvola dalsi vyjimku (SystemExit)
@@ -0,0 +1,71 @@
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Skript sql2xml.py lezi v korenovem adresari repozitare, testy jej importuji jako modul
+sys.path.insert(0, ROOT)
+
+import sql2xml  # noqa: E402
+
+
+class ScriptResult:
+    """Vysledek spusteni skriptu sql2xml.py (navratovy kod, vystup na konzoli a obsah vytvorenych souboru)"""
+
+    def __init__(self, directory: str, base_name: str, completed: subprocess.CompletedProcess):
+        self.returncode = completed.returncode
+        self.stdout = completed.stdout
+        self.__directory = directory
+        self.__base_name = base_name
+
+    def read(self, suffix: str) -> str:
+        """Vrati obsah vystupniho souboru se zadanou priponou (napr. "_vystup.txt", ".dia"), prip. None, pokud soubor neexistuje"""
+        path = os.path.join(self.__directory, self.__base_name + suffix)
+        if not os.path.exists(path):
+            return None
+        if suffix == ".dia":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return f.read()
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+
+@pytest.fixture
+def run_sql2xml(tmp_path):
+    """Vrati funkci, ktera v docasnem adresari spusti skript sql2xml.py nad zadanym SQL kodem (prip. kopii zadaneho souboru) s danymi prepinaci"""
+    counter = [0]
+
+    def run(*args, sql_text: str = None, sql_file: str = None, prep: str = "-do") -> ScriptResult:
+        counter[0] += 1
+        directory = tmp_path / f"run{counter[0]}"
+        directory.mkdir()
+        if sql_file != None:
+            base_name = os.path.splitext(os.path.basename(sql_file))[0]
+            shutil.copy(sql_file, directory / (base_name + ".sql"))
+        else:
+            base_name = "query"
+            (directory / "query.sql").write_text(sql_text, encoding="utf-8")
+        completed = subprocess.run([sys.executable, os.path.join(ROOT, "sql2xml.py"), prep, *args, base_name + ".sql", "utf-8"],
+                                   cwd=directory, capture_output=True, text=True, encoding="utf-8", timeout=300)
+        return ScriptResult(str(directory), base_name, completed)
+
+    return run
+
+
+@pytest.fixture
+def parse_sql():
+    """Vrati funkci, ktera zadany SQL kod zpracuje (bez zapisu vystupu na disk) v nove relaci zpracovani (prip. se zadanym skladem identifikatoru) a vrati tuto relaci"""
+
+    def parse(query: str, pool: sql2xml.InternPool = None) -> sql2xml.ParseSession:
+        with sql2xml.ParseSession(pool) as session:
+            for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(query)):
+                if sql2xml.get_skipped_statement_kind(s) == None:
+                    sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+        return session
+
+    return parse
@@ -0,0 +1,25 @@
+"""Testy zpracovani po blocich z casti WITH (prepinac --chunked), jehoz vysledek musi byt shodny se standardnim zpracovanim"""
+import os
+
+import pytest
+
+SAMPLE_QUERY = os.path.join(os.path.dirname(__file__), "..", "sample", "query.sql")
+
+# Statistika poctu zpracovanych tokenu se pri zpracovani po blocich lisi (prikaz je rozdelen na vice casti), do srovnani ji tedy nezahrnujeme
+TOKEN_COUNTS_HEADER = "Počty zpracovaných tokenů podle obsluhy:"
+
+
+def strip_token_counts(output: str) -> str:
+    return output.split(TOKEN_COUNTS_HEADER)[0]
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "fast"])
+def test_sample_query(run_sql2xml, engine):
+    normal = run_sql2xml("--engine", engine, sql_file=SAMPLE_QUERY)
+    chunked = run_sql2xml("--engine", engine, "--chunked", sql_file=SAMPLE_QUERY)
+    assert normal.returncode == 0, normal.stdout
+    assert chunked.returncode == 0, chunked.stdout
+    assert normal.read(".dia") != None
+    assert normal.stdout == chunked.stdout
+    assert strip_token_counts(chunked.read("_vystup.txt")) == strip_token_counts(normal.read("_vystup.txt"))
+    assert chunked.read(".dia") == normal.read(".dia")
@@ -0,0 +1,27 @@
+"""Testy nahrady dlouhych seznamu literalu v "IN (...)" (viz collapse_in_lists(...))"""
+import pytest
+
+# Polozky seznamu, ktere preprocess_query(...) docasne nahrazuje nahodnymi retezci ("data", zpetne lomitko)
+ITEMS = ["'data'", "'old\\x'", "'Level'"] + [str(i) for i in range(160)]
+IN_LIST = ", ".join(ITEMS)
+QUERY = f"SELECT a.x, a.y -- data\nFROM tab a\nWHERE a.x IN ({IN_LIST}) AND a.y = 'level'\n"
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "fast"])
+def test_in_list_restored(run_sql2xml, engine):
+    result = run_sql2xml("--engine", engine, sql_text=QUERY)
+    assert result.returncode == 0, result.stdout
+    output = result.read("_vystup.txt")
+    assert f"a.x IN ({IN_LIST}) AND a.y = 'level'" in output
+    # Vnorene nahradni retezce se nesmi objevit ani v diagramu
+    diagram = result.read(".dia")
+    assert "'data', 'old\\x', 'Level', 0, 1, 2" in diagram
+
+
+def test_same_in_lists_share_replacement(run_sql2xml):
+    query = f"SELECT a.x FROM tab a WHERE a.x IN ({IN_LIST}) OR a.y IN ({IN_LIST})\n"
+    result = run_sql2xml(sql_text=query)
+    assert result.returncode == 0, result.stdout
+    output = result.read("_vystup.txt")
+    # Druhy vyskyt seznamu je ve vypisu podminky zkracen, oba vyskyty vsak musi byt obnoveny
+    assert output.count("'data', 'old\\x', 'Level', 0, 1, 2") == 2
@@ -0,0 +1,111 @@
+"""Testy grafu zavislosti bloku z WITH a SELECTu na nejvyssi urovni (viz DependencyGraph)"""
+import random
+
+import sql2xml
+from sql2xml import Table
+
+
+def build_graph(edges: list, aux_names=()) -> tuple:
+    """Vytvori v nove relaci zpracovani tabulky z WITH (prip. mezi-tabulky s nazvy z aux_names) propojene zadanymi zavislostmi (dvojice nazvu) a vrati ntici (graf, slovnik ID tabulek podle nazvu)"""
+    ids = {}
+    with sql2xml.ParseSession() as session:
+        for edge in edges:
+            for name in edge:
+                if name not in ids:
+                    table = Table(name=name, table_type=Table.AUX_TABLE if name in aux_names else Table.WITH_TABLE)
+                    session.add_table(table)
+                    ids[name] = table.id
+        for (name, linked_name) in edges:
+            Table.get_table_by_id(ids[name]).link_to_table_id(ids[linked_name])
+        return sql2xml.DependencyGraph(session.tables), ids
+
+
+def get_edges(graph: sql2xml.DependencyGraph, ids: dict) -> set:
+    names = {id: name for (name, id) in ids.items()}
+    return {(names[id], names[linked_id]) for id in graph.dependencies for linked_id in graph.get_dependencies(id)}
+
+
+def test_dependencies_through_aux_tables():
+    (graph, ids) = build_graph([("a", "select-0"), ("select-0", "join-0"), ("join-0", "b"), ("a", "c")], aux_names=("select-0", "join-0"))
+    assert get_edges(graph, ids) == {("a", "b"), ("a", "c")}
+
+
+def test_topological_order():
+    (graph, ids) = build_graph([("main", "d"), ("d", "b"), ("d", "c"), ("b", "a"), ("c", "a")])
+    position = {id: n for (n, id) in enumerate(graph.order)}
+    # Kazdy uzel je uveden az za vsemi uzly, na kterych zavisi
+    for (name, linked_name) in get_edges(graph, ids):
+        assert position[ids[linked_name]] < position[ids[name]]
+    assert graph.cycles == []
+
+
+def test_cycles():
+    # Cyklus x -> y -> z -> x, rekurzivni blok r (zavisi sam na sobe pres mezi-tabulku) a blok w zavisly na cyklu
+    (graph, ids) = build_graph([("x", "y"), ("y", "z"), ("z", "x"), ("r", "select-0"), ("select-0", "r"), ("w", "x"), ("w", "r")], aux_names=("select-0",))
+    assert sorted(sorted(cycle) for cycle in graph.cycles) == sorted([sorted([ids["x"], ids["y"], ids["z"]]), [ids["r"]]])
+    position = {id: n for (n, id) in enumerate(graph.order)}
+    assert position[ids["w"]] > max(position[ids["x"]], position[ids["y"]], position[ids["z"]], position[ids["r"]])
+
+
+def test_recursive_with_block(run_sql2xml):
+    query = "WITH r (n) AS (SELECT x.n FROM tab x WHERE EXISTS (SELECT 1 FROM r WHERE r.n = x.n))\nSELECT r.n FROM r;\n"
+    result = run_sql2xml(sql_text=query)
+    assert result.returncode == 0, result.stdout
+    assert "Cyklické závislosti bloků (např. rekurzivní bloky z části WITH):\n    * r -> r\n" in result.stdout
+
+
+def get_reachable(graph: sql2xml.DependencyGraph) -> dict:
+    """Vrati mnoziny uzlu dosazitelnych z jednotlivych uzlu grafu (prohledavani do hloubky po aktualnich zavislostech)"""
+    reachable = {}
+    for id in graph.dependencies:
+        reached = set()
+        stack = list(graph.get_dependencies(id))
+        while len(stack) > 0:
+            linked_id = stack.pop()
+            if linked_id not in reached:
+                reached.add(linked_id)
+                stack.extend(graph.get_dependencies(linked_id))
+        reachable[id] = reached
+    return reachable
+
+
+def test_reduce_diamond():
+    # a -> b -> d, a -> c -> d: prima zavislost a -> d je nadbytecna
+    (graph, ids) = build_graph([("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("a", "d")])
+    reachable = get_reachable(graph)
+    assert graph.reduce() == 1
+    assert get_edges(graph, ids) == {("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")}
+    assert get_reachable(graph) == reachable
+
+
+def test_reduce_cycle():
+    # Zavislosti uvnitr cyklu x <-> y ani zavislosti z do cyklu se neodebiraji, nadbytecna je pouze w -> x (x je dosazitelny pres z)
+    (graph, ids) = build_graph([("x", "y"), ("y", "x"), ("z", "x"), ("z", "y"), ("w", "z"), ("w", "x"), ("r", "select-0"), ("select-0", "r"), ("w", "r")],
+                               aux_names=("select-0",))
+    reachable = get_reachable(graph)
+    assert graph.reduce() == 1
+    assert get_edges(graph, ids) == {("x", "y"), ("y", "x"), ("z", "x"), ("z", "y"), ("w", "z"), ("r", "r"), ("w", "r")}
+    assert get_reachable(graph) == reachable
+
+
+def test_reduce_random_graphs():
+    generator = random.Random(2024)
+    for _ in range(50):
+        names = [f"b{n}" for n in range(12)]
+        edges = [(a, b) for a in names for b in names if a != b and generator.random() < 0.2]
+        (graph, ids) = build_graph(edges)
+        reachable = get_reachable(graph)
+        edge_count = len(get_edges(graph, ids))
+        removed = graph.reduce()
+        assert len(get_edges(graph, ids)) == edge_count - removed
+        # Redukce nemeni dosazitelnost a zadna zbyla zavislost A -> C nevede do uzlu dosazitelneho pres jinou zavislost A -> B, pokud B lezi mimo cyklus s A i s C
+        assert get_reachable(graph) == reachable
+
+        def same_component(a: int, b: int) -> bool:
+            return a == b or (a in reachable[b] and b in reachable[a])
+
+        for (id, linked_ids) in graph.dependencies.items():
+            for linked_id in linked_ids:
+                for other_id in linked_ids:
+                    if not (same_component(other_id, linked_id) or same_component(other_id, id) or same_component(id, linked_id)):
+                        assert linked_id not in reachable[other_id]
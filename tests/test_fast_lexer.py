@@ -0,0 +1,95 @@
+"""Diferencni testy lexikalniho analyzatoru FastLexer (--engine fast) proti lexeru knihovny sqlparse"""
+import glob
+import os
+import random
+import re
+
+import pytest
+
+import sql2xml
+from sql2xml import sql
+
+SAMPLE_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "sample", "*.sql")))
+
+# Hranicni pripady: slova slepena s cisly, "&" a "#" v ruznych kontextech, problematicka slova jako soucast jinych konstrukci apod.
+EDGE_CASES = [
+    "SELECT 1data, 2level, 1.5e3do, data1, 0x1frownum, 3 result, x1old FROM t",
+    "SELECT a # c\nFROM t #x, ## y, #>> z",
+    "SELECT a#b, #data, a#-b, 'x'#'y', @data FROM t # +hint\n",
+    "SELECT x &var, c &&v, &data, &&level FROM t WHERE a = &result",
+    "SELECT data.x, t.data, :data, :level, data$x, a#data FROM data",
+    "SELECT COUNT (*), count(x), Max (y), nvl (a, b), sum (c) over(PARTITION BY d) FROM t",
+    "SELECT /*+ use_hash(a) */ a.x FROM t a WHERE NOT(a.y = 1) AND b IN (1,not(2))",
+    "SELECT 'it''s \\ a -- string', \"quoted \"\" id\", '/* not a comment */' FROM dual -- c (x)\n",
+    "SELECT x\xa0FROM t WHERE level <= 3 CONNECT BY PRIOR id = parent_id",
+    "SELECT a FROM t /* unterminated comment",
+]
+
+# Slovnik pro generovani nahodnych fragmentu SQL kodu (bez zpetnych lomitek mimo retezce, viz test_backslash_outside_strings)
+VOCABULARY = ["SELECT", "FROM", "WHERE", " ", "\n", "\t", ",", "(", ")", "+", "-", "*", ".", ";", ":=", "::", "count", "COUNT", "nvl", "not", "over", "use_hash",
+              "data", "DATA", "result", "level", "rownum", "do", "old", "new", "cmp", "table_name", "&var", "&&var", ":bind", "x", "a1", "1", "1.5e3", "0x1f",
+              "'s'", "'it''s'", "\"q\"", "-- c (x) \n", "/* c ) not( */", "/*+ hint */", "--+ hint\n", "# c\n", "#x", "@v", "JOIN", "LEFT OUTER JOIN",
+              "ORDER  BY", "GROUP BY", "UNION ALL", "NULLS LAST", "END IF", "=", ">=", "!=", "||"]
+
+
+def get_sqlparse_tokens(text: str) -> tuple:
+    """Vrati tokeny lexeru sqlparse nad SQL kodem upravenym pomoci preprocess_query(...) s hodnotami po zpetne nahrade nahodnych retezcu a pouzite nahrady jako ntici (tokeny, slovnik nahrad, spolecna znacka nahradnich retezcu)"""
+    (query, replacements, r_tag) = sql2xml.preprocess_query(text)
+    engine = sql2xml.create_restore_engine(replacements)
+    return [(ttype, engine.apply(value) if r_tag in value.lower() else value) for (ttype, value) in sql2xml.lexer.tokenize(query)], replacements, r_tag
+
+
+def get_fast_tokens(text: str, replacements: dict, r_tag: str) -> list:
+    """Vrati tokeny analyzatoru FastLexer. Komentare a retezce FastLexer ponechava beze zmeny, zatimco v ceste pres sqlparse jsou v nich provedeny kosmeticke upravy SQL kodu, ty tedy pro srovnani provedeme i zde."""
+    rewrite = sql2xml.create_rewrite_engine(replacements)
+    restore = sql2xml.create_restore_engine(replacements)
+    tokens = []
+    for (ttype, value) in sql2xml.FastLexer.get_tokens(text):
+        if ttype in sql.T.Comment or ttype in sql.T.String:
+            value = rewrite.apply(value)
+            if r_tag in value.lower():
+                value = restore.apply(value)
+        tokens.append((ttype, value))
+    return tokens
+
+
+def assert_same_tokens(text: str) -> None:
+    # Typy tokenu musi byt shodne, hodnoty porovnavame bez ohledu na velikost pismen (kosmeticke upravy v ceste pres sqlparse nekdy zmeni velikost pismen prepisovanych nazvu funkci, napr. "Max (" --> "max(")
+    (tokens, replacements, r_tag) = get_sqlparse_tokens(text)
+    expected = [(ttype, value.lower()) for (ttype, value) in tokens]
+    actual = [(ttype, value.lower()) for (ttype, value) in get_fast_tokens(text, replacements, r_tag)]
+    assert actual == expected
+
+
+@pytest.mark.parametrize("file_name", SAMPLE_FILES, ids=os.path.basename)
+def test_sample_files(file_name):
+    with open(file_name, mode="r", encoding="utf-8") as file:
+        assert_same_tokens(file.read())
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_edge_cases(text):
+    assert_same_tokens(text)
+
+
+def test_random_fragments():
+    rng = random.Random(7)
+    for _ in range(300):
+        text = "".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 40)))
+        # "&" primo za slovem je zamernym rozdilem (viz test_ampersand_after_word)
+        if re.search("\\w&", text) == None:
+            assert_same_tokens(text)
+
+
+@pytest.mark.parametrize("text, placeholder", [("SELECT a&b FROM t", "&b"), ("SELECT y& z FROM t", "&")])
+def test_ampersand_after_word(text, placeholder):
+    # Zamerny rozdil: "&" primo za slovem sqlparse po nahrade (":RANDOMSTRING") nepovazuje za zastupny symbol a vrati dvojtecku s nahodnym retezcem, FastLexer vrati substitucni promennou
+    assert (sql.T.Name.Placeholder, placeholder) in list(sql2xml.FastLexer.get_tokens(text))
+    assert not (sql.T.Name.Placeholder, placeholder) in get_sqlparse_tokens(text)[0]
+
+
+def test_backslash_outside_strings():
+    # Zamerny rozdil: zpetne lomitko mimo retezce je v ceste pres sqlparse nahrazeno nahodnymi pismeny, ktera se slouci s okolnimi slovy (napr. "ORDER BY\\x" uz neni klicove slovo ORDER BY), FastLexer lomitko povazuje za soucast slova pouze tam, kde slovo zacina ci pokracuje
+    tokens = list(sql2xml.FastLexer.get_tokens("SELECT a FROM t ORDER BY\\x"))
+    assert (sql.T.Keyword, "ORDER BY") in tokens
+    assert (sql.T.Name, "\\x") in tokens
@@ -0,0 +1,63 @@
+"""Testy zpracovani okoli jedineho bloku z WITH (prepinac --focus, viz focus_statement(...))"""
+import json
+
+import pytest
+
+QUERY = """WITH a AS (SELECT t.x FROM db_tab t),
+-- komentar b
+b AS (SELECT a.x FROM a),
+c AS (SELECT b.x FROM b JOIN other_tab o ON o.x = b.x),
+d AS (SELECT c.x FROM c)
+SELECT d.x FROM d;
+"""
+
+DB_TABLES_HEADER = "Tento SQL dotaz používá následující tabulky z DB:"
+STUBS_HEADER = "Odkazované bloky z části WITH mimo zpracované okolí bloku (nejde o tabulky z DB):"
+
+
+def get_listing(stdout: str, header: str) -> list:
+    """Vrati polozky seznamu vypsaneho pod zadanym nadpisem"""
+    lines = stdout.split(header, 1)[1].split("\n")[1:]
+    items = []
+    for line in lines:
+        if not line.startswith("    * "):
+            break
+        items.append(line[len("    * "):])
+    return items
+
+
+@pytest.mark.parametrize("args", [[], ["--engine", "fast"], ["--chunked"], ["--deps-only"]])
+def test_out_of_focus_blocks_are_stubs(run_sql2xml, args):
+    result = run_sql2xml(*args, "--focus", "c", sql_text=QUERY)
+    assert result.returncode == 0, result.stdout
+    assert "(blok \"c\" a jeho okolí do vzdálenosti 1): 3 z 4" in result.stdout
+    # Blok "a" byl odebran, blok "b" na nej ale odkazuje -- nejde vsak o tabulku z DB (a tabulka "db_tab" z bloku "a" nebyla vubec zpracovana)
+    assert get_listing(result.stdout, DB_TABLES_HEADER) == ["other_tab"]
+    assert get_listing(result.stdout, STUBS_HEADER) == ["a"]
+    # V diagramu jsou pouze zpracovane bloky z WITH
+    diagram = result.read(".dia")
+    assert "#b#" in diagram and "#c#" in diagram and "#d#" in diagram
+    assert "#a#" not in diagram
+
+
+def test_stubs_not_listed_without_focus(run_sql2xml):
+    result = run_sql2xml(sql_text=QUERY)
+    assert result.returncode == 0, result.stdout
+    assert get_listing(result.stdout, DB_TABLES_HEADER) == ["db_tab", "other_tab"]
+    assert STUBS_HEADER not in result.stdout
+
+
+@pytest.mark.parametrize("args", [["--with-block", "q"], ["--plsql"]])
+def test_statements_without_focus_block_are_reported(run_sql2xml, args):
+    other_query = "WITH q AS (SELECT x.a FROM tab_x x) SELECT q.a FROM q"
+    if "--plsql" in args:
+        loops = [f"  FOR r IN ({q}) LOOP\n    NULL;\n  END LOOP;\n" for q in [other_query, QUERY.rstrip(";\n")]]
+        query = "BEGIN\n" + "".join(loops) + "END;\n/\n"
+    else:
+        query = other_query + ";\n" + QUERY
+    result = run_sql2xml(*args, "--focus", "c", sql_text=query)
+    assert result.returncode == 0, result.stdout
+    # Prikaz bez bloku "c" neni zpracovan, ve stavu zpracovani je ale uveden
+    statements = json.loads(result.read("_stav.json"))["statements"]
+    assert [(statement["status"], statement.get("kind")) for statement in statements] == [("skipped", "focus"), ("ok", None)]
+    assert "tab_x" not in get_listing(result.stdout, DB_TABLES_HEADER)
@@ -0,0 +1,57 @@
+"""Testy skladu identifikatoru sdileneho vice relacemi zpracovani (viz InternPool)"""
+import sql2xml
+from sql2xml import Table
+
+FIRST_QUERY = "SELECT t.amount, NVL(t.bonus, 0) + t.amount AS total, t.amount * 2 AS twice FROM sch.Orders t WHERE t.amount > 10;\n"
+SECOND_QUERY = "SELECT o.amount, SUM(o.amount * 2) AS total FROM (SELECT x.amount FROM SCH.ORDERS x) o;\n"
+
+
+def get_attributes(session: sql2xml.ParseSession, table_name: str) -> dict:
+    """Vrati atributy tabulky se zadanym jmenem podle jmena atributu"""
+    with session:
+        return {attribute.name: attribute for attribute in Table.get_table_by_name(table_name, None).attributes}
+
+
+def test_identifiers_are_shared_between_sessions(parse_sql):
+    pool = sql2xml.InternPool()
+    first = parse_sql(FIRST_QUERY, pool)
+    second = parse_sql(FIRST_QUERY, pool)
+    # Stejne identifikatory z ruznych relaci (a ruznych tokenu) jsou totozne objekty
+    first_attributes = get_attributes(first, "main-select-0")
+    second_attributes = get_attributes(second, "main-select-0")
+    assert first_attributes["t.amount"].name is second_attributes["t.amount"].name
+    assert first_attributes["t.amount"].short_name is second_attributes["t.amount"].short_name
+    assert first_attributes["NVL(t.bonus, 0) + t.amount"].alias is second_attributes["NVL(t.bonus, 0) + t.amount"].alias
+    assert first.tables[1].name is second.tables[1].name
+
+
+def test_only_identifiers_are_pooled(parse_sql):
+    pool = sql2xml.InternPool()
+    parse_sql(FIRST_QUERY, pool)
+    strings = dict(pool.strings)
+    table_keys = dict(pool.table_keys)
+    assert "t.amount" in strings and "sch.Orders" in strings and "total" in strings
+    # Vyrazy ani generovana jmena mezi-tabulek ve skladu nejsou
+    assert "NVL(t.bonus, 0) + t.amount" not in strings
+    assert "t.amount * 2" not in strings
+    assert "main-select-0" not in strings and "main-select-0" not in table_keys
+    # Opakovane zpracovani stejneho kodu uz sklad nezvetsi
+    parse_sql(FIRST_QUERY, pool)
+    assert pool.strings == strings and pool.table_keys == table_keys
+
+
+def test_lookups_with_shared_pool(parse_sql):
+    pool = sql2xml.InternPool()
+    parse_sql(FIRST_QUERY, pool)
+    session = parse_sql(SECOND_QUERY, pool)
+    with session:
+        # Tabulka z DB je v kazde relaci samostatna, jeji jmeno je vsak sdilene s predchozi relaci
+        orders = Table.get_table_by_name("sch.orders", None)
+        assert orders.name == "SCH.ORDERS" and orders.name is pool.strings["SCH.ORDERS"]
+        assert Table.get_table_by_id(orders.id) is orders
+        assert Table.get_table_by_name("orders", None) is orders
+        # Aliasy jsou dohledany v oboru platnosti tabulky, ve ktere byly uvedeny
+        subselect = Table.get_table_by_name("O", alias_table=session.tables[0])
+        assert subselect.name == "select-0" and Table.get_table_by_id(subselect.id) is subselect
+        assert Table.get_table_by_name("x", alias_table=subselect) is orders
+        assert Table.get_all_known_aliases(orders.id) == ["x"]
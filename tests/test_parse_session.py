@@ -0,0 +1,100 @@
+"""Testy oddeleni stavu jednotlivych prevodu (viz ParseSession)"""
+import os
+import threading
+
+import sql2xml
+
+SAMPLE_QUERY = os.path.join(os.path.dirname(__file__), "..", "sample", "query.sql")
+
+OTHER_QUERY = """WITH a AS (SELECT t.id, t.x FROM tab1 t JOIN tab2 u ON u.id = t.id),
+b AS (SELECT a.id, (SELECT MAX(v.y) FROM tab3 v WHERE v.id = a.id) AS m FROM a)
+SELECT b.id FROM b WHERE b.m > 0;
+"""
+
+
+def describe(session: sql2xml.ParseSession) -> list:
+    """Vrati popis vsech tabulek relace zpracovani (ID, nazev, typ, SQL kod a vazby), podle ktereho lze porovnat vysledky dvou prevodu"""
+    with session:
+        return [(table.id, table.name, table.table_type, table.get_source_sql(), list(table.linked_to_tables_id)) for table in session.tables]
+
+
+def test_sessions_do_not_share_tables(parse_sql):
+    first = parse_sql(OTHER_QUERY)
+    second = parse_sql(OTHER_QUERY)
+    # Kazda relace cisluje tabulky i sablony nazvu od zacatku a tabulky jine relace nevidi
+    assert describe(first) == describe(second)
+    assert first.tables[0].id == 0
+    with second:
+        assert sql2xml.Table.get_table_by_id(first.tables[-1].id) is second.tables[-1]
+
+
+def test_current_session_is_restored():
+    outer = sql2xml.ParseSession()
+    inner = sql2xml.ParseSession()
+    with outer:
+        with inner:
+            assert sql2xml.ParseSession.current() is inner
+        assert sql2xml.ParseSession.current() is outer
+
+
+def test_two_threads(parse_sql):
+    with open(SAMPLE_QUERY, encoding="utf-8") as file:
+        sample_query = file.read()
+    queries = [sample_query, OTHER_QUERY]
+    expected = [describe(parse_sql(query)) for query in queries]
+    # Obe vlakna zacnou zaroven a kazde zpracuje svuj dotaz opakovane, takze se zpracovani v obou vlaknech prekryvaji
+    barrier = threading.Barrier(len(queries))
+    results = [[] for query in queries]
+    errors = []
+
+    def run(n: int):
+        try:
+            barrier.wait(60)
+            for _ in range(5):
+                results[n].append(describe(parse_sql(queries[n])))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(len(queries))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    for n in range(len(queries)):
+        assert results[n] == [expected[n]] * 5
+
+
+def test_tables_by_id(parse_sql):
+    session = parse_sql(OTHER_QUERY)
+    with session:
+        # Index obsahuje kazdou tabulku kolekce (tabulka muze byt v kolekci vicekrat, vzdy jde ale o tentyz objekt)
+        assert sorted(session.tables_by_id.keys()) == sorted({table.id for table in session.tables})
+        for table in session.tables:
+            assert sql2xml.Table.get_table_by_id(table.id) is table
+        assert sql2xml.Table.get_table_by_id(session.next_id) == None
+        assert sql2xml.Table.get_table_by_id(-1) == None
+        assert sql2xml.Table.get_table_by_id(None) == None
+        # Vypis tabulky dohledava nazvy navazanych tabulek podle ID
+        main_select = session.tables[-1]
+        assert "b (ID " in str(main_select)
+
+
+def test_tables_by_id_after_restore_state(parse_sql):
+    session = parse_sql("SELECT t.a FROM tab1 t;\n")
+    with session:
+        kept = list(session.tables)
+        state = session.save_state()
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(OTHER_QUERY)):
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+        removed = session.tables[len(kept):]
+        assert all(sql2xml.Table.get_table_by_id(table.id) is table for table in removed)
+        # Odvolane tabulky z indexu zmizi, jejich ID jsou pouzita znovu pro nove tabulky
+        session.restore_state(state)
+        assert session.tables_by_id == {table.id: table for table in kept}
+        assert all(sql2xml.Table.get_table_by_id(table.id) == None for table in removed)
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize("SELECT u.b FROM tab2 u;\n")):
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+        added = session.tables[len(kept):]
+        assert [table.id for table in added] == [table.id for table in removed[:len(added)]]
+        assert all(sql2xml.Table.get_table_by_id(table.id) is table for table in session.tables)
@@ -0,0 +1,41 @@
+"""Testy zpracovani dotazu vnorenych v PL/SQL kodu (prepinac --plsql)"""
+import re
+
+import pytest
+
+PACKAGE_BODY = """CREATE OR REPLACE PACKAGE BODY pkg_test AS
+  CURSOR c_emp IS SELECT e.id, e.name FROM employees e WHERE e.active = 1;
+
+  PROCEDURE load_data(p_id IN NUMBER) IS
+    v_cnt NUMBER;
+  BEGIN
+    SELECT COUNT(*) INTO v_cnt FROM orders o WHERE o.emp_id = p_id;
+    IF v_cnt > 0 THEN
+      FOR r IN (SELECT d.id FROM departments d JOIN locations l ON l.id = d.loc_id) LOOP
+        NULL;
+      END LOOP;
+    END IF;
+  END load_data;
+
+  FUNCTION get_total RETURN NUMBER IS
+    v_total NUMBER;
+  BEGIN
+    WITH s AS (SELECT amount FROM sales)
+    SELECT SUM(amount) INTO v_total FROM s;
+    RETURN v_total;
+  END get_total;
+END pkg_test;
+/
+"""
+
+
+@pytest.mark.parametrize("engine", ["sqlparse", "fast"])
+def test_package_body(run_sql2xml, engine):
+    result = run_sql2xml("--plsql", "--engine", engine, sql_text=PACKAGE_BODY)
+    assert result.returncode == 0, result.stdout
+    output = result.read("_vystup.txt")
+    tables = re.findall(r"^TABULKA (\S+)", output, re.MULTILINE)
+    assert tables == ["pkg_test.c_emp-0", "employees", "pkg_test.load_data-0", "orders", "pkg_test.load_data-1", "departments", "locations", "join-0",
+                      "pkg_test.get_total.s", "sales", "pkg_test.get_total-0"]
+    # Hlavni SELECTy maji v komentari radek, na kterem dotaz v PL/SQL kodu zacina
+    assert re.findall(r"PL/SQL, řádek (\d+)", output) == ["2", "7", "9", "18"]
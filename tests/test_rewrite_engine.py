@@ -0,0 +1,156 @@
+"""Testy uprav SQL kodu pred parsovanim (viz RewriteEngine a create_rewrite_engine(...)) v porovnani s puvodnimi postupnymi nahradami pomoci re.sub(...) a zpetne nahrady nahradnich retezcu (viz restore_replacements(...))"""
+import random
+import re
+
+import pytest
+
+import sql2xml
+
+# Pevne nahradni retezce (misto nahodnych z create_replacements(...)), aby bylo mozne vystupy porovnavat
+REPLACEMENTS = {
+    "data": ("rdataxxxxxxxxxxxxxxxxxxx", True),
+    "result": ("rresultxxxxxxxxxxxxxxxxx", True),
+    "rownum": ("rrownumxxxxxxxxxxxxxxxxx", True),
+    "cmp": ("rcmpxxxxxxxxxxxxxxxxxxxx", True),
+    "old": ("roldxxxxxxxxxxxxxxxxxxxx", True),
+    "new": ("rnewxxxxxxxxxxxxxxxxxxxx", True),
+    "do": ("rdoxxxxxxxxxxxxxxxxxxxxx", True),
+    "level": ("rlevelxxxxxxxxxxxxxxxxxx", True),
+    "table_name": ("rtablenamexxxxxxxxxxxxxx", True),
+    "&&": (":rampampxxxxxxxxxxxxxxxxx", False),
+    "&": (":rampxxxxxxxxxxxxxxxxxxxx", False),
+    "\\": ("rbackslashxxxxxxxxxxxxxx", False),
+}
+
+
+def replace_match_case(old_str: str, new_str: str, text: str, whole_words=True) -> str:
+    """Puvodni nahrada regularniho vyrazu old_str se zachovanim velikosti pismen (viz match_case(...))"""
+    if whole_words:
+        old_str = "\\b" + old_str + "\\b"
+    return re.sub(old_str, lambda match: sql2xml.match_case(match.group(), new_str), text, flags=re.I)
+
+
+def rewrite_sequentially(query: str, replacements: dict) -> str:
+    """Puvodni upravy SQL kodu (kazda nahrada jednim pruchodem pres vystup predchozi nahrady)"""
+    cosmetic = {}
+    # Puvodne byl klic chybne "u\xa0" (nahrazeno bylo i predchazejici pismeno "u" a samostatne nezlomitelne mezery zustaly)
+    cosmetic["\xa0"] = " "
+    cosmetic[",not\\("] = ", not ("
+    cosmetic["\\(not\\("] = "( not ("
+    for fcn in ["count", "nvl", "sum", "max", "min", "to_date", "to_number"]:
+        cosmetic[f" {fcn} \\("] = f" {fcn}("
+        cosmetic[f"\\n{fcn} \\("] = f"\n{fcn}("
+        cosmetic[f"\\t{fcn} \\("] = f"\t{fcn}("
+        cosmetic[f",{fcn} \\("] = f", {fcn}("
+        cosmetic[f"\\({fcn} \\("] = f"( {fcn}("
+    for kw in ["over", "not"]:
+        cosmetic[f" {kw}\\("] = f" {kw} ("
+        cosmetic[f"\\n{kw}\\("] = f"\n{kw} ("
+        cosmetic[f"\\t{kw}\\("] = f"\t{kw} ("
+    for hint in ["use_hash", "use_nl"]:
+        cosmetic[f"\\+{hint}\\("] = f"+ {hint} ("
+        cosmetic[f" {hint}\\("] = f" {hint} ("
+        cosmetic[f"\\n{hint}\\("] = f"\n{hint} ("
+        cosmetic[f"\\t{hint}\\("] = f"\t{hint} ("
+    cosmetic["\\)"] = ") "
+    for r_key in cosmetic.keys():
+        query = replace_match_case(r_key, cosmetic[r_key], query, whole_words=False)
+    for r_key in replacements.keys():
+        (r_str, whole_words) = replacements[r_key]
+        query = replace_match_case(re.escape(r_key), r_str, query, whole_words=whole_words)
+    return query
+
+
+QUERIES = [
+    "SELECT COUNT (*), nvl (x,0),Sum (y), MAX\xa0(z), to_date\xa0('1.1.2000')\nFROM t WHERE NOT(a) AND x IN(1,not(b)) AND y=(Not(c))",
+    "select /*+use_hash(t) USE_NL(u)*/ Data, result, 'a\\b' x, f()alias, olD.new, do, Level, table_name, rownum, cmp FROM dual",
+    "\tcount (x)\n nvl (y)\tOVER( x,Count (z)(sum (q)\nOver(ORDER BY 1)",
+    "SELECT &&x, &data, a & b, x&&y FROM t",
+    "SELECT nodata, data_x, x_data, \"DATA\" FROM t",
+    "SELECT flu\xa0FROM\xa0t",
+    "SELECT ROW_NUMBER() OVER(PARTITION BY id) rn FROM t",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_rewrite_matches_sequential_replacements(query):
+    assert sql2xml.create_rewrite_engine(REPLACEMENTS).apply(query) == rewrite_sequentially(query, REPLACEMENTS)
+
+
+def test_rewrite_matches_sequential_replacements_on_random_text():
+    # Nahodne kombinace casti, na jejichz hranicich se pravidla prekryvaji (s pevnym semínkem, aby byl test opakovatelny)
+    parts = list(" \xa0\n\t,()+&\\") + ["count", "Count ", "not", "NOT(", "over", "use_nl", "use_hash", "data", "Do", "x", "SUM", ")("]
+    rnd = random.Random(1)
+    engine = sql2xml.create_rewrite_engine(REPLACEMENTS)
+    for _ in range(5000):
+        query = "".join(rnd.choice(parts) for _ in range(rnd.randint(1, 12)))
+        if "not(not(" in query.lower():
+            # Viz test_overlapping_not_is_rewritten_everywhere
+            continue
+        assert engine.apply(query) == rewrite_sequentially(query, REPLACEMENTS), repr(query)
+
+
+def test_non_breaking_spaces_are_replaced():
+    query = "SELECT flu\xa0FROM\xa0t WHERE\xa0count\xa0(x) > 0"
+    assert sql2xml.create_rewrite_engine(REPLACEMENTS).apply(query) == "SELECT flu FROM t WHERE count(x)  > 0"
+    # Puvodni klic "u\xa0" odstranil i pismeno "u" a ostatni nezlomitelne mezery ponechal
+    assert replace_match_case("u\xa0", " ", query, whole_words=False) == "SELECT fl FROM\xa0t WHERE\xa0count\xa0(x) > 0"
+
+
+def test_overlapping_not_is_rewritten_everywhere():
+    # Postupnymi nahradami byl upraven jen kazdy druhy z prekryvajicich se vyskytu "(not(" (zavorka uz byla spotrebovana predchozi shodou), kontexty pravidel v RewriteEngine se ale mohou prekryvat
+    query = "',+(not(not(over'"
+    assert rewrite_sequentially(query, REPLACEMENTS) == "',+( not (not(over'"
+    assert sql2xml.create_rewrite_engine(REPLACEMENTS).apply(query) == "',+( not ( not (over'"
+
+
+def test_case_is_preserved():
+    engine = sql2xml.create_rewrite_engine(REPLACEMENTS)
+    # Velikost pismen je prevzata podle pozice znaku v nalezenem retezci (stejne jako puvodne), vlozena mezera tedy posune velikost pismen o jeden znak
+    assert engine.apply("X,COUNT (Y)") == rewrite_sequentially("X,COUNT (Y)", REPLACEMENTS) == "X, COUNt(Y) "
+    assert engine.apply("X COUNT (Y)") == "X COUNT(Y) "
+    # Znaky nahrady za delkou nalezeneho retezce zustavaji tak, jak byly zadany
+    assert engine.apply("DATA Data data") == "RDATaxxxxxxxxxxxxxxxxxxx Rdataxxxxxxxxxxxxxxxxxxx rdataxxxxxxxxxxxxxxxxxxx"
+
+
+def test_rules_with_context():
+    engine = sql2xml.RewriteEngine()
+    engine.add_rule("b", "B", whole_words=False, before="a", after="c")
+    engine.add_rule("xy", "Z")
+    # Kontexty nejsou nahrazovany a mohou byt sdileny sousednimi shodami
+    assert engine.apply("abc bc ab abcabc abcbc") == "aBc bc ab aBcaBc aBcbc"
+    # Pravidlo pro cela slova
+    assert engine.apply("xy xyz axy XY") == "Z xyz axy Z"
+
+
+def test_mapped_positions():
+    engine = sql2xml.create_rewrite_engine(REPLACEMENTS)
+    query = "a count (x)data"
+    (text, (ends, deltas)) = engine.apply_mapped(query)
+    assert text == engine.apply(query) == "a count(x) rdataxxxxxxxxxxxxxxxxxxx"
+    # Posuny pozic za " count (" (-1), za ")" (0) a za "data" (+20)
+    assert (ends, deltas) == ([8, 11, 15], [-1, 0, 20])
+    assert engine.apply_mapped("x") == ("x", ([], []))
+
+
+def test_glued_placeholders_are_restored():
+    engine = sql2xml.create_restore_engine(REPLACEMENTS)
+    # "&data" --> ":" + nahrada "&" + nahrada "data" (mezi nahradnimi retezci neni hranice slova)
+    glued = sql2xml.create_rewrite_engine(REPLACEMENTS).apply("x = &data AND y = &&Level")
+    assert glued == "x = :rampxxxxxxxxxxxxxxxxxxxxrdataxxxxxxxxxxxxxxxxxxx AND y = :rampampxxxxxxxxxxxxxxxxxRlevelxxxxxxxxxxxxxxxxxx"
+    assert engine.apply(glued) == "x = &data AND y = &&Level"
+
+
+def test_restored_model():
+    query = "SELECT t.a, &data AS x, t.level FROM tab t WHERE t.x = &data AND t.y = &&level AND t.z = :result;\n"
+    (preprocessed_query, replacements, r_tag) = sql2xml.preprocess_query(query)
+    assert not "data" in preprocessed_query and not "level" in preprocessed_query and not "result" in preprocessed_query
+    with sql2xml.ParseSession() as session:
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(preprocessed_query)):
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+        sql2xml.restore_replacements(replacements, r_tag)
+        main_select = session.tables[0]
+        assert [(attribute.name, attribute.alias) for attribute in main_select.attributes] == [("t.a", None), ("&data", "x"), ("t.level", None)]
+        assert [(attribute.name, attribute.get_condition()) for attribute in main_select.conditions] == [("t.x", "= &data"), ("t.y", "= &&level"), ("t.z", "= :result")]
+        assert list(main_select.used_bind_vars) == ["data", "level", "result"]
+        assert main_select.get_source_sql() == query.strip()
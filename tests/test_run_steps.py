@@ -0,0 +1,89 @@
+"""Testy provadeni kroku zpracovani pomoci explicitniho zasobniku (viz run_steps(...))"""
+import sys
+import threading
+
+import pytest
+
+import sql2xml
+from sql2xml import grouping
+
+
+def test_nested_steps_return_values():
+    def leaf(x):
+        return x * 2
+        yield
+
+    def inner(x):
+        a = yield leaf(x)
+        b = yield from helper(x)
+        return a + b
+
+    def helper(x):
+        value = yield leaf(x + 1)
+        return value
+
+    with sql2xml.ParseSession():
+        assert sql2xml.run_steps(inner(3)) == 6 + 8
+
+
+def test_exception_propagates_to_parent_step():
+    def failing():
+        raise ValueError("chyba")
+        yield
+
+    def parent():
+        try:
+            yield failing()
+        except ValueError as e:
+            return f"zachyceno: {e}"
+
+    with sql2xml.ParseSession():
+        assert sql2xml.run_steps(parent()) == "zachyceno: chyba"
+        with pytest.raises(ValueError):
+            sql2xml.run_steps(failing())
+
+
+def nested_query(depth: int) -> str:
+    """Vrati dotaz se zadanym poctem do sebe vnorenych subselectu"""
+    query = "SELECT t.a FROM tab t"
+    for i in range(depth):
+        query = f"SELECT s{i}.a FROM ({query}) s{i}"
+    return query
+
+
+def test_deep_nesting_does_not_hit_recursion_limit(monkeypatch):
+    # Kazda uroven vnoreni odpovida nejmene jednomu ramci zasobniku, rekurzivni zpracovani by tedy vychozi limit rekurze (1000) prekrocilo
+    depth = 1100
+    query = nested_query(depth)
+    result = {}
+
+    def run():
+        # Seskupeni tokenu v sqlparse je rekurzivni (a omezene), limity tedy zvysime jen pro nej. Samotne zpracovani uz musi probehnout s vychozim limitem.
+        monkeypatch.setattr(grouping, "MAX_GROUPING_DEPTH", None)
+        monkeypatch.setattr(grouping, "MAX_GROUPING_TOKENS", None)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100000)
+        try:
+            statements = [grouping.group(s) for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(query))]
+        finally:
+            sys.setrecursionlimit(limit)
+        try:
+            with sql2xml.ParseSession() as session:
+                for s in statements:
+                    sql2xml.run_steps(sql2xml.process_statement(s))
+                result["tables"] = session.tables
+        except RecursionError as e:
+            result["error"] = e
+
+    stack_size = threading.stack_size(256 * 1024 * 1024)
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(stack_size)
+    assert "error" not in result
+    names = [table.name for table in result["tables"]]
+    # Kazda uroven vnoreni ma vlastni mezi-tabulku, nejhlubsi subselect je zavisly na tabulce "tab"
+    assert "tab" in names
+    assert len(names) > depth
@@ -0,0 +1,52 @@
+"""Testy preskakovani SQL prikazu, ze kterych nemohou vzniknout zadne tabulky (viz get_skipped_statement_kind(...))"""
+import json
+
+import pytest
+
+import sql2xml
+
+QUERY = """SELECT t.a FROM tab1 t;
+UPDATE tab2 SET x = 1 WHERE y = 2;
+DELETE FROM tab3 WHERE z = 1;
+INSERT INTO tab4 (a) VALUES (1);
+GRANT SELECT ON tab1 TO usr;
+CREATE UNIQUE INDEX ix ON tab1 (a);
+COMMIT;
+"""
+
+
+@pytest.mark.parametrize(("statement", "kind"), [
+    ("UPDATE tab2 SET x = 1 WHERE y = 2", "UPDATE"),
+    ("delete from tab3 where z = 1", "DELETE"),
+    ("INSERT INTO tab4 (a) VALUES (1)", "INSERT"),
+    ("GRANT SELECT ON tab1 TO usr", "GRANT"),
+    ("REVOKE SELECT ON tab1 FROM usr", "REVOKE"),
+    ("CREATE UNIQUE INDEX ix ON tab1 (a)", "CREATE INDEX"),
+    ("CREATE OR REPLACE PUBLIC SYNONYM s FOR tab1", "CREATE SYNONYM"),
+    ("/* komentar */ DROP TABLE tab1", "DROP TABLE"),
+    ("COMMIT", "COMMIT"),
+    # Prikazy obsahujici dotaz preskocit nelze
+    ("SELECT t.a FROM tab1 t", None),
+    ("WITH a AS (SELECT 1 x FROM dual) SELECT a.x FROM a", None),
+    ("INSERT INTO tab4 (a) SELECT t.a FROM tab1 t", None),
+    ("UPDATE tab2 SET x = (SELECT MAX(t.a) FROM tab1 t)", None),
+    ("CREATE VIEW v AS SELECT t.a FROM tab1 t", None),
+])
+def test_skipped_statement_kind(statement, kind):
+    (s,) = sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(statement))
+    assert sql2xml.get_skipped_statement_kind(s) == kind
+
+
+def test_statements_without_query_are_skipped(run_sql2xml):
+    # Prikazy bez dotazu (napr. UPDATE bez SELECT) drive vedly k chybe ve zpracovani
+    result = run_sql2xml(sql_text=QUERY)
+    assert result.returncode == 0, result.stdout
+    assert result.read("_CHYBA.txt") == None
+    assert "Tento SQL dotaz používá následující tabulky z DB:\n    * tab1\n" in result.stdout
+    skipped = "Přeskočené SQL příkazy (neobsahují dotaz):\n    * COMMIT: 1\n    * CREATE INDEX: 1\n    * DELETE: 1\n    * GRANT: 1\n    * INSERT: 1\n    * UPDATE: 1\n"
+    assert skipped in result.stdout
+    assert skipped in result.read("_vystup.txt")
+    report = json.loads(result.read("_stav.json"))
+    assert report["summary"] == {"ok": 1, "skipped": 6}
+    assert [(statement["statement"], statement["status"], statement.get("kind")) for statement in report["statements"][1:]] == [
+        (2, "skipped", "UPDATE"), (3, "skipped", "DELETE"), (4, "skipped", "INSERT"), (5, "skipped", "GRANT"), (6, "skipped", "CREATE INDEX"), (7, "skipped", "COMMIT")]
@@ -0,0 +1,97 @@
+"""Testy SQL kodu tabulek ukladaneho jako rozsahy ve sdilenem zdrojovem kodu (viz SourceBuffer) a komentaru k blokum a sloupcum (viz split_comment(...))"""
+import pytest
+
+import sql2xml
+
+QUERY = """WITH a AS (
+  SELECT t.x, -- sloupec x
+         t.y  -- puvodni ---------- sloupec y
+  FROM tab t
+  START WITH t.p IS NULL CONNECT BY PRIOR t.id = t.p
+),
+-- ---------- Blok b
+b AS (SELECT a.x FROM a JOIN other o ON o.x = a.x WHERE o.y > 0 UNION ALL SELECT z.x FROM tab_z z)
+SELECT b.x FROM b"""
+
+
+@pytest.fixture
+def tables(parse_sql):
+    session = parse_sql(QUERY)
+    with session:
+        yield {table.name: table for table in session.tables}
+
+
+def test_source_sql(tables):
+    # Rozsah je souvisly, soucasti kodu bloku je tedy i "START WITH" (vc. komentaru a zalomeni radku)
+    assert tables["a"].get_source_sql() == QUERY[QUERY.index("SELECT t.x"):QUERY.index("\n),")]
+    assert tables["b"].get_source_sql() == "SELECT a.x FROM a JOIN other o ON o.x = a.x WHERE o.y > 0 UNION ALL SELECT z.x FROM tab_z z"
+    assert tables["join-0"].get_source_sql().rstrip() == "JOIN other o ON o.x = a.x"
+    assert tables["union-select-0"].get_source_sql() == "SELECT z.x FROM tab_z z"
+    assert tables["main-select-0"].get_source_sql() == "SELECT b.x FROM b"
+    # Tabulky z DB zadny SQL kod nemaji
+    assert tables["tab"].get_source_sql() == None
+
+
+def test_comments(tables):
+    # U bloku z WITH je pouzita cast komentare za oddelovacem "----------", u sloupce cast pred nim
+    assert tables["b"].comment == "Blok b"
+    assert [(attribute.name, attribute.comment) for attribute in tables["a"].attributes] == [("t.x", "sloupec x"), ("t.y", "puvodni")]
+
+
+def test_comments_are_split_once_per_statement(monkeypatch):
+    split_texts = []
+    split_comment_text = sql2xml.split_comment_text
+    add_statement = sql2xml.SourceBuffer.add_statement
+    in_add_statement = [False]
+
+    def split(text: str) -> list:
+        split_texts.append((text, in_add_statement[0]))
+        return split_comment_text(text)
+
+    def add(self, s):
+        in_add_statement[0] = True
+        try:
+            add_statement(self, s)
+        finally:
+            in_add_statement[0] = False
+
+    monkeypatch.setattr(sql2xml, "split_comment_text", split)
+    monkeypatch.setattr(sql2xml.SourceBuffer, "add_statement", add)
+    with sql2xml.ParseSession() as session:
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(QUERY)):
+            s = sql2xml.grouping.group(s)
+            sql2xml.run_steps(sql2xml.process_statement(s))
+            # Komentare jsou rozdeleny jedinkrat pri pridani prikazu (pro kazdy token komentare, vc. seskupenych sql.Comment), dalsi zpracovani pouziva jiz rozdelene komentare
+            assert all(inside for (_, inside) in split_texts)
+            assert len(split_texts) == len(session.source.comments)
+            comment_tokens = [t for t in s.flatten() if sql2xml.is_comment(t)]
+            assert len(comment_tokens) == 3
+            for t in comment_tokens:
+                assert sql2xml.split_comment(t) is session.source.get_comment(t)
+    assert sql2xml.split_comment(comment_tokens[0]) == split_comment_text(comment_tokens[0].value)
+
+
+DEPS_QUERY = """WITH a AS (
+  -- komentar pred SELECT
+  SELECT t.x FROM tab1 t /* komentar na konci */
+), b (c1, c2) AS ( SELECT a.x, a.x AS x2 FROM a ),
+c AS (SELECT u.y FROM tab2 u WHERE u.y IN (SELECT v.y FROM tab3 v)
+UNION ALL SELECT w.y FROM tab4 w)
+SELECT b.c1 FROM b JOIN c ON c.y = b.c2;
+"""
+
+
+@pytest.mark.parametrize("query", [QUERY, DEPS_QUERY], ids=["query", "deps-query"])
+@pytest.mark.parametrize("fast", [False, True], ids=["sqlparse", "fast"])
+def test_dependencies_source_sql(query, fast):
+    def parse(process) -> dict:
+        with sql2xml.ParseSession() as session:
+            tokens = sql2xml.FastLexer.get_tokens(query) if fast else sql2xml.lexer.tokenize(query)
+            for s in sql2xml.StatementSplitter().process(tokens):
+                process(s)
+            return {table.name: table.get_source_sql() for table in session.tables if table.table_type == sql2xml.Table.WITH_TABLE}
+
+    expected = parse(lambda s: sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s))))
+    assert len(expected) > 1
+    # Zjednodusene zpracovani (prepinac --deps-only) uklada kod bloku ve WITH ve stejnem rozsahu jako uplne zpracovani (bez nazvu bloku, zavorek a komentaru pred prvnim tokenem)
+    assert parse(sql2xml.process_statement_dependencies) == expected
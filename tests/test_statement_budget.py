@@ -0,0 +1,81 @@
+"""Testy casoveho limitu pro zpracovani jednoho SQL prikazu (prepinac --timeout, viz StatementBudget)"""
+import json
+import threading
+
+import pytest
+
+import sql2xml
+
+QUERY = """WITH a AS (SELECT x.id FROM (SELECT id FROM tab1) x),
+b AS (SELECT a.id FROM a)
+SELECT b.id FROM b;
+SELECT t.id FROM tab2 t;
+"""
+
+
+@pytest.mark.parametrize("args", [[], ["--chunked"], ["--deps-only"]])
+def test_timeout_is_reported_per_statement(run_sql2xml, args):
+    result = run_sql2xml(*args, "--timeout", "0", sql_text=QUERY)
+    assert result.returncode == 0, result.stdout
+    report = json.loads(result.read("_stav.json"))
+    statuses = [statement["status"] for statement in report["statements"]]
+    # Druhy prikaz nema zadne vnorene kroky ani bloky ve WITH, limit tedy neni zkontrolovan
+    assert statuses == ["timeout", "ok"]
+    # Z prikazu, jehoz zpracovani bylo preruseno, jsou prevzaty alespon nazvy bloku ve WITH
+    assert report["statements"][0]["with_blocks"] == ["a", "b"]
+
+
+def parse(query: str) -> list:
+    """Zpracuje SQL kod v aktualni relaci zpracovani a vrati nazvy vytvorenych tabulek"""
+    for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(query)):
+        if sql2xml.get_skipped_statement_kind(s) == None:
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+    return [table.name for table in sql2xml.ParseSession.current().tables]
+
+
+def test_budget_is_per_session():
+    results = {}
+
+    def run_limited(started: threading.Event, finished: threading.Event):
+        with sql2xml.ParseSession() as session:
+            # Limit je prekrocen uz pri prvnim vnorenem kroku, zpracovani v druhem vlakne vsak nesmi ovlivnit
+            session.budget.set_limits(0, None)
+            session.budget.start()
+            started.set()
+            finished.wait(60)
+            try:
+                parse(QUERY)
+            except sql2xml.StatementBudgetExceeded as e:
+                results["limited"] = e.kind
+            finally:
+                session.budget.stop()
+
+    def run_unlimited():
+        with sql2xml.ParseSession():
+            results["unlimited"] = parse(QUERY)
+
+    started = threading.Event()
+    finished = threading.Event()
+    limited = threading.Thread(target=run_limited, args=(started, finished))
+    limited.start()
+    started.wait(60)
+    unlimited = threading.Thread(target=run_unlimited)
+    unlimited.start()
+    unlimited.join()
+    finished.set()
+    limited.join()
+    assert results["limited"] == "timeout"
+    assert "tab1" in results["unlimited"] and "tab2" in results["unlimited"]
+
+
+def test_selected_statement_keeps_its_number(run_sql2xml):
+    query = "SELECT t.a FROM tab1 t;\nSELECT u.b FROM tab2 u;\n" + QUERY.split(";")[0] + ";\n"
+    result = run_sql2xml("--statement", "3", "--timeout", "0", sql_text=query)
+    assert result.returncode == 0, result.stdout
+    # Cislo prikazu odpovida jeho poradi ve zdrojovem souboru (ne poradi mezi vybranymi prikazy)
+    report = json.loads(result.read("_stav.json"))
+    assert [(statement["statement"], statement["status"]) for statement in report["statements"]] == [(3, "timeout")]
+    assert "SQL PŘÍKAZ Č. 3 SE NEPODAŘILO ZPRACOVAT" in result.stdout
+    assert "    * příkaz č. 3: timeout" in result.stdout
+    assert result.read("_CHYBA.txt").startswith("SQL příkaz č. 3:")
+    assert "Příkaz č. 3 se nepodařilo zpracovat (timeout)" in result.read("_vystup.txt")
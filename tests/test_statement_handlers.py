@@ -0,0 +1,131 @@
+"""Testy obsluhy tokenu v process_statement(...) podle typu tokenu, klicoveho slova a kontextu (viz TokenKind a StatementHandler)"""
+import pytest
+
+import sql2xml
+from sql2xml import StatementHandler, Table, TokenKind
+
+T = sql2xml.sql.T
+
+# Ocekavane modely odpovidaji zpracovani pred zavedenim tabulky obsluznych metod (postupne porovnavani klicovych slov v process_statement(...))
+WITH_QUERY = """WITH a AS (SELECT t.id, t.x AS xx FROM sch.tab1 t JOIN tab2 u ON u.id = t.id AND u.flag = 'Y' WHERE t.x > :p_min),
+-- ---------- Blok b
+b AS (SELECT a.id, COUNT(*) cnt FROM a GROUP BY a.id HAVING COUNT(*) > 1 UNION ALL SELECT v.id, v.cnt FROM tab3 v WHERE NOT EXISTS (SELECT 1 FROM tab4 w WHERE w.id = v.id))
+SELECT b.id, (SELECT MAX(z.y) FROM tab5 z WHERE z.id = b.id) AS m, ROW_NUMBER() OVER (PARTITION BY b.id ORDER BY b.cnt) rn FROM b LEFT JOIN a ON a.id = b.id ORDER BY b.id;
+"""
+WITH_MODEL = [
+    ("a", Table.WITH_TABLE, {"sch.tab1": ["t"], "tab2": ["u"]}, ["sch.tab1", "join-0"], None,
+     [("t.id", None), ("t.x", "xx")], [("t.x", "> :p_min")]),
+    ("sch.tab1", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("tab2", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("join-0", Table.AUX_TABLE, {}, ["tab2"], None, [], [("u.id", "= t.id"), ("u.flag", "= 'Y'")]),
+    ("b", Table.WITH_TABLE, {"tab3": ["v"]}, ["a", "union-select-0"], "Blok b", [("a.id", None), ("COUNT(*)", "cnt")], []),
+    ("union-select-0", Table.AUX_TABLE, {}, ["tab3", "exists-select-0"], None, [("v.id", None), ("v.cnt", None)], [("<exists-select-0>", None)]),
+    ("tab3", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("exists-select-0", Table.AUX_TABLE, {"tab4": ["w"]}, ["tab4"], None, [("1", None)], [("w.id", "= v.id")]),
+    ("tab4", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("main-select-0", Table.MAIN_SELECT, {}, ["select-0", "b", "join-1"], None,
+     [("b.id", None), ("Op(<select-0>)", "m"), ("ROW_NUMBER() OVER (PARTITION BY b.id ORDER BY b.cnt)", "rn")], []),
+    ("select-0", Table.AUX_TABLE, {"tab5": ["z"]}, ["tab5"], None, [("MAX(z.y)", None)], [("z.id", "= b.id")]),
+    ("tab5", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("join-1", Table.AUX_TABLE, {}, ["a"], None, [], [("a.id", "= b.id")]),
+]
+
+MERGE_QUERY = "MERGE INTO tgt g USING (SELECT s.id, s.val FROM src s) q ON (g.id = q.id) WHEN MATCHED THEN UPDATE SET g.val = q.val;\n"
+MERGE_MODEL = [
+    ("main-select-0", Table.MAIN_SELECT, {"src": ["s"]}, ["src"], None, [("s.id", None), ("s.val", None)], []),
+    ("src", Table.STANDARD_TABLE, {}, [], None, [], []),
+]
+
+INSERT_QUERY = "INSERT INTO tgt (id) SELECT r.id FROM tab1 r START WITH r.parent_id IS NULL CONNECT BY PRIOR r.id = r.parent_id;\n"
+INSERT_MODEL = [
+    ("main-select-0", Table.MAIN_SELECT, {"tab1": ["r"]}, ["tab1"], None, [("r.id", None)], []),
+    ("tab1", Table.STANDARD_TABLE, {}, [], None, [], []),
+]
+
+CREATE_QUERY = "CREATE VIEW v_x AS SELECT e.id FROM emp e WHERE e.id IN (SELECT d.emp_id FROM dept d) AND e.x > 5;\n"
+CREATE_MODEL = [
+    ("main-select-0", Table.MAIN_SELECT, {"emp": ["e"]}, ["emp", "select-0"], None, [("e.id", None)], [("e.id", "IN Op(<select-0>) AND e.x > 5")]),
+    ("emp", Table.STANDARD_TABLE, {}, [], None, [], []),
+    ("select-0", Table.AUX_TABLE, {"dept": ["d"]}, ["dept"], None, [("d.emp_id", None)], []),
+    ("dept", Table.STANDARD_TABLE, {}, [], None, [], []),
+]
+
+
+def describe(session: sql2xml.ParseSession) -> list:
+    """Vrati popis tabulek relace zpracovani: (jmeno, typ, aliasy podle jmena tabulky, vazby na tabulky, komentar, atributy (jmeno, alias), podminky (jmeno, podminka))"""
+    with session:
+        names = {table.id: table.name for table in session.tables}
+        return [(table.name, table.table_type, {names[id]: list(aliases) for (id, aliases) in table.statement_aliases.items()},
+                 [names[id] for id in table.linked_to_tables_id], table.comment,
+                 [(attribute.name, attribute.alias) for attribute in table.attributes],
+                 [(attribute.name, attribute.get_condition()) for attribute in table.conditions])
+                for table in session.tables]
+
+
+@pytest.mark.parametrize(("query", "model"), [(WITH_QUERY, WITH_MODEL), (MERGE_QUERY, MERGE_MODEL), (INSERT_QUERY, INSERT_MODEL), (CREATE_QUERY, CREATE_MODEL)],
+                         ids=["with", "merge", "insert", "create"])
+def test_grouped_statement_model(parse_sql, query, model):
+    assert describe(parse_sql(query)) == model
+
+
+# Vzorove tokeny jednotlivych zpusobu zpracovani (index == TokenKind.*)
+SAMPLE_TOKENS = [
+    sql2xml.sql.Identifier([sql2xml.sql.Token(T.Name, "x")]),
+    sql2xml.sql.Token(T.Whitespace, " "),
+    sql2xml.sql.Token(T.Comment.Single, "-- x\n"),
+    sql2xml.sql.Token(T.Keyword, "DISTINCT"),
+    sql2xml.sql.Token(T.Keyword, "from"),
+    sql2xml.sql.Token(T.Keyword, "LEFT JOIN"),
+    sql2xml.sql.Token(T.Keyword, "ON"),
+    sql2xml.sql.Token(T.Keyword, "UNION ALL"),
+    sql2xml.sql.Token(T.Keyword, "NOT EXISTS"),
+    sql2xml.sql.Token(T.Keyword, "OVER"),
+    sql2xml.sql.Token(T.Keyword, "ORDER BY"),
+    sql2xml.sql.Token(T.Keyword, "INTO"),
+    sql2xml.sql.Token(T.Keyword, "CONNECT"),
+    sql2xml.sql.Token(T.Keyword, "SEARCH"),
+    sql2xml.sql.Token(T.Keyword, "GRANT"),
+    sql2xml.sql.Token(T.CTE, "WITH"),
+    sql2xml.sql.Token(T.DML, "SELECT"),
+    sql2xml.sql.Token(T.DML, "MERGE"),
+    sql2xml.sql.Token(T.DML, "INSERT"),
+    sql2xml.sql.Token(T.DDL, "CREATE"),
+    sql2xml.sql.Where([sql2xml.sql.Token(T.Keyword, "WHERE")]),
+    sql2xml.sql.Token(T.DDL, "ALTER"),
+]
+
+
+def test_sample_tokens_cover_all_kinds():
+    assert [TokenKind.get(t) for t in SAMPLE_TOKENS] == list(range(len(TokenKind.NAMES)))
+
+
+@pytest.mark.parametrize("context", list(StatementHandler.CONTEXTS) + ["unknown-context"])
+def test_handler_for_each_kind_and_context(context):
+    handler_class = StatementHandler.CONTEXTS.get(context, StatementHandler)
+    for (kind, t) in enumerate(SAMPLE_TOKENS):
+        (found_kind, name, method, is_step) = StatementHandler.get(t, context)
+        assert found_kind == kind
+        method_name = StatementHandler.METHODS[kind]
+        if method_name == None:
+            # Bile znaky a interpunkce jsou pouze preskoceny
+            assert (name, method, is_step) == (TokenKind.NAMES[kind], None, False)
+        else:
+            # Metoda kontextu (prip. zdedena z obecne obsluhy), kroky zpracovani jsou generatory volane pres "yield from"
+            assert method == getattr(handler_class, method_name)
+            assert name == f"{handler_class.__name__}.{method_name}"
+            assert is_step == sql2xml.inspect.isgeneratorfunction(method)
+        # Opakovane vyhledani vraci tutez (jiz ulozenou) obsluhu
+        assert StatementHandler.get(t, context) == (found_kind, name, method, is_step)
+
+
+def test_tokens_are_counted_only_for_debug_output(parse_sql, run_sql2xml):
+    assert parse_sql(MERGE_QUERY).token_counts == None
+    with sql2xml.ParseSession() as session:
+        session.token_counts = {}
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(MERGE_QUERY)):
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+    assert session.token_counts["StatementHandler.on_merge"] == 1 and session.token_counts["MergeHandler.on_into"] == 1
+    # Pocty tokenu jsou soucasti ladiciho vystupu (prepinac -d)
+    result = run_sql2xml(sql_text=MERGE_QUERY)
+    assert result.returncode == 0, result.stdout
+    assert "Počty zpracovaných tokenů podle obsluhy:\n" in result.read("_vystup.txt")
@@ -0,0 +1,101 @@
+"""Testy indexu SQL prikazu v souboru a vyberu prikazu podle poradoveho cisla ci bloku z WITH (prepinace --statement a --with-block, viz build_statement_index(...))"""
+import json
+import os
+
+import pytest
+
+import sql2xml
+
+STATEMENTS = [
+    "-- Úvodní komentář ; se středníkem\nSELECT t.a, 'řetězec; se středníkem' AS s FROM tab1 t; -- za středníkem\n",
+    "WITH Blok_B AS (SELECT u.b FROM tab2 u /* komentář; */ WHERE u.\"sloupec;č\" = 1)\nSELECT Blok_B.b FROM Blok_B;\n",
+    "\nWITH blok_c AS (SELECT v.c FROM tab3 v), d AS (SELECT blok_c.c FROM blok_c)\nSELECT d.c FROM d;\n",
+]
+
+
+
+def split(query: str) -> list:
+    """Vrati prikazy tak, jak je rozdeli sqlparse (konec radku za strednikem patri az k nasledujicimu prikazu, zaverecne bile znaky k zadnemu prikazu)"""
+    return [str(s) for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(query))]
+
+
+SPLIT_STATEMENTS = split("".join(STATEMENTS))
+
+
+def write_sql(path, encoding: str, bom=False, newline="\n") -> str:
+    """Zapise ukazkove prikazy do souboru se zadanym kodovanim (prip. s BOM a jinymi konci radku) a vrati cestu k souboru"""
+    # Kodek "utf-8-sig" by BOM pridal vzdy
+    data = "".join(STATEMENTS).replace("\n", newline).encode("utf-8" if encoding == "utf-8-sig" else encoding)
+    if bom:
+        data = sql2xml.codecs.BOM_UTF8 + data
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize(("encoding", "bom", "newline"), [("utf-8", False, "\n"), ("utf-8-sig", True, "\n"), ("utf-8-sig", False, "\n"), ("cp1250", False, "\r\n")])
+def test_byte_offsets(tmp_path, encoding, bom, newline):
+    file_name = write_sql(tmp_path / "query.sql", encoding, bom, newline)
+    index = sql2xml.build_statement_index(file_name, encoding)
+    with open(file_name, mode="rb") as file:
+        data = file.read()
+    # Prikazy navazuji bez mezer od zacatku souboru (za pripadnym BOM) az do jeho konce (zaverecne bile znaky nejsou soucasti zadneho prikazu)
+    assert index[0]["start"] == (len(sql2xml.codecs.BOM_UTF8) if bom else 0)
+    assert [entry["start"] for entry in index[1:]] == [entry["end"] for entry in index[:-1]]
+    assert data[index[-1]["end"]:].decode(encoding) == newline
+    # Rozsahy odpovidaji prikazum, jak je rozdeli sqlparse (vc. zbytku radku za strednikem)
+    texts = [data[entry["start"]:entry["end"]].decode(encoding).replace("\r\n", "\n") for entry in index]
+    assert texts == SPLIT_STATEMENTS
+    assert texts[0].endswith("; -- za středníkem\n")
+    assert [entry["hash"] for entry in index] == [sql2xml.hashlib.sha1(data[entry["start"]:entry["end"]]).hexdigest() for entry in index]
+    assert [(entry["keyword"], entry["with_blocks"]) for entry in index] == [("SELECT", []), ("WITH", ["Blok_B"]), ("WITH", ["blok_c", "d"])]
+
+
+def test_index_is_reused(tmp_path, monkeypatch):
+    file_name = write_sql(tmp_path / "query.sql", "utf-8")
+    index = sql2xml.get_statement_index(file_name, "utf-8")
+    assert os.path.exists(str(tmp_path / "query_index.json"))
+
+    def fail(file_name: str, encoding: str):
+        raise AssertionError("Index byl vytvoren znovu")
+
+    # Nezmeneny soubor uz neni znovu prochazen
+    monkeypatch.setattr(sql2xml, "build_statement_index", fail)
+    assert sql2xml.get_statement_index(file_name, "utf-8") == index
+    assert sql2xml.select_statements(file_name, "utf-8", [3]) == (SPLIT_STATEMENTS[2], [3])
+
+
+def test_index_is_rebuilt_after_change(tmp_path):
+    path = tmp_path / "query.sql"
+    file_name = write_sql(path, "utf-8")
+    sql2xml.get_statement_index(file_name, "utf-8")
+    # Jina velikost souboru
+    path.write_text(STATEMENTS[1] + STATEMENTS[2], encoding="utf-8")
+    assert sql2xml.select_statements(file_name, "utf-8", [2]) == (split(STATEMENTS[1] + STATEMENTS[2])[1], [2])
+    # Stejna velikost i cas posledni zmeny, ale jiny obsah (hranice prikazu jsou posunute): nesouhlasi hash nacteneho prikazu
+    stat = os.stat(file_name)
+    changed = STATEMENTS[1].replace("WHERE", "") + STATEMENTS[2] + " " * len("WHERE")
+    path.write_text(changed, encoding="utf-8")
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(file_name).st_size == stat.st_size
+    assert sql2xml.select_statements(file_name, "utf-8", [2]) == (split(changed)[1], [2])
+    with open(str(tmp_path / "query_index.json"), encoding="utf-8") as index_file:
+        assert len(json.load(index_file)["statements"]) == 2
+
+
+def test_select_by_with_block(tmp_path):
+    file_name = write_sql(tmp_path / "query.sql", "utf-8")
+    # Nazvy bloku jsou porovnavany bez ohledu na velikost pismen a uvozovky
+    assert sql2xml.select_statements(file_name, "utf-8", with_block_names=["blok_b"]) == (SPLIT_STATEMENTS[1], [2])
+    assert sql2xml.select_statements(file_name, "utf-8", [1], ["BLOK_C"]) == (SPLIT_STATEMENTS[0] + SPLIT_STATEMENTS[2], [1, 3])
+    with pytest.raises(Exception, match="nebyl nalezen žádný z požadovaných příkazů"):
+        sql2xml.select_statements(file_name, "utf-8", with_block_names=["x"])
+    with pytest.raises(Exception, match="není příkaz č. 4"):
+        sql2xml.select_statements(file_name, "utf-8", [4])
+
+
+def test_with_block_option(run_sql2xml):
+    result = run_sql2xml("--with-block", "\"BLOK_C\"", sql_text="".join(STATEMENTS))
+    assert result.returncode == 0, result.stdout
+    assert "Tento SQL dotaz používá následující tabulky z DB:\n    * tab3\n" in result.stdout
+    report = json.loads(result.read("_stav.json"))
+    assert [(statement["statement"], statement["status"]) for statement in report["statements"]] == [(3, "ok")]
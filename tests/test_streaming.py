@@ -0,0 +1,84 @@
+"""Testy postupneho cteni a parsovani SQL souboru (prepinac -s, viz split_sql_file(...) a parse_file(...))"""
+import pytest
+import sqlparse
+
+import sql2xml
+
+QUERY = """-- Komentar se strednikem; na zacatku
+SELECT 'a;b', 'it''s;', "sloupec;x" FROM tab1; /* komentar; za strednikem */
+SELECT t.a -- radkovy komentar;
+FROM tab2 t WHERE t.b = 'x;' /* vice;
+radkovy; komentar */ AND t.c = "q"";"; SELECT 1 FROM dual;
+CREATE OR REPLACE PROCEDURE p_test IS
+  v_x NUMBER;
+BEGIN
+  SELECT COUNT(*) INTO v_x FROM tab3 WHERE c = ';';
+  IF v_x > 0 THEN
+    UPDATE tab4 SET d = 1;
+  END IF;
+END;
+/
+DECLARE
+  v_y NUMBER;
+BEGIN
+  v_y := 1; -- ;
+END;
+/
+WITH a AS (SELECT ';' AS s FROM dual) SELECT a.s FROM a;
+"""
+
+
+def get_statements(statements) -> list:
+    """Vrati prikazy jako seznam dvojic (text prikazu, seznam (typ, hodnota) listovych tokenu)"""
+    return [(str(s), [(t.ttype, t.value) for t in s.flatten()]) for s in statements]
+
+
+@pytest.fixture
+def sql_file(tmp_path) -> str:
+    path = tmp_path / "query.sql"
+    path.write_text(QUERY, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 1048576])
+def test_segments_do_not_split_tokens(sql_file, chunk_size):
+    with open(sql_file, encoding="utf-8") as file:
+        segments = list(sql2xml.split_sql_file(file, chunk_size))
+    assert "".join(segments) == QUERY
+    # Useky konci strednikem mimo retezce, identifikatory v uvozovkach a komentare (posledni usek je zbytek souboru)
+    assert segments[0] == "-- Komentar se strednikem; na zacatku\nSELECT 'a;b', 'it''s;', \"sloupec;x\" FROM tab1;"
+    assert segments[1] == " /* komentar; za strednikem */\nSELECT t.a -- radkovy komentar;\nFROM tab2 t WHERE t.b = 'x;' /* vice;\nradkovy; komentar */ AND t.c = \"q\"\";\";"
+    assert all(segment.endswith(";") for segment in segments[:-1])
+    assert segments[-1] == "\n"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 13, 1048576])
+def test_statements_match_sqlparse(sql_file, chunk_size):
+    (engine, replacements, r_tag) = sql2xml.preprocess_file(sql_file, "utf-8")
+    expected = get_statements(sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(engine.apply(QUERY), "utf-8")))
+    assert get_statements(sql2xml.parse_file(sql_file, "utf-8", engine, group_tokens=False, chunk_size=chunk_size)) == expected
+    # Bloky BEGIN ... END jsou (stejne jako v sqlparse) jedinym prikazem vc. vnorenych prikazu (hlavicka procedury a deklarace jsou v sqlparse samostatnymi prikazy)
+    texts = [text.strip() for (text, _) in expected]
+    assert len(texts) == 8
+    assert texts[4].startswith("BEGIN\n  SELECT COUNT(*)") and texts[4].endswith("END IF;\nEND;")
+    assert texts[6] == "BEGIN\n  v_y := 1; -- ;\nEND;"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1048576])
+def test_statements_match_fast_lexer(sql_file, chunk_size):
+    expected = get_statements(sql2xml.StatementSplitter().process(sql2xml.FastLexer.get_tokens(QUERY)))
+    assert get_statements(sql2xml.parse_file(sql_file, "utf-8", None, group_tokens=False, chunk_size=chunk_size)) == expected
+
+
+def test_grouped_statements_match_sqlparse(sql_file):
+    (engine, replacements, r_tag) = sql2xml.preprocess_file(sql_file, "utf-8")
+    expected = [str(s) for s in sqlparse.parse(engine.apply(QUERY))]
+    assert [str(s) for s in sql2xml.parse_file(sql_file, "utf-8", engine, chunk_size=4)] == expected
+
+
+def test_streaming_option(run_sql2xml):
+    results = [run_sql2xml(sql_text=QUERY, prep=prep) for prep in ["-do", "-dos"]]
+    for result in results:
+        assert result.returncode == 0, result.stdout
+    assert results[0].stdout == results[1].stdout
+    assert results[0].read("_vystup.txt") == results[1].read("_vystup.txt")
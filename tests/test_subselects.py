@@ -0,0 +1,47 @@
+"""Testy sdileni mezi-tabulky identickymi subselecty v ramci jednoho prikazu (viz ParseSession.find_subselect(...))"""
+import pytest
+
+import sql2xml
+
+SUBSELECT = "(SELECT MAX(b.y) FROM tab_b b WHERE b.id = 'x')"
+
+
+def get_aux_tables(session: sql2xml.ParseSession) -> list:
+    return [table for table in session.tables if table.table_type == sql2xml.Table.AUX_TABLE]
+
+
+@pytest.mark.parametrize("second", [
+    SUBSELECT,
+    "(select max(b.y)   from TAB_B b WHERE b.id = 'x')",
+    "(SELECT MAX(b.y) -- komentar\n  FROM tab_b b /* dalsi komentar */ WHERE b.id = 'x')",
+])
+def test_identical_subselects_share_table(parse_sql, second):
+    session = parse_sql(f"SELECT a.x, {SUBSELECT} AS m1, {second} AS m2 FROM tab_a a")
+    aux_tables = get_aux_tables(session)
+    assert len(aux_tables) == 1
+    assert aux_tables[0].references == 2
+    # Sdilena mezi-tabulka si ponechava SQL kod prvniho vyskytu (zdrojovy kod je ulozen v relaci zpracovani)
+    with session:
+        assert aux_tables[0].get_source_sql() == SUBSELECT[1:-1]
+    main_select = session.tables[0]
+    assert list(main_select.linked_to_tables_id).count(aux_tables[0].id) == 1
+
+
+def test_derived_tables_share_table(parse_sql):
+    session = parse_sql("SELECT a.y FROM (SELECT y FROM tab_b) a JOIN (SELECT y FROM tab_b) b ON a.y = b.y")
+    selects = [table for table in get_aux_tables(session) if table.name.startswith("select-")]
+    assert len(selects) == 1
+    assert selects[0].references == 2
+
+
+def test_different_literals_are_not_shared(parse_sql):
+    # Retezcove literaly se pri normalizaci nemeni (ani velikost pismen)
+    other = SUBSELECT.replace("'x'", "'X'")
+    session = parse_sql(f"SELECT a.x, {SUBSELECT} AS m1, {other} AS m2 FROM tab_a a")
+    assert [table.references for table in get_aux_tables(session)] == [1, 1]
+
+
+def test_subselects_not_shared_across_statements(parse_sql):
+    query = f"SELECT a.x, {SUBSELECT} AS m FROM tab_a a;\n"
+    session = parse_sql(query * 2)
+    assert [table.references for table in get_aux_tables(session)] == [1, 1]
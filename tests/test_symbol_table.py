@@ -0,0 +1,86 @@
+"""Testy dohledavani tabulek podle nazvu a aliasu (viz SymbolTable)"""
+import sql2xml
+from sql2xml import Table
+
+
+def test_alias_is_not_matched_as_substring(run_sql2xml):
+    # Tabulka "b" nesmi byt zamenena s tabulkou "tab" (jejiz alias "abc" nazev "b" obsahuje)
+    result = run_sql2xml(sql_text="SELECT abc.x, b.y FROM tab abc, b WHERE b.z = abc.z\n")
+    assert result.returncode == 0, result.stdout
+    assert "Tento SQL dotaz používá následující tabulky z DB:\n    * b\n    * tab\n" in result.stdout
+
+
+def test_lookup_by_name_and_alias(parse_sql):
+    session = parse_sql("SELECT t.x, u.y FROM sch.Tab t JOIN other u ON u.id = t.id;\nSELECT o.z FROM other o;\n")
+    with session:
+        main_select = session.tables[0]
+        tab = Table.get_table_by_name("sch.tab", None)
+        other = Table.get_table_by_name("OTHER", None)
+        assert tab.name == "sch.Tab" and other.name == "other"
+        # Nazev bez schematu a aliasy platne v ramci tabulky, ve ktere byly uvedeny
+        assert Table.get_table_by_name("tab", None) is tab
+        assert Table.get_table_by_name("t", alias_table=main_select) is tab
+        assert Table.get_table_by_name("u", alias_table=main_select) is other
+        # Vsechny zname aliasy tabulky (ze vsech prikazu) jsou serazeny abecedne
+        assert Table.get_all_known_aliases(other.id) == ["o", "u"]
+
+
+ALIAS_QUERY = """WITH a AS (SELECT t.id FROM tab1 t WHERE t.x IN (SELECT tt.x FROM tab1 tt)),
+b AS (SELECT x.id, (SELECT MAX(y.v) FROM tab2 y WHERE y.id = x.id) AS m FROM (SELECT s.id FROM tab1 s JOIN a q ON q.id = s.id) x)
+SELECT b.id FROM b bb JOIN a ON a.id = bb.id;
+SELECT z.v FROM tab2 z;
+"""
+
+
+def scan_aliases(session: sql2xml.ParseSession, table_id: int) -> list:
+    """Vrati vsechny zname aliasy tabulky prochazenim aliasu vsech tabulek relace (puvodni implementace Table.get_all_known_aliases(...))"""
+    aliases = []
+    for table in session.tables:
+        for a in table.statement_aliases.get(table_id, {}):
+            if not a in aliases:
+                aliases.append(a)
+    return sorted(aliases)
+
+
+def test_all_known_aliases_match_scan(parse_sql):
+    session = parse_sql(ALIAS_QUERY)
+    with session:
+        expected = {table.id: scan_aliases(session, table.id) for table in session.tables}
+        assert {id: Table.get_all_known_aliases(id) for id in expected} == expected
+        # Aliasy z vnorenych subselectu jsou do nadrazenych tabulek kopirovany (copy_aliases_to_table(...)), v indexu se ale kazdy alias objevi jen jednou
+        tab1 = Table.get_table_by_name("tab1", None)
+        assert Table.get_all_known_aliases(tab1.id) == ["s", "t", "tt"]
+        assert Table.get_all_known_aliases(Table.get_table_by_name("tab2", None).id) == ["y", "z"]
+        assert Table.get_all_known_aliases(Table.get_table_by_name("a", None).id) == ["q"]
+        assert Table.get_all_known_aliases(session.next_id) == []
+        # Po sestaveni indexu znovu (napr. po zpetne nahrade nahradnich retezcu) zustavaji aliasy stejne
+        session.symbols.rebuild(session.tables)
+        assert {id: Table.get_all_known_aliases(id) for id in expected} == expected
+
+
+def test_all_known_aliases_after_restore_state(parse_sql):
+    session = parse_sql("SELECT z.v FROM tab2 z;\n")
+    with session:
+        tab2 = Table.get_table_by_name("tab2", None)
+        state = session.save_state()
+        for s in sql2xml.StatementSplitter().process(sql2xml.lexer.tokenize(ALIAS_QUERY)):
+            sql2xml.run_steps(sql2xml.process_statement(sql2xml.grouping.group(s)))
+        assert Table.get_all_known_aliases(tab2.id) == ["y", "z"]
+        # Aliasy z odvolanych tabulek zmizi
+        session.restore_state(state)
+        assert Table.get_all_known_aliases(tab2.id) == scan_aliases(session, tab2.id) == ["z"]
+
+
+def test_match_attribute_with_unaliased_columns(parse_sql):
+    # Tabulka z DB "sch.x" a subselect s aliasem "x": mezi nimi rozhoduje sloupec, na ktery se odkazujeme (sloupce bez aliasu, prip. vyrazy bez kratkeho jmena nesmi porovnani prerusit)
+    session = parse_sql("SELECT x.cnt FROM sch.x, (SELECT COUNT(*), t.a, MAX(t.b) AS cnt FROM tab t GROUP BY t.a) x;\n")
+    with session:
+        main_select = session.tables[0]
+        db_table = Table.get_table_by_name("sch.x", None)
+        subselect = Table.get_table_by_name("select-0", None)
+        assert [(attribute.short_name, attribute.alias) for attribute in subselect.attributes] == [(None, None), ("a", None), (None, "cnt")]
+        assert Table.get_table_by_name("x", main_select, match_attribute="x.cnt") is subselect
+        assert Table.get_table_by_name("x", main_select, match_attribute="X.A") is subselect
+        assert Table.get_table_by_name("x", main_select, match_attribute="x.other") is db_table
+        # Bez rozhodujiciho sloupce je vracena tabulka nalezena podle jmena
+        assert Table.get_table_by_name("x", main_select) is db_table
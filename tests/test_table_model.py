@@ -0,0 +1,80 @@
+"""Testy modelu tabulek a atributu (viz Table a Attribute)"""
+import pytest
+
+import sql2xml
+from sql2xml import Attribute, Table
+
+# Nazvy specialnich podminek (puvodne primo hodnoty konstant CONDITION_*, ktere byly ukladany do condition)
+CONDITION_NAMES = {
+    Attribute.CONDITION_COMMENT: "COMMENT",
+    Attribute.CONDITION_EXISTS_SELECT: "EXISTS_SELECT",
+    Attribute.CONDITION_DEPENDENCY: "DEPENDENCY",
+    Attribute.CONDITION_SUBSELECT_NAME: "SUBSELECT_NAME",
+    Attribute.CONDITION_PLACEHOLDER_PRESENT: "PLACEHOLDER_PRESENT",
+    Attribute.CONDITION_SPLIT_ATTRIBUTE: "SPLIT_ATTRIBUTE",
+    Attribute.CONDITION_SPLIT_ATTRIBUTE_LINK: "SPLIT_ATTRIBUTE_LINK",
+    Attribute.CONDITION_SPLIT_ATTRIBUTE_ALIAS_MISSING: "SPLIT_ATTRIBUTE_ALIAS_MISSING",
+    Attribute.CONDITION_SINGLE_ELEMENT: "SINGLE_ELEMENT",
+    Attribute.CONDITION_TBD: "TO_BE_DETERMINED",
+}
+
+
+def test_slots():
+    with sql2xml.ParseSession():
+        attribute = Attribute("t.x")
+        table = Table(name="tab")
+        # Instance nemaji slovnik __dict__, nezname atributy tedy nelze nastavit
+        for obj in [attribute, table]:
+            assert not hasattr(obj, "__dict__")
+            with pytest.raises(AttributeError):
+                obj.unknown = 1
+
+
+def test_special_conditions():
+    assert {kind: Attribute.CONDITION_NAMES[kind] for kind in CONDITION_NAMES} == CONDITION_NAMES
+    assert Attribute.CONDITION_NAMES[Attribute.CONDITION_TEXT] == None
+    with sql2xml.ParseSession():
+        for (kind, name) in CONDITION_NAMES.items():
+            attribute = Attribute("t.x", kind=kind)
+            assert not attribute.is_standard_attribute()
+            assert attribute.has_condition()
+            assert attribute.condition == None
+            assert attribute.get_condition() == name
+            # Pripojeny text z nej dela bezny atribut s textovou podminkou (jako drive u retezcovych konstant)
+            attribute.append_to_condition(" = 1")
+            assert (attribute.kind, attribute.condition, attribute.get_condition()) == (Attribute.CONDITION_TEXT, name + " = 1", name + " = 1")
+            assert attribute.is_standard_attribute()
+
+
+def test_text_conditions():
+    with sql2xml.ParseSession():
+        attribute = Attribute("t.x")
+        assert attribute.is_standard_attribute() and not attribute.has_condition() and attribute.get_condition() == None
+        attribute.set_condition("= 1")
+        assert attribute.has_condition() and attribute.get_condition() == "= 1"
+        attribute.append_to_condition(" AND t.y = 2")
+        assert attribute.get_condition() == "= 1 AND t.y = 2"
+        attribute.set_condition(None, Attribute.CONDITION_PLACEHOLDER_PRESENT)
+        assert attribute.get_condition() == "PLACEHOLDER_PRESENT" and not attribute.is_standard_attribute()
+        attribute.set_condition(None)
+        assert not attribute.has_condition()
+        # Fiktivni atribut bez jmena neni standardni ani bez specialni podminky
+        assert not Attribute(None, comment="komentar").is_standard_attribute()
+        # Kopie zachovava druh i text podminky
+        attribute.set_condition("> 0")
+        copy = Attribute("t.y", kind=Attribute.CONDITION_SINGLE_ELEMENT).deep_copy()
+        assert (copy.name, copy.short_name, copy.kind, copy.get_condition()) == ("t.y", "y", Attribute.CONDITION_SINGLE_ELEMENT, "SINGLE_ELEMENT")
+        copy = attribute.deep_copy()
+        assert (copy.name, copy.kind, copy.condition) == ("t.x", Attribute.CONDITION_TEXT, "> 0")
+
+
+def test_sets_keep_order(parse_sql):
+    session = parse_sql("SELECT t.a FROM tab2 t WHERE t.b = :p_b AND t.c = :p_a AND t.d = :p_b AND EXISTS (SELECT 1 FROM tab1 u WHERE u.x = t.a);\n")
+    with session:
+        main_select = session.tables[0]
+        # Bindovane promenne a navazane tabulky jsou bez duplicit v poradi pridani
+        assert list(main_select.used_bind_vars) == ["p_b", "p_a"]
+        assert not main_select.add_bind_var(":p_a")
+        assert [session.tables_by_id[id].name for id in main_select.linked_to_tables_id] == ["tab2", "exists-select-0"]
+        # Ve vypisu tabulky jsou serazeny abecedne
+        assert "    Použité bindované proměnné:\n        p_a\n        p_b\n" in str(main_select)